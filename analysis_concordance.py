@@ -0,0 +1,354 @@
+"""
+一致性指数（C-index）模块
+
+Harrell's C需要统计所有可比较的观测对中风险评分与生存时间顺序一致的
+对数，直接枚举为O(n²)。这里把问题转化为二维支配计数：把观测按生存
+时间从晚到早排列后，对每个事件统计排在它前面且风险评分更低（或相同）
+的观测数。
+计数使用归并排序的分层形式（与树状数组等价），每层是一次向量化的
+稳定排序（各块内已有序，合并接近线性）和累积和，没有Python层面的逐对循环。
+另外提供二分类结局的C统计量（ROC曲线下面积）、累积/动态时间依赖AUC，
+以及由重抽样模块并行计算的自助法置信区间，供生存分析、风险评估和
+结局预测共用
+"""
+
+from functools import partial
+
+import numpy as np
+
+from analysis_resampling import (DEFAULT_RESAMPLES, bootstrap_indices, percentile_interval,
+                                 run_replicates)
+
+
+def _dense_rank(values):
+    """从0开始的稠密秩（相同取值的秩相同）"""
+    return np.unique(values, return_inverse=True)[1].astype(np.int64)
+
+
+def count_preceding(values):
+    """对序列中的每个位置p，统计位置在p之前且取值小于/不大于values[p]的元素个数
+
+    Args:
+        values: 非负整数数组
+
+    Returns:
+        tuple: (取值小于的个数, 取值不大于的个数)，均为int64数组
+    """
+    n = len(values)
+    lower = np.zeros(n, dtype=np.int64)
+    not_higher = np.zeros(n, dtype=np.int64)
+    if n < 2:
+        return lower, not_higher
+    values = np.asarray(values, dtype=np.int64)
+    scale = 2 * (int(values.max()) + 1)
+    index = np.arange(n)
+    order = index.copy()       # 当前各块内按取值排列的元素下标
+    size = 1
+    while size < n:
+        # 把每个长度为2*size的块的左右两半合并；取值相同时右半部分的元素排在前面
+        right = (order // size) % 2 == 1
+        keys = (order // (2 * size)) * scale + 2 * values[order] + ~right
+        merge = np.argsort(keys, kind='stable')
+        order = order[merge]
+        right = right[merge]
+        keys = keys[merge] >> 1
+        left = ~right
+        left_total = np.cumsum(left)
+        left_before = left_total - left
+        block_start = left_before[(index // (2 * size)) * (2 * size)]
+        # 取值相同的一段的末尾，用于统计取值相等的左半部分元素
+        run_end = np.flatnonzero(np.append(keys[1:] != keys[:-1], True))
+        run_total = left_total[run_end][np.searchsorted(run_end, index)]
+        rows = order[right]
+        lower[rows] += (left_before - block_start)[right]
+        not_higher[rows] += (run_total - block_start)[right]
+        size *= 2
+    return lower, not_higher
+
+
+def _group_starts(keys):
+    """已排序的键数组中，每个位置所在的相同键分组的起始位置"""
+    new_group = np.ones(len(keys), dtype=bool)
+    new_group[1:] = keys[1:] != keys[:-1]
+    starts = np.flatnonzero(new_group)
+    return np.repeat(starts, np.diff(np.append(starts, len(keys))))
+
+
+def _truncated_counts(start, time, risk_rank, event):
+    """统计事件i与开始时间不早于t_i的观测j组成的对（左截断时j在t_i处不在风险集中）
+
+    把所有观测的(start_j, 风险评分)作为点、事件的(t_i, 风险评分)作为查询，
+    按坐标从大到小排列（坐标相同时点在前）后，排在查询之前的点就是start_j >= t_i的观测
+
+    Returns:
+        tuple: (风险评分低于i的对数, 风险评分不高于i的对数, 总对数)
+    """
+    events = np.flatnonzero(event)
+    coordinates = np.concatenate((start, time[events]))
+    values = np.concatenate((risk_rank, risk_rank[events]))
+    is_query = np.arange(len(coordinates)) >= len(start)
+    order = np.lexsort((is_query, -coordinates))
+    values = values[order]
+    queries = is_query[order]
+    # 全部元素中的计数减去查询之间的计数，就是点的计数
+    lower, not_higher = count_preceding(values)
+    query_lower, query_not_higher = count_preceding(values[queries])
+    lower = lower[queries] - query_lower
+    not_higher = not_higher[queries] - query_not_higher
+    points = np.cumsum(~queries)[queries]
+    return int(lower.sum()), int(not_higher.sum()), int(points.sum())
+
+
+def concordance_counts(time, event, risk, start=None, strata=None):
+    """统计Harrell's C的一致对、不一致对和风险评分相同的对
+
+    可比较的观测对(i, j)：i发生事件且 t_i < t_j，或 t_i = t_j 且j删失；
+    计数过程数据还要求j在t_i处处于风险中（start_j < t_i），分层时只比较
+    同一层内的观测。风险评分越高表示生存时间越短，risk_i > risk_j为一致
+
+    Args:
+        time: 生存时间数组（计数过程数据为区间的结束时间）
+        event: 事件指示数组（1/0）
+        risk: 风险评分数组
+        start: 可选，区间的开始时间数组
+        strata: 可选，分层编码数组
+
+    Returns:
+        tuple: (一致对数, 不一致对数, 风险评分相同的对数)
+    """
+    time = np.asarray(time, dtype=np.float64)
+    event = np.asarray(event) > 0
+    risk = np.asarray(risk, dtype=np.float64)
+    if strata is not None:
+        strata = np.asarray(strata)
+        totals = np.zeros(3, dtype=np.int64)
+        for layer in np.unique(strata):
+            rows = strata == layer
+            totals += concordance_counts(time[rows], event[rows], risk[rows],
+                                         None if start is None else np.asarray(start)[rows])
+        return tuple(int(total) for total in totals)
+
+    if len(time) < 2 or not event.any():
+        return 0, 0, 0
+    risk_rank = _dense_rank(risk)
+    # 同一时间的删失观测排在事件之后：顺序键严格大于事件i的观测就是与i可比较的观测
+    order_key = _dense_rank(time) * 2 + (~event).astype(np.int64)
+
+    # 按顺序键从大到小排列，同一键内按风险评分从小到大排列
+    order = np.lexsort((risk_rank, -order_key))
+    keys = order_key[order]
+    values = risk_rank[order]
+    positions = np.arange(len(keys))
+    starts = _group_starts(keys)
+
+    # 排在前面的元素中扣除同一键内的元素（同一键内排在前面的风险评分都不高于当前元素）
+    value_starts = _group_starts(keys * (values.max() + 1) + values)
+    lower, not_higher = count_preceding(values)
+    lower -= value_starts - starts
+    not_higher -= positions - starts
+
+    events = event[order]
+    concordant = int(lower[events].sum())
+    tied_risk = int((not_higher - lower)[events].sum())
+    comparable = int(starts[events].sum())
+    if start is not None:
+        # start_j >= t_i的观测都有t_j > t_i，上面已计为可比较，需要扣除
+        truncated_lower, truncated_not_higher, truncated = _truncated_counts(
+            np.asarray(start, dtype=np.float64), time, risk_rank, event)
+        concordant -= truncated_lower
+        tied_risk -= truncated_not_higher - truncated_lower
+        comparable -= truncated
+    return concordant, comparable - concordant - tied_risk, tied_risk
+
+
+def concordance_index(time, event, risk, start=None, strata=None):
+    """Harrell's C-index
+
+    Args:
+        time: 生存时间数组（计数过程数据为区间的结束时间）
+        event: 事件指示数组（1/0）
+        risk: 风险评分数组（越高表示风险越大）
+        start: 可选，区间的开始时间数组
+        strata: 可选，分层编码数组（只比较同一层内的观测）
+
+    Returns:
+        dict: c_index（没有可比较的对时为None）、concordant、discordant、tied_risk、comparable
+    """
+    concordant, discordant, tied_risk = concordance_counts(time, event, risk, start, strata)
+    comparable = concordant + discordant + tied_risk
+    return {
+        'c_index': (concordant + 0.5 * tied_risk) / comparable if comparable else None,
+        'concordant': concordant,
+        'discordant': discordant,
+        'tied_risk': tied_risk,
+        'comparable': comparable
+    }
+
+
+def binary_concordance(outcome, score):
+    """二分类结局的C统计量（等于ROC曲线下面积）
+
+    取值最大的类别为阳性结局（与sklearn的roc_auc_score一致）。等价于所有
+    阳性观测的"时间"早于所有阴性观测、全部观测都有事件时的Harrell's C
+
+    Args:
+        outcome: 结局数组
+        score: 预测评分数组（越高表示越可能为阳性）
+
+    Returns:
+        dict: 与concordance_index相同
+    """
+    outcome = np.asarray(outcome)
+    positive = outcome == outcome.max() if len(outcome) else outcome.astype(bool)
+    return concordance_index((~positive).astype(np.float64), np.ones(len(outcome)), score)
+
+
+def _censoring_survival(time, event):
+    """删失分布的Kaplan-Meier估计G(t-)，用于逆概率删失加权
+
+    Returns:
+        function: 给定时间数组，返回G在这些时间之前（不含该时间）的取值
+    """
+    times, inverse = np.unique(time, return_inverse=True)
+    at_risk = np.cumsum(np.bincount(inverse, minlength=len(times))[::-1])[::-1]
+    censored = np.bincount(inverse, weights=~event, minlength=len(times))
+    survival = np.cumprod(1.0 - censored / at_risk)
+
+    def before(t):
+        index = np.searchsorted(times, t, side='left')
+        return np.where(index > 0, survival[np.maximum(index - 1, 0)], 1.0)
+    return before
+
+
+def time_dependent_auc(time, event, risk, times):
+    """累积/动态时间依赖AUC（逆概率删失加权，Uno等人的估计）
+
+    在时间点t，t之前（含t）发生事件的观测为病例，生存时间超过t的观测为
+    对照；病例按1/G(t_i-)加权，G为删失分布的Kaplan-Meier估计。每个时间点
+    把对照的风险评分排序后二分查找，计算量为O(n log n)
+
+    Args:
+        time: 生存时间数组
+        event: 事件指示数组（1/0）
+        risk: 风险评分数组（越高表示风险越大）
+        times: 评估的时间点
+
+    Returns:
+        list: 每个时间点的time、auc（没有病例或对照时为None）、cases、controls
+    """
+    time = np.asarray(time, dtype=np.float64)
+    event = np.asarray(event) > 0
+    risk = np.asarray(risk, dtype=np.float64)
+    censoring = _censoring_survival(time, event)
+    with np.errstate(divide='ignore'):
+        weights = np.where(event, 1.0 / censoring(time), 0.0)
+
+    results = []
+    for t in times:
+        cases = event & (time <= t) & np.isfinite(weights)
+        controls = np.sort(risk[time > t])
+        auc = None
+        if cases.any() and len(controls):
+            lower = np.searchsorted(controls, risk[cases], side='left')
+            ties = np.searchsorted(controls, risk[cases], side='right') - lower
+            case_weights = weights[cases]
+            auc = float(((lower + 0.5 * ties) * case_weights).sum()
+                        / (case_weights.sum() * len(controls)))
+        results.append({
+            'time': float(t),
+            'auc': auc,
+            'cases': int(cases.sum()),
+            'controls': int(len(controls))
+        })
+    return results
+
+
+def _bootstrap_statistics(statistic, arrays, rng, size):
+    """计算一批（size个）自助样本的统计量"""
+    n = len(arrays[0])
+    values = np.full(size, np.nan)
+    for k, rows in enumerate(bootstrap_indices(rng, size, n)):
+        value = statistic(*(array[rows] for array in arrays))
+        if value is not None:
+            values[k] = value
+    return values
+
+
+def bootstrap_interval(statistic, arrays, n_resamples=DEFAULT_RESAMPLES, confidence_level=0.95, seed=None):
+    """统计量的自助法百分位数置信区间（由重抽样模块分批并行计算）
+
+    Args:
+        statistic: 模块级统计量函数，参数为各数组的自助样本，无法计算时返回None
+        arrays: 按观测对齐的numpy数组列表，按相同的行下标重抽样
+        n_resamples: 自助样本数
+        confidence_level: 置信水平
+        seed: 随机种子，None时使用重抽样模块的默认种子
+
+    Returns:
+        dict: ci_lower、ci_upper、std_error（有效样本不足时为None）和n_resamples
+    """
+    values = run_replicates(partial(_bootstrap_statistics, statistic), arrays, n_resamples, seed)
+    values = values[~np.isnan(values)]
+    if len(values) < 2:
+        return {'ci_lower': None, 'ci_upper': None, 'std_error': None, 'n_resamples': int(len(values))}
+    lower, upper, std_error = percentile_interval(values, confidence_level)
+    return {
+        'ci_lower': float(lower),
+        'ci_upper': float(upper),
+        'std_error': float(std_error),
+        'n_resamples': int(len(values))
+    }
+
+
+def _c_index_statistic(time, event, risk, strata=None):
+    return concordance_index(time, event, risk, strata=strata)['c_index']
+
+
+def _c_statistic(outcome, score):
+    return binary_concordance(outcome, score)['c_index']
+
+
+def concordance_summary(time, event, risk, strata=None, n_resamples=0, confidence_level=0.95, seed=None):
+    """Harrell's C-index及其自助法置信区间
+
+    Args:
+        time: 生存时间数组
+        event: 事件指示数组（1/0）
+        risk: 风险评分数组（越高表示风险越大）
+        strata: 可选，分层编码数组
+        n_resamples: 自助样本数，为0时不计算置信区间
+        confidence_level: 置信水平
+        seed: 随机种子
+
+    Returns:
+        dict: concordance_index的结果，n_resamples > 0时另有ci_lower、ci_upper、std_error
+    """
+    arrays = [np.asarray(time, dtype=np.float64), np.asarray(event, dtype=np.float64),
+              np.asarray(risk, dtype=np.float64)]
+    if strata is not None:
+        arrays.append(np.asarray(strata))
+    summary = concordance_index(*arrays[:3], strata=strata)
+    if n_resamples > 0:
+        summary.update(bootstrap_interval(_c_index_statistic, arrays, n_resamples, confidence_level, seed))
+    return summary
+
+
+def c_statistic_summary(outcome, score, n_resamples=DEFAULT_RESAMPLES, confidence_level=0.95, seed=None):
+    """二分类结局的C统计量及其自助法置信区间
+
+    Args:
+        outcome: 结局数组
+        score: 预测评分数组
+        n_resamples: 自助样本数，为0时不计算置信区间
+        confidence_level: 置信水平
+        seed: 随机种子
+
+    Returns:
+        dict: binary_concordance的结果，n_resamples > 0时另有ci_lower、ci_upper、std_error
+    """
+    outcome = np.asarray(outcome)
+    score = np.asarray(score, dtype=np.float64)
+    summary = binary_concordance(outcome, score)
+    if n_resamples > 0:
+        summary.update(bootstrap_interval(_c_statistic, [outcome, score], n_resamples, confidence_level, seed))
+    return summary
@@ -0,0 +1,526 @@
+"""
+相关性分析模块
+
+所有变量整理为一个float64矩阵（行是记录，列是变量，缺失值和非数值为NaN），
+一次计算整个相关系数矩阵：
+- Pearson: 列中心化后用矩阵乘法得到全部变量对的协方差
+- Spearman: 每列只排序一次（平均秩），对秩矩阵计算Pearson相关
+- Kendall: tau-b，记录数不多时用符号矩阵乘法一次计算全部变量对，否则逐对
+  计算（O(n log n)），小样本无结时使用精确分布
+缺失值可以按整行删除（listwise，默认）或按变量对删除（pairwise），
+pairwise时用缺失掩码的矩阵乘法得到每对变量的有效样本量和各项和。
+Pearson和Spearman的p值由t分布计算。
+可选的重抽样把一批自助样本（整行有放回抽样）或置换样本（除第一列外各列
+独立置换，任意两列之间的对应关系都被打乱）排成 次数×记录×变量 的张量，
+用批量矩阵乘法一次得到所有重抽样的相关系数矩阵
+"""
+
+from functools import partial
+
+import numpy as np
+from scipy import stats as sp_stats
+
+from analysis_resampling import (bootstrap_indices, percentile_interval, permutation_p_value, permuted_rows,
+                                 resampling_summary, run_replicates)
+
+
+# 支持的相关系数类型
+CORRELATION_TYPES = ('pearson', 'spearman', 'kendall', 'point_biserial')
+
+# 缺失值处理方式
+MISSING_POLICIES = ('listwise', 'pairwise')
+
+# 计算相关系数需要的最少观测数
+MIN_OBSERVATIONS = 3
+
+
+def numeric_matrix(columns, variables, binary_categories=False):
+    """把变量整理为float64矩阵
+
+    Args:
+        columns: DatasetColumns列式快照
+        variables: 变量名列表
+        binary_categories: 为True时，恰好有两个取值的非数值变量编码为0/1
+                           （点二列相关的二分变量）
+
+    Returns:
+        numpy.ndarray: 记录×变量矩阵，缺失值和非数值为NaN
+    """
+    X = np.empty((columns.n_rows, len(variables)), dtype=np.float64)
+    for j, variable in enumerate(variables):
+        values = columns.numeric(variable)
+        if binary_categories and not np.isfinite(values).any():
+            values = _binary_codes(columns.raw(variable), values)
+        X[:, j] = values
+    X[~np.isfinite(X)] = np.nan
+    return X
+
+
+def _binary_codes(raw, default):
+    """恰好有两个取值的变量按取值第一次出现的顺序编码为0/1，否则返回default"""
+    labels = {}
+    codes = np.full(len(raw), np.nan)
+    for i, value in enumerate(raw):
+        if value is None or value == '':
+            continue
+        code = labels.setdefault(str(value), len(labels))
+        if code > 1:
+            return default
+        codes[i] = code
+    return codes if len(labels) == 2 else default
+
+
+def rank_columns(X):
+    """对每列的非缺失值计算平均秩（每列只排序一次），缺失值仍为NaN"""
+    return sp_stats.rankdata(X, axis=0, nan_policy='omit')
+
+
+def _correlation_from_sums(n, sx, sy, sxx, syy, sxy):
+    """由有效样本量和各项和计算相关系数（各参数为变量×变量矩阵）"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        r = cov / np.sqrt(var_x * var_y)
+        # 方差的舍入误差接近0时视为没有变异
+        scale = np.maximum(sxx, syy)
+        r[(var_x <= 1e-12 * sxx) | (var_y <= 1e-12 * syy) | (scale == 0)] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+
+def pearson_matrix(X, pairwise=False):
+    """计算Pearson相关系数矩阵
+
+    Args:
+        X: 记录×变量矩阵，缺失值为NaN
+        pairwise: 是否按变量对删除缺失值；为False时调用方应已删除含缺失值的行
+
+    Returns:
+        tuple: (相关系数矩阵, 有效样本量矩阵)，无法计算的位置为NaN
+    """
+    present = ~np.isnan(X)
+    values = np.where(present, X, 0.0)
+    # 先按列均值中心化，减小各项和相减时的舍入误差
+    counts = present.sum(axis=0)
+    values -= np.where(present, values.sum(axis=0) / np.maximum(counts, 1), 0.0)
+    p = X.shape[1]
+    if not pairwise or present.all():
+        n = np.full((p, p), float(X.shape[0]))
+        sums = values.sum(axis=0)
+        squares = np.einsum('ij,ij->j', values, values)
+        sxy = values.T @ values
+        return _correlation_from_sums(n, sums[:, None], sums[None, :], squares[:, None],
+                                      squares[None, :], sxy), n
+
+    mask = present.astype(np.float64)
+    n = mask.T @ mask
+    sx = values.T @ mask            # sx[a, b]: a在a、b都有值的行上的和
+    sxx = (values * values).T @ mask
+    sxy = values.T @ values
+    return _correlation_from_sums(n, sx, sx.T, sxx, sxx.T, sxy), n
+
+
+class _ColumnOrder:
+    """一列非缺失值的排序结果（每列只排序一次），用于计算该列在任意行子集上的秩"""
+
+    def __init__(self, column):
+        missing = np.isnan(column)
+        rows = np.flatnonzero(~missing)
+        self.missing = np.flatnonzero(missing)
+        self.order = rows[np.argsort(column[rows], kind='stable')]
+        values = column[self.order]
+        new_group = np.ones(len(values), dtype=bool)
+        new_group[1:] = values[1:] != values[:-1]
+        self.tied = not new_group.all()
+        self.starts = np.flatnonzero(new_group)      # 每组相同取值在排序中的起始位置
+        self.groups = np.cumsum(new_group) - 1       # 排序后每个位置所属的组
+
+    def subset_ranks(self, masks, out):
+        """计算该列在masks每一列选出的记录子集上的平均秩
+
+        秩不超过2^24时是float32可以精确表示的整数或半整数，out可以是float32数组
+
+        Args:
+            masks: 记录×q的布尔矩阵
+            out: 记录×q的输出数组，该列缺失或不在子集中的位置为0
+
+        Returns:
+            numpy.ndarray: 每个子集上秩的平方和（长度q），由子集大小和结的个数直接计算
+        """
+        out[self.missing] = 0.0
+        if len(self.order) == 0:
+            return np.zeros(masks.shape[1])
+        selected = masks[self.order]
+        if self.tied:
+            counts = np.add.reduceat(selected, self.starts, axis=0, dtype=out.dtype)
+            average = np.cumsum(counts, axis=0)
+            average -= (counts - 1) / 2
+            ranks = average[self.groups]
+            counts = counts.astype(np.float64)
+            size = counts.sum(axis=0)
+            ties = (counts ** 3 - counts).sum(axis=0)
+        else:
+            ranks = np.cumsum(selected, axis=0, dtype=out.dtype)
+            size = ranks[-1].astype(np.float64)
+            ties = 0.0
+        ranks *= selected
+        out[self.order] = ranks
+        # 平均秩的平方和 = m(m+1)(2m+1)/6 - Σ(t^3 - t)/12
+        return size * (size + 1) * (2 * size + 1) / 6 - ties / 12
+
+
+# pairwise Spearman每块秩张量的元素个数上限
+SPEARMAN_BLOCK_ELEMENTS = 8_000_000
+
+# 缺失模式较少时一次计算全部变量在各缺失模式上的秩，秩张量的元素个数上限
+SPEARMAN_PATTERN_ELEMENTS = 16_000_000
+
+
+def _spearman_by_pattern(orders, present, patterns, pattern_ids, n):
+    """缺失模式较少时的pairwise Spearman
+
+    变量a在变量b有效行上的秩只取决于b的缺失模式，每个变量在每种缺失模式上
+    只计算一次秩；缺失模式分别为h、g的变量a、b之间的乘积和是秩矩阵的
+    一次矩阵乘法
+    """
+    n_rows, p = present.shape
+    ranks = np.empty((n_rows, p, len(patterns)), dtype=np.float32)
+    squares = np.empty((p, len(patterns)))
+    masks = present[:, patterns]
+    for a in range(p):
+        squares[a] = orders[a].subset_ranks(masks, ranks[:, a])
+    sxx = squares[:, pattern_ids]
+    sxy = np.empty((p, p))
+    members = [np.flatnonzero(pattern_ids == h) for h in range(len(patterns))]
+    for h, first in enumerate(members):
+        for g, second in enumerate(members):
+            # 缺失模式为h的变量在模式g上的秩 × 缺失模式为g的变量在模式h上的秩
+            sxy[np.ix_(first, second)] = (ranks[:, first, g].T.astype(np.float64)
+                                          @ ranks[:, second, h].astype(np.float64))
+    sums = n * (n + 1) / 2
+    return _correlation_from_sums(n, sums, sums, sxx, sxx.T, sxy)
+
+
+def spearman_matrix(X, pairwise=False):
+    """计算Spearman等级相关系数矩阵
+
+    每列只排序一次。没有缺失值（或listwise）时对秩矩阵做一次矩阵乘法；
+    pairwise时每对变量需要在共同有效的行上重新计算秩，利用各列的排序
+    结果批量计算（秩以float32精确保存，秩的平方和由子集大小和结直接得到）：
+    - 缺失模式较少时，每个变量在每种缺失模式上计算一次秩，乘积和用矩阵乘法
+    - 否则按变量块计算每个变量在另一块各变量有效行上的秩，计算量为O(n·p²)，
+      缺失模式各不相同时200个变量、5000行约需数秒
+
+    Returns:
+        tuple: (相关系数矩阵, 有效样本量矩阵)
+    """
+    present = ~np.isnan(X)
+    if not pairwise or present.all():
+        return pearson_matrix(rank_columns(X), pairwise)
+
+    n_rows, p = X.shape
+    mask = present.astype(np.float64)
+    n = mask.T @ mask
+    orders = [_ColumnOrder(X[:, j]) for j in range(p)]
+    _, patterns, pattern_ids = np.unique(present, axis=1, return_index=True, return_inverse=True)
+    if len(patterns) < p and n_rows * p * len(patterns) <= SPEARMAN_PATTERN_ELEMENTS:
+        return _spearman_by_pattern(orders, present, patterns, pattern_ids.ravel(), n), n
+
+    r = np.full((p, p), np.nan)
+    block = max(1, min(p, int((SPEARMAN_BLOCK_ELEMENTS / max(n_rows, 1)) ** 0.5)))
+    blocks = [range(start, min(start + block, p)) for start in range(0, p, block)]
+    for i, first in enumerate(blocks):
+        for second in blocks[i:]:
+            rows, cols = slice(first.start, first.stop), slice(second.start, second.stop)
+            # x[i, a, b]: 变量a在a、b共同有效行上的秩；y[i, b, a]: 变量b在同样行上的秩
+            x = np.empty((n_rows, len(first), len(second)), dtype=np.float32)
+            sxx = np.array([orders[a].subset_ranks(present[:, cols], x[:, k])
+                            for k, a in enumerate(first)])
+            if first == second:
+                y, syy = x, sxx.T
+            else:
+                y = np.empty((n_rows, len(second), len(first)), dtype=np.float32)
+                syy = np.array([orders[b].subset_ranks(present[:, rows], y[:, k])
+                                for k, b in enumerate(second)]).T
+            sxy = np.einsum('iab,iba->ab', x, y, dtype=np.float64)
+            # 共同有效行上两列的秩和都是n(n+1)/2
+            counts = n[rows, cols]
+            sums = counts * (counts + 1) / 2
+            block_r = _correlation_from_sums(counts, sums, sums, sxx, syy, sxy)
+            r[rows, cols] = block_r
+            r[cols, rows] = block_r.T
+    return r, n
+
+
+# 记录数不超过该值时，Kendall相关用符号矩阵乘法一次计算全部变量对，否则逐对计算
+KENDALL_MATRIX_MAX_ROWS = 2000
+
+# 符号矩阵乘法每块的元素个数上限（记录对×变量）
+KENDALL_BLOCK_ELEMENTS = 4_000_000
+
+
+def _kendall_scores(X, present):
+    """全部变量对的S = Σ_{i<j} sgn(x_ia - x_ja)·sgn(x_ib - x_jb)
+
+    只计入两个变量在i、j两条记录上都有值的记录对。每块记录对的符号矩阵
+    （记录对×变量）与自身做一次矩阵乘法，元素为0、±1，float32乘积和精确
+    """
+    n_rows, p = X.shape
+    values = np.where(present, X, 0.0)
+    scores = np.zeros((p, p))
+    step = max(1, KENDALL_BLOCK_ELEMENTS // max(1, n_rows * p))
+    for start in range(0, n_rows - 1, step):
+        signs = np.concatenate([
+            np.sign(values[i + 1:] - values[i]) * (present[i + 1:] & present[i])
+            for i in range(start, min(start + step, n_rows - 1))
+        ]).astype(np.float32)
+        scores += signs.T @ signs
+    return scores
+
+
+def _tie_sums(order, present):
+    """变量在其他各变量有效行上的结统计（scipy.stats.kendalltau的记法）
+
+    Returns:
+        tuple: (Σt(t-1)/2, Σt(t-1)(t-2), Σt(t-1)(2t+5))，每项是长度为变量数的数组，
+               t为相同取值在共同有效行上的个数
+    """
+    counts = np.add.reduceat(present[order.order], order.starts, axis=0, dtype=np.float64)
+    pairs = counts * (counts - 1)
+    return (pairs.sum(axis=0) / 2, (pairs * (counts - 2)).sum(axis=0),
+            (pairs * (2 * counts + 5)).sum(axis=0))
+
+
+def kendall_matrix(X):
+    """计算Kendall tau-b相关系数矩阵及p值（每对只使用两个变量都有值的行）
+
+    记录数不超过KENDALL_MATRIX_MAX_ROWS时，用符号矩阵乘法一次得到全部变量对的
+    S（计算量O(n²·p²)，由BLAS完成），结的个数按各列的排序结果批量统计，
+    p值与scipy.stats.kendalltau相同（有结或样本较大时用正态近似，小样本无结时
+    逐对计算精确p值）。记录数更多时逐对调用scipy.stats.kendalltau
+    （每对O(n log n)，总计算量随变量对数增长，变量很多时仍较慢）
+
+    Returns:
+        tuple: (相关系数矩阵, p值矩阵, 有效样本量矩阵)
+    """
+    n_rows, p = X.shape
+    present = ~np.isnan(X)
+    mask = present.astype(np.float64)
+    n = mask.T @ mask
+    if n_rows > KENDALL_MATRIX_MAX_ROWS:
+        return _pairwise_kendall(X, present, n)
+
+    scores = _kendall_scores(X, present)
+    xtie, x0, x1 = (np.zeros((p, p)) for _ in range(3))
+    for a in range(p):
+        order = _ColumnOrder(X[:, a])
+        if order.tied:
+            xtie[a], x0[a], x1[a] = _tie_sums(order, present)
+    ytie, y0, y1 = xtie.T, x0.T, x1.T
+
+    total = n * (n - 1) / 2
+    valid = (n >= MIN_OBSERVATIONS) & (xtie < total) & (ytie < total)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau = np.clip(scores / np.sqrt(total - xtie) / np.sqrt(total - ytie), -1.0, 1.0)
+        m = n * (n - 1)
+        variance = ((m * (2 * n + 5) - x1 - y1) / 18 + 2 * xtie * ytie / m
+                    + x0 * y0 / (9 * m * (n - 2)))
+        p_values = 2 * sp_stats.norm.sf(np.abs(scores) / np.sqrt(variance))
+    tau[~valid] = np.nan
+    p_values[~valid] = np.nan
+
+    # 无结且样本较小（或几乎完全一致）时scipy使用精确分布
+    discordant = (total - scores) / 2
+    exact = valid & (xtie == 0) & (ytie == 0) & ((n <= 33) | (np.minimum(discordant, total - discordant) <= 1))
+    for a, b in zip(*np.nonzero(np.triu(exact, 1))):
+        rows = present[:, a] & present[:, b]
+        p_values[a, b] = p_values[b, a] = sp_stats.kendalltau(X[rows, a], X[rows, b])[1]
+    return tau, p_values, n
+
+
+def _pairwise_kendall(X, present, n):
+    """逐对调用scipy.stats.kendalltau计算Kendall tau-b及p值"""
+    p = X.shape[1]
+    tau = np.full((p, p), np.nan)
+    p_values = np.full((p, p), np.nan)
+    for a in range(p):
+        for b in range(a + 1, p):
+            rows = present[:, a] & present[:, b]
+            if rows.sum() < MIN_OBSERVATIONS:
+                continue
+            x, y = X[rows, a], X[rows, b]
+            if np.ptp(x) == 0 or np.ptp(y) == 0:
+                continue
+            statistic, p_value = sp_stats.kendalltau(x, y)
+            tau[a, b] = tau[b, a] = statistic
+            p_values[a, b] = p_values[b, a] = p_value
+    return tau, p_values, n
+
+
+def t_test_p_values(r, n):
+    """相关系数为0的双侧检验p值（t = r * sqrt((n - 2) / (1 - r^2))，自由度n - 2）"""
+    df = n - 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = r * np.sqrt(df / np.maximum(1.0 - r * r, 0.0))
+        p_values = 2 * sp_stats.t.sf(np.abs(t), df)
+    p_values[np.abs(r) >= 1.0] = 0.0
+    return np.where(np.isnan(r) | (df < 1), np.nan, p_values)
+
+
+def _coefficients(X, correlation_type, pairwise):
+    """一个样本的相关系数矩阵（无法计算的位置为NaN）"""
+    if correlation_type == 'kendall':
+        return kendall_matrix(X)[0]
+    if correlation_type == 'spearman':
+        return spearman_matrix(X, pairwise)[0]
+    return pearson_matrix(X, pairwise)[0]
+
+
+def _batched_pearson(samples):
+    """没有缺失值时，次数×记录×变量张量中每个样本的Pearson相关系数矩阵"""
+    centred = samples - samples.mean(axis=1, keepdims=True)
+    cov = np.matmul(centred.transpose(0, 2, 1), centred)
+    variances = np.einsum('bii->bi', cov)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = cov / np.sqrt(variances[:, :, None] * variances[:, None, :])
+    scale = np.einsum('bij,bij->bj', samples, samples)
+    constant = variances <= 1e-12 * np.maximum(scale, 1e-300)
+    r[constant[:, :, None] | constant[:, None, :]] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+
+def _resample_batch(correlation_type, pairwise, method, arrays, rng, size):
+    """重抽样模块调用的批处理函数：一批重抽样的相关系数矩阵（次数×变量×变量）"""
+    X = arrays[0]
+    n, p = X.shape
+    if method == 'permutation':
+        samples = np.empty((size, n, p))
+        samples[:, :, 0] = X[:, 0]
+        for j in range(1, p):
+            samples[:, :, j] = permuted_rows(rng, size, X[:, j])
+    else:
+        samples = X[bootstrap_indices(rng, size, n)]
+    if correlation_type in ('pearson', 'point_biserial', 'spearman') and not np.isnan(X).any():
+        if correlation_type == 'spearman':
+            samples = sp_stats.rankdata(samples, axis=1)
+        return _batched_pearson(samples)
+    return np.stack([_coefficients(sample, correlation_type, pairwise) for sample in samples])
+
+
+def resample_correlations(X, r, correlation_type, pairwise, method, n_resamples, seed=None,
+                          confidence_level=0.95):
+    """相关系数矩阵的自助法置信区间或置换检验p值
+
+    Args:
+        X: 参与计算的记录×变量矩阵（listwise时已删除含缺失值的行）
+        r: 观测的相关系数矩阵（无法计算的位置为NaN）
+        correlation_type: 相关系数类型
+        pairwise: 是否按变量对删除缺失值
+        method: bootstrap或permutation
+        n_resamples: 重抽样次数
+        seed: 随机种子
+        confidence_level: 自助法置信水平
+
+    Returns:
+        dict: 重抽样设置，自助法另有ci_lower、ci_upper、std_error矩阵，
+              置换检验另有p_values矩阵（双侧），无法计算的位置为None
+    """
+    replicate_type = correlation_type
+    if method == 'permutation' and correlation_type == 'spearman' and not np.isnan(X).any():
+        # 置换不改变各列的秩，先求秩后按Pearson计算
+        X, replicate_type = rank_columns(X), 'pearson'
+    batch = partial(_resample_batch, replicate_type, pairwise, method)
+    replicates = run_replicates(batch, [X], n_resamples, seed, width=X.shape[1])
+
+    def to_list(matrix, diagonal):
+        matrix = np.where(np.isnan(r), np.nan, matrix)
+        np.fill_diagonal(matrix, diagonal)
+        return [[float(value) if np.isfinite(value) else None for value in row] for row in matrix]
+
+    summary = resampling_summary(method, n_resamples, seed)
+    if method == 'permutation':
+        summary['p_values'] = to_list(permutation_p_value(r, replicates), 0.0)
+    else:
+        lower, upper, std_error = percentile_interval(replicates, confidence_level)
+        summary.update({
+            'confidence_level': confidence_level,
+            'ci_lower': to_list(lower, 1.0),
+            'ci_upper': to_list(upper, 1.0),
+            'std_error': to_list(std_error, 0.0)
+        })
+    return summary
+
+
+def correlation_matrix(columns, variables, correlation_type='pearson', missing='listwise',
+                       significance_test=True, n_resamples=0, resampling_method='bootstrap', seed=None):
+    """计算变量间的相关系数矩阵
+
+    Args:
+        columns: DatasetColumns列式快照
+        variables: 变量名列表
+        correlation_type: 相关系数类型，见CORRELATION_TYPES；point_biserial与Pearson
+                          相同，二分类文本变量编码为0/1
+        missing: listwise（删除任一变量缺失的行）或pairwise（按变量对删除）
+        significance_test: 是否计算p值
+        n_resamples: 重抽样次数，为0时不做重抽样
+        resampling_method: bootstrap（置信区间）或permutation（置换检验p值）
+        seed: 重抽样随机种子
+
+    Returns:
+        dict: matrix（相关系数）、p_values（不检验时为None）、n_matrix（每对变量的
+              有效样本量）、n（listwise为有效行数，pairwise为各变量对中最小的有效样本量）；
+              没有变异或样本量不足的变量对相关系数为0、p值为1；
+              n_resamples > 0时另有resampling（见resample_correlations）
+
+    Raises:
+        ValueError: 参数不合法或有效数据不足
+    """
+    if correlation_type not in CORRELATION_TYPES:
+        raise ValueError(f'不支持的相关系数类型: {correlation_type}')
+    if missing not in MISSING_POLICIES:
+        raise ValueError(f'不支持的缺失值处理方式: {missing}')
+
+    X = numeric_matrix(columns, variables, binary_categories=correlation_type == 'point_biserial')
+    pairwise = missing == 'pairwise'
+    if not pairwise:
+        X = X[~np.isnan(X).any(axis=1)]
+        if X.shape[0] < MIN_OBSERVATIONS:
+            raise ValueError(f'没有足够的数据点进行相关性分析(仅有{X.shape[0]}个有效观测)')
+
+    p_values = None
+    if correlation_type == 'kendall':
+        r, p_values, n = kendall_matrix(X)
+    elif correlation_type == 'spearman':
+        r, n = spearman_matrix(X, pairwise)
+    else:
+        r, n = pearson_matrix(X, pairwise)
+    r[n < MIN_OBSERVATIONS] = np.nan
+    if significance_test and p_values is None:
+        p_values = t_test_p_values(r, n)
+
+    off_diagonal = ~np.eye(len(variables), dtype=bool)
+    if pairwise and n[off_diagonal].max() < MIN_OBSERVATIONS:
+        raise ValueError(f'没有足够的数据点进行相关性分析(各变量对最多只有{int(n[off_diagonal].max())}个有效观测)')
+
+    resampling = None
+    if n_resamples > 0:
+        resampling = resample_correlations(X, r, correlation_type, pairwise, resampling_method,
+                                           n_resamples, seed)
+
+    # 无法计算的相关系数记为0、p值记为1，对角线为1、p值为0
+    undefined = np.isnan(r)
+    r[undefined] = 0.0
+    np.fill_diagonal(r, 1.0)
+    if significance_test:
+        p_values = np.where(undefined, 1.0, p_values)
+        np.fill_diagonal(p_values, 0.0)
+
+    result = {
+        'matrix': r.tolist(),
+        'p_values': p_values.tolist() if significance_test else None,
+        'n_matrix': n.astype(np.int64).tolist(),
+        'n': int(n[off_diagonal].min()) if pairwise else int(X.shape[0])
+    }
+    if resampling is not None:
+        result['resampling'] = resampling
+    return result
@@ -0,0 +1,395 @@
+"""
+Cox比例风险回归模块
+
+每个不同事件时间的风险集汇总量（Σexp(η)、Σexp(η)x）由按事件时间
+汇总的直方图（np.bincount）的反向累积和得到，部分似然、得分向量和
+信息矩阵的计算量为O(n·p²)，不需要对风险集做逐对循环。
+支持计数过程(start, stop]数据（左截断、随时间变化的协变量，同一患者
+可以有多个区间）和分层模型（各层有各自的基线风险，共用回归系数）。
+同一时间的多个事件支持Breslow和Efron两种处理方式（默认Efron，与R的
+coxph一致）。参数用Newton-Raphson迭代（似然下降时步长减半）估计，
+标准误来自信息矩阵的逆（也可以用自助法重新拟合得到置信区间），
+模型区分度用Harrell's C-index评估
+"""
+
+from functools import partial
+
+import numpy as np
+from scipy import stats as sp_stats
+
+from analysis_concordance import concordance_index, concordance_summary, time_dependent_auc
+from analysis_resampling import bootstrap_indices, percentile_interval, resampling_summary, run_replicates
+
+
+# 同时发生事件的处理方式
+TIES_METHODS = ('efron', 'breslow')
+
+# Newton-Raphson迭代的最大次数和收敛阈值（对数似然的相对变化）
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-9
+
+# 单次迭代中步长减半的最大次数
+MAX_STEP_HALVING = 20
+
+
+def design_matrix(columns, covariates, rows):
+    """把协变量整理为设计矩阵
+
+    全部取值都是数值的协变量作为连续变量；否则作为分类变量，按类别
+    （字符串排序）生成虚拟变量，第一个类别为参考类别。Cox模型的基线
+    风险已经包含常数项，设计矩阵不加截距
+
+    Args:
+        columns: DatasetColumns列式快照
+        covariates: 协变量名列表
+        rows: 参与分析的行下标数组
+
+    Returns:
+        tuple: (设计矩阵, 列名列表, 协变量类型字典)
+
+    Raises:
+        ValueError: 协变量没有变异
+    """
+    blocks = []
+    names = []
+    covariate_types = {}
+    for cov in covariates:
+        values = columns.values(cov)
+        values = [values[i] for i in rows]
+        if all(isinstance(v, (int, float)) for v in values):
+            covariate_types[cov] = 'continuous'
+            blocks.append(np.asarray(values, dtype=np.float64)[:, None])
+            names.append(cov)
+        else:
+            covariate_types[cov] = 'categorical'
+            labels = np.asarray([str(v) for v in values], dtype=object)
+            categories, codes = np.unique(labels, return_inverse=True)
+            # 虚拟变量（除了参考类别）
+            blocks.append((codes[:, None] == np.arange(1, len(categories))[None, :]).astype(np.float64))
+            names.extend(f"{cov}_{category}" for category in categories[1:])
+
+    X = np.hstack(blocks) if blocks else np.empty((len(rows), 0))
+    constant = [name for name, column in zip(names, X.T) if np.ptp(column) == 0]
+    if not names or constant:
+        raise ValueError(f"协变量没有变异，无法估计回归系数: {', '.join(constant or covariates)}")
+    return X, names, covariate_types
+
+
+class _RiskSets:
+    """事件时间和风险集的结构，拟合过程中各次迭代共用
+
+    支持计数过程数据：观测(start, stop]只在start < t <= stop的事件时间t处
+    属于风险集（左截断和随时间变化的协变量）。各层的不同事件时间依次
+    编号，每层多留一个位置，观测按开始/结束时间映射到这张表的位置上，
+    风险集汇总量是每层内的反向累积和，不需要复制或重排设计矩阵
+    """
+
+    def __init__(self, stop, event, ties, start=None, strata=None):
+        n = len(stop)
+        event = event > 0
+        strata = np.zeros(n, dtype=np.int64) if strata is None else np.asarray(strata, dtype=np.int64)
+        n_strata = int(strata.max()) + 1 if n else 1
+
+        # 所有时间统一编为从1开始的整数秩，层和时间组合为整数键
+        times = stop if start is None else np.concatenate((stop, start))
+        unique_times, inverse = np.unique(times, return_inverse=True)
+        scale = len(unique_times) + 1
+        stop_keys = strata * scale + inverse[:n] + 1
+
+        # 按(层, 时间)排列的事件观测和不同的事件键
+        self.death_rows = np.flatnonzero(event)
+        self.death_rows = self.death_rows[np.argsort(stop_keys[self.death_rows], kind='stable')]
+        event_keys, self.deaths = np.unique(stop_keys[self.death_rows], return_counts=True)
+        K = len(event_keys)
+        event_strata = event_keys // scale
+        self.n_event_times = K
+
+        # 每层在位置表中占(该层事件时间数 + 1)个位置，第k个事件时间的位置为k + 层号
+        layer_starts = np.searchsorted(event_strata, np.arange(n_strata + 1), side='left')
+        bounds = layer_starts + np.arange(n_strata + 1)
+        self.segments = [(bounds[s], bounds[s + 1]) for s in range(n_strata)]
+        self.size = bounds[-1]
+        self.event_positions = np.arange(K) + event_strata
+
+        # 观测在结束时间之前的事件时间处都在风险集中，开始时间及之前的事件时间处不在
+        self.stop_bins = np.searchsorted(event_keys, stop_keys, side='right') + strata
+        if start is None:
+            self.start_bins = None
+            entry = layer_starts[strata]
+        else:
+            start_keys = strata * scale + inverse[n:] + 1
+            entry = np.searchsorted(event_keys, start_keys, side='right')
+            self.start_bins = entry + strata
+        self.entry_bins = entry + strata
+
+        self.death_index = np.repeat(np.arange(K), self.deaths)
+        self.death_start = np.concatenate(([0], np.cumsum(self.deaths)[:-1]))
+        # Efron近似：同一时间的第l个事件（l=0..d-1）从风险集中扣除l/d的事件风险
+        if ties == 'efron':
+            within = np.arange(len(self.death_index)) - self.death_start[self.death_index]
+            self.fraction = within / self.deaths[self.death_index]
+        else:
+            self.fraction = np.zeros(len(self.death_index))
+
+    def _segment_cumsum(self, values, reverse=False):
+        """在每层的位置区间内分别计算（反向）累积和，各层之间互不影响"""
+        out = np.empty_like(values)
+        for lo, hi in self.segments:
+            block = values[lo:hi]
+            out[lo:hi] = np.cumsum(block[::-1])[::-1] if reverse else np.cumsum(block)
+        return out
+
+    def at_risk_sums(self, values):
+        """每个事件时间的风险集中values的和"""
+        total = np.bincount(self.stop_bins, weights=values, minlength=self.size)
+        if self.start_bins is not None:
+            # 开始时间不早于事件时间的观测不在风险集中
+            total -= np.bincount(self.start_bins, weights=values, minlength=self.size)
+        return self._segment_cumsum(total, reverse=True)[self.event_positions + 1]
+
+    def death_sums(self, values):
+        """每个事件时间的事件观测中values的和"""
+        return np.add.reduceat(values[self.death_rows], self.death_start)
+
+    def evaluate(self, X, mean, beta, derivatives=True):
+        """计算部分对数似然及其得分向量和信息矩阵
+
+        设计矩阵按列中心化（中心化不改变系数估计，可以避免exp(η)上溢），
+        计算时逐列减去均值，不复制整个矩阵
+
+        Args:
+            X: 设计矩阵
+            mean: 设计矩阵的列均值
+            beta: 回归系数
+            derivatives: 是否计算得分向量和信息矩阵
+
+        Returns:
+            tuple: (对数似然, 得分向量, 信息矩阵)
+        """
+        eta = X @ beta - mean @ beta
+        shift = eta.max()
+        w = np.exp(eta - shift)
+
+        idx = self.death_index
+        f = self.fraction
+        S0 = self.at_risk_sums(w)
+        D0 = self.death_sums(w)
+        phi0 = S0[idx] - f * D0[idx]
+        loglik = eta[self.death_rows].sum() - np.log(phi0).sum() - len(idx) * shift
+        if not derivatives:
+            return loglik, None, None
+
+        p = len(beta)
+        S1 = np.empty((self.n_event_times, p))
+        D1 = np.empty((self.n_event_times, p))
+        for j in range(p):
+            weighted = w * (X[:, j] - mean[j])
+            S1[:, j] = self.at_risk_sums(weighted)
+            D1[:, j] = self.death_sums(weighted)
+
+        # 每个观测在其所在各风险集中的权重之和Σ1/φ0，事件观测在自身事件时间上只计(1-f)/φ0
+        inv = 1.0 / phi0
+        A = np.zeros(self.size)
+        A[self.event_positions + 1] = np.bincount(idx, weights=inv, minlength=self.n_event_times)
+        cumulative = self._segment_cumsum(A)
+        a = cumulative[self.stop_bins] - cumulative[self.entry_bins]
+        a[self.death_rows] -= np.bincount(idx, weights=f * inv, minlength=self.n_event_times)[idx]
+        wa = w * a
+
+        score = X[self.death_rows].sum(axis=0) - len(idx) * mean - (X.T @ wa - mean * wa.sum())
+        information = np.empty((p, p))
+        for j in range(p):
+            weighted = wa * (X[:, j] - mean[j])
+            information[:, j] = X.T @ weighted - mean * weighted.sum()
+
+        # 减去Σ Φ Φ'/φ0²，其中Φ = S1 - f·D1，按事件时间汇总
+        E0 = np.bincount(idx, weights=inv * inv, minlength=self.n_event_times)
+        E1 = np.bincount(idx, weights=f * inv * inv, minlength=self.n_event_times)
+        E2 = np.bincount(idx, weights=f * f * inv * inv, minlength=self.n_event_times)
+        cross = (S1.T * E1) @ D1
+        information -= (S1.T * E0) @ S1 - cross - cross.T + (D1.T * E2) @ D1
+        return loglik, score, information
+
+
+def _newton(risk_sets, X, mean):
+    """Newton-Raphson迭代求部分似然的最大值（似然没有增加时步长减半）
+
+    Returns:
+        tuple: (系数, 对数似然, 零模型对数似然, 信息矩阵, 是否收敛, 迭代次数)
+
+    Raises:
+        ValueError: 信息矩阵奇异
+    """
+    beta = np.zeros(X.shape[1])
+    loglik, score, information = risk_sets.evaluate(X, mean, beta)
+    null_loglik = loglik
+    converged = False
+    iterations = 0
+    try:
+        for iterations in range(1, MAX_ITERATIONS + 1):
+            step = np.linalg.solve(information, score)
+            for _ in range(MAX_STEP_HALVING):
+                candidate = beta + step
+                new_loglik = risk_sets.evaluate(X, mean, candidate, derivatives=False)[0]
+                if np.isfinite(new_loglik) and new_loglik >= loglik - 1e-12 * abs(loglik):
+                    break
+                step = step / 2
+            beta = candidate
+            previous = loglik
+            loglik, score, information = risk_sets.evaluate(X, mean, beta)
+            if abs(loglik - previous) <= TOLERANCE * abs(loglik):
+                converged = True
+                break
+    except np.linalg.LinAlgError:
+        raise ValueError('信息矩阵奇异，协变量之间可能存在共线性')
+    return beta, loglik, null_loglik, information, converged, iterations
+
+
+def _bootstrap_coefficients(ties, arrays, rng, size):
+    """重抽样模块调用的批处理函数：一批自助样本（按观测有放回抽样）重新拟合的系数
+
+    无法拟合（没有事件或信息矩阵奇异）的样本系数为NaN
+    """
+    time, event, X = arrays[:3]
+    strata = arrays[3] if len(arrays) > 3 else None
+    coefficients = np.full((size, X.shape[1]), np.nan)
+    for k, rows in enumerate(bootstrap_indices(rng, size, len(time))):
+        if not (event[rows] > 0).any():
+            continue
+        sample = X[rows]
+        risk_sets = _RiskSets(time[rows], event[rows], ties,
+                              strata=None if strata is None else strata[rows])
+        try:
+            beta, _, _, _, converged, _ = _newton(risk_sets, sample, sample.mean(axis=0))
+        except ValueError:
+            continue
+        if converged:
+            coefficients[k] = beta
+    return coefficients
+
+
+def _coefficient_intervals(coefficients, time, event, X, ties, strata, n_resamples, seed, confidence_level):
+    """在coefficients中加入自助法标准误和风险比的百分位数置信区间，返回重抽样设置"""
+    arrays = [time, event, X] + ([np.asarray(strata)] if strata is not None else [])
+    replicates = run_replicates(partial(_bootstrap_coefficients, ties), arrays, n_resamples, seed,
+                                width=X.shape[1])
+    lower, upper, std_error = percentile_interval(replicates, confidence_level)
+    for j, coefficient in enumerate(coefficients):
+        coefficient.update({
+            'bootstrap_se': float(std_error[j]) if np.isfinite(std_error[j]) else None,
+            'bootstrap_hr_lower': float(np.exp(lower[j])) if np.isfinite(lower[j]) else None,
+            'bootstrap_hr_upper': float(np.exp(upper[j])) if np.isfinite(upper[j]) else None
+        })
+    summary = resampling_summary('bootstrap', n_resamples, seed)
+    summary['n_valid'] = int(np.isfinite(replicates).all(axis=1).sum())
+    return summary
+
+
+def cox_regression(time, event, X, names, ties='efron', confidence_level=0.95,
+                   start=None, strata=None, n_resamples=0, auc_times=None, seed=None):
+    """拟合Cox比例风险模型
+
+    Args:
+        time: 生存时间数组（计数过程数据为区间的结束时间）
+        event: 事件指示数组（1/0，计数过程数据为区间结束时是否发生事件）
+        X: 设计矩阵（观测×变量）
+        names: 设计矩阵各列的名称
+        ties: 同时发生事件的处理方式，efron或breslow
+        confidence_level: 风险比置信区间的置信水平
+        start: 可选，区间的开始时间数组（计数过程数据，观测在(start, time]内处于风险中）
+        strata: 可选，从0开始的分层编码数组
+        n_resamples: 自助样本数，大于0时计算C-index和系数（风险比）的自助法置信区间；
+                     计数过程数据不计算
+        auc_times: 时间依赖AUC的评估时间点，默认为事件时间的四分位数
+        seed: 自助法随机种子
+
+    Returns:
+        dict: coefficients（系数、标准误、z值、p值、风险比及置信区间）和
+              model_fit（对数似然、似然比检验、收敛情况、迭代次数、C-index、
+              时间依赖AUC）
+
+    Raises:
+        ValueError: 参数不合法、没有事件或协变量共线
+    """
+    if ties not in TIES_METHODS:
+        raise ValueError(f'不支持的结处理方式: {ties}')
+    time = np.asarray(time, dtype=np.float64)
+    event = np.asarray(event, dtype=np.float64)
+    if not (event > 0).any():
+        raise ValueError('没有发生事件的观测，无法拟合Cox回归')
+    if start is not None:
+        start = np.asarray(start, dtype=np.float64)
+        if (start >= time).any():
+            raise ValueError('区间的开始时间必须早于结束时间')
+
+    risk_sets = _RiskSets(time, event, ties, start=start, strata=strata)
+    X = np.asarray(X, dtype=np.float64)
+    mean = X.mean(axis=0)
+    p = X.shape[1]
+    beta, loglik, null_loglik, information, converged, iterations = _newton(risk_sets, X, mean)
+    try:
+        covariance = np.linalg.inv(information)
+    except np.linalg.LinAlgError:
+        raise ValueError('信息矩阵奇异，协变量之间可能存在共线性')
+
+    se = np.sqrt(np.maximum(np.diag(covariance), 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z_values = beta / se
+    p_values = 2 * sp_stats.norm.sf(np.abs(z_values))
+    z = sp_stats.norm.ppf(0.5 + confidence_level / 2)
+    alpha = 1 - confidence_level
+
+    coefficients = []
+    for j, name in enumerate(names):
+        coefficients.append({
+            'variable': name,
+            'coefficient': float(beta[j]),
+            'se': float(se[j]),
+            'z_value': float(z_values[j]),
+            'p_value': float(p_values[j]),
+            'hr': float(np.exp(beta[j])),
+            'hr_lower': float(np.exp(beta[j] - z * se[j])),
+            'hr_upper': float(np.exp(beta[j] + z * se[j])),
+            'significant': bool(p_values[j] < alpha)
+        })
+
+    # 似然比检验（与只有基线风险的模型比较）
+    lr_statistic = max(2 * (loglik - null_loglik), 0.0)
+    risk = X @ beta
+    resampling = None
+    if start is None:
+        concordance = concordance_summary(time, event, risk, strata=strata, n_resamples=n_resamples,
+                                          confidence_level=confidence_level, seed=seed)
+        if n_resamples > 0:
+            resampling = _coefficient_intervals(coefficients, time, event, X, ties, strata,
+                                                n_resamples, seed, confidence_level)
+        if auc_times is None:
+            auc_times = np.percentile(time[event > 0], [25, 50, 75])
+        auc = time_dependent_auc(time, event, risk, auc_times)
+    else:
+        # 计数过程数据中同一患者有多个区间，按区间重抽样和划分病例/对照都不适用
+        concordance = concordance_index(time, event, risk, start=start, strata=strata)
+        auc = None
+    return {
+        'coefficients': coefficients,
+        'model_fit': {
+            'log_likelihood': float(loglik),
+            'null_log_likelihood': float(null_loglik),
+            'negative_log_likelihood': float(-loglik),
+            'likelihood_ratio_test': {
+                'statistic': float(lr_statistic),
+                'df': p,
+                'p_value': float(sp_stats.chi2.sf(lr_statistic, p))
+            },
+            'aic': float(2 * p - 2 * loglik),
+            'convergence': converged,
+            'iterations': iterations,
+            'ties': ties,
+            'c_index': concordance['c_index'],
+            'concordance': concordance,
+            'time_dependent_auc': auc,
+            'resampling': resampling
+        },
+        'n_events': int((event > 0).sum()),
+        'n_strata': int(np.max(strata)) + 1 if strata is not None else 1
+    }
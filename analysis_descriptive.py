@@ -0,0 +1,312 @@
+"""
+描述性统计模块
+
+每个变量的取值先整理为类型化数组（原始值object数组和float64数组，缺失值
+和非数值为NaN）。多个数据集时，每个数据集单独生成可合并的摘要
+（VariableSummary，可以在线程池中并行计算），再按数据集顺序合并，合并
+开销只与数据集个数有关；所有请求的统计指标由合并后的摘要一次得到。
+指定权重变量时计算加权统计量（权重视为频数权重）
+"""
+
+import copy
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from analysis_sketches import (DistinctSketch, FrequencySketch, MomentSketch, QuantileSketch,
+                               text_labels)
+
+
+# 分位数统计指标对应的百分位
+PERCENTILE_STATS = {'q1': 25, 'median': 50, 'q3': 75}
+
+# 分类变量频数表最多返回的类别数
+MAX_FREQUENCY_CATEGORIES = 100
+
+_summary_pool = None
+_summary_pool_lock = threading.Lock()
+
+
+def get_summary_pool():
+    """获取计算数据集摘要的线程池（首次使用时创建，线程数默认为CPU核数）"""
+    global _summary_pool
+    with _summary_pool_lock:
+        if _summary_pool is None:
+            workers = int(os.getenv('ANALYSIS_WORKERS', 0)) or os.cpu_count() or 1
+            _summary_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analysis')
+        return _summary_pool
+
+
+def _present_mask(raw):
+    """原始值非缺失（不为None）的布尔数组"""
+    return np.fromiter((value is not None for value in raw), dtype=bool, count=len(raw))
+
+
+def _valid_weights(weights):
+    """权重有效（有限且非负）的布尔数组"""
+    return np.isfinite(weights) & (weights >= 0)
+
+
+def _wants_percentiles(stats):
+    return [stat for stat in PERCENTILE_STATS
+            if stat in stats or (stat in ('q1', 'q3') and 'iqr' in stats)]
+
+
+class VariableSummary:
+    """一个变量在一个或多个数据集上的可合并摘要
+
+    有数值的变量保存矩、分位数摘要，分类变量保存频数表；只计算请求的
+    统计指标需要的部分。不同值个数使用HyperLogLog估计，频数表完整时
+    使用精确值（distinct_approximate标明是否为估计值）；频数表被截断时
+    无法确定众数，mode为None
+    """
+
+    def __init__(self):
+        self.n_values = 0         # 非缺失值个数（含非数值文本）
+        self.n_numeric = 0        # 数值个数
+        self.moments = MomentSketch()
+        self.quantiles = None
+        self.numeric_frequencies = None
+        self.numeric_distinct = None
+        self.n_categorical = 0    # 参与分类统计的取值个数
+        self.frequencies = None
+        self.distinct = None
+        self.weighted = False
+
+    @classmethod
+    def from_arrays(cls, raw, numeric, stats, weights=None, order=0):
+        """由一个数据集的列数组计算摘要
+
+        Args:
+            raw: 原始值object数组，缺失值为None
+            numeric: 与raw对应的float64数组
+            stats: 请求的统计指标列表
+            weights: 可选，与raw对应的权重数组；权重缺失或为负的观测不参与计算
+            order: 数据集在合并顺序中的序号（用于分类变量众数的先后判断）
+        """
+        summary = cls()
+        summary.weighted = weights is not None
+        present = _present_mask(raw)
+        summary.n_values = int(present.sum())
+        finite = np.isfinite(numeric)
+        summary.n_numeric = int(finite.sum())
+
+        if summary.n_numeric > 0:
+            valid = finite & _valid_weights(weights) if weights is not None else finite
+            x = numeric[valid]
+            w = weights[valid] if weights is not None else None
+            summary.moments = MomentSketch.from_array(x, w)
+            if _wants_percentiles(stats):
+                summary.quantiles = QuantileSketch.from_array(x, w)
+            if 'mode' in stats or 'distinct' in stats:
+                summary.numeric_frequencies = FrequencySketch.from_values(x, w, order)
+            if 'distinct' in stats:
+                summary.numeric_distinct = DistinctSketch.from_values(x)
+            return summary
+
+        if summary.n_values > 0:
+            values = raw[present]
+            w = None
+            if weights is not None:
+                w = weights[present]
+                valid = _valid_weights(w)
+                values = values[valid]
+                w = w[valid]
+            summary.n_categorical = len(values)
+            labels = text_labels(values)
+            summary.frequencies = FrequencySketch.from_values(values, w, order, labels=labels)
+            summary.distinct = DistinctSketch.from_values(values, labels=labels)
+        return summary
+
+    def merge(self, other):
+        """合并另一个数据集的摘要（按数据集顺序依次合并）"""
+        self.n_values += other.n_values
+        self.n_numeric += other.n_numeric
+        self.n_categorical += other.n_categorical
+        self.weighted = self.weighted or other.weighted
+        self.moments.merge(other.moments)
+        for name in ('quantiles', 'numeric_frequencies', 'numeric_distinct', 'frequencies', 'distinct'):
+            mine, theirs = getattr(self, name), getattr(other, name)
+            if theirs is None:
+                continue
+            if mine is None:
+                setattr(self, name, copy.deepcopy(theirs))
+            else:
+                mine.merge(theirs)
+        return self
+
+    def describe(self, name, stats):
+        """由摘要计算请求的统计指标
+
+        Returns:
+            dict: {"name", "type", "stats"}，分类变量另有"categories"和"frequencies"；
+                  没有任何非缺失值时返回None
+        """
+        if self.n_values == 0:
+            return None
+        if self.n_numeric > 0:
+            return {'name': name, 'type': 'numeric', 'stats': self._describe_numeric(stats)}
+        categorical_stats, frequencies, n_categories = self._describe_categorical(stats)
+        return {
+            'name': name,
+            'type': 'categorical',
+            'stats': categorical_stats,
+            'categories': n_categories,
+            'categories_approximate': self.frequencies is not None and not self.frequencies.complete,
+            'frequencies': frequencies
+        }
+
+    def _describe_numeric(self, stats):
+        result = {stat: None for stat in stats}
+        moments = self.moments
+        if 'count' in result:
+            result['count'] = int(moments.count)
+        if 'missing' in result:
+            result['missing'] = int(self.n_values - self.n_numeric)
+        if moments.count == 0 or moments.weight <= 0:
+            return result
+
+        percentile_values = {}
+        wanted = _wants_percentiles(stats)
+        if wanted and self.quantiles is not None:
+            computed = self.quantiles.percentiles([PERCENTILE_STATS[stat] for stat in wanted])
+            percentile_values = dict(zip(wanted, (float(v) for v in computed)))
+
+        variance = moments.variance
+        for stat in result:
+            if stat == 'mean':
+                result[stat] = moments.mean
+            elif stat in PERCENTILE_STATS:
+                result[stat] = percentile_values.get(stat)
+            elif stat == 'iqr' and percentile_values:
+                result[stat] = percentile_values['q3'] - percentile_values['q1']
+            elif stat == 'sd' and variance is not None:
+                result[stat] = variance ** 0.5
+            elif stat == 'variance':
+                result[stat] = variance
+            elif stat == 'se' and variance is not None:
+                result[stat] = (variance / moments.weight) ** 0.5
+            elif stat == 'min':
+                result[stat] = moments.min
+            elif stat == 'max':
+                result[stat] = moments.max
+            elif stat == 'range':
+                result[stat] = moments.max - moments.min
+            elif stat == 'sum':
+                result[stat] = moments.total
+            elif stat == 'mode' and self.numeric_frequencies is not None and self.numeric_frequencies.complete:
+                # 出现次数（或权重和）最多的取值，相同时取较小的值
+                ranked = self.numeric_frequencies.most_common()
+                top = ranked[0][1]
+                result[stat] = float(min(value for value, count in ranked if count == top))
+            elif stat == 'distinct' and self.numeric_distinct is not None:
+                # 频数表完整时使用精确值
+                if self.numeric_frequencies.complete:
+                    result[stat] = len(self.numeric_frequencies.counts)
+                else:
+                    result[stat] = self.numeric_distinct.estimate()
+        if 'distinct' in result:
+            result['distinct_approximate'] = (self.numeric_frequencies is not None
+                                              and not self.numeric_frequencies.complete)
+        return result
+
+    def _describe_categorical(self, stats):
+        result = {stat: None for stat in stats}
+        if 'count' in result:
+            result['count'] = int(self.n_categorical)
+        if self.n_categorical == 0 or self.frequencies is None:
+            return result, [], 0
+
+        frequencies = self.frequencies
+        n_categories = len(frequencies.counts) if frequencies.complete else self.distinct.estimate()
+        ranked = frequencies.most_common()
+        if 'mode' in result and frequencies.complete:
+            # 频数相同时取最先出现的取值
+            result['mode'] = ranked[0][0]
+        if 'distinct' in result:
+            result['distinct'] = n_categories
+            result['distinct_approximate'] = not frequencies.complete
+
+        # 百分比以全部取值为分母（频数表被截断时也是如此）
+        total = frequencies.total
+        table = [{
+            'value': value,
+            'count': float(count) if self.weighted else int(count),
+            'percent': float(count / total * 100) if total > 0 else None
+        } for value, count in ranked[:MAX_FREQUENCY_CATEGORIES]]
+        return result, table, n_categories
+
+
+def describe_variable(name, raw, numeric, stats, weights=None):
+    """计算一个变量的描述性统计（单个数组）
+
+    Args:
+        name: 变量名
+        raw: 原始值object数组，缺失值为None
+        numeric: 与raw对应的float64数组
+        stats: 请求的统计指标列表
+        weights: 可选，与raw对应的权重数组
+
+    Returns:
+        dict: 见VariableSummary.describe
+    """
+    return VariableSummary.from_arrays(raw, numeric, stats, weights).describe(name, stats)
+
+
+def summarize_dataset(columns, variables, stats, weight_variable=None, order=0):
+    """计算一个数据集各变量的摘要
+
+    Args:
+        columns: DatasetColumns列式快照
+        variables: 变量名列表
+        stats: 请求的统计指标列表
+        weight_variable: 可选，权重变量名
+        order: 数据集在合并顺序中的序号
+
+    Returns:
+        dict: {变量名: VariableSummary}
+    """
+    weights = columns.numeric(weight_variable) if weight_variable else None
+    return {
+        variable: VariableSummary.from_arrays(columns.raw(variable), columns.numeric(variable),
+                                              stats, weights, order)
+        for variable in variables
+    }
+
+
+def describe_datasets(load_columns, dataset_ids, variables, stats, weight_variable=None):
+    """多个数据集的描述性统计：并行计算各数据集的摘要，再按数据集顺序合并
+
+    Args:
+        load_columns: 函数 load_columns(dataset_id) -> DatasetColumns
+        dataset_ids: 数据集ID列表
+        variables: 变量名列表
+        stats: 请求的统计指标列表
+        weight_variable: 可选，权重变量名
+
+    Returns:
+        tuple: (记录总数, {变量名: 统计结果})，没有任何非缺失值的变量不包含在结果中
+    """
+    def summarize(order, dataset_id):
+        columns = load_columns(dataset_id)
+        return columns.n_rows, summarize_dataset(columns, variables, stats, weight_variable, order)
+
+    if len(dataset_ids) == 1:
+        parts = [summarize(0, dataset_ids[0])]
+    else:
+        pool = get_summary_pool()
+        futures = [pool.submit(summarize, order, dataset_id) for order, dataset_id in enumerate(dataset_ids)]
+        parts = [future.result() for future in futures]
+
+    total_records = sum(n_rows for n_rows, _ in parts)
+    results = {}
+    for variable in variables:
+        merged = VariableSummary()
+        for _, summaries in parts:
+            merged.merge(summaries[variable])
+        result = merged.describe(variable, stats)
+        if result is not None:
+            results[variable] = result
+    return total_records, results
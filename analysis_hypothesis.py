@@ -0,0 +1,751 @@
+"""
+假设检验模块
+
+所有请求的变量先整理为一个float64矩阵（行是记录，列是变量，缺失值和
+非数值为NaN），分组变量编码为整数组号。t检验、配对t检验、方差分析、
+Wilcoxon秩和检验和Kruskal-Wallis检验按组对整个矩阵做一次分组汇总，
+所有变量的统计量同时算出；p值由scipy.stats的t、F、卡方和正态分布函数
+计算。卡方检验和Fisher精确检验按变量构建列联表。
+可选的重抽样（置换检验p值、效应量的自助法置信区间）对每个变量把一批
+置换样本或组内自助样本排成矩阵（观测按组排序，组号在所有重抽样中不变），
+用reduceat或一次带偏移的bincount算出所有重抽样的分组汇总或列联表
+"""
+
+from functools import partial
+
+import numpy as np
+from scipy import stats as sp_stats
+
+from analysis_resampling import (bootstrap_indices, percentile_interval, permutation_p_value, permuted_rows,
+                                 resampling_summary, run_replicates, stratified_bootstrap_indices)
+
+
+# 支持的检验类型
+TEST_TYPES = ('ttest', 'paired_ttest', 'anova', 'chi2', 'fisher', 'wilcoxon', 'kruskal')
+
+# 需要分组变量的检验类型
+GROUPED_TESTS = ('ttest', 'anova', 'chi2', 'fisher', 'wilcoxon', 'kruskal')
+
+# 备择假设类型
+ALTERNATIVES = ('two-sided', 'greater', 'less')
+
+# Wilcoxon秩和检验使用精确分布的样本量上限（两组都不超过该值且没有结时）
+EXACT_RANK_SUM_LIMIT = 8
+
+
+def is_missing(value):
+    """分组变量和分类变量的缺失值：None或空字符串"""
+    return value is None or value == ''
+
+
+def encode_categories(raw):
+    """把原始值编码为整数类别号，类别按第一次出现的顺序排列
+
+    取值按文本形式区分（1与"1"视为同一类别），缺失值编码为-1
+
+    Args:
+        raw: 原始值object数组
+
+    Returns:
+        tuple: (类别号int64数组, 类别原始值列表)
+    """
+    labels = {}
+    names = []
+    codes = np.full(len(raw), -1, dtype=np.int64)
+    for i, value in enumerate(raw):
+        if is_missing(value):
+            continue
+        label = str(value)
+        code = labels.get(label)
+        if code is None:
+            code = labels[label] = len(names)
+            names.append(value)
+        codes[i] = code
+    return codes, names
+
+
+def p_value_from(statistic, distribution, alternative='two-sided'):
+    """由检验统计量和对称分布（t或标准正态）计算p值
+
+    Args:
+        statistic: 统计量数组
+        distribution: scipy.stats的冻结分布或分布对象，需要sf和cdf
+        alternative: two-sided、greater（第一组大于第二组）或less
+
+    Returns:
+        numpy.ndarray: p值数组
+    """
+    statistic = np.asarray(statistic, dtype=np.float64)
+    if alternative == 'greater':
+        return distribution.sf(statistic)
+    if alternative == 'less':
+        return distribution.cdf(statistic)
+    return np.minimum(2 * distribution.sf(np.abs(statistic)), 1.0)
+
+
+def _float(value):
+    """转换为可以序列化的float，NaN和无穷大为None"""
+    if value is None:
+        return None
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def _error(variable, message):
+    return {'variable_id': variable, 'variable_name': variable, 'error': message}
+
+
+def group_moments(X, codes, n_groups):
+    """按组汇总矩阵每一列的样本量、和与平方和
+
+    Args:
+        X: float64矩阵（记录×变量），缺失为NaN
+        codes: 组号数组，-1表示不属于任何组
+        n_groups: 组数
+
+    Returns:
+        tuple: (n, sums, sumsq)，均为 组数×变量数 的数组
+    """
+    valid = ~np.isnan(X) & (codes >= 0)[:, None]
+    values = np.where(valid, X, 0.0)
+    one_hot = np.zeros((n_groups, len(codes)), dtype=np.float64)
+    rows = np.flatnonzero(codes >= 0)
+    one_hot[codes[rows], rows] = 1.0
+    n = one_hot @ valid.astype(np.float64)
+    sums = one_hot @ values
+    sumsq = one_hot @ (values * values)
+    return n, sums, sumsq
+
+
+def _moments_to_stats(n, sums, sumsq):
+    """由样本量、和与平方和计算均值和样本方差（样本量不足时为NaN）"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = sums / n
+        variances = (sumsq - n * means * means) / (n - 1)
+    variances = np.where(n > 1, np.maximum(variances, 0.0), np.nan)
+    return means, variances
+
+
+def ttest_independent(X, variables, codes, group_names, alpha, alternative, equal_var=True):
+    """独立样本t检验（默认方差齐性，equal_var为False时使用Welch校正）"""
+    if len(group_names) != 2:
+        return [_error(variable, 't检验需要恰好两个组') for variable in variables]
+
+    n, sums, sumsq = group_moments(X, codes, 2)
+    means, variances = _moments_to_stats(n, sums, sumsq)
+    n1, n2 = n
+    mean_diff = means[0] - means[1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if equal_var:
+            df = n1 + n2 - 2
+            pooled = ((n1 - 1) * variances[0] + (n2 - 1) * variances[1]) / df
+            se = np.sqrt(pooled * (1 / n1 + 1 / n2))
+            pooled_sd = np.sqrt(pooled)
+        else:
+            a = variances[0] / n1
+            b = variances[1] / n2
+            se = np.sqrt(a + b)
+            df = (a + b) ** 2 / (a * a / (n1 - 1) + b * b / (n2 - 1))
+            pooled_sd = np.sqrt((variances[0] + variances[1]) / 2)
+        t_stat = mean_diff / se
+        cohen_d = mean_diff / pooled_sd
+    distribution = sp_stats.t(df)
+    p_values = p_value_from(t_stat, distribution, alternative)
+    margin = distribution.ppf(1 - alpha / 2) * se
+
+    results = []
+    for j, variable in enumerate(variables):
+        if n1[j] < 2 or n2[j] < 2:
+            results.append(_error(variable, '每组至少需要2个有效数据点进行t检验'))
+            continue
+        results.append({
+            'variable_id': variable,
+            'variable_name': variable,
+            'group1_name': group_names[0],
+            'group1_n': int(n1[j]),
+            'group1_mean': _float(means[0, j]),
+            'group1_sd': _float(np.sqrt(variances[0, j])),
+            'group2_name': group_names[1],
+            'group2_n': int(n2[j]),
+            'group2_mean': _float(means[1, j]),
+            'group2_sd': _float(np.sqrt(variances[1, j])),
+            'mean_diff': _float(mean_diff[j]),
+            'statistic': _float(t_stat[j]),
+            'df': int(df[j]) if equal_var else _float(df[j]),
+            'p_value': _float(p_values[j]),
+            'significant': bool(p_values[j] < alpha),
+            'confidence_interval': [_float(mean_diff[j] - margin[j]), _float(mean_diff[j] + margin[j])],
+            'confidence_level': 1 - alpha,
+            'cohen_d': _float(cohen_d[j]),
+            'equal_var': bool(equal_var)
+        })
+    return results
+
+
+def paired_ttest(A, B, pairs, alpha, alternative):
+    """配对t检验：每对变量在同一记录上的差值与0比较"""
+    D = A - B
+    valid = ~np.isnan(D)
+    n = valid.sum(axis=0).astype(np.float64)
+    values = np.where(valid, D, 0.0)
+    sums = values.sum(axis=0)
+    sumsq = (values * values).sum(axis=0)
+    means, variances = _moments_to_stats(n, sums, sumsq)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        se = np.sqrt(variances / n)
+        t_stat = means / se
+        effect = means / np.sqrt(variances)
+    df = n - 1
+    distribution = sp_stats.t(df)
+    p_values = p_value_from(t_stat, distribution, alternative)
+    margin = distribution.ppf(1 - alpha / 2) * se
+
+    results = []
+    for j, (first, second) in enumerate(pairs):
+        name = f'{first} - {second}'
+        if n[j] < 2:
+            results.append({'variable_id': first, 'variable_name': name, 'variable_pair': [first, second],
+                            'error': '配对t检验至少需要2对有效数据'})
+            continue
+        results.append({
+            'variable_id': first,
+            'variable_name': name,
+            'variable_pair': [first, second],
+            'n': int(n[j]),
+            'mean1': _float(np.nanmean(np.where(valid[:, j], A[:, j], np.nan))),
+            'mean2': _float(np.nanmean(np.where(valid[:, j], B[:, j], np.nan))),
+            'mean_diff': _float(means[j]),
+            'sd_diff': _float(np.sqrt(variances[j])),
+            'statistic': _float(t_stat[j]),
+            'df': int(df[j]),
+            'p_value': _float(p_values[j]),
+            'significant': bool(p_values[j] < alpha),
+            'confidence_interval': [_float(means[j] - margin[j]), _float(means[j] + margin[j])],
+            'confidence_level': 1 - alpha,
+            'cohen_d': _float(effect[j])
+        })
+    return results
+
+
+def one_way_anova(X, variables, codes, group_names, alpha):
+    """单因素方差分析"""
+    n_groups = len(group_names)
+    n, sums, sumsq = group_moments(X, codes, n_groups)
+    means, variances = _moments_to_stats(n, sums, sumsq)
+    total_n = n.sum(axis=0)
+    k = (n > 0).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = np.where(n > 0, sums * sums / n, 0.0).sum(axis=0) - sums.sum(axis=0) ** 2 / total_n
+        within = (sumsq - np.where(n > 0, sums * sums / n, 0.0)).sum(axis=0)
+        between = np.maximum(between, 0.0)
+        within = np.maximum(within, 0.0)
+        df_between = k - 1
+        df_within = total_n - k
+        f_stat = (between / df_between) / (within / df_within)
+        eta_squared = between / (between + within)
+    p_values = sp_stats.f.sf(f_stat, df_between, df_within)
+
+    results = []
+    for j, variable in enumerate(variables):
+        if k[j] < 2:
+            results.append(_error(variable, '方差分析至少需要两个有数据的组'))
+            continue
+        if df_within[j] < 1:
+            results.append(_error(variable, '有效数据点不足，无法进行方差分析'))
+            continue
+        groups = [{
+            'name': group_names[g],
+            'n': int(n[g, j]),
+            'mean': _float(means[g, j]),
+            'sd': _float(np.sqrt(variances[g, j]))
+        } for g in range(n_groups) if n[g, j] > 0]
+        results.append({
+            'variable_id': variable,
+            'variable_name': variable,
+            'groups': groups,
+            'statistic': _float(f_stat[j]),
+            'df': [int(df_between[j]), int(df_within[j])],
+            'sum_sq_between': _float(between[j]),
+            'sum_sq_within': _float(within[j]),
+            'eta_squared': _float(eta_squared[j]),
+            'p_value': _float(p_values[j]),
+            'significant': bool(p_values[j] < alpha)
+        })
+    return results
+
+
+def _ranks_and_ties(X, in_group):
+    """每列在组内有效数据中的秩（平均秩）以及结校正项sum(t^3 - t)"""
+    masked = np.where(in_group[:, None], X, np.nan)
+    ranks = sp_stats.rankdata(masked, axis=0, nan_policy='omit')
+    ties = np.zeros(X.shape[1], dtype=np.float64)
+    for j in range(X.shape[1]):
+        column = masked[:, j]
+        _, counts = np.unique(column[~np.isnan(column)], return_counts=True)
+        counts = counts[counts > 1].astype(np.float64)
+        ties[j] = np.sum(counts ** 3 - counts)
+    return ranks, ties
+
+
+def rank_sum_test(X, variables, codes, group_names, alpha, alternative):
+    """Wilcoxon秩和检验（Mann-Whitney U检验）
+
+    样本量较小且没有结时使用精确分布，否则使用带结校正和连续性校正的
+    正态近似（与scipy.stats.mannwhitneyu一致）
+    """
+    if len(group_names) != 2:
+        return [_error(variable, 'Wilcoxon秩和检验需要恰好两个组') for variable in variables]
+
+    in_group = codes >= 0
+    ranks, ties = _ranks_and_ties(X, in_group)
+    valid = ~np.isnan(ranks)
+    first = valid & (codes == 0)[:, None]
+    n1 = first.sum(axis=0).astype(np.float64)
+    n2 = (valid & (codes == 1)[:, None]).sum(axis=0).astype(np.float64)
+    rank_sum1 = np.where(first, ranks, 0.0).sum(axis=0)
+    u1 = rank_sum1 - n1 * (n1 + 1) / 2
+    total = n1 + n2
+    mean_u = n1 * n2 / 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sd_u = np.sqrt(n1 * n2 / 12 * ((total + 1) - ties / (total * (total - 1))))
+        if alternative == 'greater':
+            z = (u1 - mean_u - 0.5) / sd_u
+        elif alternative == 'less':
+            z = (u1 - mean_u + 0.5) / sd_u
+        else:
+            z = (np.abs(u1 - mean_u) - 0.5) / sd_u
+        effect = 1 - 2 * u1 / (n1 * n2)
+    if alternative == 'two-sided':
+        # z已按|U - E(U)|做了连续性校正，不能再取绝对值
+        p_values = np.minimum(2 * sp_stats.norm.sf(z), 1.0)
+    else:
+        p_values = p_value_from(z, sp_stats.norm, alternative)
+
+    results = []
+    for j, variable in enumerate(variables):
+        if n1[j] < 1 or n2[j] < 1:
+            results.append(_error(variable, '每组至少需要1个有效数据点进行Wilcoxon秩和检验'))
+            continue
+        method = 'asymptotic'
+        p_value = p_values[j]
+        if ties[j] == 0 and max(n1[j], n2[j]) <= EXACT_RANK_SUM_LIMIT:
+            x = X[first[:, j], j]
+            y = X[valid[:, j] & (codes == 1), j]
+            p_value = sp_stats.mannwhitneyu(x, y, alternative=alternative, method='exact').pvalue
+            method = 'exact'
+        results.append({
+            'variable_id': variable,
+            'variable_name': variable,
+            'group1_name': group_names[0],
+            'group1_n': int(n1[j]),
+            'group1_median': _float(np.median(X[first[:, j], j])),
+            'group2_name': group_names[1],
+            'group2_n': int(n2[j]),
+            'group2_median': _float(np.median(X[valid[:, j] & (codes == 1), j])),
+            'statistic': _float(u1[j]),
+            'z': _float(z[j]),
+            'p_value': _float(p_value),
+            'significant': bool(p_value < alpha),
+            'rank_biserial': _float(-effect[j]),
+            'method': method
+        })
+    return results
+
+
+def kruskal_wallis(X, variables, codes, group_names, alpha):
+    """Kruskal-Wallis H检验（带结校正，p值由卡方分布计算）"""
+    n_groups = len(group_names)
+    in_group = codes >= 0
+    ranks, ties = _ranks_and_ties(X, in_group)
+    valid = ~np.isnan(ranks)
+    n, rank_sums, _ = group_moments(np.where(valid, ranks, np.nan), codes, n_groups)
+    total = n.sum(axis=0)
+    k = (n > 0).sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h = 12 / (total * (total + 1)) * np.where(n > 0, rank_sums ** 2 / n, 0.0).sum(axis=0) - 3 * (total + 1)
+        h = h / (1 - ties / (total ** 3 - total))
+        epsilon_squared = h / (total - 1)
+    df = k - 1
+    p_values = sp_stats.chi2.sf(h, df)
+
+    results = []
+    for j, variable in enumerate(variables):
+        if k[j] < 2:
+            results.append(_error(variable, 'Kruskal-Wallis检验至少需要两个有数据的组'))
+            continue
+        if not np.isfinite(h[j]):
+            results.append(_error(variable, '所有数据相同，无法进行Kruskal-Wallis检验'))
+            continue
+        groups = []
+        for g in range(n_groups):
+            if n[g, j] == 0:
+                continue
+            group_values = X[valid[:, j] & (codes == g), j]
+            groups.append({
+                'name': group_names[g],
+                'n': int(n[g, j]),
+                'median': _float(np.median(group_values)),
+                'mean_rank': _float(rank_sums[g, j] / n[g, j])
+            })
+        results.append({
+            'variable_id': variable,
+            'variable_name': variable,
+            'groups': groups,
+            'statistic': _float(h[j]),
+            'df': int(df[j]),
+            'p_value': _float(p_values[j]),
+            'significant': bool(p_values[j] < alpha),
+            'epsilon_squared': _float(epsilon_squared[j])
+        })
+    return results
+
+
+def contingency_table(variable_raw, codes, group_names):
+    """构建分组×变量取值的列联表（忽略缺失值）
+
+    Returns:
+        tuple: (列联表int64矩阵, 有数据的组名列表, 变量取值列表)
+    """
+    value_codes, value_names = encode_categories(variable_raw)
+    valid = (codes >= 0) & (value_codes >= 0)
+    n_values = len(value_names)
+    matrix = np.bincount(codes[valid] * n_values + value_codes[valid],
+                         minlength=len(group_names) * n_values).reshape(len(group_names), n_values)
+    keep = matrix.sum(axis=1) > 0
+    return matrix[keep], [name for name, kept in zip(group_names, keep) if kept], value_names
+
+
+def chi_square_test(raw_columns, variables, codes, group_names, alpha):
+    """Pearson卡方独立性检验（不做连续性校正）"""
+    results = []
+    for variable in variables:
+        matrix, groups, values = contingency_table(raw_columns[variable], codes, group_names)
+        if matrix.shape[0] < 2 or matrix.shape[1] < 2:
+            results.append(_error(variable, '卡方检验需要至少两个组和两个取值'))
+            continue
+        observed = matrix.astype(np.float64)
+        expected = np.outer(observed.sum(axis=1), observed.sum(axis=0)) / observed.sum()
+        chi2 = float(np.sum((observed - expected) ** 2 / expected))
+        df = (matrix.shape[0] - 1) * (matrix.shape[1] - 1)
+        p_value = float(sp_stats.chi2.sf(chi2, df))
+        cramers_v = np.sqrt(chi2 / (observed.sum() * (min(matrix.shape) - 1)))
+        results.append({
+            'variable_id': variable,
+            'variable_name': variable,
+            'statistic': chi2,
+            'df': df,
+            'p_value': p_value,
+            'significant': p_value < alpha,
+            'cramers_v': _float(cramers_v),
+            'min_expected': _float(expected.min()),
+            'expected_below_5': int(np.sum(expected < 5)),
+            'contingency_table': {
+                'group_names': groups,
+                'var_values': values,
+                'matrix': matrix.tolist()
+            }
+        })
+    return results
+
+
+def fisher_exact_test(raw_columns, variables, codes, group_names, alpha, alternative):
+    """Fisher精确检验（2×2列联表，p值由超几何分布精确计算）"""
+    results = []
+    for variable in variables:
+        matrix, groups, values = contingency_table(raw_columns[variable], codes, group_names)
+        if matrix.shape != (2, 2):
+            results.append(_error(variable, 'Fisher精确检验需要2×2列联表（两个组、变量有两个取值），'
+                                            f'当前为{matrix.shape[0]}×{matrix.shape[1]}，请使用卡方检验'))
+            continue
+        odds_ratio, p_value = sp_stats.fisher_exact(matrix, alternative=alternative)
+        results.append({
+            'variable_id': variable,
+            'variable_name': variable,
+            'statistic': _float(odds_ratio),
+            'odds_ratio': _float(odds_ratio),
+            'p_value': float(p_value),
+            'significant': bool(p_value < alpha),
+            'contingency_table': {
+                'group_names': groups,
+                'var_values': values,
+                'matrix': matrix.tolist()
+            }
+        })
+    return results
+
+
+# 重抽样时报告置信区间的效应量（自助法）
+RESAMPLED_EFFECTS = {
+    'ttest': 'mean_diff',
+    'paired_ttest': 'mean_diff',
+    'anova': 'eta_squared',
+    'wilcoxon': 'rank_biserial',
+    'kruskal': 'epsilon_squared',
+    'chi2': 'cramers_v',
+    'fisher': 'odds_ratio'
+}
+
+# 统计量越大越极端、置换检验只比较上侧的检验类型
+UPPER_TAIL_TESTS = ('anova', 'kruskal', 'chi2')
+
+
+def _replicate_tables(codes, values, n_groups, n_values):
+    """每次重抽样（values的每一行）的组×取值列联表，返回 次数×组数×取值数 的数组"""
+    size = values.shape[0]
+    keys = ((np.arange(size)[:, None] * n_groups + codes) * n_values + values).ravel()
+    return np.bincount(keys, minlength=size * n_groups * n_values).reshape(
+        size, n_groups, n_values).astype(np.float64)
+
+
+def _replicate_statistic(test_type, method, equal_var, values, codes, n_groups, n_values):
+    """一批重抽样的统计量：置换检验返回检验统计量，自助法返回效应量
+
+    Args:
+        values: 次数×观测数矩阵，均值类检验为数值，秩检验为取值的秩次编号，
+                列联表检验为变量取值编号
+        codes: 各位置的组号（0..n_groups-1，已按组排序，所有重抽样相同）
+        n_values: 秩检验和列联表检验的取值个数
+    """
+    permutation = method == 'permutation'
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        if test_type in ('ttest', 'anova'):
+            # 各组在行内连续，按组求和用reduceat
+            starts = np.searchsorted(codes, np.arange(n_groups))
+            n = np.diff(np.append(starts, len(codes))).astype(np.float64)
+            sums = np.add.reduceat(values, starts, axis=1)
+            sumsq = np.add.reduceat(values * values, starts, axis=1)
+            if test_type == 'ttest':
+                means = sums / n
+                variances = (sumsq - n * means * means) / (n - 1)
+                mean_diff = means[:, 0] - means[:, 1]
+                if not permutation:
+                    return mean_diff
+                if equal_var:
+                    pooled = ((n[0] - 1) * variances[:, 0] + (n[1] - 1) * variances[:, 1]) / (n.sum() - 2)
+                    return mean_diff / np.sqrt(pooled * (1 / n[0] + 1 / n[1]))
+                return mean_diff / np.sqrt(variances[:, 0] / n[0] + variances[:, 1] / n[1])
+            total = n.sum()
+            between = (sums * sums / n).sum(axis=1) - sums.sum(axis=1) ** 2 / total
+            within = sumsq.sum(axis=1) - (sums * sums / n).sum(axis=1)
+            if permutation:
+                return (between / (n_groups - 1)) / (within / (total - n_groups))
+            return between / (between + within)
+
+        tables = _replicate_tables(codes, values, n_groups, n_values)
+        if test_type in ('wilcoxon', 'kruskal'):
+            # 取值按大小编号，每次重抽样的平均秩由各取值出现次数的累积和得到
+            counts = tables.sum(axis=1)
+            mean_ranks = np.cumsum(counts, axis=1) - counts + (counts + 1) / 2
+            rank_sums = (tables * mean_ranks[:, None, :]).sum(axis=2)
+            n = tables.sum(axis=2)
+            if test_type == 'wilcoxon':
+                n1, n2 = n[:, 0], n[:, 1]
+                u1 = rank_sums[:, 0] - n1 * (n1 + 1) / 2
+                return u1 - n1 * n2 / 2 if permutation else 2 * u1 / (n1 * n2) - 1
+            total = n.sum(axis=1)
+            ties = (counts ** 3 - counts).sum(axis=1)
+            h = 12 / (total * (total + 1)) * (rank_sums ** 2 / n).sum(axis=1) - 3 * (total + 1)
+            h = h / (1 - ties / (total ** 3 - total))
+            return h if permutation else h / (total - 1)
+
+        total = tables.sum(axis=(1, 2))
+        expected = tables.sum(axis=2)[:, :, None] * tables.sum(axis=1)[:, None, :] / total[:, None, None]
+        if test_type == 'fisher':
+            if permutation:
+                # 边际固定时第一格的频数决定优势比的方向（与Fisher精确检验相同的参照分布）
+                return tables[:, 0, 0] - expected[:, 0, 0]
+            return tables[:, 0, 0] * tables[:, 1, 1] / (tables[:, 0, 1] * tables[:, 1, 0])
+        # 自助样本中未出现的取值（期望频数为0）不计入卡方统计量
+        chi2 = np.where(expected > 0, (tables - expected) ** 2 / np.where(expected > 0, expected, 1.0),
+                        0.0).sum(axis=(1, 2))
+        if permutation:
+            return chi2
+        return np.sqrt(chi2 / (total * (min(n_groups, n_values) - 1)))
+
+
+def _paired_statistic(sums, values):
+    """符号翻转后差值和为sums时的配对t统计量（平方和不随符号变化）"""
+    n = len(values)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = sums / n
+        variances = (np.dot(values, values) - n * means * means) / (n - 1)
+        return means / np.sqrt(variances / n)
+
+
+def _resample_batch(test_type, method, equal_var, n_groups, n_values, arrays, rng, size):
+    """重抽样模块调用的批处理函数：生成一批置换或自助样本并计算统计量"""
+    values, codes = arrays
+    n = len(values)
+    if test_type == 'paired_ttest':
+        # 配对差值：置换检验随机翻转符号，自助法对差值有放回抽样
+        if method == 'permutation':
+            signs = rng.integers(0, 2, (size, n)) * 2 - 1
+            return _paired_statistic(signs @ values, values)
+        return values[bootstrap_indices(rng, size, n)].mean(axis=1)
+    if method == 'permutation':
+        # 置换各位置上的取值（等价于置换组号），组号保持按组排序
+        sample_values = permuted_rows(rng, size, values)
+    else:
+        # 在每组内有放回抽样，各位置的组号不变
+        sample_values = values[stratified_bootstrap_indices(rng, size, codes)]
+    return _replicate_statistic(test_type, method, equal_var, sample_values, codes, n_groups, n_values)
+
+
+def _resampling_samples(test_type, data, codes):
+    """每个变量参与检验的数据（只保留有效观测，组号重新编号为0..k-1并按组排序）
+
+    Returns:
+        list: 每项为(values, codes, 组数, 取值数)
+    """
+    samples = []
+    for values in data:
+        if test_type == 'paired_ttest':
+            values = values[~np.isnan(values)]
+            samples.append((values, np.zeros(len(values), dtype=np.int64), 1, 0))
+            continue
+        if test_type in ('chi2', 'fisher'):
+            value_codes, _ = encode_categories(values)
+            valid = (codes >= 0) & (value_codes >= 0)
+            values = value_codes[valid]
+        else:
+            valid = (codes >= 0) & ~np.isnan(values)
+            values = values[valid]
+        _, group_codes = np.unique(codes[valid], return_inverse=True)
+        order = np.argsort(group_codes, kind='stable')
+        values, group_codes = values[order], group_codes[order]
+        n_groups = int(group_codes.max()) + 1 if len(group_codes) else 0
+        n_values = 0
+        if test_type in ('wilcoxon', 'kruskal'):
+            _, values = np.unique(values, return_inverse=True)
+        if test_type in ('wilcoxon', 'kruskal', 'chi2', 'fisher'):
+            n_values = int(values.max()) + 1 if len(values) else 0
+        samples.append((values, group_codes.astype(np.int64), n_groups, n_values))
+    return samples
+
+
+def add_resampling(results, samples, test_type, method, n_resamples, seed=None,
+                   alpha=0.05, alternative='two-sided', equal_var=True):
+    """为每个检验结果增加置换检验p值或效应量的自助法置信区间（结果中的resampling）
+
+    Args:
+        results: run_hypothesis_test的结果列表（原地修改，含error的项跳过）
+        samples: _resampling_samples的结果，与results一一对应
+        test_type: 检验类型
+        method: permutation或bootstrap
+        n_resamples: 重抽样次数
+        seed: 随机种子
+        alpha: 显著性水平（自助法置信水平为1 - alpha）
+        alternative: 备择假设
+        equal_var: t检验是否假设方差齐性
+    """
+    effect = RESAMPLED_EFFECTS[test_type]
+    tail = 'greater' if test_type in UPPER_TAIL_TESTS else alternative
+    for result, (values, codes, n_groups, n_values) in zip(results, samples):
+        if 'error' in result:
+            continue
+        batch = partial(_resample_batch, test_type, method, equal_var, n_groups, n_values)
+        width = 1 + (n_groups * n_values) // max(1, len(values))
+        replicates = run_replicates(batch, [values, codes], n_resamples, seed, width)
+        summary = resampling_summary(method, n_resamples, seed)
+        summary['n_valid'] = int(np.isfinite(replicates).sum())
+        if method == 'permutation':
+            if test_type == 'paired_ttest':
+                observed = _paired_statistic(np.array([values.sum()]), values)
+            else:
+                observed = _replicate_statistic(test_type, method, equal_var, values[None, :], codes,
+                                                n_groups, n_values)
+            p_value = float(permutation_p_value(observed[0], replicates, tail))
+            summary.update({
+                'statistic': _float(observed[0]),
+                'p_value': _float(p_value),
+                'significant': bool(p_value < alpha),
+                'alternative': tail
+            })
+        else:
+            lower, upper, std_error = percentile_interval(replicates, 1 - alpha)
+            summary.update({
+                'effect': effect,
+                'estimate': result.get(effect),
+                'confidence_interval': [_float(lower), _float(upper)],
+                'confidence_level': 1 - alpha,
+                'std_error': _float(std_error)
+            })
+        result['resampling'] = summary
+
+
+def resolve_pairs(variables, pairs=None):
+    """配对检验的变量对：优先使用pairs，否则把variables按顺序两两配对
+
+    Raises:
+        ValueError: 变量无法配对
+    """
+    if pairs:
+        if not all(isinstance(pair, (list, tuple)) and len(pair) == 2 for pair in pairs):
+            raise ValueError('pairs中的每一项必须是两个变量名')
+        return [tuple(pair) for pair in pairs]
+    if len(variables) < 2 or len(variables) % 2:
+        raise ValueError('配对t检验需要成对的变量（如[治疗前, 治疗后]），或通过pairs指定变量对')
+    return [(variables[i], variables[i + 1]) for i in range(0, len(variables), 2)]
+
+
+def run_hypothesis_test(columns, test_type, variables, group_variable=None, alpha=0.05,
+                        alternative='two-sided', pairs=None, equal_var=True,
+                        n_resamples=0, resampling_method='bootstrap', seed=None):
+    """执行假设检验
+
+    Args:
+        columns: DatasetColumns列式快照，需包含变量和分组变量
+        test_type: 检验类型，见TEST_TYPES
+        variables: 变量名列表
+        group_variable: 分组变量名
+        alpha: 显著性水平
+        alternative: two-sided、greater或less（第一组大于第二组为greater）
+        pairs: 配对t检验的变量对列表
+        equal_var: t检验是否假设方差齐性
+        n_resamples: 重抽样次数，为0时不做重抽样
+        resampling_method: permutation（置换检验p值）或bootstrap（效应量置信区间）
+        seed: 重抽样随机种子
+
+    Returns:
+        list: 每个变量（或变量对）一项检验结果，无法检验的项包含error
+
+    Raises:
+        ValueError: 参数不合法
+    """
+    if test_type not in TEST_TYPES:
+        raise ValueError(f'未实现的检验类型: {test_type}')
+    if alternative not in ALTERNATIVES:
+        raise ValueError(f'不支持的假设类型: {alternative}')
+
+    codes = None
+    if test_type == 'paired_ttest':
+        pair_list = resolve_pairs(variables, pairs)
+        A = np.column_stack([columns.numeric(first) for first, _ in pair_list])
+        B = np.column_stack([columns.numeric(second) for _, second in pair_list])
+        results = paired_ttest(A, B, pair_list, alpha, alternative)
+        data = (A - B).T
+    else:
+        codes, group_names = encode_categories(columns.raw(group_variable))
+        if test_type in ('chi2', 'fisher'):
+            raw_columns = {variable: columns.raw(variable) for variable in variables}
+            if test_type == 'chi2':
+                results = chi_square_test(raw_columns, variables, codes, group_names, alpha)
+            else:
+                results = fisher_exact_test(raw_columns, variables, codes, group_names, alpha, alternative)
+            data = [raw_columns[variable] for variable in variables]
+        else:
+            X = np.column_stack([columns.numeric(variable) for variable in variables])
+            if test_type == 'ttest':
+                results = ttest_independent(X, variables, codes, group_names, alpha, alternative, equal_var)
+            elif test_type == 'anova':
+                results = one_way_anova(X, variables, codes, group_names, alpha)
+            elif test_type == 'wilcoxon':
+                results = rank_sum_test(X, variables, codes, group_names, alpha, alternative)
+            else:
+                results = kruskal_wallis(X, variables, codes, group_names, alpha)
+            data = X.T
+
+    if n_resamples > 0:
+        add_resampling(results, _resampling_samples(test_type, data, codes), test_type, resampling_method,
+                       n_resamples, seed, alpha, alternative, equal_var)
+    return results
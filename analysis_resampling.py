@@ -0,0 +1,233 @@
+"""
+重抽样模块（自助法置信区间和置换检验）
+
+B次重抽样按固定大小分批，每批在一次NumPy运算中生成全部下标（或置换、
+符号翻转）并计算统计量；各批分发到共享进程池（process_pool模块）并行计算。随机种子由
+SeedSequence.spawn为每批派生，批的划分只取决于数据规模，因此给定种子时
+结果与进程数和完成顺序无关，可以复现；进程池不可用时在当前进程中计算。结果按（数据集版本, 分析参数）
+缓存，数据集的每次写入都会使数据版本号加一，缓存自动失效
+"""
+
+import json
+import threading
+import warnings
+from collections import OrderedDict
+
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from process_pool import discard_process_pool, get_process_pool
+
+
+# 支持的重抽样方法
+RESAMPLING_METHODS = ('bootstrap', 'permutation')
+
+# 默认和单次请求允许的最大重抽样次数
+DEFAULT_RESAMPLES = 200
+MAX_RESAMPLES = 10000
+
+# 未指定种子时使用的默认种子（相同请求得到相同结果）
+DEFAULT_SEED = 0
+
+# 每批重抽样的最大次数，以及每批生成的下标矩阵元素个数上限
+MAX_BATCH = 100
+BATCH_ELEMENTS = 2_000_000
+
+# 重抽样总计算量（次数×观测数）低于该值时在当前进程中计算，避免进程间传输数据的开销
+PARALLEL_MIN_WORK = 2_000_000
+
+# 结果缓存的最大条目数
+CACHE_SIZE = 64
+
+
+def batch_size(n_observations, width=1):
+    """每批重抽样的次数：每批的下标矩阵（次数×观测数×width）不超过BATCH_ELEMENTS"""
+    return int(max(1, min(MAX_BATCH, BATCH_ELEMENTS // max(1, n_observations * width))))
+
+
+def _run_batch(replicate, arrays, seed, size):
+    return replicate(arrays, np.random.default_rng(seed), size)
+
+
+def run_replicates(replicate, arrays, n_resamples, seed=None, width=1):
+    """计算B次重抽样的统计量
+
+    Args:
+        replicate: 模块级函数replicate(arrays, rng, size)，返回size次重抽样的
+                   统计量数组（第一维为size）；在进程池中执行，必须可以pickle
+        arrays: 传给replicate的数组列表，第一个数组的长度为观测数
+        n_resamples: 重抽样次数
+        seed: 随机种子，None时使用DEFAULT_SEED
+        width: 每个观测在一次重抽样中占用的元素个数，用于确定批大小
+
+    Returns:
+        numpy.ndarray: 第一维为n_resamples的统计量数组
+    """
+    n_observations = len(arrays[0])
+    size = batch_size(n_observations, width)
+    sizes = [min(size, n_resamples - start) for start in range(0, n_resamples, size)]
+    seeds = np.random.SeedSequence(DEFAULT_SEED if seed is None else seed).spawn(len(sizes))
+
+    if n_resamples * n_observations * width < PARALLEL_MIN_WORK or len(sizes) == 1:
+        batches = [_run_batch(replicate, arrays, s, k) for s, k in zip(seeds, sizes)]
+    else:
+        pool = get_process_pool()
+        try:
+            futures = [pool.submit(_run_batch, replicate, arrays, s, k) for s, k in zip(seeds, sizes)]
+            batches = [future.result() for future in futures]
+        except BrokenProcessPool as e:
+            # 工作进程异常退出：丢弃进程池，在当前进程中重新计算（各批种子不变，结果相同）
+            discard_process_pool(pool)
+            warnings.warn(f'进程池不可用，重抽样改为在当前进程中计算: {e}', RuntimeWarning)
+            batches = [_run_batch(replicate, arrays, s, k) for s, k in zip(seeds, sizes)]
+    return np.concatenate(batches, axis=0)
+
+
+def bootstrap_indices(rng, size, n):
+    """size次有放回抽样的行下标矩阵（size×n）"""
+    return rng.integers(0, n, (size, n))
+
+
+def stratified_bootstrap_indices(rng, size, codes):
+    """在每组内分别有放回抽样（保持各组样本量），返回size×n的行下标矩阵
+
+    codes为-1的行不属于任何组，保持原位置不参与抽样
+    """
+    indices = np.broadcast_to(np.arange(len(codes)), (size, len(codes))).copy()
+    for code in np.unique(codes[codes >= 0]):
+        rows = np.flatnonzero(codes == code)
+        indices[:, rows] = rows[rng.integers(0, len(rows), (size, len(rows)))]
+    return indices
+
+
+def permuted_rows(rng, size, values):
+    """size次独立置换后的矩阵（size×n，每行是values的一个随机排列）
+
+    逐行原地shuffle连续内存，比Generator.permuted沿axis=1置换快约一倍
+    """
+    rows = np.tile(values, (size, 1))
+    for row in rows:
+        rng.shuffle(row)
+    return rows
+
+
+def percentile_interval(replicates, confidence_level=0.95):
+    """自助法百分位数置信区间（按第一维汇总，忽略无法计算的NaN）
+
+    Returns:
+        tuple: (下限, 上限, 标准误)，有效重抽样少于2次的位置为NaN
+    """
+    replicates = np.asarray(replicates, dtype=np.float64)
+    replicates = np.where(np.isfinite(replicates), replicates, np.nan)
+    alpha = 1 - confidence_level
+    valid = (~np.isnan(replicates)).sum(axis=0)
+    with warnings.catch_warnings():
+        # 全部为NaN的位置会产生RuntimeWarning，结果随后置为NaN
+        warnings.simplefilter('ignore', RuntimeWarning)
+        lower = np.nanpercentile(replicates, 100 * alpha / 2, axis=0)
+        upper = np.nanpercentile(replicates, 100 * (1 - alpha / 2), axis=0)
+        std_error = np.nanstd(replicates, axis=0, ddof=1)
+    enough = valid >= 2
+    return (np.where(enough, lower, np.nan), np.where(enough, upper, np.nan),
+            np.where(enough, std_error, np.nan))
+
+
+def permutation_p_value(observed, replicates, alternative='two-sided'):
+    """置换检验p值 (1 + #{统计量至少与观测值一样极端}) / (1 + B)
+
+    Args:
+        observed: 观测统计量
+        replicates: 置换统计量（第一维为置换次数）
+        alternative: two-sided比较绝对值，greater比较上侧，less比较下侧
+
+    Returns:
+        numpy.ndarray: p值，观测统计量无法计算的位置为NaN
+    """
+    observed = np.asarray(observed, dtype=np.float64)
+    replicates = np.asarray(replicates, dtype=np.float64)
+    # 浮点舍入误差内相等的统计量视为一样极端
+    tolerance = 1e-9 * np.maximum(np.abs(observed), 1.0)
+    with np.errstate(invalid='ignore'):
+        if alternative == 'greater':
+            extreme = replicates >= observed - tolerance
+        elif alternative == 'less':
+            extreme = replicates <= observed + tolerance
+        else:
+            extreme = np.abs(replicates) >= np.abs(observed) - tolerance
+    counted = np.isfinite(replicates)
+    p_values = (1 + (extreme & counted).sum(axis=0)) / (1 + counted.sum(axis=0))
+    return np.where(np.isfinite(observed), p_values, np.nan)
+
+
+def resampling_summary(method, n_resamples, seed):
+    """重抽样设置的JSON表示"""
+    return {
+        'method': method,
+        'n_resamples': int(n_resamples),
+        'seed': DEFAULT_SEED if seed is None else seed
+    }
+
+
+def parse_resampling_options(request_data):
+    """从请求中读取重抽样参数
+
+    Args:
+        request_data: 请求JSON，可包含n_resamples、resampling_method、seed
+
+    Returns:
+        tuple: (n_resamples, method, seed)；n_resamples为0表示不做重抽样
+
+    Raises:
+        ValueError: 参数不合法
+    """
+    try:
+        n_resamples = int(request_data.get('n_resamples', 0) or 0)
+    except (TypeError, ValueError):
+        raise ValueError('n_resamples必须是整数')
+    if not 0 <= n_resamples <= MAX_RESAMPLES:
+        raise ValueError(f'n_resamples必须在0到{MAX_RESAMPLES}之间')
+    method = request_data.get('resampling_method', 'bootstrap')
+    if method not in RESAMPLING_METHODS:
+        raise ValueError(f'不支持的重抽样方法: {method}，可选: {", ".join(RESAMPLING_METHODS)}')
+    seed = request_data.get('seed')
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+        raise ValueError('seed必须是非负整数')
+    return n_resamples, method, seed
+
+
+class ResultCache:
+    """分析结果的LRU缓存，键为（数据集ID, 数据集签名, 分析参数）
+
+    数据集签名（数据版本号）随每次写入变化，旧结果不会再被命中，
+    按最近使用顺序淘汰
+    """
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(dataset_id, signature, spec):
+        """由数据集版本和分析参数（可JSON序列化的字典）生成缓存键"""
+        return (int(dataset_id), tuple(signature or ()),
+                json.dumps(spec, sort_keys=True, ensure_ascii=False, default=str))
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# 各分析接口共用的结果缓存
+result_cache = ResultCache()
@@ -0,0 +1,325 @@
+"""
+可合并统计摘要模块
+
+每个数据集先单独计算摘要，再把各数据集的摘要合并，合并的开销只与数据集
+个数和摘要大小有关，与记录总数无关：
+- MomentSketch: 计数、均值、二阶中心矩（Welford/Chan合并公式）、最小值、最大值
+- QuantileSketch: t-digest分位数摘要，取值不超过EXACT_LIMIT个时保存全部取值，
+  分位数是精确值；超过后压缩为质心，秩误差约为1/compression
+- DistinctSketch: HyperLogLog不同值个数估计，相对误差约1.04/sqrt(2^precision)
+- FrequencySketch: 频数表，类别数超过容量时只保留频数最高的类别
+"""
+
+import numpy as np
+import pandas as pd
+
+
+# 分位数摘要保存全部取值的上限
+EXACT_LIMIT = 10000
+
+# t-digest压缩参数，质心数约为compression/2
+DEFAULT_COMPRESSION = 500
+
+# HyperLogLog寄存器个数为2^precision
+HLL_PRECISION = 14
+
+# 频数表最多保留的类别数
+FREQUENCY_CAPACITY = 10000
+
+
+def text_labels(values):
+    """把取值转换为文本形式的object数组，频数表和不同值计数按文本区分取值"""
+    return np.asarray([str(value) for value in values], dtype=object)
+
+
+class MomentSketch:
+    """均值、方差等矩统计量的可合并摘要（支持频数权重）"""
+
+    def __init__(self):
+        self.count = 0        # 观测个数
+        self.weight = 0.0     # 权重和（无权重时等于观测个数）
+        self.mean = 0.0
+        self.m2 = 0.0         # 加权离差平方和
+        self.total = 0.0      # 加权和
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def from_array(cls, values, weights=None):
+        """由取值数组（不含NaN）计算摘要"""
+        sketch = cls()
+        if len(values) == 0:
+            return sketch
+        sketch.count = len(values)
+        if weights is None:
+            sketch.weight = float(len(values))
+            sketch.total = float(values.sum())
+            sketch.mean = sketch.total / sketch.weight
+            deviations = values - sketch.mean
+            sketch.m2 = float(np.dot(deviations, deviations))
+        else:
+            sketch.weight = float(weights.sum())
+            sketch.total = float(np.dot(weights, values))
+            sketch.mean = sketch.total / sketch.weight if sketch.weight > 0 else 0.0
+            deviations = values - sketch.mean
+            sketch.m2 = float(np.dot(weights, deviations * deviations))
+        sketch.min = float(values.min())
+        sketch.max = float(values.max())
+        return sketch
+
+    def merge(self, other):
+        """合并另一个摘要（Chan等人的并行方差合并公式）"""
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.__dict__.update(other.__dict__)
+            return self
+        weight = self.weight + other.weight
+        if weight > 0:
+            delta = other.mean - self.mean
+            self.m2 += other.m2 + delta * delta * self.weight * other.weight / weight
+            self.mean += delta * other.weight / weight
+        self.count += other.count
+        self.weight = weight
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        """样本方差（频数权重），权重和不大于1时为None"""
+        if self.weight <= 1:
+            return None
+        return max(self.m2, 0.0) / (self.weight - 1)
+
+
+def _scale(q, compression):
+    """t-digest的k1尺度函数"""
+    return compression / (2 * np.pi) * np.arcsin(2 * q - 1)
+
+
+class QuantileSketch:
+    """t-digest分位数摘要
+
+    取值较少时保存全部取值（精确模式），分位数与直接计算一致；超过
+    EXACT_LIMIT后按k1尺度函数把相邻取值合并为质心，两端的质心较小，
+    中间的质心较大
+    """
+
+    def __init__(self, compression=DEFAULT_COMPRESSION, exact_limit=EXACT_LIMIT):
+        self.compression = compression
+        self.exact_limit = exact_limit
+        self.means = np.empty(0, dtype=np.float64)
+        self.weights = np.empty(0, dtype=np.float64)
+        self.exact = True
+        self.weighted = False
+        self.min = None
+        self.max = None
+
+    @classmethod
+    def from_array(cls, values, weights=None, compression=DEFAULT_COMPRESSION,
+                   exact_limit=EXACT_LIMIT):
+        """由取值数组（不含NaN）计算摘要"""
+        sketch = cls(compression, exact_limit)
+        if len(values) == 0:
+            return sketch
+        sketch.means = np.asarray(values, dtype=np.float64)
+        sketch.weighted = weights is not None
+        sketch.weights = (np.asarray(weights, dtype=np.float64) if weights is not None
+                          else np.ones(len(values), dtype=np.float64))
+        sketch.min = float(sketch.means.min())
+        sketch.max = float(sketch.means.max())
+        if len(values) > exact_limit:
+            sketch._compress()
+        return sketch
+
+    @property
+    def size(self):
+        return len(self.means)
+
+    def merge(self, other):
+        """合并另一个摘要，合并后超过上限或任一方已压缩时压缩"""
+        if other.size == 0:
+            return self
+        if self.size == 0:
+            self.means = other.means.copy()
+            self.weights = other.weights.copy()
+            self.exact = other.exact
+            self.weighted = other.weighted
+            self.min, self.max = other.min, other.max
+            return self
+        self.means = np.concatenate([self.means, other.means])
+        self.weights = np.concatenate([self.weights, other.weights])
+        self.exact = self.exact and other.exact
+        self.weighted = self.weighted or other.weighted
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if not self.exact or self.size > self.exact_limit:
+            self._compress()
+        return self
+
+    def _compress(self):
+        order = np.argsort(self.means, kind='stable')
+        means = self.means[order]
+        weights = self.weights[order]
+        cumulative = np.cumsum(weights)
+        total = cumulative[-1]
+        if total <= 0:
+            return
+        # 按质心中点的分位数划分簇，同一簇内k值相差不超过1
+        q = (cumulative - weights / 2) / total
+        clusters = np.floor(_scale(q, self.compression) - _scale(0.0, self.compression)).astype(np.int64)
+        clusters = np.unique(clusters, return_inverse=True)[1]
+        cluster_weights = np.bincount(clusters, weights=weights)
+        cluster_sums = np.bincount(clusters, weights=weights * means)
+        keep = cluster_weights > 0
+        self.weights = cluster_weights[keep]
+        self.means = cluster_sums[keep] / self.weights
+        self.exact = False
+
+    def percentiles(self, percentiles):
+        """计算百分位数（0-100）
+
+        按频数权重展开后的数据计算，与np.percentile（线性插值）的定义一致：
+        第q个百分位数位于展开数据的第(W-1)*q/100个位置（W为权重和），权重为w
+        的取值占据w个相邻位置。已压缩时每个质心位于其位置区间的中心，两端
+        用最小值和最大值界定，相邻位置之间线性插值
+        """
+        if self.size == 0:
+            return None
+        qs = np.asarray(percentiles, dtype=np.float64)
+        if self.exact and not self.weighted:
+            return np.percentile(self.means, qs)
+        order = np.argsort(self.means, kind='stable')
+        means = self.means[order]
+        weights = self.weights[order]
+        cumulative = np.cumsum(weights)
+        starts = cumulative - weights
+        last = max(cumulative[-1] - 1, 0.0)
+        if self.exact:
+            # 每个取值在展开数据中占据的第一个和最后一个位置
+            ends = np.maximum(cumulative - 1, starts)
+            positions = np.column_stack([starts, ends]).ravel()
+            means = np.repeat(means, 2)
+        else:
+            positions = np.concatenate([[0.0], starts + np.maximum(weights - 1, 0) / 2, [last]])
+            means = np.concatenate([[self.min], means, [self.max]])
+        return np.interp(qs / 100.0 * last, positions, means)
+
+
+class DistinctSketch:
+    """HyperLogLog不同值个数摘要"""
+
+    def __init__(self, precision=HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @classmethod
+    def from_values(cls, values, precision=HLL_PRECISION, labels=None):
+        """由取值数组计算摘要（取值按文本形式区分）
+
+        Args:
+            values: 取值数组
+            precision: 寄存器个数的以2为底的对数
+            labels: 可选，已转换好的文本形式
+        """
+        sketch = cls(precision)
+        if len(values) == 0:
+            return sketch
+        if labels is None:
+            labels = text_labels(values)
+        hashes = pd.util.hash_array(labels)
+        index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+        rest = (hashes << np.uint64(precision)) | np.uint64(1 << (precision - 1))
+        # 剩余位中第一个1的位置（从1开始），先用浮点对数估计再修正舍入误差
+        bit_length = np.floor(np.log2(rest.astype(np.float64))).astype(np.int64) + 1
+        too_long = (rest >> (bit_length - 1).astype(np.uint64)) == 0
+        bit_length[too_long] -= 1
+        ranks = (65 - bit_length).astype(np.uint8)
+        np.maximum.at(sketch.registers, index, ranks)
+        return sketch
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def estimate(self):
+        """不同值个数的估计值"""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            # 小基数时使用线性计数
+            return int(round(m * np.log(m / zeros)))
+        return int(round(raw))
+
+
+class FrequencySketch:
+    """可合并的频数表
+
+    按取值的文本形式计数，同时记录每个类别第一次出现的位置和原始值；
+    类别数超过容量时只保留频数最高的类别（此时complete为False），
+    total仍是全部取值的频数（权重）和
+    """
+
+    def __init__(self, capacity=FREQUENCY_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.total = 0.0
+        self.complete = True
+
+    @classmethod
+    def from_values(cls, values, weights=None, order=0, capacity=FREQUENCY_CAPACITY, labels=None):
+        """由取值数组计算频数表
+
+        Args:
+            values: 取值数组（不含缺失值）
+            weights: 可选，与values对应的权重
+            order: 该数组在合并顺序中的序号，用于确定类别第一次出现的先后
+            capacity: 最多保留的类别数
+            labels: 可选，已转换好的文本形式
+        """
+        sketch = cls(capacity)
+        if len(values) == 0:
+            return sketch
+        if labels is None:
+            labels = text_labels(values)
+        categories, first_index, inverse = np.unique(labels, return_index=True, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights, minlength=len(categories))
+        sketch.total = float(counts.sum())
+        sketch.counts = {
+            label: [float(count), (order, int(first)), values[first]]
+            for label, count, first in zip(categories, counts, first_index)
+        }
+        sketch._truncate()
+        return sketch
+
+    def merge(self, other):
+        for label, (count, first, value) in other.counts.items():
+            entry = self.counts.get(label)
+            if entry is None:
+                self.counts[label] = [count, first, value]
+            else:
+                entry[0] += count
+                if first < entry[1]:
+                    entry[1], entry[2] = first, value
+        self.total += other.total
+        self.complete = self.complete and other.complete
+        self._truncate()
+        return self
+
+    def _truncate(self):
+        if len(self.counts) <= self.capacity:
+            return
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1][0], item[1][1]))
+        self.counts = dict(ranked[:self.capacity])
+        self.complete = False
+
+    def most_common(self, limit=None):
+        """按频数从高到低（相同时按第一次出现的先后）返回 [(原始值, 频数), ...]"""
+        ranked = sorted(self.counts.values(), key=lambda entry: (-entry[0], entry[1]))
+        if limit is not None:
+            ranked = ranked[:limit]
+        return [(value, count) for count, _, value in ranked]
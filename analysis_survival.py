@@ -0,0 +1,508 @@
+"""
+生存分析模块（Kaplan-Meier与Log-rank检验）
+
+时间、事件和分组整理为NumPy数组后只排序一次（np.unique），按不同时间点
+汇总每组的事件数和删失数，风险集大小由反向累积和得到，生存曲线、
+Greenwood方差和各组的观察/期望事件数都是对这张事件表的向量运算，
+总计算量为O(n log n)。组间比较支持k组Log-rank检验、分层Log-rank检验和
+Fleming-Harrington加权检验，p值由卡方分布计算，也可以用层内置换组号的
+置换检验计算；中位生存时间可以用自助法估计置信区间
+"""
+
+from functools import partial
+
+import numpy as np
+from scipy import stats as sp_stats
+
+from analysis_resampling import (bootstrap_indices, percentile_interval, permutation_p_value, permuted_rows,
+                                 resampling_summary, run_replicates)
+
+
+# 事件变量的文本取值
+EVENT_TRUE = ('1', 'true', 'yes', 'y')
+EVENT_FALSE = ('0', 'false', 'no', 'n')
+
+# 生存率里程碑（天）
+SURVIVAL_MILESTONES = (30, 60, 90, 180, 365)
+
+# 生存曲线的默认置信水平
+CONFIDENCE_LEVEL = 0.95
+
+# 绘制生存曲线至少需要的观测数
+MIN_GROUP_SIZE = 3
+
+
+def event_indicator(raw):
+    """把事件变量的原始值转换为事件指示（1=事件，0=删失）
+
+    文本1/true/yes/y为事件，0/false/no/n为删失，其他文本按数值解析；
+    数值等于1为事件，其他数值为删失；无法解析的值为NaN
+
+    Args:
+        raw: 原始值object数组
+
+    Returns:
+        numpy.ndarray: float64数组
+    """
+    events = np.full(len(raw), np.nan)
+    for i, value in enumerate(raw):
+        if value is None:
+            continue
+        if isinstance(value, str):
+            text = value.strip().lower()
+            if text in EVENT_TRUE:
+                events[i] = 1.0
+                continue
+            if text in EVENT_FALSE:
+                events[i] = 0.0
+                continue
+            try:
+                value = int(float(text))
+            except (ValueError, OverflowError):
+                continue
+        try:
+            events[i] = 1.0 if value == 1 else 0.0
+        except TypeError:
+            continue
+    return events
+
+
+def group_codes(raw):
+    """把分组变量编码为整数组号，组按取值排序（缺失值和空字符串编码为-1）
+
+    Returns:
+        tuple: (组号int64数组, 组取值列表)
+    """
+    present = [value for value in raw if value is not None and value != '']
+    labels = {}
+    for value in present:
+        labels.setdefault(str(value), value)
+    try:
+        names = sorted(labels.values())
+    except TypeError:
+        names = [labels[label] for label in sorted(labels)]
+    index = {str(name): code for code, name in enumerate(names)}
+    codes = np.fromiter((index.get(str(value), -1) if value is not None and value != '' else -1
+                         for value in raw), dtype=np.int64, count=len(raw))
+    return codes, names
+
+
+def event_table(time, event, codes=None, n_groups=1):
+    """按不同时间点汇总各组的风险集、事件数和删失数
+
+    Args:
+        time: 时间数组
+        event: 事件指示数组（1/0）
+        codes: 可选，组号数组（0..n_groups-1）
+        n_groups: 组数
+
+    Returns:
+        tuple: (不同时间点数组, 风险集大小[T, G], 事件数[T, G], 删失数[T, G])
+    """
+    if codes is None:
+        codes = np.zeros(len(time), dtype=np.int64)
+    times, inverse = np.unique(time, return_inverse=True)
+    size = len(times) * n_groups
+    cells = inverse * n_groups + codes
+    counts = np.bincount(cells, minlength=size).reshape(len(times), n_groups).astype(np.float64)
+    deaths = np.bincount(cells, weights=event, minlength=size).reshape(len(times), n_groups)
+    # 时间点t的风险集：时间不早于t的观测数（反向累积和）
+    at_risk = np.cumsum(counts[::-1], axis=0)[::-1]
+    return times, at_risk, deaths, counts - deaths
+
+
+def _median_survival(times, survival):
+    """生存概率首次降到0.5以下的时间（与前一个事件时间点之间线性插值）"""
+    below = np.flatnonzero(survival <= 0.5)
+    if len(below) == 0:
+        return None
+    i = below[0]
+    if i == 0:
+        return float(times[0])
+    return float(times[i - 1] + (times[i] - times[i - 1]) * (0.5 - survival[i - 1])
+                 / (survival[i] - survival[i - 1]))
+
+
+def _milestone_rates(times, survival):
+    """各里程碑附近事件时间点的生存概率（取离里程碑较近的事件时间点）"""
+    rates = {}
+    if len(times) == 0:
+        return rates
+    for milestone in SURVIVAL_MILESTONES:
+        i = int(np.searchsorted(times, milestone, side='left'))
+        if i >= len(times):
+            i = len(times) - 1
+        elif i > 0 and abs(times[i - 1] - milestone) < abs(times[i] - milestone):
+            i -= 1
+        rates[str(milestone)] = float(survival[i])
+    return rates
+
+
+def _number(value):
+    value = float(value)
+    return value if np.isfinite(value) else None
+
+
+def kaplan_meier_curve(times, at_risk, deaths, censored, confidence_level=CONFIDENCE_LEVEL):
+    """由一组的事件表计算Kaplan-Meier生存曲线
+
+    置信区间使用Greenwood方差的log(-log)变换，区间始终位于[0, 1]内
+
+    Args:
+        times, at_risk, deaths, censored: event_table返回的一组的一维数组
+        confidence_level: 置信水平
+
+    Returns:
+        dict: survival_curve（每个事件时间点）、median_survival、survival_rates、
+              total_events、total_censored、total_subjects、confidence_level
+    """
+    has_event = deaths > 0
+    times, at_risk, deaths, censored = (times[has_event], at_risk[has_event],
+                                        deaths[has_event], censored[has_event])
+    survival = np.cumprod(1.0 - deaths / at_risk)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        greenwood = np.cumsum(deaths / (at_risk * (at_risk - deaths)))
+        std_error = survival * np.sqrt(greenwood)
+        z = sp_stats.norm.ppf(0.5 + confidence_level / 2)
+        log_log_se = np.sqrt(greenwood) / np.abs(np.log(survival))
+        lower = survival ** np.exp(z * log_log_se)
+        upper = survival ** np.exp(-z * log_log_se)
+    defined = (survival > 0) & (survival < 1) & np.isfinite(greenwood)
+    lower = np.where(defined, lower, np.where(survival >= 1, 1.0, np.nan))
+    upper = np.where(defined, upper, np.where(survival >= 1, 1.0, np.nan))
+
+    curve = [{
+        'time': float(t),
+        'survival': float(s),
+        'at_risk': int(n),
+        'events': int(d),
+        'censored': int(c),
+        'std_error': _number(se),
+        'ci_lower': _number(lo),
+        'ci_upper': _number(hi)
+    } for t, s, n, d, c, se, lo, hi in zip(times, survival, at_risk, deaths, censored,
+                                           std_error, lower, upper)]
+    return {
+        'survival_curve': curve,
+        'median_survival': _median_survival(times, survival),
+        'survival_rates': _milestone_rates(times, survival),
+        'confidence_level': confidence_level
+    }
+
+
+def kaplan_meier(time, event, confidence_level=CONFIDENCE_LEVEL, n_resamples=0, seed=None):
+    """单组Kaplan-Meier生存曲线
+
+    Args:
+        time: 时间数组（不含缺失值）
+        event: 事件指示数组（1/0）
+        confidence_level: 置信水平
+        n_resamples: 中位生存时间自助法置信区间的样本数，为0时不计算
+        seed: 自助法随机种子
+
+    Returns:
+        dict: 见kaplan_meier_curve，n_resamples > 0时另有median_survival_ci
+    """
+    times, at_risk, deaths, censored = event_table(time, event)
+    result = kaplan_meier_curve(times, at_risk[:, 0], deaths[:, 0], censored[:, 0], confidence_level)
+    total_events = int(event.sum())
+    result.update(total_events=total_events, total_censored=len(event) - total_events,
+                  total_subjects=len(event))
+    if n_resamples > 0:
+        result['median_survival_ci'] = median_survival_interval(time, event, n_resamples, seed, confidence_level)
+    return result
+
+
+def _logrank_components(time, event, codes, n_groups, rho=0.0, gamma=0.0):
+    """一个层内Log-rank检验的观察数、期望数、得分向量和方差矩阵
+
+    Fleming-Harrington权重为 S(t-)^rho * (1 - S(t-))^gamma，S为合并样本的
+    Kaplan-Meier估计；rho = gamma = 0时为普通Log-rank检验
+    """
+    times, at_risk, deaths, _ = event_table(time, event, codes, n_groups)
+    total_risk = at_risk.sum(axis=1)
+    total_deaths = deaths.sum(axis=1)
+    keep = total_deaths > 0
+    at_risk, deaths, total_risk, total_deaths = (at_risk[keep], deaths[keep],
+                                                 total_risk[keep], total_deaths[keep])
+
+    weights = np.ones(len(total_deaths))
+    if rho or gamma:
+        survival = np.cumprod(1.0 - total_deaths / total_risk)
+        previous = np.concatenate([[1.0], survival[:-1]])
+        weights = previous ** rho * (1.0 - previous) ** gamma
+
+    share = at_risk / total_risk[:, None]
+    expected = total_deaths[:, None] * share
+    score = (weights[:, None] * (deaths - expected)).sum(axis=0)
+    # 超几何方差：d(n-d)/(n-1) * [diag(share) - share share^T]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = np.where(total_risk > 1,
+                          total_deaths * (total_risk - total_deaths) / (total_risk - 1), 0.0)
+    factor = factor * weights * weights
+    variance = np.diag((factor[:, None] * share).sum(axis=0)) - (factor[:, None] * share).T @ share
+    return deaths.sum(axis=0), expected.sum(axis=0), score, variance
+
+
+def logrank_test(time, event, codes, group_names, strata=None, rho=0.0, gamma=0.0, alpha=0.05):
+    """k组Log-rank检验（可分层、可加权）
+
+    Args:
+        time: 时间数组
+        event: 事件指示数组（1/0）
+        codes: 组号数组
+        group_names: 组取值列表
+        strata: 可选，层号数组；分层时各层的得分向量和方差矩阵分别相加
+        rho, gamma: Fleming-Harrington权重参数
+        alpha: 显著性水平
+
+    Returns:
+        dict: statistic、df、p_value、significant、observed、expected、method
+    """
+    n_groups = len(group_names)
+    observed = np.zeros(n_groups)
+    expected = np.zeros(n_groups)
+    score = np.zeros(n_groups)
+    variance = np.zeros((n_groups, n_groups))
+    layers = [np.ones(len(time), dtype=bool)] if strata is None else [strata == s for s in np.unique(strata)]
+    for rows in layers:
+        o, e, u, v = _logrank_components(time[rows], event[rows], codes[rows], n_groups, rho, gamma)
+        observed += o
+        expected += e
+        score += u
+        variance += v
+
+    # 有观测的组参与检验，去掉最后一组后方差矩阵可逆
+    present = np.flatnonzero(np.bincount(codes, minlength=n_groups) > 0)
+    df = len(present) - 1
+    statistic = None
+    p_value = None
+    if df >= 1:
+        used = present[:-1]
+        u = score[used]
+        v = variance[np.ix_(used, used)]
+        statistic = float(u @ np.linalg.pinv(v) @ u)
+        p_value = float(sp_stats.chi2.sf(statistic, df))
+
+    method = 'logrank' if not (rho or gamma) else 'fleming_harrington'
+    result = {
+        'method': method,
+        'statistic': statistic,
+        'df': df,
+        'p_value': p_value,
+        'significant': p_value is not None and p_value < alpha,
+        'observed': {str(name): float(observed[g]) for g, name in enumerate(group_names)},
+        'expected': {str(name): float(expected[g]) for g, name in enumerate(group_names)},
+        'stratified': strata is not None
+    }
+    if method == 'fleming_harrington':
+        result.update(rho=rho, gamma=gamma)
+    return result
+
+
+def kaplan_meier_grouped(time, event, codes, group_names, strata=None, rho=0.0, gamma=0.0,
+                         confidence_level=CONFIDENCE_LEVEL, n_resamples=0, resampling_method='bootstrap',
+                         seed=None):
+    """分组Kaplan-Meier生存曲线和组间Log-rank检验
+
+    所有组共用一张事件表（只排序一次），观测数少于MIN_GROUP_SIZE的组不绘制曲线
+
+    Args:
+        time: 时间数组
+        event: 事件指示数组（1/0）
+        codes: 组号数组（0..len(group_names)-1）
+        group_names: 组取值列表
+        strata: 可选，分层Log-rank检验的层号数组
+        rho, gamma: Fleming-Harrington权重参数
+        confidence_level: 生存曲线的置信水平
+        n_resamples: 重抽样次数，为0时不做重抽样
+        resampling_method: bootstrap（各组中位生存时间的置信区间）或
+                           permutation（组间比较的置换检验p值）
+        seed: 重抽样随机种子
+
+    Returns:
+        dict: groups、group_results（按组名）、comparison；重抽样结果在各组的
+              median_survival_ci或comparison的permutation中
+    """
+    n_groups = len(group_names)
+    times, at_risk, deaths, censored = event_table(time, event, codes, n_groups)
+    sizes = np.bincount(codes, minlength=n_groups)
+    group_events = np.bincount(codes, weights=event, minlength=n_groups)
+
+    group_results = {}
+    for g, name in enumerate(group_names):
+        if sizes[g] < MIN_GROUP_SIZE:
+            continue
+        result = kaplan_meier_curve(times, at_risk[:, g], deaths[:, g], censored[:, g], confidence_level)
+        result.update(total_events=int(group_events[g]), total_censored=int(sizes[g] - group_events[g]),
+                      total_subjects=int(sizes[g]), group_name=str(name), group_size=int(sizes[g]))
+        if n_resamples > 0 and resampling_method == 'bootstrap':
+            rows = codes == g
+            result['median_survival_ci'] = median_survival_interval(time[rows], event[rows], n_resamples,
+                                                                    seed, confidence_level)
+        group_results[str(name)] = result
+
+    if np.count_nonzero(sizes) >= 2:
+        comparison = logrank_test(time, event, codes, group_names, strata, rho, gamma)
+        if n_resamples > 0 and resampling_method == 'permutation':
+            comparison['permutation'] = permutation_logrank(time, event, codes, n_groups, strata, rho, gamma,
+                                                            n_resamples, seed)
+    else:
+        comparison = {'message': '无法执行组间比较，至少需要两个有数据的组'}
+
+    return {
+        'groups': list(group_names),
+        'group_results': group_results,
+        'comparison': comparison
+    }
+
+
+def _median_batch(arrays, rng, size):
+    """重抽样模块调用的批处理函数：一批自助样本的Kaplan-Meier中位生存时间
+
+    所有自助样本共用原样本的不同时间点，每个样本的事件表是一次带偏移的bincount，
+    未达到中位生存时间的样本为NaN
+    """
+    inverse, event, times = arrays
+    n, n_times = len(inverse), len(times)
+    rows = bootstrap_indices(rng, size, n)
+    cells = (np.arange(size)[:, None] * n_times + inverse[rows]).ravel()
+    counts = np.bincount(cells, minlength=size * n_times).reshape(size, n_times)
+    deaths = np.bincount(cells, weights=event[rows].ravel(), minlength=size * n_times).reshape(size, n_times)
+    at_risk = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        survival = np.cumprod(np.where(at_risk > 0, 1.0 - deaths / at_risk, 1.0), axis=1)
+    below = survival <= 0.5
+    first = below.argmax(axis=1)
+    # 与_median_survival相同：在前一个事件时间点和首次降到0.5以下的时间点之间线性插值
+    last_event = np.maximum.accumulate(np.where(deaths > 0, np.arange(n_times), -1), axis=1)
+    batch = np.arange(size)
+    previous = np.where(first > 0, last_event[batch, np.maximum(first - 1, 0)], -1)
+    s_previous = survival[batch, np.maximum(previous, 0)]
+    s_first = survival[batch, first]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        interpolated = (times[np.maximum(previous, 0)] + (times[first] - times[np.maximum(previous, 0)])
+                        * (0.5 - s_previous) / (s_first - s_previous))
+    median = np.where(previous >= 0, interpolated, times[first])
+    return np.where(below.any(axis=1), median, np.nan)
+
+
+def median_survival_interval(time, event, n_resamples, seed=None, confidence_level=CONFIDENCE_LEVEL):
+    """中位生存时间的自助法百分位数置信区间
+
+    Args:
+        time: 时间数组
+        event: 事件指示数组（1/0）
+        n_resamples: 自助样本数
+        seed: 随机种子
+        confidence_level: 置信水平
+
+    Returns:
+        dict: 重抽样设置、ci_lower、ci_upper、std_error（无法估计时为None）和
+              n_valid（达到中位生存时间的自助样本数）
+    """
+    times, inverse = np.unique(time, return_inverse=True)
+    replicates = run_replicates(_median_batch, [inverse, np.asarray(event, dtype=np.float64), times],
+                                n_resamples, seed)
+    lower, upper, std_error = percentile_interval(replicates, confidence_level)
+    summary = resampling_summary('bootstrap', n_resamples, seed)
+    summary.update({
+        'confidence_level': confidence_level,
+        'ci_lower': _number(lower),
+        'ci_upper': _number(upper),
+        'std_error': _number(std_error),
+        'n_valid': int(np.isfinite(replicates).sum())
+    })
+    return summary
+
+
+def _logrank_chi_square(time_codes, event, codes, bounds, n_groups, rho, gamma):
+    """每行组号（codes为 次数×观测数 矩阵）对应的分层Log-rank卡方统计量
+
+    观测已按层排序，bounds为各层在数组中的边界，time_codes为层内的时间点编号
+    """
+    size = codes.shape[0]
+    score = np.zeros((size, n_groups))
+    variance = np.zeros((size, n_groups, n_groups))
+    diagonal = np.arange(n_groups)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        inverse = time_codes[start:stop]
+        n_times = int(inverse.max()) + 1
+        cells = ((np.arange(size)[:, None] * n_times + inverse) * n_groups + codes[:, start:stop]).ravel()
+        total = size * n_times * n_groups
+        counts = np.bincount(cells, minlength=total).reshape(size, n_times, n_groups)
+        deaths = np.bincount(cells, weights=np.broadcast_to(event[start:stop], (size, stop - start)).ravel(),
+                             minlength=total).reshape(size, n_times, n_groups)
+        at_risk = np.cumsum(counts[:, ::-1], axis=1)[:, ::-1]
+        total_risk = at_risk.sum(axis=2)
+        total_deaths = deaths.sum(axis=2)
+
+        # 合并样本的生存曲线不随组号置换而改变，权重只由第一行计算
+        weights = np.ones(n_times)
+        if rho or gamma:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                survival = np.cumprod(np.where(total_risk[0] > 0, 1.0 - total_deaths[0] / total_risk[0], 1.0))
+            previous = np.concatenate([[1.0], survival[:-1]])
+            weights = previous ** rho * (1.0 - previous) ** gamma
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.where(total_risk[:, :, None] > 0, at_risk / total_risk[:, :, None], 0.0)
+            factor = np.where(total_risk > 1,
+                              total_deaths * (total_risk - total_deaths) / (total_risk - 1), 0.0)
+        factor = factor * weights * weights
+        score += np.einsum('t,btg->bg', weights, deaths - total_deaths[:, :, None] * share)
+        weighted = factor[:, :, None] * share
+        variance -= np.einsum('btg,bth->bgh', weighted, share)
+        variance[:, diagonal, diagonal] += weighted.sum(axis=1)
+
+    # 与logrank_test相同：去掉有观测的最后一组
+    used = np.flatnonzero(np.bincount(codes[0], minlength=n_groups) > 0)[:-1]
+    u = score[:, used]
+    v = variance[:, used][:, :, used]
+    return np.einsum('bi,bij,bj->b', u, np.linalg.pinv(v, hermitian=True), u)
+
+
+def _logrank_batch(n_groups, rho, gamma, arrays, rng, size):
+    """重抽样模块调用的批处理函数：在各层内置换组号后的Log-rank统计量"""
+    time_codes, event, codes, bounds = arrays
+    permuted = np.empty((size, len(codes)), dtype=codes.dtype)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        permuted[:, start:stop] = permuted_rows(rng, size, codes[start:stop])
+    return _logrank_chi_square(time_codes, event, permuted, bounds, n_groups, rho, gamma)
+
+
+def permutation_logrank(time, event, codes, n_groups, strata=None, rho=0.0, gamma=0.0,
+                        n_resamples=1000, seed=None):
+    """Log-rank检验的置换检验p值（在各层内置换组号）
+
+    Args:
+        time: 时间数组
+        event: 事件指示数组（1/0）
+        codes: 组号数组
+        n_groups: 组数
+        strata: 可选，层号数组
+        rho, gamma: Fleming-Harrington权重参数
+        n_resamples: 置换次数
+        seed: 随机种子
+
+    Returns:
+        dict: 重抽样设置、statistic、p_value和n_valid
+    """
+    strata = np.zeros(len(time), dtype=np.int64) if strata is None else np.asarray(strata)
+    order = np.argsort(strata, kind='stable')
+    time, event, codes, strata = time[order], np.asarray(event, dtype=np.float64)[order], codes[order], strata[order]
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(strata)) + 1, [len(time)]])
+    time_codes = np.empty(len(time), dtype=np.int64)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        time_codes[start:stop] = np.unique(time[start:stop], return_inverse=True)[1]
+
+    observed = _logrank_chi_square(time_codes, event, codes[None, :], bounds, n_groups, rho, gamma)[0]
+    replicates = run_replicates(partial(_logrank_batch, n_groups, rho, gamma),
+                                [time_codes, event, codes, bounds], n_resamples, seed, width=n_groups)
+    summary = resampling_summary('permutation', n_resamples, seed)
+    summary.update({
+        'statistic': _number(observed),
+        'p_value': _number(permutation_p_value(observed, replicates, 'greater')),
+        'n_valid': int(np.isfinite(replicates).sum())
+    })
+    return summary
@@ -1,6 +1,8 @@
-from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, send_file, current_app, session
+from flask import Flask, render_template, redirect, url_for, flash, request, jsonify, send_file, current_app, session, Response, after_this_request
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+import importlib.util
+import itertools
 import os
 import json
 import pandas as pd
@@ -13,14 +15,38 @@ from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, HiddenField, SelectField, TextAreaField
 from wtforms.validators import DataRequired
 from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 import sqlite3
 from datetime import datetime, timedelta
 from flask_cors import CORS
 from sqlalchemy import func
-import math
+import uuid
 from app_risk import setup_risk_assessment_api
 from app_outcome import setup_outcome_prediction_api
+from analysis_resampling import parse_resampling_options, resampling_summary, result_cache
+from analysis_correlation import MISSING_POLICIES, correlation_matrix
+from analysis_descriptive import describe_datasets
+from analysis_hypothesis import GROUPED_TESTS, run_hypothesis_test
+from analysis_cox import TIES_METHODS, cox_regression, design_matrix
+from analysis_survival import event_indicator, group_codes, kaplan_meier, kaplan_meier_grouped
+from dataset_column_store import DatasetColumnStore, bump_data_version, field_types_from_custom_fields
+from dataset_csv_reader import CSVStreamReader, mapping_row_mapper, positional_row_mapper
+from dataset_excel_reader import frame_records, read_excel_frame
+from dataset_export import (count_entries, csv_download_response, excel_download_response, export_headers,
+                            fetch_first_entry, item_headers, item_rows, iter_csv_bytes,
+                            iter_entries, iter_export_rows, iter_parallel_members, iter_zip_stream,
+                            resolve_field_names, write_export_artifact)
+from dataset_filters import compile_entry_filters, register_filter_functions
+from export_jobs import ExportJobManager
+from process_pool import get_process_pool
+from dataset_field_stats import FieldStatsDelta, load_entry_data, load_field_stats
+from dataset_import import BulkImporter
+from dataset_import_preview import MAX_PREVIEW_ROWS, PREVIEW_ROWS, preview_csv, preview_excel
+from dataset_indexes import create_field_index, drop_field_index, index_name_for
+from dataset_pagination import PAGE_ORDER_SQL, cursor_condition, decode_cursor, fetch_page
+from upload_sessions import UploadSessionManager
+from import_jobs import ImportJobManager
 
 # Load environment variables
 load_dotenv()
@@ -56,6 +82,15 @@ def csrf_exempt_api():
 # Initialize database
 db = SQLAlchemy(app)
 
+# 数据集列式存储，分析接口按需读取字段列
+column_store = DatasetColumnStore(os.path.join('instance', 'zl_geniusmedvault.db'))
+app.extensions['column_store'] = column_store
+
+# 后台导出任务、后台导入任务和分块上传会话，由init_app创建
+export_jobs = None
+import_jobs = None
+upload_sessions = None
+
 # Initialize login manager
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -221,6 +256,140 @@ class DatasetEntry(db.Model):
     def __repr__(self):
         return f'<DatasetEntry {self.id} for Dataset {self.dataset_id}>'
 
+class DatasetIndexedField(db.Model):
+    """数据集索引字段模型（由管理员维护，对应dataset_entries上的表达式索引）"""
+    __tablename__ = 'dataset_indexed_fields'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('data_set.id'), nullable=False)
+    field_name = db.Column(db.String(200), nullable=False)
+    index_name = db.Column(db.String(100), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_by = db.Column(db.Integer, db.ForeignKey('user.id'))
+    
+    __table_args__ = (db.UniqueConstraint('dataset_id', 'field_name', name='uq_dataset_indexed_field'),)
+
+class ImportJob(db.Model):
+    """后台导入任务模型（进度由import_jobs模块在每批提交时更新）"""
+    __tablename__ = 'import_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('data_set.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    status = db.Column(db.String(20), default='queued')  # queued, running, completed, failed, cancelled, interrupted
+    filename = db.Column(db.String(255))
+    file_path = db.Column(db.String(500), nullable=False)
+    file_ext = db.Column(db.String(10), nullable=False)
+    owns_file = db.Column(db.Boolean, default=False)  # 导入文件是否在任务完成后删除
+    options = db.Column(db.Text)  # JSON格式的导入选项
+    total_rows = db.Column(db.Integer)
+    processed_rows = db.Column(db.Integer, default=0)  # 已提交的源数据行数（继续导入的断点）
+    inserted_rows = db.Column(db.Integer, default=0)
+    updated_rows = db.Column(db.Integer, default=0)
+    error_rows = db.Column(db.Integer, default=0)
+    max_existing_id = db.Column(db.Integer)  # 参与主键匹配的最大记录ID
+    errors = db.Column(db.Text)  # JSON格式的错误信息（最多100条）
+    message = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+class DatasetStats(db.Model):
+    """数据集统计状态模型（存在记录表示字段统计已构建，由dataset_field_stats模块维护）"""
+    __tablename__ = 'dataset_stats'
+    
+    dataset_id = db.Column(db.Integer, db.ForeignKey('data_set.id'), primary_key=True)
+    record_count = db.Column(db.Integer, nullable=False, default=0)
+    rebuilt_at = db.Column(db.Float)  # 最近一次整体构建的时间戳
+
+class DatasetFieldStat(db.Model):
+    """数据集字段统计模型（随记录的增删改和导入增量更新）"""
+    __tablename__ = 'dataset_field_stats'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dataset_id = db.Column(db.Integer, db.ForeignKey('data_set.id'), nullable=False)
+    field_name = db.Column(db.String(200), nullable=False)
+    value_count = db.Column(db.Integer, nullable=False, default=0)  # 包含该字段的记录数
+    non_null_count = db.Column(db.Integer, nullable=False, default=0)  # 非空值个数
+    numeric_count = db.Column(db.Integer, nullable=False, default=0)  # 数值个数
+    sum_value = db.Column(db.Float, nullable=False, default=0.0)
+    sum_squares = db.Column(db.Float, nullable=False, default=0.0)
+    min_value = db.Column(db.Float)
+    max_value = db.Column(db.Float)
+    stale = db.Column(db.Boolean, nullable=False, default=False)  # 最小值/最大值需要重新计算
+    
+    __table_args__ = (db.UniqueConstraint('dataset_id', 'field_name', name='uq_dataset_field_stat'),)
+
+class DatasetVersion(db.Model):
+    """数据集数据版本模型（记录每次写入时在同一事务中加一，由dataset_column_store模块维护）"""
+    __tablename__ = 'dataset_versions'
+    
+    # 不设外键：数据集删除后保留版本号，复用的数据集ID不会命中旧缓存
+    dataset_id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+def read_field_stats(dataset_id):
+    """读取数据集的字段统计
+    
+    Returns:
+        tuple: (记录总数, {字段名: 统计信息})
+    """
+    conn = sqlite3.connect(os.path.join('instance', 'zl_geniusmedvault.db'), timeout=30)
+    try:
+        return load_field_stats(conn, dataset_id)
+    finally:
+        conn.close()
+
+def session_sqlite_connection():
+    """ORM会话当前事务使用的sqlite3连接，用于在同一事务中执行原始SQL"""
+    return db.session.connection().connection.driver_connection
+
+def load_dataset_columns(dataset, fields):
+    """从列式存储读取数据集的指定字段
+    
+    Args:
+        dataset: DataSet实例
+        fields: 需要的字段名列表
+        
+    Returns:
+        DatasetColumns: 数据集列式快照
+    """
+    try:
+        custom_fields = dataset.custom_fields_obj or []
+    except (json.JSONDecodeError, TypeError):
+        custom_fields = []
+    return column_store.get_columns(dataset.id, fields, field_types_from_custom_fields(custom_fields))
+
+def get_indexed_fields(dataset_id):
+    """获取数据集已建立表达式索引的字段名列表"""
+    return [item.field_name for item in DatasetIndexedField.query.filter_by(dataset_id=dataset_id).all()]
+
+def ensure_field_index(dataset_id, field_name):
+    """确保数据集字段已建立表达式索引，未建立时自动创建并登记
+
+    按主键导入时用于批量查找已有记录；创建失败时导入仍可进行，只是查找较慢
+    """
+    if DatasetIndexedField.query.filter_by(dataset_id=dataset_id, field_name=field_name).first():
+        return
+    conn = None
+    try:
+        conn = sqlite3.connect(os.path.join('instance', 'zl_geniusmedvault.db'))
+        index_name = create_field_index(conn, field_name)
+    except Exception as e:
+        print(f"创建字段索引出错: {str(e)}")
+        return
+    finally:
+        if conn:
+            conn.close()
+    db.session.add(DatasetIndexedField(
+        dataset_id=dataset_id,
+        field_name=field_name,
+        index_name=index_name,
+        created_by=current_user.id
+    ))
+    db.session.commit()
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -1487,17 +1656,31 @@ def delete_dataset(dataset_id):
         for mapping in mappings:
             db.session.delete(mapping)
         
+        # 删除数据集的索引字段登记
+        indexed_fields = DatasetIndexedField.query.filter_by(dataset_id=dataset_id).all()
+        indexed_field_names = [indexed_field.field_name for indexed_field in indexed_fields]
+        for indexed_field in indexed_fields:
+            db.session.delete(indexed_field)
+        
         # 删除所有关联的数据条目 - 即使没有条目也不会出错
         entries = DatasetEntry.query.filter_by(dataset_id=dataset_id).all()
         for entry in entries:
             db.session.delete(entry)
         
+        # 删除数据集的字段统计，数据版本号加一使缓存的结果失效
+        DatasetFieldStat.query.filter_by(dataset_id=dataset_id).delete()
+        DatasetStats.query.filter_by(dataset_id=dataset_id).delete()
+        bump_data_version(session_sqlite_connection(), dataset_id)
+        
         # 保存数据集名称用于反馈信息
         dataset_name = dataset.name
         
         # 删除数据集本身
         db.session.delete(dataset)
         db.session.commit()
+        column_store.invalidate(dataset_id)
+        for field_name in indexed_field_names:
+            release_field_index(field_name)
         
         if is_ajax:
             return jsonify({
@@ -1703,37 +1886,6 @@ def change_phone():
 def handle_csrf_error(e):
     return render_template('error.html', reason=e.description), 400
 
-# Initialize database within application context
-with app.app_context():
-    db.create_all()
-    # Create admin user if none exists
-    admin = User.query.filter_by(username='admin').first()
-    if not admin:
-        admin = User(username='admin', email='admin@zltech.com', role='admin')
-        admin.set_password('admin123')
-        db.session.add(admin)
-        db.session.commit()
-    
-    # Create test doctor user if none exists
-    doctor = User.query.filter_by(username='doctor').first()
-    if not doctor:
-        doctor = User(
-            username='doctor', 
-            email='doctor@zltech.com', 
-            role='doctor',
-            name='张医生',
-            title='主治医师',
-            department='内科',
-            professional_title='副主任医师',
-            doctor_id='DR20230001',
-            phone='13800138000',
-            last_login=datetime.now(),
-            password_updated_at=datetime.now() - timedelta(days=30)
-        )
-        doctor.set_password('doctor123')
-        db.session.add(doctor)
-        db.session.commit()
-
 # 在app.run()之前添加此代码块
 def reset_database():
     with app.app_context():
@@ -2128,9 +2280,15 @@ def save_dataset_data(dataset_id):
             created_at=datetime.now()
         )
         
-        # 保存到数据库
+        # 保存到数据库，字段统计的增量在同一事务中写入
         db.session.add(data_entry)
+        db.session.flush()
+        stats_delta = FieldStatsDelta()
+        stats_delta.add(form_data)
+        stats_delta.apply(session_sqlite_connection(), dataset_id)
+        version = bump_data_version(session_sqlite_connection(), dataset_id)
         db.session.commit()
+        column_store.on_insert(dataset_id, data_entry.id, form_data, version)
         
         # 更新数据集的修改时间
         dataset.updated_at = datetime.now()
@@ -2157,6 +2315,10 @@ def save_dataset_data(dataset_id):
 def get_dataset_entries(dataset_id):
     """获取数据集的已保存数据记录
     
+    支持以下URL参数:
+    - limit: 每次返回的记录数（最多1000），不提供时返回全部记录
+    - cursor: 上一次响应返回的next_cursor，从该位置继续读取
+    
     Args:
         dataset_id: 数据集ID
         
@@ -2164,6 +2326,17 @@ def get_dataset_entries(dataset_id):
         数据记录的JSON响应
     """
     try:
+        limit = request.args.get('limit', None, type=int)
+        page_cursor = request.args.get('cursor') or None
+        if page_cursor:
+            try:
+                decode_cursor(page_cursor)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': str(e)
+                }), 400
+        
         # 从数据库获取数据集
         dataset = DataSet.query.get(dataset_id)
         
@@ -2202,16 +2375,28 @@ def get_dataset_entries(dataset_id):
             conn.row_factory = sqlite3.Row  # 使查询结果可以通过列名访问
             cursor = conn.cursor()
             
-            # 查询数据集的数据记录
-            cursor.execute("""
+            cursor.execute("SELECT COUNT(*) FROM dataset_entries WHERE dataset_id = ?", (dataset_id,))
+            total_count = cursor.fetchone()[0]
+            
+            # 查询数据集的数据记录，提供游标时从游标位置之后开始
+            params = {'dataset_id': dataset_id}
+            where_sql = "de.dataset_id = :dataset_id"
+            if page_cursor:
+                where_sql += " AND " + cursor_condition(page_cursor, params)
+            query = f"""
                 SELECT de.id, de.user_id, u.username, de.data, de.created_at 
                 FROM dataset_entries de
                 LEFT JOIN user u ON de.user_id = u.id
-                WHERE de.dataset_id = ?
-                ORDER BY de.created_at DESC
-            """, (dataset_id,))
+                WHERE {where_sql}
+                {PAGE_ORDER_SQL}
+            """
             
-            entries_db = cursor.fetchall()
+            next_cursor = None
+            if limit is not None:
+                entries_db, next_cursor = fetch_page(cursor, query, params, max(1, min(limit, 1000)))
+            else:
+                cursor.execute(query, params)
+                entries_db = cursor.fetchall()
             
             # 转换为可序列化的格式
             entries = []
@@ -2239,7 +2424,9 @@ def get_dataset_entries(dataset_id):
             return jsonify({
                 'success': True,
                 'entries': entries,
-                'custom_fields': custom_fields
+                'custom_fields': custom_fields,
+                'total_count': total_count,
+                'next_cursor': next_cursor
             })
                 
         except sqlite3.Error as db_err:
@@ -2319,9 +2506,14 @@ def delete_dataset_entry(entry_id):
                         'message': '您没有权限删除此记录'
                     }), 403
             
-            # 删除数据记录
+            # 删除数据记录，并在同一事务中更新字段统计
+            stats_delta = FieldStatsDelta()
+            stats_delta.remove(load_entry_data(conn, [entry_id]).get(entry_id))
             cursor.execute("DELETE FROM dataset_entries WHERE id = ?", (entry_id,))
+            stats_delta.apply(conn, dataset_id)
+            version = bump_data_version(conn, dataset_id)
             conn.commit()
+            column_store.on_delete(dataset_id, entry_id, version)
             
             return jsonify({
                 'success': True,
@@ -2421,14 +2613,19 @@ def update_dataset_entry(entry_id):
                 # 将表单数据转换为JSON字符串
                 data_json = json.dumps(form_data, ensure_ascii=False)
                 
-                # 更新数据记录
+                # 更新数据记录，并在同一事务中更新字段统计
+                stats_delta = FieldStatsDelta()
+                stats_delta.replace(load_entry_data(conn, [entry_id]).get(entry_id), form_data)
                 cursor.execute("""
                     UPDATE dataset_entries
                     SET data = ?, updated_at = CURRENT_TIMESTAMP
                     WHERE id = ?
                 """, (data_json, entry_id))
+                stats_delta.apply(conn, dataset_id)
+                version = bump_data_version(conn, dataset_id)
                 
                 conn.commit()
+                column_store.on_update(dataset_id, entry_id, form_data, version)
                 
                 return jsonify({
                     'success': True,
@@ -2463,6 +2660,18 @@ def update_dataset_entry(entry_id):
             'message': f'更新数据记录失败: {str(e)}'
         }), 500
 
+def dataset_export_metadata(dataset):
+    """Excel导出的元数据工作表内容"""
+    return {
+        '数据集名称': dataset.name,
+        '数据集描述': dataset.description or '',
+        '创建时间': dataset.created_at.strftime('%Y-%m-%d %H:%M:%S') if dataset.created_at else '',
+        '创建者': User.query.get(dataset.created_by).username if dataset.created_by else '未知',
+        '版本': dataset.version or '1.0',
+        '导出时间': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        '导出用户': current_user.username
+    }
+
 # 数据集导出API
 @app.route('/api/datasets/export', methods=['POST'])
 @login_required
@@ -2533,151 +2742,41 @@ def export_dataset_api():
                 'message': f'数据库文件不存在: {db_path}'
             }), 500
             
-        conn = None
         try:
-            # 连接到SQLite数据库
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
+            where_sql = "de.dataset_id = :dataset_id"
+            params = {'dataset_id': dataset_id}
             
-            # 查询数据集的数据记录
-            cursor.execute("""
-                SELECT de.id, de.user_id, u.username, de.data, de.created_at 
-                FROM dataset_entries de
-                LEFT JOIN user u ON de.user_id = u.id
-                WHERE de.dataset_id = ?
-                ORDER BY de.created_at DESC
-            """, (dataset_id,))
-            
-            entries_db = cursor.fetchall()
+            # 只读取第一条记录判断是否有数据，完整数据在输出时按块读取
+            first_entry = fetch_first_entry(db_path, where_sql, params)
             
             # 如果没有数据记录
-            if not entries_db:
+            if first_entry is None:
                 return jsonify({
                     'success': False,
                     'message': '数据集中没有数据记录'
                 }), 404
                 
-            # 获取字段名称
-            field_names = []
-            
-            # 尝试从数据集的自定义字段获取
-            if dataset.custom_fields:
-                try:
-                    custom_fields = json.loads(dataset.custom_fields)
-                    field_names = [field['name'] for field in custom_fields]
-                except json.JSONDecodeError:
-                    print(f"无法解析数据集 {dataset_id} 的自定义字段")
-            
-            # 如果没有自定义字段，尝试从第一条记录中获取
+            # 获取字段名称：优先使用数据集的自定义字段，否则从第一条记录中获取
+            field_names = resolve_field_names(dataset.custom_fields, first_entry, dataset_id)
             if not field_names:
-                try:
-                    first_entry = entries_db[0]
-                    data = json.loads(first_entry['data'])
-                    field_names = list(data.keys())
-                except (json.JSONDecodeError, KeyError, IndexError) as e:
-                    print(f"从记录中获取字段名失败: {str(e)}")
-                    return jsonify({
-                        'success': False,
-                        'message': '无法确定数据字段'
-                    }), 500
-            
-            # 准备导出数据
-            export_data = []
-            
-            # 如果包含表头
-            if include_headers:
-                headers = field_names.copy()
-                if include_metadata:
-                    headers.extend(['记录ID', '创建时间', '创建用户'])
-                export_data.append(headers)
-            
-            # 添加数据行
-            for entry in entries_db:
-                try:
-                    data = json.loads(entry['data'])
-                    row = [data.get(field, '') for field in field_names]
-                    
-                    if include_metadata:
-                        row.extend([
-                            entry['id'],
-                            entry['created_at'],
-                            entry['username'] or '未知用户'
-                        ])
-                    
-                    export_data.append(row)
-                except json.JSONDecodeError:
-                    print(f"无法解析数据记录ID {entry['id']} 的JSON数据")
+                return jsonify({
+                    'success': False,
+                    'message': '无法确定数据字段'
+                }), 500
             
-            # 创建临时文件
-            import tempfile
+            headers = export_headers(field_names, include_metadata) if include_headers else None
+            rows = iter_export_rows(iter_entries(db_path, where_sql, params), field_names, include_metadata)
             
             if export_format == 'excel':
-                # 导出为Excel
-                import pandas as pd
-                from io import BytesIO
-                
-                df = pd.DataFrame(export_data[1:], columns=export_data[0] if include_headers else None)
-                
-                # 创建Excel文件
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                    df.to_excel(writer, sheet_name='数据', index=False, header=include_headers)
-                    
-                    # 如果包含元数据，添加元数据表
-                    if include_metadata:
-                        metadata = {
-                            '数据集名称': [dataset.name],
-                            '数据集描述': [dataset.description or ''],
-                            '创建时间': [dataset.created_at.strftime('%Y-%m-%d %H:%M:%S') if dataset.created_at else ''],
-                            '创建者': [User.query.get(dataset.created_by).username if dataset.created_by else '未知'],
-                            '版本': [dataset.version or '1.0'],
-                            '导出时间': [datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-                            '导出用户': [current_user.username]
-                        }
-                        pd.DataFrame(metadata).to_excel(writer, sheet_name='元数据', index=False)
-                
-                output.seek(0)
-                
-                # 设置文件名
+                # 导出为Excel：逐行写入，元数据表最后写入
                 filename = f"{secure_filename(dataset.name)}_export_{datetime.now().strftime('%Y%m%d%H%M%S')}.xlsx"
-                
-                # 返回Excel文件
-                return send_file(
-                    output,
-                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                    as_attachment=True,
-                    download_name=filename
-                )
+                metadata = dataset_export_metadata(dataset) if include_metadata else None
+                return excel_download_response(rows, headers, filename, metadata)
                 
             else:
-                # 导出为CSV
-                import csv
-                
-                fd, path = tempfile.mkstemp(suffix='.csv')
-                # 使用兼容性更好的编码
-                try:
-                    with os.fdopen(fd, 'w', newline='', encoding='utf-8-sig') as temp:
-                        writer = csv.writer(temp)
-                        writer.writerows(export_data)
-                except UnicodeEncodeError:
-                    # 如果UTF-8编码失败，尝试使用GBK或其他编码
-                    os.close(fd)  # 关闭之前打开的文件描述符
-                    fd, path = tempfile.mkstemp(suffix='.csv')  # 重新创建
-                    with os.fdopen(fd, 'w', newline='', encoding='gbk') as temp:
-                        writer = csv.writer(temp)
-                        writer.writerows(export_data)
-                
-                # 设置文件名
+                # 导出为CSV：边读取边输出
                 filename = f"{secure_filename(dataset.name)}_export_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
-                
-                # 返回CSV文件
-                return send_file(
-                    path,
-                    mimetype='text/csv',
-                    as_attachment=True,
-                    download_name=filename
-                )
+                return csv_download_response(iter_csv_bytes(rows, headers), filename)
                 
         except sqlite3.Error as db_err:
             print(f"SQLite错误: {db_err}")
@@ -2685,9 +2784,6 @@ def export_dataset_api():
                 'success': False,
                 'message': f'数据库操作错误: {str(db_err)}'
             }), 500
-        finally:
-            if conn:
-                conn.close()
                 
     except Exception as e:
         print(f"导出数据集失败: {str(e)}")
@@ -2698,6 +2794,70 @@ def export_dataset_api():
             'message': f'导出数据集失败: {str(e)}'
         }), 500
 
+def collect_export_items(dataset_ids, export_format, with_metadata=False):
+    """确定多个数据集的导出项
+    
+    跳过不存在、无权限、没有数据或无法确定字段的数据集
+    
+    Args:
+        dataset_ids: 数据集ID列表
+        export_format: 导出格式 (csv, excel)
+        with_metadata: Excel导出时是否附加元数据工作表
+        
+    Returns:
+        list: 导出项列表，供dataset_export.write_export_artifact使用
+    """
+    db_path = os.path.join('instance', 'zl_geniusmedvault.db')
+    if not os.path.exists(db_path):
+        return []
+    
+    export_items = []
+    for dataset_id in dataset_ids:
+        try:
+            # 获取数据集
+            dataset = DataSet.query.get(dataset_id)
+            if not dataset:
+                continue
+                
+            # 检查权限
+            if dataset.privacy_level and dataset.privacy_level != 'public':
+                if dataset.created_by != current_user.id and current_user.role != 'admin':
+                    if not dataset.is_shared_with(current_user.id):
+                        continue
+            
+            where_sql = "de.dataset_id = :dataset_id"
+            params = {'dataset_id': dataset.id}
+            
+            # 如果没有数据记录，跳过此数据集
+            first_entry = fetch_first_entry(db_path, where_sql, params)
+            if first_entry is None:
+                continue
+            
+            field_names = resolve_field_names(dataset.custom_fields, first_entry, dataset.id)
+            if not field_names:
+                continue
+            
+            # 文件名去除特殊字符后可能为空或重复，此时附加数据集ID
+            file_ext = 'xlsx' if export_format == 'excel' else 'csv'
+            base_name = secure_filename(dataset.name) or f"dataset_{dataset.id}"
+            if any(item['filename'] == f"{base_name}.{file_ext}" for item in export_items):
+                base_name = f"{base_name}_{dataset.id}"
+            item = {
+                'dataset_id': dataset.id,
+                'filename': f"{base_name}.{file_ext}",
+                'where_sql': where_sql,
+                'params': params,
+                'field_names': field_names
+            }
+            if with_metadata:
+                item['metadata'] = dataset_export_metadata(dataset)
+            export_items.append(item)
+                    
+        except Exception as e:
+            print(f"导出数据集 {dataset_id} 失败: {str(e)}")
+            continue
+    return export_items
+
 # 批量导出数据集API
 @app.route('/api/datasets/batch_export', methods=['POST'])
 @login_required
@@ -2747,129 +2907,11 @@ def batch_export_datasets_api():
             return export_dataset_api()
         
         # 批量导出多个数据集
-        import tempfile
-        import zipfile
-        import os
-        
-        # 创建临时目录存放导出文件
-        temp_dir = tempfile.mkdtemp()
-        export_files = []
-        
-        # 导出每个数据集
-        for dataset_id in dataset_ids:
-            try:
-                # 获取数据集
-                dataset = DataSet.query.get(dataset_id)
-                if not dataset:
-                    continue
-                    
-                # 检查权限
-                if dataset.privacy_level and dataset.privacy_level != 'public':
-                    if dataset.created_by != current_user.id and current_user.role != 'admin':
-                        if not dataset.is_shared_with(current_user.id):
-                            continue
-                
-                # 从数据库获取数据
-                db_path = os.path.join('instance', 'zl_geniusmedvault.db')
-                if not os.path.exists(db_path):
-                    continue
-                    
-                conn = None
-                try:
-                    # 连接到SQLite数据库
-                    conn = sqlite3.connect(db_path)
-                    conn.row_factory = sqlite3.Row
-                    cursor = conn.cursor()
-                    
-                    # 查询数据集的数据记录
-                    cursor.execute("""
-                        SELECT de.id, de.user_id, u.username, de.data, de.created_at 
-                        FROM dataset_entries de
-                        LEFT JOIN user u ON de.user_id = u.id
-                        WHERE de.dataset_id = ?
-                        ORDER BY de.created_at DESC
-                    """, (dataset_id,))
-                    
-                    entries_db = cursor.fetchall()
-                    
-                    # 如果没有数据记录，跳过此数据集
-                    if not entries_db:
-                        continue
-                        
-                    # 获取字段名称
-                    field_names = []
-                    
-                    # 尝试从数据集的自定义字段获取
-                    if dataset.custom_fields:
-                        try:
-                            custom_fields = json.loads(dataset.custom_fields)
-                            field_names = [field['name'] for field in custom_fields]
-                        except json.JSONDecodeError:
-                            print(f"无法解析数据集 {dataset_id} 的自定义字段")
-                    
-                    # 如果没有自定义字段，尝试从第一条记录中获取
-                    if not field_names:
-                        try:
-                            first_entry = entries_db[0]
-                            data = json.loads(first_entry['data'])
-                            field_names = list(data.keys())
-                        except (json.JSONDecodeError, KeyError, IndexError) as e:
-                            print(f"从记录中获取字段名失败: {str(e)}")
-                            continue
-                    
-                    # 准备导出数据
-                    export_data = []
-                    
-                    # 添加表头
-                    headers = field_names.copy()
-                    headers.extend(['记录ID', '创建时间', '创建用户'])
-                    export_data.append(headers)
-                    
-                    # 添加数据行
-                    for entry in entries_db:
-                        try:
-                            data = json.loads(entry['data'])
-                            row = [data.get(field, '') for field in field_names]
-                            row.extend([
-                                entry['id'],
-                                entry['created_at'],
-                                entry['username'] or '未知用户'
-                            ])
-                            export_data.append(row)
-                        except json.JSONDecodeError:
-                            print(f"无法解析数据记录ID {entry['id']} 的JSON数据")
-                    
-                    # 导出文件名
-                    safe_name = secure_filename(dataset.name)
-                    file_ext = 'xlsx' if export_format == 'excel' else 'csv'
-                    file_path = os.path.join(temp_dir, f"{safe_name}.{file_ext}")
-                    
-                    if export_format == 'excel':
-                        # 导出为Excel
-                        import pandas as pd
-                        
-                        df = pd.DataFrame(export_data[1:], columns=export_data[0])
-                        df.to_excel(file_path, index=False)
-                    else:
-                        # 导出为CSV
-                        import csv
-                        
-                        with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
-                            writer = csv.writer(f)
-                            writer.writerows(export_data)
-                    
-                    export_files.append(file_path)
-                    
-                finally:
-                    if conn:
-                        conn.close()
-                        
-            except Exception as e:
-                print(f"导出数据集 {dataset_id} 失败: {str(e)}")
-                continue
+        db_path = os.path.join('instance', 'zl_geniusmedvault.db')
+        export_items = collect_export_items(dataset_ids, export_format)
         
         # 如果没有成功导出任何文件
-        if not export_files:
+        if not export_items:
             return jsonify({
                 'success': False,
                 'message': '没有可导出的数据或权限不足'
@@ -2877,30 +2919,26 @@ def batch_export_datasets_api():
             
         # 如果需要打包为zip
         if as_zip:
-            # 创建zip文件
-            zip_path = os.path.join(temp_dir, 'datasets_export.zip')
-            with zipfile.ZipFile(zip_path, 'w') as zipf:
-                for file in export_files:
-                    zipf.write(file, os.path.basename(file))
-            
-            # 返回zip文件
-            return send_file(
-                zip_path,
+            # 各数据集在进程池中并行生成，哪个先完成就先写入zip并立即发送；
+            # 等第一个文件生成后再开始响应，进程池不可用等错误仍能返回错误信息
+            members = iter_parallel_members(get_process_pool(), db_path, export_items, export_format)
+            first_member = next(members)
+            members = itertools.chain([first_member], members)
+            filename = f"datasets_export_{datetime.now().strftime('%Y%m%d%H%M%S')}.zip"
+            return Response(
+                iter_zip_stream(members),
                 mimetype='application/zip',
-                as_attachment=True,
-                download_name=f"datasets_export_{datetime.now().strftime('%Y%m%d%H%M%S')}.zip"
+                headers={'Content-Disposition': f'attachment; filename="{filename}"'}
             )
         else:
             # 如果只有一个文件，直接返回
-            if len(export_files) == 1:
-                file_path = export_files[0]
-                mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet' if file_path.endswith('.xlsx') else 'text/csv'
-                
-                return send_file(
-                    file_path,
-                    mimetype=mimetype,
-                    as_attachment=True,
-                    download_name=os.path.basename(file_path)
+            if len(export_items) == 1:
+                item = export_items[0]
+                if export_format == 'excel':
+                    return excel_download_response(item_rows(db_path, item), item_headers(item), item['filename'])
+                return csv_download_response(
+                    iter_csv_bytes(item_rows(db_path, item), item_headers(item)),
+                    item['filename']
                 )
             else:
                 # 多个文件但不打包，返回错误
@@ -2918,6 +2956,181 @@ def batch_export_datasets_api():
             'message': f'批量导出数据集失败: {str(e)}'
         }), 500
 
+def dataset_signature(dataset_id):
+    """数据集数据版本签名（数据版本号），用于结果缓存和导出缓存"""
+    conn = column_store.connect()
+    try:
+        return column_store.signature(conn, dataset_id)
+    finally:
+        conn.close()
+
+def analysis_cache_key(dataset, analysis, request_data):
+    """分析结果的缓存键：数据集版本（数据签名和字段定义）、分析类型和请求参数"""
+    spec = {'analysis': analysis, 'request': request_data, 'custom_fields': dataset.custom_fields}
+    return result_cache.key(dataset.id, dataset_signature(dataset.id), spec)
+
+def export_job_info(job):
+    """导出任务的JSON表示"""
+    total_rows = job['total_rows']
+    progress = None
+    if job['status'] == 'completed':
+        progress = 100
+    elif total_rows:
+        progress = min(99, int(job['processed_rows'] * 100 / total_rows))
+    
+    info = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'filename': job['filename'],
+        'total_rows': total_rows,
+        'processed_rows': job['processed_rows'],
+        'progress': progress,
+        'error': job['error'],
+        'created_at': datetime.fromtimestamp(job['created_at']).strftime('%Y-%m-%d %H:%M:%S'),
+        'expires_at': datetime.fromtimestamp(job['expires_at']).strftime('%Y-%m-%d %H:%M:%S') if job['expires_at'] else None,
+        'status_url': url_for('get_export_job', job_id=job['id'])
+    }
+    if job['status'] == 'completed':
+        info['download_url'] = url_for('download_export_job', job_id=job['id'])
+    return info
+
+def get_user_export_job(job_id):
+    """获取当前用户可以访问的导出任务，不存在或无权限时返回None"""
+    job = export_jobs.get(job_id)
+    if not job:
+        return None
+    if job['user_id'] != current_user.id and current_user.role != 'admin':
+        return None
+    return job
+
+# 后台导出任务API
+@app.route('/api/datasets/export_jobs', methods=['POST'])
+@login_required
+def create_export_job():
+    """创建后台导出任务
+    
+    Args:
+        从请求体获取参数:
+        - datasets: 数据集ID列表（或使用dataset_id导出单个数据集）
+        - format: 导出格式 (csv, excel)
+        - as_zip: 是否打包为zip文件，多个数据集时总是打包
+        
+    Returns:
+        任务信息的JSON响应，通过status_url查询进度
+    """
+    try:
+        request_data = request.get_json(silent=True)
+        if not request_data:
+            return jsonify({
+                'success': False,
+                'message': '没有接收到数据'
+            }), 400
+        
+        dataset_ids = request_data.get('datasets')
+        if not dataset_ids and request_data.get('dataset_id'):
+            dataset_ids = [request_data.get('dataset_id')]
+        if not dataset_ids or not isinstance(dataset_ids, list):
+            return jsonify({
+                'success': False,
+                'message': '缺少有效的数据集ID列表'
+            }), 400
+        
+        export_format = 'excel' if request_data.get('format') == 'excel' else 'csv'
+        as_zip = bool(request_data.get('as_zip', False)) or len(dataset_ids) > 1
+        
+        export_items = collect_export_items(dataset_ids, export_format, with_metadata=True)
+        if not export_items:
+            return jsonify({
+                'success': False,
+                'message': '没有可导出的数据或权限不足'
+            }), 404
+        
+        db_path = os.path.join('instance', 'zl_geniusmedvault.db')
+        timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+        if as_zip or len(export_items) > 1:
+            filename = f"datasets_export_{timestamp}.zip"
+            mimetype = 'application/zip'
+        else:
+            base_name = os.path.splitext(export_items[0]['filename'])[0]
+            if export_format == 'excel':
+                filename = f"{base_name}_export_{timestamp}.xlsx"
+                mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            else:
+                filename = f"{base_name}_export_{timestamp}.csv"
+                mimetype = 'text/csv'
+        
+        # 同一用户对未变化的数据重复导出时复用已生成的文件
+        cache_key = (
+            current_user.id,
+            export_format,
+            as_zip,
+            tuple((item['dataset_id'], dataset_signature(item['dataset_id'])) for item in export_items)
+        )
+        
+        def build(path, progress):
+            for item in export_items:
+                progress.add_total(count_entries(db_path, item['where_sql'], item['params']))
+            write_export_artifact(path, db_path, export_items, export_format, as_zip, progress)
+        
+        job = export_jobs.submit(current_user.id, build, filename, mimetype, cache_key)
+        
+        return jsonify({
+            'success': True,
+            'message': '导出任务已创建',
+            'job': export_job_info(job)
+        }), 202
+        
+    except Exception as e:
+        print(f"创建导出任务失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'message': f'创建导出任务失败: {str(e)}'
+        }), 500
+
+@app.route('/api/datasets/export_jobs/<job_id>', methods=['GET'])
+@login_required
+def get_export_job(job_id):
+    """查询后台导出任务的状态和进度"""
+    job = get_user_export_job(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': '导出任务不存在或已过期'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': export_job_info(job)
+    })
+
+@app.route('/api/datasets/export_jobs/<job_id>/download', methods=['GET'])
+@login_required
+def download_export_job(job_id):
+    """下载后台导出任务生成的文件，支持HTTP Range断点续传"""
+    job = get_user_export_job(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': '导出任务不存在或已过期'
+        }), 404
+    
+    if job['status'] != 'completed' or not os.path.exists(job['path']):
+        return jsonify({
+            'success': False,
+            'message': '导出文件尚未生成',
+            'job': export_job_info(job)
+        }), 409
+    
+    return send_file(
+        os.path.abspath(job['path']),
+        mimetype=job['mimetype'],
+        as_attachment=True,
+        download_name=job['filename'],
+        conditional=True
+    )
+
 # 查看数据集数据API
 @app.route('/api/datasets/<int:dataset_id>/view_data', methods=['GET'])
 @login_required
@@ -2979,267 +3192,127 @@ def view_dataset_data(dataset_id):
         # 限制每页最大条数，避免加载过多数据
         per_page = min(per_page, 100)
         
-        # 查询基础
-        query = DatasetEntry.query.filter_by(dataset_id=dataset_id)
+        # 游标分页参数（上一页返回的next_cursor）
+        page_cursor = request.args.get('cursor') or None
+        if page_cursor:
+            try:
+                decode_cursor(page_cursor)
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'message': str(e)
+                }), 400
         
-        # 应用搜索过滤
-        if search:
-            # 由于SQLAlchemy不直接支持JSON查询，这里我们获取所有条目然后手动过滤
-            # 这对于大数据集可能不是最优解，但可以实现基本功能
-            # 如果有高级搜索需求，可以考虑使用原生SQL或其他技术
-            pass  # 先跳过，在后面处理
-
-        # 获取总记录数（未筛选前）
-        original_total_count = query.count()
-        
-        # 处理预览请求，只返回少量数据
-        if request.args.get('preview'):
-            entries = query.order_by(DatasetEntry.created_at.desc()).limit(5).all()
-        else:
-            # 对于搜索和筛选，我们需要先获取所有数据，然后在内存中进行筛选
-            # 检查是否有高级筛选参数
-            advanced_filters = request.args.get('advanced_filters')
-            
-            # 检查是否有单独的筛选参数 (filter_field_0, filter_op_0, filter_value_0, etc.)
-            has_individual_filters = False
-            individual_filters = []
-            
-            # 查找所有filter_field_X参数
-            for key in request.args:
-                if key.startswith('filter_field_'):
-                    try:
-                        index = int(key.split('_')[-1])
-                        field = request.args.get(f'filter_field_{index}')
-                        operator = request.args.get(f'filter_op_{index}')
-                        value = request.args.get(f'filter_value_{index}')
-                        
-                        if field and operator and value:
-                            has_individual_filters = True
-                            individual_filters.append({
-                                'field': field,
-                                'operator': operator,
-                                'value': value
-                            })
-                    except (ValueError, TypeError):
-                        pass
-            
-            if search or advanced_filters or has_individual_filters:
-                # 获取所有数据条目（可能需要分批处理大数据集）
-                all_entries = query.order_by(DatasetEntry.created_at.desc()).all()
-                
-                # 处理所有条目并应用筛选
-                all_data_entries = []
-                for entry in all_entries:
-                    try:
-                        entry_data = json.loads(entry.data) if entry.data else {}
-                        
-                        # 检查是否为演示数据（如果需要过滤）
-                        if search_real_data and entry_data.get('_demo_data'):
-                            continue
-                            
-                        entry_info = {
-                            'id': entry.id,
-                            'user_id': entry.user_id,
-                            'username': entry.user.username if entry.user else '未知用户',
-                            'created_at': entry.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                            'data': entry_data
-                        }
-                        
-                        # 如果有搜索条件，检查是否匹配
-                        if search:
-                            found = False
-                            search_lower = search.lower()
-                            
-                            # 检查所有字段值是否包含搜索文本
-                            for field_name, field_value in entry_data.items():
-                                if field_name.startswith('_'):  # 跳过内部字段
-                                    continue
-                                    
-                                if field_value and str(field_value).lower().find(search_lower) != -1:
-                                    found = True
-                                    break
-                            
-                            # 如果不匹配，跳过
-                            if not found:
-                                continue
-                        
-                        # 添加到结果集
-                        all_data_entries.append(entry_info)
-                    except json.JSONDecodeError:
-                        continue
+        # 获取数据集的总记录数（未筛选前）和筛选条件
+        db_path = os.path.join('instance', 'zl_geniusmedvault.db')
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        register_filter_functions(conn)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM dataset_entries WHERE dataset_id = :dataset_id",
+                           {'dataset_id': dataset_id})
+            original_total_count = cursor.fetchone()[0]
+            
+            where_sql = "de.dataset_id = :dataset_id"
+            params = {'dataset_id': dataset_id}
+            filtered_by_backend = False
+            
+            # 处理预览请求，只返回少量数据
+            if request.args.get('preview'):
+                page = 1
+                per_page = 5
+            else:
+                # 检查是否有高级筛选参数
+                advanced_filters = request.args.get('advanced_filters')
                 
-                # 应用高级筛选
-                filtered_by_backend = False
+                # 检查是否有单独的筛选参数 (filter_field_0, filter_op_0, filter_value_0, etc.)
+                has_individual_filters = False
+                individual_filters = []
                 
-                # 处理advanced_filters参数
-                if advanced_filters:
-                    try:
-                        filters = json.loads(advanced_filters)
-                        filtered_entries = []
-                        
-                        print(f"应用高级筛选，共 {len(filters)} 个条件: {filters}")
-                        
-                        for entry in all_data_entries:
-                            matches_all = True
-                            
-                            for filter_item in filters:
-                                field = filter_item.get('field')
-                                operator = filter_item.get('operator')
-                                value = filter_item.get('value')
-                                
-                                # 跳过内部字段
-                                if field.startswith('_'):
-                                    continue
-                                    
-                                field_value = entry['data'].get(field)
-                                
-                                # 应用操作符
-                                match = True
-                                if operator == 'equals':
-                                    match = str(field_value) == str(value)
-                                elif operator == 'notEquals':
-                                    match = str(field_value) != str(value)
-                                elif operator == 'contains':
-                                    match = field_value and str(field_value).lower().find(str(value).lower()) != -1
-                                elif operator == 'startsWith':
-                                    match = field_value and str(field_value).lower().startswith(str(value).lower())
-                                elif operator == 'endsWith':
-                                    match = field_value and str(field_value).lower().endswith(str(value).lower())
-                                elif operator == 'greaterThan':
-                                    try:
-                                        match = float(field_value) > float(value)
-                                    except (ValueError, TypeError):
-                                        match = False
-                                elif operator == 'lessThan':
-                                    try:
-                                        match = float(field_value) < float(value)
-                                    except (ValueError, TypeError):
-                                        match = False
-                                elif operator == 'between':
-                                    try:
-                                        min_val = float(value.get('min', 0))
-                                        max_val = float(value.get('max', 0))
-                                        match = float(field_value) >= min_val and float(field_value) <= max_val
-                                    except (ValueError, TypeError, AttributeError):
-                                        match = False
-                                elif operator == 'isNull':
-                                    match = field_value is None or field_value == ''
-                                elif operator == 'isNotNull':
-                                    match = field_value is not None and field_value != ''
-                                
-                                if not match:
-                                    matches_all = False
-                                    break
+                # 查找所有filter_field_X参数
+                for key in request.args:
+                    if key.startswith('filter_field_'):
+                        try:
+                            index = int(key.split('_')[-1])
+                            field = request.args.get(f'filter_field_{index}')
+                            operator = request.args.get(f'filter_op_{index}')
+                            value = request.args.get(f'filter_value_{index}')
                             
-                            if matches_all:
-                                filtered_entries.append(entry)
-                        
-                        # 用筛选后的结果替换
-                        all_data_entries = filtered_entries
-                        filtered_by_backend = True
-                        print(f"筛选后剩余 {len(all_data_entries)} 条记录")
-                    except (json.JSONDecodeError, KeyError, Exception) as e:
-                        print(f"应用高级筛选出错: {str(e)}")
+                            if field and operator and value:
+                                has_individual_filters = True
+                                individual_filters.append({
+                                    'field': field,
+                                    'operator': operator,
+                                    'value': value
+                                })
+                        except (ValueError, TypeError):
+                            pass
                 
-                # 处理单独的筛选参数
-                elif has_individual_filters:
-                    try:
-                        filtered_entries = []
-                        
-                        print(f"应用单独筛选参数，共 {len(individual_filters)} 个条件: {individual_filters}")
-                        
-                        for entry in all_data_entries:
-                            matches_all = True
-                            
-                            for filter_item in individual_filters:
-                                field = filter_item.get('field')
-                                operator = filter_item.get('operator')
-                                value = filter_item.get('value')
-                                
-                                # 跳过内部字段
-                                if field.startswith('_'):
-                                    continue
-                                    
-                                field_value = entry['data'].get(field)
-                                
-                                # 应用操作符
-                                match = True
-                                if operator == 'eq':
-                                    match = str(field_value) == str(value)
-                                elif operator == 'neq':
-                                    match = str(field_value) != str(value)
-                                elif operator == 'gt':
-                                    try:
-                                        match = float(field_value) > float(value)
-                                    except (ValueError, TypeError):
-                                        match = False
-                                elif operator == 'gte':
-                                    try:
-                                        match = float(field_value) >= float(value)
-                                    except (ValueError, TypeError):
-                                        match = False
-                                elif operator == 'lt':
-                                    try:
-                                        match = float(field_value) < float(value)
-                                    except (ValueError, TypeError):
-                                        match = False
-                                elif operator == 'lte':
-                                    try:
-                                        match = float(field_value) <= float(value)
-                                    except (ValueError, TypeError):
-                                        match = False
-                                elif operator == 'contains':
-                                    match = field_value and str(field_value).lower().find(str(value).lower()) != -1
-                                elif operator == 'starts':
-                                    match = field_value and str(field_value).lower().startswith(str(value).lower())
-                                elif operator == 'ends':
-                                    match = field_value and str(field_value).lower().endswith(str(value).lower())
-                                
-                                if not match:
-                                    matches_all = False
-                                    break
-                            
-                            if matches_all:
-                                filtered_entries.append(entry)
-                        
-                        # 用筛选后的结果替换
-                        all_data_entries = filtered_entries
+                if search or advanced_filters or has_individual_filters:
+                    # 选择要应用的筛选条件：高级筛选优先于单独筛选参数
+                    filters = []
+                    if advanced_filters:
+                        try:
+                            filters = json.loads(advanced_filters)
+                            filtered_by_backend = True
+                            print(f"应用高级筛选，共 {len(filters)} 个条件: {filters}")
+                        except json.JSONDecodeError as e:
+                            print(f"应用高级筛选出错: {str(e)}")
+                            filters = []
+                    elif has_individual_filters:
+                        filters = individual_filters
                         filtered_by_backend = True
-                        print(f"筛选后剩余 {len(all_data_entries)} 条记录")
-                    except Exception as e:
-                        print(f"应用单独筛选参数出错: {str(e)}")
-                
-                # 计算筛选后的总记录数
-                total_count = len(all_data_entries)
-                
-                # 应用分页
-                start_idx = (page - 1) * per_page
-                end_idx = start_idx + per_page
-                data_entries = all_data_entries[start_idx:end_idx] if start_idx < len(all_data_entries) else []
-            else:
-                # 如果没有搜索/筛选，直接应用分页
-                offset = (page - 1) * per_page
-                entries = query.order_by(DatasetEntry.created_at.desc()).offset(offset).limit(per_page).all()
-                
-                # 处理数据条目
-                data_entries = []
-                for entry in entries:
-                    try:
-                        entry_data = json.loads(entry.data) if entry.data else {}
-                        entry_info = {
-                            'id': entry.id,
-                            'user_id': entry.user_id,
-                            'username': entry.user.username if entry.user else '未知用户',
-                            'created_at': entry.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                            'data': entry_data
-                        }
-                        data_entries.append(entry_info)
-                    except json.JSONDecodeError:
-                        continue
-                        
-                # 使用原始总记录数
+                        print(f"应用单独筛选参数，共 {len(individual_filters)} 个条件: {individual_filters}")
+                    
+                    # 将搜索和筛选条件编译为SQL，在数据库中完成筛选
+                    filter_sql, filter_params = compile_entry_filters(
+                        search=search,
+                        filters=filters,
+                        exclude_demo=bool(search_real_data),
+                        column='de.data',
+                        indexed_fields=get_indexed_fields(dataset_id)
+                    )
+                    where_sql += " AND " + filter_sql
+                    params.update(filter_params)
+            
+            # 计算筛选后的总记录数
+            if where_sql == "de.dataset_id = :dataset_id":
                 total_count = original_total_count
-                filtered_by_backend = False
+            else:
+                cursor.execute(f"SELECT COUNT(*) FROM dataset_entries de WHERE {where_sql}", params)
+                total_count = cursor.fetchone()[0]
+            
+            # 在数据库中分页：提供游标时从游标位置继续读取，否则按页码偏移
+            page_sql = where_sql
+            offset = (page - 1) * per_page
+            if page_cursor:
+                page_sql += " AND " + cursor_condition(page_cursor, params)
+                offset = 0
+            rows, next_cursor = fetch_page(cursor, f"""
+                SELECT de.id, de.user_id, u.username, de.data, de.created_at
+                FROM dataset_entries de
+                LEFT JOIN user u ON de.user_id = u.id
+                WHERE {page_sql}
+                {PAGE_ORDER_SQL}
+            """, params, per_page, offset)
+        finally:
+            conn.close()
+        
+        # 处理数据条目
+        data_entries = []
+        for row in rows:
+            try:
+                entry_data = json.loads(row['data']) if row['data'] else {}
+                data_entries.append({
+                    'id': row['id'],
+                    'user_id': row['user_id'],
+                    'username': row['username'] or '未知用户',
+                    'created_at': str(row['created_at'])[:19] if row['created_at'] else None,
+                    'data': entry_data
+                })
+            except json.JSONDecodeError:
+                continue
         
         # 计算总页数
         total_pages = (total_count + per_page - 1) // per_page if per_page > 0 else 1
@@ -3262,7 +3335,8 @@ def view_dataset_data(dataset_id):
                 'page': page,
                 'per_page': per_page,
                 'total_count': total_count,
-                'total_pages': total_pages
+                'total_pages': total_pages,
+                'next_cursor': next_cursor
             },
             'filtered_by_backend': filtered_by_backend
         })
@@ -3345,287 +3419,64 @@ def export_dataset_data(dataset_id):
                 'message': f'数据库文件不存在: {db_path}'
             }), 500
             
-        conn = None
         try:
-            # 连接到SQLite数据库
-            conn = sqlite3.connect(db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            # 构建查询语句和参数
-            query = """
-                SELECT de.id, de.user_id, u.username, de.data, de.created_at 
-                FROM dataset_entries de
-                LEFT JOIN user u ON de.user_id = u.id
-                WHERE de.dataset_id = ?
-            """
-            
-            params = [dataset_id]
-            
-            # 处理筛选和搜索
-            if filter_column and search:
-                # 在SQLite中，JSON操作需要使用json_extract
-                query += " AND json_extract(de.data, '$." + filter_column + "') LIKE ?"
-                params.append(f"%{search}%")
+            where_sql = "de.dataset_id = :dataset_id"
+            params = {'dataset_id': dataset_id}
             
-            query += " ORDER BY de.created_at DESC"
-            
-            # 高级筛选需要在获取数据后进行，因为SQLite的JSON查询功能有限
-            
-            # 执行查询
-            cursor.execute(query, params)
-            entries_db = cursor.fetchall()
-            
-            # 如果没有数据记录
-            if not entries_db:
+            # 数据集中没有任何记录时直接返回
+            if fetch_first_entry(db_path, where_sql, params) is None:
                 return jsonify({
                     'success': False,
                     'message': '数据集中没有数据记录'
                 }), 404
-                
-            # 处理高级筛选
+            
+            # 处理筛选和搜索：筛选列搜索和高级筛选都编译为SQL条件，
+            # 已建立索引的字段会命中表达式索引
+            filters = []
+            if filter_column and search:
+                filters.append({'field': filter_column, 'operator': 'contains', 'value': search})
+            
             if advanced_filters:
                 try:
                     print(f"收到高级筛选参数: {advanced_filters}")
-                    filters = json.loads(advanced_filters)
-                    filtered_entries = []
-                    
-                    print(f"应用高级筛选，共 {len(filters)} 个条件: {filters}")
-                    
-                    for entry in entries_db:
-                        try:
-                            entry_data = json.loads(entry['data'])
-                            matches_all = True
-                            
-                            for filter_item in filters:
-                                field = filter_item.get('field')
-                                operator = filter_item.get('operator')
-                                value = filter_item.get('value')
-                                
-                                # 跳过内部字段
-                                if field.startswith('_'):
-                                    continue
-                                    
-                                # 如果字段不存在于数据中，跳过此条件
-                                if field not in entry_data:
-                                    print(f"字段 {field} 不存在于数据中")
-                                    matches_all = False
-                                    break
-                                    
-                                entry_value = entry_data[field]
-                                
-                                # 根据操作符进行比较
-                                if operator == 'equals':
-                                    if str(entry_value).lower() != str(value).lower():
-                                        matches_all = False
-                                        break
-                                elif operator == 'notEquals':
-                                    if str(entry_value).lower() == str(value).lower():
-                                        matches_all = False
-                                        break
-                                elif operator == 'contains':
-                                    if str(value).lower() not in str(entry_value).lower():
-                                        matches_all = False
-                                        break
-                                elif operator == 'startsWith':
-                                    if not str(entry_value).lower().startswith(str(value).lower()):
-                                        matches_all = False
-                                        break
-                                elif operator == 'endsWith':
-                                    if not str(entry_value).lower().endswith(str(value).lower()):
-                                        matches_all = False
-                                        break
-                                elif operator == 'greaterThan':
-                                    try:
-                                        if float(entry_value) <= float(value):
-                                            matches_all = False
-                                            break
-                                    except (ValueError, TypeError):
-                                        matches_all = False
-                                        break
-                                elif operator == 'greaterThanOrEqual':
-                                    try:
-                                        if float(entry_value) < float(value):
-                                            matches_all = False
-                                            break
-                                    except (ValueError, TypeError):
-                                        matches_all = False
-                                        break
-                                elif operator == 'lessThan':
-                                    try:
-                                        if float(entry_value) >= float(value):
-                                            matches_all = False
-                                            break
-                                    except (ValueError, TypeError):
-                                        matches_all = False
-                                        break
-                                elif operator == 'lessThanOrEqual':
-                                    try:
-                                        if float(entry_value) > float(value):
-                                            matches_all = False
-                                            break
-                                    except (ValueError, TypeError):
-                                        matches_all = False
-                                        break
-                            
-                            # 如果所有条件都匹配，添加到过滤结果中（移到内层循环外）
-                            if matches_all:
-                                filtered_entries.append(entry)
-                                
-                        except json.JSONDecodeError as e:
-                            print(f"解析数据条目时出错: {e}")
-                    
-                    print(f"筛选前有 {len(entries_db)} 条数据，筛选后剩余 {len(filtered_entries)} 条数据")
-                    entries_db = filtered_entries
-                    
+                    parsed_filters = json.loads(advanced_filters)
+                    print(f"应用高级筛选，共 {len(parsed_filters)} 个条件: {parsed_filters}")
+                    filters.extend(parsed_filters)
                 except json.JSONDecodeError:
                     print(f"无法解析高级筛选参数: {advanced_filters}")
-                except Exception as e:
-                    print(f"应用高级筛选时出错: {e}")
-                    import traceback
-                    traceback.print_exc()
-                
-            # 获取字段名称
-            field_names = []
             
-            # 尝试从数据集的自定义字段获取
-            if dataset.custom_fields:
-                try:
-                    custom_fields = json.loads(dataset.custom_fields)
-                    field_names = [field['name'] for field in custom_fields]
-                except json.JSONDecodeError:
-                    print(f"无法解析数据集 {dataset_id} 的自定义字段")
+            if filters:
+                filter_sql, filter_params = compile_entry_filters(
+                    filters=filters,
+                    column='de.data',
+                    case_insensitive_equals=True,
+                    indexed_fields=get_indexed_fields(dataset_id),
+                    require_fields=True
+                )
+                where_sql += " AND " + filter_sql
+                params.update(filter_params)
             
-            # 如果没有自定义字段，尝试从第一条记录中获取
+            # 获取字段名称：优先使用数据集的自定义字段，否则从第一条符合条件的记录中获取
+            first_entry = fetch_first_entry(db_path, where_sql, params)
+            field_names = resolve_field_names(dataset.custom_fields, first_entry, dataset_id)
             if not field_names:
-                try:
-                    first_entry = entries_db[0]
-                    data = json.loads(first_entry['data'])
-                    field_names = list(data.keys())
-                except (json.JSONDecodeError, KeyError, IndexError) as e:
-                    print(f"从记录中获取字段名失败: {str(e)}")
-                    return jsonify({
-                        'success': False,
-                        'message': '无法确定数据字段'
-                    }), 500
-            
-            # 准备导出数据
-            export_data = []
-            
-            # 添加表头
-            headers = field_names.copy()
-            headers.extend(['记录ID', '创建时间', '创建用户'])
-            export_data.append(headers)
-            
-            # 添加数据行
-            for entry in entries_db:
-                try:
-                    data = json.loads(entry['data'])
-                    
-                    # 如果启用了数据脱敏，处理敏感字段
-                    if anonymize:
-                        # 定义需要脱敏的字段
-                        sensitive_fields = ['姓名', '身份证号', '手机号', '电话', '住址', '地址', '邮箱', 'email', '联系方式']
-                        
-                        # 脱敏处理
-                        for field in field_names:
-                            if field in data and any(sensitive in field for sensitive in sensitive_fields):
-                                value = data[field]
-                                if value:
-                                    # 根据字段类型进行不同的脱敏处理
-                                    if '姓名' in field or '名字' in field:
-                                        # 姓名：保留姓，其他用*代替
-                                        if isinstance(value, str) and len(value) > 0:
-                                            data[field] = value[0] + '*' * (len(value) - 1)
-                                    elif '身份证' in field:
-                                        # 身份证号：保留前6位和后4位，中间用*代替
-                                        if isinstance(value, str) and len(value) >= 10:
-                                            data[field] = value[:6] + '*' * (len(value) - 10) + value[-4:]
-                                    elif '手机' in field or '电话' in field:
-                                        # 手机号：保留前3位和后4位，中间用*代替
-                                        if isinstance(value, str) and len(value) >= 7:
-                                            data[field] = value[:3] + '*' * (len(value) - 7) + value[-4:]
-                                    elif '邮箱' in field or 'email' in field:
-                                        # 邮箱：用户名部分保留前3个字符，其余用*代替
-                                        if isinstance(value, str) and '@' in value:
-                                            username, domain = value.split('@', 1)
-                                            if len(username) > 3:
-                                                data[field] = username[:3] + '*' * (len(username) - 3) + '@' + domain
-                                    else:
-                                        # 其他敏感字段：用*代替一半内容
-                                        if isinstance(value, str) and len(value) > 0:
-                                            half_len = max(1, len(value) // 2)
-                                            data[field] = value[:half_len] + '*' * (len(value) - half_len)
-                    
-                    row = [data.get(field, '') for field in field_names]
-                    row.extend([
-                        entry['id'],
-                        entry['created_at'],
-                        entry['username'] or '未知用户'
-                    ])
-                    export_data.append(row)
-                except json.JSONDecodeError:
-                    print(f"无法解析数据记录ID {entry['id']} 的JSON数据")
+                return jsonify({
+                    'success': False,
+                    'message': '无法确定数据字段'
+                }), 500
             
-            # 创建临时文件
-            import tempfile
+            headers = export_headers(field_names)
+            rows = iter_export_rows(iter_entries(db_path, where_sql, params), field_names, anonymize=anonymize)
             
             if export_format == 'excel':
-                # 导出为Excel
-                import pandas as pd
-                from io import BytesIO
-                
-                df = pd.DataFrame(export_data[1:], columns=export_data[0])
-                
-                # 创建Excel文件
-                output = BytesIO()
-                with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                    df.to_excel(writer, sheet_name='数据', index=False)
-                    
-                    # 添加元数据表
-                    metadata = {
-                        '数据集名称': [dataset.name],
-                        '数据集描述': [dataset.description or ''],
-                        '创建时间': [dataset.created_at.strftime('%Y-%m-%d %H:%M:%S') if dataset.created_at else ''],
-                        '创建者': [User.query.get(dataset.created_by).username if dataset.created_by else '未知'],
-                        '版本': [dataset.version or '1.0'],
-                        '导出时间': [datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-                        '导出用户': [current_user.username]
-                    }
-                    pd.DataFrame(metadata).to_excel(writer, sheet_name='元数据', index=False)
-                
-                output.seek(0)
-                
-                # 设置文件名
+                # 导出为Excel：逐行写入，元数据表最后写入
                 filename = f"{secure_filename(dataset.name)}_export_{datetime.now().strftime('%Y%m%d%H%M%S')}.xlsx"
-                
-                # 返回Excel文件
-                return send_file(
-                    output,
-                    mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-                    as_attachment=True,
-                    download_name=filename
-                )
+                return excel_download_response(rows, headers, filename, dataset_export_metadata(dataset))
                 
             else:
-                # 导出为CSV
-                import csv
-                
-                fd, path = tempfile.mkstemp(suffix='.csv')
-                with os.fdopen(fd, 'w', newline='', encoding='utf-8-sig') as temp:
-                    writer = csv.writer(temp)
-                    writer.writerows(export_data)
-                
-                # 设置文件名
+                # 导出为CSV：边读取边输出
                 filename = f"{secure_filename(dataset.name)}_export_{datetime.now().strftime('%Y%m%d%H%M%S')}.csv"
-                
-                # 返回CSV文件
-                return send_file(
-                    path,
-                    mimetype='text/csv',
-                    as_attachment=True,
-                    download_name=filename
-                )
+                return csv_download_response(iter_csv_bytes(rows, headers), filename)
                 
         except sqlite3.Error as db_err:
             print(f"SQLite错误: {db_err}")
@@ -3633,9 +3484,6 @@ def export_dataset_data(dataset_id):
                 'success': False,
                 'message': f'数据库操作错误: {str(db_err)}'
             }), 500
-        finally:
-            if conn:
-                conn.close()
                 
     except Exception as e:
         print(f"导出数据集失败: {str(e)}")
@@ -3646,6 +3494,184 @@ def export_dataset_data(dataset_id):
             'message': f'导出数据集失败: {str(e)}'
         }), 500
 
+# 分块上传API
+def get_user_upload(upload_id):
+    """获取当前用户的分块上传会话，不存在或无权限时返回None"""
+    upload = upload_sessions.get(upload_id)
+    if not upload or upload['user_id'] != current_user.id:
+        return None
+    return upload
+
+def request_import_file(field_name):
+    """获取导入文件
+    
+    表单中提供upload_id时使用已合并的分块上传文件，否则使用直接上传的文件
+    
+    Args:
+        field_name: 直接上传时的文件字段名
+        
+    Returns:
+        tuple: (FileStorage, 错误信息)，没有可用文件时FileStorage为None
+    """
+    upload_id = request.form.get('upload_id')
+    if not upload_id:
+        if field_name not in request.files:
+            return None, '没有选择文件'
+        return request.files[field_name], None
+    
+    upload = get_user_upload(upload_id)
+    if not upload:
+        return None, '上传会话不存在或已过期'
+    if upload['status'] != 'completed':
+        return None, '文件尚未上传完成'
+    
+    stream = upload_sessions.open(upload)
+    
+    @after_this_request
+    def close_upload_stream(response):
+        stream.close()
+        return response
+    
+    return FileStorage(stream=stream, filename=upload['filename']), None
+
+@app.route('/api/uploads', methods=['POST'])
+@login_required
+def create_upload():
+    """创建分块上传会话
+    
+    请求体: {"filename": "emr.csv", "total_size": 字节数, "chunk_size": 块大小（可选）,
+            "checksum": 整个文件的SHA-256（可选）}
+    
+    Returns:
+        会话信息的JSON响应，包含upload_id、块大小和块数
+    """
+    request_data = request.get_json(silent=True) or {}
+    filename = request_data.get('filename') or ''
+    file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    if file_ext not in {'csv', 'xlsx', 'xls'}:
+        return jsonify({
+            'success': False,
+            'message': '不支持的文件类型，请上传CSV或Excel文件'
+        }), 400
+    
+    try:
+        upload = upload_sessions.create(
+            current_user.id,
+            filename,
+            request_data.get('total_size'),
+            chunk_size=request_data.get('chunk_size'),
+            checksum=request_data.get('checksum')
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({
+            'success': False,
+            'message': f'创建上传会话失败: {str(e)}'
+        }), 400
+    
+    status = upload_sessions.status(upload)
+    return jsonify({
+        'success': True,
+        'upload_id': upload['id'],
+        'upload': status
+    }), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+@login_required
+def get_upload_status(upload_id):
+    """查询分块上传状态，断点续传时根据missing_chunks补传"""
+    upload = get_user_upload(upload_id)
+    if not upload:
+        return jsonify({
+            'success': False,
+            'message': '上传会话不存在或已过期'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'upload': upload_sessions.status(upload)
+    })
+
+@app.route('/api/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id, index):
+    """上传一个数据块
+    
+    请求体为块的原始字节（也可以用multipart表单的chunk字段），
+    可以通过X-Chunk-Checksum请求头提供该块的SHA-256。同一块可以重复上传
+    
+    Args:
+        upload_id: 上传会话ID
+        index: 块序号（从0开始）
+    """
+    upload = get_user_upload(upload_id)
+    if not upload:
+        return jsonify({
+            'success': False,
+            'message': '上传会话不存在或已过期'
+        }), 404
+    
+    chunk_file = request.files.get('chunk')
+    stream = chunk_file.stream if chunk_file else request.stream
+    try:
+        status = upload_sessions.save_chunk(upload, index, stream,
+                                            checksum=request.headers.get('X-Chunk-Checksum'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'upload': status
+    })
+
+@app.route('/api/uploads/<upload_id>/finalize', methods=['POST'])
+@login_required
+def finalize_upload(upload_id):
+    """合并已上传的块并校验文件
+    
+    完成后可以在导入和导入预览接口中用upload_id代替上传文件
+    """
+    upload = get_user_upload(upload_id)
+    if not upload:
+        return jsonify({
+            'success': False,
+            'message': '上传会话不存在或已过期'
+        }), 404
+    
+    try:
+        status = upload_sessions.finalize(upload)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e),
+            'upload': upload_sessions.status(upload)
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'upload_id': upload['id'],
+        'upload': status
+    })
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def delete_upload(upload_id):
+    """取消分块上传并删除已上传的数据"""
+    upload = get_user_upload(upload_id)
+    if not upload:
+        return jsonify({
+            'success': False,
+            'message': '上传会话不存在或已过期'
+        }), 404
+    
+    upload_sessions.delete(upload['id'])
+    return jsonify({
+        'success': True,
+        'message': '上传已取消'
+    })
+
 @app.route('/api/datasets/import', methods=['POST'])
 @login_required
 def import_dataset():
@@ -3655,16 +3681,17 @@ def import_dataset():
     支持主键功能：
     - 如果指定了主键字段且勾选了更新已有数据，会根据主键更新已有记录
     - 否则会插入新记录
+    
+    大文件可以先通过分块上传API上传，再用upload_id代替file字段
     """
     try:
-        # 检查是否有文件上传
-        if 'file' not in request.files:
+        # 检查是否有文件上传（直接上传或已完成的分块上传）
+        file, file_error = request_import_file('file')
+        if file is None:
             return jsonify({
                 'success': False,
-                'message': '没有选择文件'
+                'message': file_error
             }), 400
-            
-        file = request.files['file']
         
         # 检查文件名是否为空
         if file.filename == '':
@@ -3690,6 +3717,7 @@ def import_dataset():
         update_existing = request.form.get('update_existing') == 'true'
         primary_key = request.form.get('primary_key')
         field_mapping = json.loads(request.form.get('field_mapping', '{}'))
+        sheet_name = request.form.get('sheet_name') or 0  # Excel工作表，默认第一个
         
         # 检查数据集是否存在
         dataset = DataSet.query.get(dataset_id)
@@ -3706,12 +3734,6 @@ def import_dataset():
                 'message': '您没有权限访问此数据集'
             }), 403
             
-        # 保存文件到临时目录
-        temp_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
-        temp_file_path = os.path.join(temp_dir, secure_filename(file.filename))
-        file.save(temp_file_path)
-        
         # 初始化计数器
         total_rows = 0
         success_rows = 0
@@ -3720,72 +3742,29 @@ def import_dataset():
         updated_rows = 0
         inserted_rows = 0
         
-        # 如果有主键和需要更新，先获取现有条目的主键映射
-        existing_entries = {}
-        if primary_key and update_existing:
-            # 查询现有条目
-            entries = DatasetEntry.query.filter_by(dataset_id=dataset_id).all()
-            for entry in entries:
-                try:
-                    entry_data = json.loads(entry.data)
-                    if primary_key in entry_data:
-                        pk_value = str(entry_data[primary_key])
-                        existing_entries[pk_value] = entry
-                except:
-                    continue
+        # 批量写入引擎：不跳过错误时所有批次在同一事务中，出错可整体回滚
+        db_path = os.path.join('instance', 'zl_geniusmedvault.db')
+        use_primary_key = bool(primary_key and update_existing)
+        if use_primary_key:
+            # 按主键导入：每批记录通过主键字段索引查找已有记录，无需加载整个数据集
+            ensure_field_index(dataset_id, primary_key)
+        importer = BulkImporter(db_path, dataset_id, current_user.id, atomic=not skip_errors,
+                                key_field=primary_key if use_primary_key else None)
         
         # 读取文件数据
         try:
             if file_ext == 'csv':
-                # 读取CSV文件
-                import csv
-                
-                # 尝试不同的编码格式
-                encodings = ['utf-8-sig', 'gbk', 'gb2312', 'latin-1']
-                for encoding in encodings:
-                    try:
-                        with open(temp_file_path, 'r', encoding=encoding) as f:
-                            # 读取前几行来检查编码是否正确
-                            sample_content = ''.join([f.readline() for _ in range(5)])
-                        # 如果没有出现编码错误，使用此编码
-                        break
-                    except UnicodeDecodeError:
-                        continue
+                # 直接从上传流中读取CSV，按块处理
+                reader = CSVStreamReader(file.stream, has_header=has_header)
+                headers = reader.headers
+                row_mapper = mapping_row_mapper(headers, field_mapping)
                 
-                # 使用确定的编码打开文件
-                with open(temp_file_path, 'r', encoding=encoding) as f:
-                    csv_reader = csv.reader(f)
-                    
-                    # 跳过表头
-                    headers = next(csv_reader) if has_header else None
-                    
-                    # 如果没有表头，使用列索引作为列名
-                    if not headers:
-                        # 读取第一行来确定列数
-                        first_row = next(csv_reader)
-                        headers = [f'列{i+1}' for i in range(len(first_row))]
-                        # 重置文件指针
-                        f.seek(0)
-                        # 如果有表头，再次跳过
-                        if has_header:
-                            next(csv_reader)
-                    
-                    # 处理每一行数据
-                    for row_index, row in enumerate(csv_reader, start=1):
+                # 处理每一块数据
+                for chunk in reader.iter_chunks(row_mapper):
+                    for row_index, row_dict in chunk:
                         total_rows += 1
                         
                         try:
-                            # 将行数据转换为字典
-                            row_dict = {}
-                            for j, value in enumerate(row):
-                                if j < len(headers):
-                                    column_name = headers[j]
-                                    # 检查此列是否在映射中
-                                    if column_name in field_mapping:
-                                        # 使用映射的字段名
-                                        field_name = field_mapping[column_name]
-                                        row_dict[field_name] = value
-                            
                             # 如果字典为空，跳过此行
                             if not row_dict:
                                 if not skip_errors:
@@ -3797,31 +3776,12 @@ def import_dataset():
                                 })
                                 continue
                             
-                            # 检查是否有主键并且需要更新现有数据
-                            is_update = False
-                            if primary_key and update_existing and primary_key in row_dict:
-                                pk_value = str(row_dict[primary_key])
-                                if pk_value in existing_entries:
-                                    # 更新现有记录
-                                    existing_entry = existing_entries[pk_value]
-                                    existing_entry.data = json.dumps(row_dict)
-                                    existing_entry.updated_at = datetime.utcnow()
-                                    updated_rows += 1
-                                    success_rows += 1
-                                    is_update = True
-                            
-                            # 如果不是更新，则插入新记录
-                            if not is_update:
-                                # 创建新的数据记录
-                                new_entry = DatasetEntry(
-                                    dataset_id=dataset_id,
-                                    user_id=current_user.id,
-                                    data=json.dumps(row_dict)
-                                )
-                                
-                                db.session.add(new_entry)
-                                inserted_rows += 1
-                                success_rows += 1
+                            # 有主键时按主键更新或插入，否则直接插入
+                            if use_primary_key:
+                                importer.upsert(row_dict)
+                            else:
+                                importer.insert(row_dict)
+                            success_rows += 1
                         
                         except Exception as e:
                             error_rows += 1
@@ -3832,7 +3792,9 @@ def import_dataset():
                             
                             if not skip_errors:
                                 # 回滚并中止导入
-                                db.session.rollback()
+                                importer.rollback()
+                                importer.close()
+                                column_store.invalidate(dataset_id)
                                 return jsonify({
                                     'success': False,
                                     'message': f'导入第 {row_index} 行时出错: {str(e)}',
@@ -3843,10 +3805,7 @@ def import_dataset():
                                 }), 500
             else:
                 # 读取Excel文件
-                import pandas as pd
-                
-                # 读取Excel文件
-                df = pd.read_excel(temp_file_path, header=0 if has_header else None)
+                df = read_excel_frame(file.stream, header=0 if has_header else None, sheet_name=sheet_name)
                 
                 # 如果没有表头，使用列索引作为列名
                 if not has_header:
@@ -3855,24 +3814,15 @@ def import_dataset():
                 # 获取总行数
                 total_rows = len(df)
                 
+                # 按字段映射批量转换为记录，空值转换为空字符串
+                records = frame_records(df, [field_mapping[column_name] if column_name in field_mapping else None
+                                             for column_name in df.columns])
+                
                 # 处理每一行数据
-                for index, row in df.iterrows():
+                for index, row_dict in enumerate(records):
                     row_index = index + 2  # Excel行号从1开始，且有表头
                     
                     try:
-                        # 将行数据转换为字典
-                        row_dict = {}
-                        for column_name in df.columns:
-                            # 检查此列是否在映射中
-                            if column_name in field_mapping:
-                                # 使用映射的字段名
-                                field_name = field_mapping[column_name]
-                                # 处理NaN值
-                                value = row[column_name]
-                                if pd.isna(value):
-                                    value = ""
-                                row_dict[field_name] = str(value)
-                        
                         # 如果字典为空，跳过此行
                         if not row_dict:
                             if not skip_errors:
@@ -3884,31 +3834,12 @@ def import_dataset():
                             })
                             continue
                         
-                        # 检查是否有主键并且需要更新现有数据
-                        is_update = False
-                        if primary_key and update_existing and primary_key in row_dict:
-                            pk_value = str(row_dict[primary_key])
-                            if pk_value in existing_entries:
-                                # 更新现有记录
-                                existing_entry = existing_entries[pk_value]
-                                existing_entry.data = json.dumps(row_dict)
-                                existing_entry.updated_at = datetime.utcnow()
-                                updated_rows += 1
-                                success_rows += 1
-                                is_update = True
-                        
-                        # 如果不是更新，则插入新记录
-                        if not is_update:
-                            # 创建新的数据记录
-                            new_entry = DatasetEntry(
-                                dataset_id=dataset_id,
-                                user_id=current_user.id,
-                                data=json.dumps(row_dict)
-                            )
-                            
-                            db.session.add(new_entry)
-                            inserted_rows += 1
-                            success_rows += 1
+                        # 有主键时按主键更新或插入，否则直接插入
+                        if use_primary_key:
+                            importer.upsert(row_dict)
+                        else:
+                            importer.insert(row_dict)
+                        success_rows += 1
                         
                     except Exception as e:
                         error_rows += 1
@@ -3919,7 +3850,9 @@ def import_dataset():
                         
                         if not skip_errors:
                             # 回滚并中止导入
-                            db.session.rollback()
+                            importer.rollback()
+                            importer.close()
+                            column_store.invalidate(dataset_id)
                             return jsonify({
                                 'success': False,
                                 'message': f'导入第 {row_index} 行时出错: {str(e)}',
@@ -3929,15 +3862,13 @@ def import_dataset():
                                 'errors': errors
                             }), 500
             
-            # 提交所有更改
-            db.session.commit()
-            
-            # 删除临时文件
-            try:
-                os.remove(temp_file_path)
-                os.rmdir(temp_dir)
-            except:
-                pass
+            # 提交剩余的批次
+            importer.commit()
+            importer.close()
+            column_store.invalidate(dataset_id)
+            updated_rows = importer.updated
+            inserted_rows = importer.inserted
+            print(f"导入完成: {importer.inserted} 条新增, {importer.updated} 条更新, {importer.rows_per_second} 行/秒")
             
             return jsonify({
                 'success': True,
@@ -3947,17 +3878,16 @@ def import_dataset():
                 'error_rows': error_rows,
                 'updated_rows': updated_rows,
                 'inserted_rows': inserted_rows,
-                'errors': errors
+                'errors': errors,
+                'performance': importer.stats()
             })
             
         except Exception as e:
-            # 回滚事务
-            db.session.rollback()
+            # 回滚未提交的批次
+            importer.rollback()
+            importer.close()
+            column_store.invalidate(dataset_id)
             
-            # 删除临时文件
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-                
             return jsonify({
                 'success': False,
                 'message': f'导入数据时出错: {str(e)}',
@@ -3973,6 +3903,372 @@ def import_dataset():
             'message': f'处理请求时出错: {str(e)}'
         }), 500
 
+# 后台导入任务API
+def import_job_info(job):
+    """导入任务的JSON表示"""
+    total_rows = job['total_rows']
+    progress = None
+    if job['status'] == 'completed':
+        progress = 100
+    elif total_rows:
+        progress = min(99, int(job['processed_rows'] * 100 / total_rows))
+    
+    return {
+        'job_id': job['id'],
+        'dataset_id': job['dataset_id'],
+        'status': job['status'],
+        'filename': job['filename'],
+        'total_rows': total_rows,
+        'processed_rows': job['processed_rows'],
+        'inserted_rows': job['inserted_rows'],
+        'updated_rows': job['updated_rows'],
+        'error_rows': job['error_rows'],
+        'progress': progress,
+        'message': job['message'],
+        'errors': job['errors'][:10],  # 只返回前10条错误信息，避免响应过大
+        'cancel_requested': job['cancel_requested'],
+        'created_at': job['created_at'][:19],
+        'updated_at': job['updated_at'][:19],
+        'finished_at': job['finished_at'][:19] if job['finished_at'] else None,
+        'status_url': url_for('get_import_job', job_id=job['id'])
+    }
+
+def get_user_import_job(job_id):
+    """获取当前用户可以访问的导入任务，不存在或无权限时返回None"""
+    job = import_jobs.get(job_id)
+    if not job:
+        return None
+    if job['user_id'] != current_user.id and current_user.role != 'admin':
+        return None
+    return job
+
+@app.route('/api/datasets/import_jobs', methods=['POST'])
+@login_required
+def create_import_job():
+    """创建后台导入任务
+    
+    参数与 /api/datasets/import 相同（file或upload_id、dataset_id、has_header、
+    skip_errors、update_existing、primary_key、field_mapping、sheet_name）。
+    任务每1000行提交一次并记录进度；不跳过错误时遇到错误行停止，
+    已提交的批次保留，可以在修正后从断点继续
+    
+    Returns:
+        任务信息的JSON响应
+    """
+    try:
+        dataset_id = request.form.get('dataset_id')
+        dataset = DataSet.query.get(dataset_id)
+        if not dataset:
+            return jsonify({
+                'success': False,
+                'message': '数据集不存在'
+            }), 404
+            
+        if dataset.created_by != current_user.id and not dataset.is_shared_with(current_user.id):
+            return jsonify({
+                'success': False,
+                'message': '您没有权限访问此数据集'
+            }), 403
+        
+        job_id = uuid.uuid4().hex
+        upload_id = request.form.get('upload_id')
+        if upload_id:
+            # 使用已完成的分块上传文件
+            upload = get_user_upload(upload_id)
+            if not upload or upload['status'] != 'completed':
+                return jsonify({
+                    'success': False,
+                    'message': '上传会话不存在或文件尚未上传完成'
+                }), 400
+            filename = upload['filename']
+            file_path = upload_sessions.file_path(upload)
+            owns_file = False
+        else:
+            file = request.files.get('file')
+            if not file or file.filename == '':
+                return jsonify({
+                    'success': False,
+                    'message': '没有选择文件'
+                }), 400
+            filename = file.filename
+            file_path = None
+            owns_file = True
+        
+        file_ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+        if file_ext not in {'csv', 'xlsx', 'xls'}:
+            return jsonify({
+                'success': False,
+                'message': '不支持的文件类型，请上传CSV或Excel文件'
+            }), 400
+        
+        options = {
+            'has_header': request.form.get('has_header') == 'true',
+            'skip_errors': request.form.get('skip_errors') == 'true',
+            'update_existing': request.form.get('update_existing') == 'true',
+            'primary_key': request.form.get('primary_key'),
+            'field_mapping': json.loads(request.form.get('field_mapping', '{}')),
+            'sheet_name': request.form.get('sheet_name') or 0
+        }
+        
+        if owns_file:
+            # 任务可能中断后继续执行，直接上传的文件需要保存到任务完成
+            job_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'import_jobs')
+            os.makedirs(job_dir, exist_ok=True)
+            file_path = os.path.join(job_dir, f"{job_id}.{file_ext}")
+            file.save(file_path)
+        
+        if options['primary_key'] and options['update_existing']:
+            ensure_field_index(dataset.id, options['primary_key'])
+        
+        job = import_jobs.create(job_id, current_user.id, dataset.id, filename, file_path,
+                                 file_ext, options, owns_file=owns_file)
+        
+        return jsonify({
+            'success': True,
+            'message': '导入任务已创建',
+            'job': import_job_info(job)
+        }), 202
+        
+    except Exception as e:
+        print(f"创建导入任务失败: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'创建导入任务失败: {str(e)}'
+        }), 500
+
+@app.route('/api/datasets/import_jobs/<job_id>', methods=['GET'])
+@login_required
+def get_import_job(job_id):
+    """查询导入任务进度"""
+    job = get_user_import_job(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': '导入任务不存在'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': import_job_info(job)
+    })
+
+@app.route('/api/datasets/import_jobs/<job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_import_job(job_id):
+    """取消导入任务，任务在处理完当前数据块后停止，已导入的批次保留"""
+    job = get_user_import_job(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': '导入任务不存在'
+        }), 404
+    
+    if job['status'] not in ('queued', 'running'):
+        return jsonify({
+            'success': False,
+            'message': '任务已结束，无法取消'
+        }), 400
+    
+    job = import_jobs.cancel(job_id)
+    return jsonify({
+        'success': True,
+        'message': '已请求取消导入任务',
+        'job': import_job_info(job)
+    })
+
+@app.route('/api/datasets/import_jobs/<job_id>/resume', methods=['POST'])
+@login_required
+def resume_import_job(job_id):
+    """从最后提交的批次继续执行失败、取消或中断的导入任务
+    
+    因某一行数据错误失败的任务，需要传入skip_errors=true跳过错误行后继续，
+    否则会在同一行再次失败；该设置会保存到任务的导入选项中
+    """
+    job = get_user_import_job(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': '导入任务不存在'
+        }), 404
+    
+    request_data = request.get_json(silent=True) or request.form
+    skip_errors = request_data.get('skip_errors')
+    if skip_errors is not None and not isinstance(skip_errors, bool):
+        skip_errors = str(skip_errors).lower() == 'true'
+    
+    try:
+        job = import_jobs.resume(job_id, skip_errors=skip_errors)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'message': '导入任务已继续',
+        'job': import_job_info(job)
+    }), 202
+
+# 数据集索引字段管理API
+@app.route('/api/datasets/<int:dataset_id>/indexed_fields', methods=['GET'])
+@login_required
+def get_dataset_indexed_fields(dataset_id):
+    """获取数据集的索引字段列表
+    
+    Args:
+        dataset_id: 数据集ID
+        
+    Returns:
+        索引字段列表的JSON响应
+    """
+    dataset = DataSet.query.get(dataset_id)
+    if not dataset:
+        return jsonify({
+            'success': False,
+            'message': '数据集不存在'
+        }), 404
+    
+    items = DatasetIndexedField.query.filter_by(dataset_id=dataset_id).order_by(DatasetIndexedField.id).all()
+    return jsonify({
+        'success': True,
+        'indexed_fields': [{
+            'field_name': item.field_name,
+            'index_name': item.index_name,
+            'created_at': item.created_at.strftime('%Y-%m-%d %H:%M:%S') if item.created_at else None
+        } for item in items]
+    })
+
+@app.route('/api/datasets/<int:dataset_id>/indexed_fields', methods=['POST'])
+@login_required
+def add_dataset_indexed_field(dataset_id):
+    """为数据集字段建立表达式索引（仅管理员）
+    
+    请求体: {"field_name": "患者编号"}
+    
+    Args:
+        dataset_id: 数据集ID
+        
+    Returns:
+        操作结果的JSON响应
+    """
+    if current_user.role != 'admin':
+        return jsonify({
+            'success': False,
+            'message': '只有管理员可以管理索引字段'
+        }), 403
+    
+    dataset = DataSet.query.get(dataset_id)
+    if not dataset:
+        return jsonify({
+            'success': False,
+            'message': '数据集不存在'
+        }), 404
+    
+    request_data = request.get_json(silent=True) or {}
+    field_name = (request_data.get('field_name') or request.form.get('field_name') or '').strip()
+    if not field_name or field_name.startswith('_'):
+        return jsonify({
+            'success': False,
+            'message': '请提供有效的字段名'
+        }), 400
+    
+    # 字段必须是数据集定义的字段
+    try:
+        custom_fields = dataset.custom_fields_obj or []
+    except (json.JSONDecodeError, TypeError):
+        custom_fields = []
+    field_names = [field.get('name') for field in custom_fields if isinstance(field, dict)]
+    if field_names and field_name not in field_names:
+        return jsonify({
+            'success': False,
+            'message': f'数据集中不存在字段: {field_name}'
+        }), 400
+    
+    if DatasetIndexedField.query.filter_by(dataset_id=dataset_id, field_name=field_name).first():
+        return jsonify({
+            'success': False,
+            'message': f'字段 {field_name} 已建立索引'
+        }), 400
+    
+    conn = None
+    try:
+        conn = sqlite3.connect(os.path.join('instance', 'zl_geniusmedvault.db'))
+        index_name = create_field_index(conn, field_name)
+    except Exception as e:
+        print(f"创建字段索引出错: {str(e)}")
+        return jsonify({
+            'success': False,
+            'message': f'创建索引失败: {str(e)}'
+        }), 500
+    finally:
+        if conn:
+            conn.close()
+    
+    db.session.add(DatasetIndexedField(
+        dataset_id=dataset_id,
+        field_name=field_name,
+        index_name=index_name,
+        created_by=current_user.id
+    ))
+    db.session.commit()
+    
+    return jsonify({
+        'success': True,
+        'message': f'已为字段 {field_name} 建立索引',
+        'index_name': index_name
+    })
+
+@app.route('/api/datasets/<int:dataset_id>/indexed_fields/<path:field_name>', methods=['DELETE'])
+@login_required
+def remove_dataset_indexed_field(dataset_id, field_name):
+    """删除数据集的索引字段（仅管理员）
+    
+    同名字段的索引由多个数据集共用，只有没有数据集再使用时才删除索引本身
+    
+    Args:
+        dataset_id: 数据集ID
+        field_name: 字段名
+        
+    Returns:
+        操作结果的JSON响应
+    """
+    if current_user.role != 'admin':
+        return jsonify({
+            'success': False,
+            'message': '只有管理员可以管理索引字段'
+        }), 403
+    
+    item = DatasetIndexedField.query.filter_by(dataset_id=dataset_id, field_name=field_name).first()
+    if not item:
+        return jsonify({
+            'success': False,
+            'message': f'字段 {field_name} 没有建立索引'
+        }), 404
+    
+    db.session.delete(item)
+    db.session.commit()
+    release_field_index(field_name)
+    
+    return jsonify({
+        'success': True,
+        'message': f'已删除字段 {field_name} 的索引'
+    })
+
+def release_field_index(field_name):
+    """没有数据集再使用某字段的索引时，删除该表达式索引"""
+    if DatasetIndexedField.query.filter_by(index_name=index_name_for(field_name)).first():
+        return
+    conn = None
+    try:
+        conn = sqlite3.connect(os.path.join('instance', 'zl_geniusmedvault.db'))
+        drop_field_index(conn, field_name)
+    except Exception as e:
+        print(f"删除字段索引出错: {str(e)}")
+    finally:
+        if conn:
+            conn.close()
+
 # 获取数据集信息API
 @app.route('/api/datasets/<int:dataset_id>/info', methods=['GET'])
 @login_required
@@ -4063,17 +4359,8 @@ def get_dataset_field_stats(dataset_id):
             except json.JSONDecodeError:
                 pass
         
-        # 获取数据集条目
-        entries = DatasetEntry.query.filter_by(dataset_id=dataset_id).all()
-        entries_data = []
-        
-        # 解析每个条目的数据
-        for entry in entries:
-            try:
-                entry_data = json.loads(entry.data)
-                entries_data.append(entry_data)
-            except (json.JSONDecodeError, AttributeError):
-                continue
+        # 读取持久化的字段统计（按字段读取，不需要解析全部记录）
+        total_records, field_stats = read_field_stats(dataset_id)
         
         # 计算字段类型分布
         field_types = {
@@ -4108,7 +4395,7 @@ def get_dataset_field_stats(dataset_id):
         }
         
         # 如果没有条目数据，则无法计算完整度
-        if not entries_data:
+        if total_records == 0:
             # 返回默认值
             return jsonify({
                 'success': True,
@@ -4130,8 +4417,8 @@ def get_dataset_field_stats(dataset_id):
                 continue
             
             # 计算该字段在所有条目中的存在比例
-            present_count = sum(1 for entry in entries_data if field_name in entry and entry[field_name] not in [None, ''])
-            completeness_ratio = present_count / len(entries_data) if entries_data else 0
+            present_count = field_stats.get(field_name, {}).get('non_null', 0)
+            completeness_ratio = present_count / total_records if total_records else 0
             
             # 根据完整度比例分类
             if completeness_ratio >= 0.9:  # 90%以上视为完整
@@ -4212,20 +4499,11 @@ def get_dataset_field_completeness(dataset_id):
             except json.JSONDecodeError:
                 pass
         
-        # 获取数据集条目
-        entries = DatasetEntry.query.filter_by(dataset_id=dataset_id).all()
-        entries_data = []
-        
-        # 解析每个条目的数据
-        for entry in entries:
-            try:
-                entry_data = json.loads(entry.data)
-                entries_data.append(entry_data)
-            except (json.JSONDecodeError, AttributeError):
-                continue
+        # 读取持久化的字段统计（按字段读取，不需要解析全部记录）
+        total_records, field_stats = read_field_stats(dataset_id)
         
         # 如果没有条目数据，返回默认值
-        if not entries_data:
+        if total_records == 0:
             # 创建一些模拟数据
             mock_fields = [
                 {"name": "姓名", "count": 120},
@@ -4246,21 +4524,27 @@ def get_dataset_field_completeness(dataset_id):
         
         # 计算每个字段的完整度数据
         field_data = []
-        total_records = len(entries_data)
         
         for field in custom_fields:
             field_name = field.get('name')
             if not field_name:
                 continue
             
-            # 计算该字段在所有条目中的存在数量
-            present_count = sum(1 for entry in entries_data if field_name in entry and entry[field_name] not in [None, ''])
+            # 该字段在所有条目中的存在数量
+            stats = field_stats.get(field_name, {})
+            present_count = stats.get('non_null', 0)
+            
+            # 数值型取值的汇总统计
+            numeric = None
+            if stats.get('numeric_count'):
+                numeric = {key: stats[key] for key in ('numeric_count', 'min', 'max', 'mean', 'std')}
             
             field_data.append({
                 'name': field_name,
                 'count': present_count,
                 'type': field.get('type', 'text'),
-                'required': field.get('required', False)
+                'required': field.get('required', False),
+                'numeric': numeric
             })
         
         # 返回统计结果
@@ -4491,6 +4775,8 @@ def import_dataset_data():
     支持以下参数：
     - dataset_id: 数据集ID
     - import_file: 上传的文件
+    - upload_id: 已完成的分块上传ID（代替import_file）
+    - sheet_name: Excel工作表名称（可选，默认第一个工作表）
     - skip_header: 是否跳过第一行（表头）
     - detect_duplicates: 是否检测重复数据
     - unique_identifier: 用于检测重复的唯一标识符字段
@@ -4500,14 +4786,13 @@ def import_dataset_data():
         导入结果的JSON响应
     """
     try:
-        # 检查是否有文件上传
-        if 'import_file' not in request.files:
+        # 检查是否有文件上传（直接上传或已完成的分块上传）
+        file, file_error = request_import_file('import_file')
+        if file is None:
             return jsonify({
                 'success': False,
-                'message': '没有选择文件'
+                'message': file_error
             }), 400
-            
-        file = request.files['import_file']
         
         # 检查文件名是否为空
         if file.filename == '':
@@ -4533,6 +4818,7 @@ def import_dataset_data():
         detect_duplicates = request.form.get('detect_duplicates') == 'true'
         unique_identifier = request.form.get('unique_identifier')
         duplicate_strategy = request.form.get('duplicate_strategy', 'skip')  # 默认跳过重复数据
+        sheet_name = request.form.get('sheet_name') or 0  # Excel工作表，默认第一个
         
         # 检查数据集是否存在
         dataset = DataSet.query.get(dataset_id)
@@ -4551,12 +4837,6 @@ def import_dataset_data():
                     'message': '没有权限导入数据到此数据集'
                 }), 403
             
-        # 保存文件到临时目录
-        temp_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
-        temp_file_path = os.path.join(temp_dir, secure_filename(file.filename))
-        file.save(temp_file_path)
-        
         # 初始化计数器
         total_rows = 0
         valid_rows = 0
@@ -4575,76 +4855,37 @@ def import_dataset_data():
             except json.JSONDecodeError:
                 print(f"无法解析数据集 {dataset_id} 的自定义字段")
         
-        # 如果有唯一标识符和需要检测重复，先获取现有条目的标识符映射
-        existing_entries = {}
-        if detect_duplicates and unique_identifier:
-            # 查询现有条目
-            entries = DatasetEntry.query.filter_by(dataset_id=dataset_id).all()
-            for entry in entries:
-                try:
-                    entry_data = json.loads(entry.data)
-                    if unique_identifier in entry_data:
-                        id_value = str(entry_data[unique_identifier])
-                        existing_entries[id_value] = entry
-                except:
-                    continue
+        # 批量写入引擎，所有批次在同一事务中提交；检测重复时每批记录
+        # 通过唯一标识符字段索引查找已有记录，无需加载整个数据集
+        use_identifier = bool(detect_duplicates and unique_identifier)
+        if use_identifier:
+            ensure_field_index(dataset_id, unique_identifier)
+        importer = BulkImporter(os.path.join('instance', 'zl_geniusmedvault.db'), dataset_id,
+                                current_user.id, atomic=True,
+                                key_field=unique_identifier if use_identifier else None,
+                                duplicate_strategy=duplicate_strategy)
         
         # 读取文件数据
         try:
             if file_ext == 'csv':
-                # 读取CSV文件
-                import csv
+                # 直接从上传流中读取CSV，按块处理
+                reader = CSVStreamReader(file.stream, has_header=True)
+                headers = reader.headers
+                if skip_header:
+                    # 跳过第一行时不使用其作为表头，列名为列序号
+                    headers = [f'列{i+1}' for i in range(len(headers))]
                 
-                # 尝试不同的编码格式
-                encodings = ['utf-8-sig', 'gbk', 'gb2312', 'latin-1']
-                for encoding in encodings:
-                    try:
-                        with open(temp_file_path, 'r', encoding=encoding) as f:
-                            # 读取前几行来检查编码是否正确
-                            sample_content = ''.join([f.readline() for _ in range(5)])
-                        # 如果没有出现编码错误，使用此编码
-                        break
-                    except UnicodeDecodeError:
-                        continue
+                # 如果数据集没有自定义字段但有表头，使用表头作为字段
+                if has_header and not dataset_fields:
+                    dataset_fields = headers
+                row_mapper = positional_row_mapper(headers, dataset_fields)
                 
-                # 使用确定的编码打开文件
-                with open(temp_file_path, 'r', encoding=encoding) as f:
-                    csv_reader = csv.reader(f)
-                    
-                    # 读取表头（如果有）
-                    if has_header:
-                        headers = next(csv_reader)
-                    else:
-                        # 读取第一行来确定列数
-                        first_row = next(csv_reader)
-                        headers = [f'列{i+1}' for i in range(len(first_row))]
-                        # 重置文件指针，因为我们需要从头开始读取数据
-                        f.seek(0)
-                        # 如果没有表头，但是skip_header设置为true，仍然需要跳过第一行
-                        if skip_header:
-                            next(csv_reader)
-                    
-                    # 如果数据集没有自定义字段但有表头，使用表头作为字段
-                    if has_header and not dataset_fields:
-                        dataset_fields = headers
-                    
-                    # 处理每一行数据
-                    for row_index, row in enumerate(csv_reader, start=1):
+                # 处理每一块数据
+                for chunk in reader.iter_chunks(row_mapper):
+                    for row_index, row_dict in chunk:
                         total_rows += 1
                         
                         try:
-                            # 将行数据转换为字典
-                            row_dict = {}
-                            for j, value in enumerate(row):
-                                if j < len(headers):
-                                    column_name = headers[j]
-                                    # 检查是否要使用数据集自定义字段
-                                    if dataset_fields and j < len(dataset_fields):
-                                        field_name = dataset_fields[j]
-                                    else:
-                                        field_name = column_name
-                                    row_dict[field_name] = value
-                            
                             # 如果字典为空，跳过此行
                             if not row_dict:
                                 error_rows += 1
@@ -4656,42 +4897,11 @@ def import_dataset_data():
                             
                             valid_rows += 1
                             
-                            # 检查是否有唯一标识符且需要检测重复
-                            is_duplicate = False
-                            if detect_duplicates and unique_identifier and unique_identifier in row_dict:
-                                id_value = str(row_dict[unique_identifier])
-                                if id_value in existing_entries:
-                                    is_duplicate = True
-                                    
-                                    # 根据重复策略处理
-                                    if duplicate_strategy == 'skip':
-                                        # 跳过重复数据
-                                        skipped_rows += 1
-                                        continue
-                                    elif duplicate_strategy == 'update':
-                                        # 更新现有记录
-                                        existing_entry = existing_entries[id_value]
-                                        existing_entry.data = json.dumps(row_dict)
-                                        existing_entry.updated_at = datetime.utcnow()
-                                        updated_rows += 1
-                                    elif duplicate_strategy == 'keep_both':
-                                        # 标记为重复
-                                        row_dict['_duplicate'] = True
-                                        row_dict['_original_id'] = existing_entries[id_value].id
-                                        # 继续插入
-                                        is_duplicate = False
-                            
-                            # 如果不是更新重复记录，则插入新记录
-                            if not is_duplicate or duplicate_strategy == 'keep_both':
-                                # 创建新的数据记录
-                                new_entry = DatasetEntry(
-                                    dataset_id=dataset_id,
-                                    user_id=current_user.id,
-                                    data=json.dumps(row_dict)
-                                )
-                                
-                                db.session.add(new_entry)
-                                inserted_rows += 1
+                            # 检测重复时按唯一标识符和重复策略处理，否则直接插入
+                            if use_identifier:
+                                importer.upsert(row_dict)
+                            else:
+                                importer.insert(row_dict)
                         
                         except Exception as e:
                             error_rows += 1
@@ -4701,10 +4911,7 @@ def import_dataset_data():
                             })
             else:
                 # 读取Excel文件
-                import pandas as pd
-                
-                # 读取Excel文件
-                df = pd.read_excel(temp_file_path, header=0 if has_header else None)
+                df = read_excel_frame(file.stream, header=0 if has_header else None, sheet_name=sheet_name)
                 
                 # 如果没有表头，使用列索引作为列名
                 if not has_header:
@@ -4722,25 +4929,16 @@ def import_dataset_data():
                 if has_header and not dataset_fields:
                     dataset_fields = df.columns.tolist()
                 
+                # 按列位置批量转换为记录：优先使用数据集自定义字段名，空值转换为空字符串
+                records = frame_records(df, [dataset_fields[j] if dataset_fields and j < len(dataset_fields)
+                                             else column_name
+                                             for j, column_name in enumerate(df.columns)])
+                
                 # 处理每一行数据
-                for index, row in df.iterrows():
+                for index, row_dict in enumerate(records):
                     row_index = index + 2  # Excel行号从1开始，且有表头
                     
                     try:
-                        # 将行数据转换为字典
-                        row_dict = {}
-                        for j, column_name in enumerate(df.columns):
-                            # 检查是否要使用数据集自定义字段
-                            if dataset_fields and j < len(dataset_fields):
-                                field_name = dataset_fields[j]
-                            else:
-                                field_name = column_name
-                            # 处理NaN值
-                            value = row[column_name]
-                            if pd.isna(value):
-                                value = ""
-                            row_dict[field_name] = str(value)
-                        
                         # 如果字典为空，跳过此行
                         if not row_dict:
                             error_rows += 1
@@ -4752,42 +4950,11 @@ def import_dataset_data():
                         
                         valid_rows += 1
                         
-                        # 检查是否有唯一标识符且需要检测重复
-                        is_duplicate = False
-                        if detect_duplicates and unique_identifier and unique_identifier in row_dict:
-                            id_value = str(row_dict[unique_identifier])
-                            if id_value in existing_entries:
-                                is_duplicate = True
-                                
-                                # 根据重复策略处理
-                                if duplicate_strategy == 'skip':
-                                    # 跳过重复数据
-                                    skipped_rows += 1
-                                    continue
-                                elif duplicate_strategy == 'update':
-                                    # 更新现有记录
-                                    existing_entry = existing_entries[id_value]
-                                    existing_entry.data = json.dumps(row_dict)
-                                    existing_entry.updated_at = datetime.utcnow()
-                                    updated_rows += 1
-                                elif duplicate_strategy == 'keep_both':
-                                    # 标记为重复
-                                    row_dict['_duplicate'] = True
-                                    row_dict['_original_id'] = existing_entries[id_value].id
-                                    # 继续插入
-                                    is_duplicate = False
-                        
-                        # 如果不是更新重复记录，则插入新记录
-                        if not is_duplicate or duplicate_strategy == 'keep_both':
-                            # 创建新的数据记录
-                            new_entry = DatasetEntry(
-                                dataset_id=dataset_id,
-                                user_id=current_user.id,
-                                data=json.dumps(row_dict)
-                            )
-                            
-                            db.session.add(new_entry)
-                            inserted_rows += 1
+                        # 检测重复时按唯一标识符和重复策略处理，否则直接插入
+                        if use_identifier:
+                            importer.upsert(row_dict)
+                        else:
+                            importer.insert(row_dict)
                     
                     except Exception as e:
                         error_rows += 1
@@ -4796,14 +4963,14 @@ def import_dataset_data():
                             'message': str(e)
                         })
             
-            # 提交所有更改
-            db.session.commit()
-            
-            # 删除临时文件
-            try:
-                os.remove(temp_file_path)
-            except:
-                pass
+            # 提交所有批次
+            importer.commit()
+            importer.close()
+            column_store.invalidate(dataset_id)
+            skipped_rows = importer.skipped
+            updated_rows = importer.updated
+            inserted_rows = importer.inserted
+            print(f"导入完成: {importer.inserted} 条新增, {importer.updated} 条更新, {importer.rows_per_second} 行/秒")
             
             return jsonify({
                 'success': True,
@@ -4815,17 +4982,15 @@ def import_dataset_data():
                 'updated': updated_rows,
                 'imported': inserted_rows,
                 'total_processed': inserted_rows + updated_rows + skipped_rows,
-                'errors': errors[:10]  # 只返回前10条错误信息，避免响应过大
+                'errors': errors[:10],  # 只返回前10条错误信息，避免响应过大
+                'performance': importer.stats()
             })
             
         except Exception as e:
             # 回滚事务
-            db.session.rollback()
+            importer.rollback()
+            importer.close()
             
-            # 删除临时文件
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
-                
             import traceback
             traceback.print_exc()
             
@@ -4860,9 +5025,14 @@ def descriptive_analysis():
     {
         "dataset_ids": [1, 2, 3],  // 数据集ID列表
         "variables": ["age", "gender", "bmi"],  // 变量名列表
-        "stats": ["mean", "median", "sd", "min", "max"]  // 统计指标列表
+        "stats": ["mean", "median", "sd", "min", "max"],  // 统计指标列表
+        "weight_variable": "weight"  // 可选，权重变量（频数权重）
     }
     
+    支持的统计指标: count、missing、mean、median、sd、variance、se、min、max、range、
+    q1、q3、iqr、sum、mode、distinct；分类变量另外返回频数表。多个数据集时
+    先计算各数据集的摘要再合并，记录数较多时分位数为t-digest近似值
+    
     Returns:
         包含分析结果的JSON响应
     """
@@ -4903,6 +5073,7 @@ def descriptive_analysis():
         dataset_ids = request_data.get('dataset_ids', [])
         variables = request_data.get('variables', [])
         stats = request_data.get('stats', [])
+        weight_variable = request_data.get('weight_variable') or None
         
         current_app.logger.info(f"解析请求参数 - 数据集IDs: {dataset_ids}, 变量: {variables}, 统计指标: {stats}")
         current_app.logger.info(f"参数类型 - 数据集IDs: {type(dataset_ids)}, 变量: {type(variables)}, 统计指标: {type(stats)}")
@@ -4929,6 +5100,12 @@ def descriptive_analysis():
                 'message': f'统计指标参数类型错误，应为列表，实际为: {type(stats)}'
             }), 400
             
+        if weight_variable is not None and not isinstance(weight_variable, str):
+            return jsonify({
+                'success': False,
+                'message': f'权重变量参数类型错误，应为字符串，实际为: {type(weight_variable)}'
+            }), 400
+            
         # 检查参数是否为空
         if not dataset_ids:
             current_app.logger.warning("未指定数据集")
@@ -4998,113 +5175,13 @@ def descriptive_analysis():
                     'message': f'检查数据集权限时出错: {str(e)}'
                 }), 500
         
-        # 初始化结果字典
-        results = {}
-        total_records = 0
-        
-        # 遍历每个数据集，收集数据
-        for dataset_id in dataset_ids:
-            # 获取数据集的所有条目
-            entries = DatasetEntry.query.filter_by(dataset_id=dataset_id).all()
-            
-            for entry in entries:
-                try:
-                    # 解析条目数据
-                    entry_data = json.loads(entry.data)
-                    total_records += 1
-                    
-                    # 提取每个请求的变量的值
-                    for variable in variables:
-                        if variable in entry_data:
-                            # 如果变量还未初始化，创建它的数据列表
-                            if variable not in results:
-                                results[variable] = {
-                                    'name': variable,
-                                    'values': [],
-                                    'stats': {}
-                                }
-                            
-                            # 添加值到列表
-                            value = entry_data[variable]
-                            # 尝试将数值型字符串转换为数字
-                            if isinstance(value, str):
-                                try:
-                                    if '.' in value:
-                                        value = float(value)
-                                    else:
-                                        value = int(value)
-                                except (ValueError, TypeError):
-                                    pass  # 保持为字符串
-                            
-                            results[variable]['values'].append(value)
-                except Exception as e:
-                    current_app.logger.warning(f"处理数据条目时出错: {str(e)}")
-                    continue
-        
-        # 计算请求的统计指标
-        for variable, data in results.items():
-            values = data['values']
-            
-            # 初始化统计结果
-            for stat in stats:
-                data['stats'][stat] = None
-            
-            # 计算数值型变量的统计指标
-            numeric_values = [v for v in values if isinstance(v, (int, float))]
-            if numeric_values:
-                for stat in stats:
-                    if stat == 'mean' and 'mean' in stats:
-                        data['stats']['mean'] = sum(numeric_values) / len(numeric_values)
-                    elif stat == 'median' and 'median' in stats:
-                        sorted_values = sorted(numeric_values)
-                        mid = len(sorted_values) // 2
-                        if len(sorted_values) % 2 == 0:
-                            data['stats']['median'] = (sorted_values[mid-1] + sorted_values[mid]) / 2
-                        else:
-                            data['stats']['median'] = sorted_values[mid]
-                    elif stat == 'sd' and 'sd' in stats:
-                        if len(numeric_values) > 1:
-                            mean = sum(numeric_values) / len(numeric_values)
-                            variance = sum((x - mean) ** 2 for x in numeric_values) / (len(numeric_values) - 1)
-                            data['stats']['sd'] = variance ** 0.5
-                    elif stat == 'min' and 'min' in stats:
-                        data['stats']['min'] = min(numeric_values)
-                    elif stat == 'max' and 'max' in stats:
-                        data['stats']['max'] = max(numeric_values)
-                    elif stat == 'q1' and 'q1' in stats:
-                        sorted_values = sorted(numeric_values)
-                        q1_pos = len(sorted_values) // 4
-                        data['stats']['q1'] = sorted_values[q1_pos]
-                    elif stat == 'q3' and 'q3' in stats:
-                        sorted_values = sorted(numeric_values)
-                        q3_pos = 3 * len(sorted_values) // 4
-                        data['stats']['q3'] = sorted_values[q3_pos]
-                    elif stat == 'count' and 'count' in stats:
-                        data['stats']['count'] = len(numeric_values)
-                    elif stat == 'missing' and 'missing' in stats:
-                        data['stats']['missing'] = len(values) - len(numeric_values)
-            
-            # 分类变量统计
-            if not numeric_values and values:
-                # 计算分类变量的频率分布
-                category_counts = {}
-                for value in values:
-                    if value in category_counts:
-                        category_counts[value] += 1
-                    else:
-                        category_counts[value] = 1
-                
-                # 计算众数
-                if 'mode' in stats:
-                    mode_value = max(category_counts.items(), key=lambda x: x[1])[0]
-                    data['stats']['mode'] = mode_value
-                
-                # 计数
-                if 'count' in stats:
-                    data['stats']['count'] = len(values)
-            
-            # 删除原始值列表以减少响应大小
-            del data['values']
+        # 每个数据集单独计算各变量的可合并摘要（并行），再合并得到统计结果
+        datasets = {dataset_id: DataSet.query.get(dataset_id) for dataset_id in dataset_ids}
+        fields = variables + ([weight_variable] if weight_variable else [])
+        total_records, results = describe_datasets(
+            lambda dataset_id: load_dataset_columns(datasets[dataset_id], fields),
+            dataset_ids, variables, stats, weight_variable
+        )
         
         return jsonify({
             'success': True,
@@ -5202,17 +5279,31 @@ def admin_delete_dataset(dataset_id):
         for mapping in mappings:
             db.session.delete(mapping)
         
+        # 删除数据集的索引字段登记
+        indexed_fields = DatasetIndexedField.query.filter_by(dataset_id=dataset_id).all()
+        indexed_field_names = [indexed_field.field_name for indexed_field in indexed_fields]
+        for indexed_field in indexed_fields:
+            db.session.delete(indexed_field)
+        
         # 删除所有关联的数据条目 - 即使没有条目也不会出错
         entries = DatasetEntry.query.filter_by(dataset_id=dataset_id).all()
         for entry in entries:
             db.session.delete(entry)
         
+        # 删除数据集的字段统计，数据版本号加一使缓存的结果失效
+        DatasetFieldStat.query.filter_by(dataset_id=dataset_id).delete()
+        DatasetStats.query.filter_by(dataset_id=dataset_id).delete()
+        bump_data_version(session_sqlite_connection(), dataset_id)
+        
         # 保存数据集名称用于反馈信息
         dataset_name = dataset.name
         
         # 删除数据集本身
         db.session.delete(dataset)
         db.session.commit()
+        column_store.invalidate(dataset_id)
+        for field_name in indexed_field_names:
+            release_field_index(field_name)
         
         if is_ajax:
             return jsonify({
@@ -5241,20 +5332,25 @@ def preview_import_data():
     支持以下参数：
     - dataset_id: 数据集ID
     - import_file: 上传的文件
+    - upload_id: 已完成的分块上传ID（代替import_file）
     - has_header: 是否包含表头
+    - preview_rows: 预览行数（默认10，最多100）
+    - sheet_name: Excel工作表名称（默认第一个工作表）
+    
+    CSV文件最多读取开头1MB，超过时总行数为估算值（total_rows_estimated）；
+    Excel文件只解析前几行，并返回全部工作表名称。column_types为根据样本推断的列类型
     
     Returns:
         预览数据的JSON响应
     """
     try:
-        # 检查是否有文件上传
-        if 'import_file' not in request.files:
+        # 检查是否有文件上传（直接上传或已完成的分块上传）
+        file, file_error = request_import_file('import_file')
+        if file is None:
             return jsonify({
                 'success': False,
-                'message': '没有选择文件'
+                'message': file_error
             }), 400
-            
-        file = request.files['import_file']
         
         # 检查文件名是否为空
         if file.filename == '':
@@ -5294,17 +5390,12 @@ def preview_import_data():
                     'message': '没有权限预览此数据集的数据'
                 }), 403
             
-        # 保存文件到临时目录
-        temp_dir = os.path.join(app.config['UPLOAD_FOLDER'], 'temp')
-        os.makedirs(temp_dir, exist_ok=True)
-        temp_file_path = os.path.join(temp_dir, secure_filename(file.filename))
-        file.save(temp_file_path)
-        
-        # 初始化计数器和数据
-        total_rows = 0
-        valid_rows = 0
-        headers = []
-        preview_data = []
+        # 预览行数（最多100行）和Excel工作表
+        try:
+            preview_rows = min(max(int(request.form.get('preview_rows', PREVIEW_ROWS)), 1), MAX_PREVIEW_ROWS)
+        except (TypeError, ValueError):
+            preview_rows = PREVIEW_ROWS
+        sheet_name = request.form.get('sheet_name') or None
         
         # 获取数据集字段
         dataset_fields = []
@@ -5315,121 +5406,47 @@ def preview_import_data():
             except json.JSONDecodeError:
                 print(f"无法解析数据集 {dataset_id} 的自定义字段")
         
-        # 读取文件数据
+        # 读取文件数据：只读取文件开头，耗时与文件大小无关
         try:
             if file_ext == 'csv':
-                # 读取CSV文件
-                import csv
-                
-                # 尝试不同的编码格式
-                encodings = ['utf-8-sig', 'gbk', 'gb2312', 'latin-1']
-                for encoding in encodings:
-                    try:
-                        with open(temp_file_path, 'r', encoding=encoding) as f:
-                            # 读取前几行来检查编码是否正确
-                            sample_content = ''.join([f.readline() for _ in range(5)])
-                        # 如果没有出现编码错误，使用此编码
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                
-                # 使用确定的编码打开文件
-                with open(temp_file_path, 'r', encoding=encoding) as f:
-                    csv_reader = csv.reader(f)
-                    
-                    # 读取表头
-                    if has_header:
-                        headers = next(csv_reader)
-                    else:
-                        # 读取第一行来确定列数
-                        first_row = next(csv_reader)
-                        headers = [f'列{i+1}' for i in range(len(first_row))]
-                        # 重置文件指针
-                        f.seek(0)
-                    
-                    # 如果数据集有自定义字段，使用自定义字段作为表头
-                    if dataset_fields:
-                        display_headers = dataset_fields[:len(headers)]
-                        # 如果自定义字段不够，补充原始表头
-                        if len(display_headers) < len(headers):
-                            display_headers.extend(headers[len(display_headers):])
-                    else:
-                        display_headers = headers
-                    
-                    # 读取前10行作为预览数据
-                    preview_count = 0
-                    max_preview = 10
-                    
-                    for row in csv_reader:
-                        if preview_count >= max_preview:
-                            break
-                        
-                        total_rows += 1
-                        
-                        if len(row) > 0:  # 确保行不为空
-                            preview_data.append(row)
-                            valid_rows += 1
-                            preview_count += 1
-                    
-                    # 继续读取剩余行以计算总行数
-                    for _ in csv_reader:
-                        total_rows += 1
-                
-            elif file_ext in ['xlsx', 'xls']:
-                # 读取Excel文件
-                import pandas as pd
-                
-                # 使用pandas读取Excel
-                df = pd.read_excel(temp_file_path)
-                
-                # 获取总行数
-                total_rows = len(df)
-                
-                # 获取表头
-                if has_header:
-                    headers = df.columns.tolist()
-                else:
-                    headers = [f'列{i+1}' for i in range(len(df.columns))]
-                
-                # 如果数据集有自定义字段，使用自定义字段作为表头
-                if dataset_fields:
-                    display_headers = dataset_fields[:len(headers)]
-                    # 如果自定义字段不够，补充原始表头
-                    if len(display_headers) < len(headers):
-                        display_headers.extend(headers[len(display_headers):])
-                else:
-                    display_headers = headers
-                
-                # 读取前10行作为预览数据
-                preview_df = df.head(10)
-                valid_rows = min(10, total_rows)
-                
-                # 将DataFrame转换为列表
-                preview_data = preview_df.values.tolist()
-                
-            # 删除临时文件
-            try:
-                os.remove(temp_file_path)
-            except:
-                pass
+                preview = preview_csv(file.stream, has_header=has_header, max_rows=preview_rows)
+            else:
+                preview = preview_excel(file.stream, has_header=has_header, max_rows=preview_rows,
+                                        sheet_name=sheet_name)
+            
+            headers = preview['headers']
+            
+            # 如果数据集有自定义字段，使用自定义字段作为表头
+            if dataset_fields:
+                display_headers = dataset_fields[:len(headers)]
+                # 如果自定义字段不够，补充原始表头
+                if len(display_headers) < len(headers):
+                    display_headers.extend(headers[len(display_headers):])
+            else:
+                display_headers = headers
+            
+            valid_rows = len(preview['preview_data'])
             
             # 返回预览数据
-            return jsonify({
+            result = {
                 'success': True,
                 'headers': display_headers,
-                'preview_data': preview_data,
-                'total_rows': total_rows,
+                'source_headers': headers,
+                'column_types': preview['column_types'],
+                'preview_data': preview['preview_data'],
+                'total_rows': preview['total_rows'],
+                'total_rows_estimated': preview['total_rows_estimated'],
                 'valid_rows': valid_rows,
                 'new_records': valid_rows  # 假设所有有效行都是新记录
-            })
+            }
+            if file_ext == 'csv':
+                result['encoding'] = preview['encoding']
+            else:
+                result['sheet_names'] = preview['sheet_names']
+                result['sheet_name'] = preview['sheet_name']
+            return jsonify(result)
             
         except Exception as e:
-            # 删除临时文件
-            try:
-                os.remove(temp_file_path)
-            except:
-                pass
-            
             print(f"预览导入数据时出错: {str(e)}")
             return jsonify({
                 'success': False,
@@ -5537,7 +5554,12 @@ def hypothesis_test_analysis():
         "variables": ["age", "bmi"],  // 要检验的变量列表
         "group_variable": "gender",  // 分组变量（对于需要分组的检验）
         "alpha": 0.05,  // 显著性水平
-        "hypothesis": "two-sided"  // 假设类型：two-sided, greater, less
+        "hypothesis": "two-sided",  // 假设类型：two-sided, greater, less（greater为第一组大于第二组）
+        "pairs": [["sbp_before", "sbp_after"]],  // 可选，配对t检验的变量对，默认按variables顺序两两配对
+        "equal_var": true,  // 可选，t检验是否假设方差齐性，false时使用Welch校正
+        "n_resamples": 1000,  // 可选，重抽样次数，默认0（不做重抽样）
+        "resampling_method": "permutation",  // 可选，permutation（置换检验p值）或bootstrap（效应量置信区间，默认）
+        "seed": 42  // 可选，重抽样随机种子，默认0
     }
     
     Returns:
@@ -5575,6 +5597,13 @@ def hypothesis_test_analysis():
         group_variable = request_data.get('group_variable')
         alpha = request_data.get('alpha', 0.05)
         hypothesis = request_data.get('hypothesis', 'two-sided')
+        pairs = request_data.get('pairs')
+        equal_var = request_data.get('equal_var', True)
+        
+        # 配对t检验只指定了变量对时，由变量对得到变量列表
+        if pairs and not variables and isinstance(pairs, list):
+            variables = list(dict.fromkeys(
+                variable for pair in pairs if isinstance(pair, list) for variable in pair))
         
         current_app.logger.info(f"解析请求参数 - 数据集ID: {dataset_id}, 检验类型: {test_type}, "
                                f"变量: {variables}, 分组变量: {group_variable}, "
@@ -5600,11 +5629,29 @@ def hypothesis_test_analysis():
             }), 400
             
         # 对于需要分组变量的检验类型，检查是否提供了分组变量
-        needs_group_var = test_type in ['ttest', 'anova', 'chi2', 'fisher', 'wilcoxon', 'kruskal']
+        needs_group_var = test_type in GROUPED_TESTS
         if needs_group_var and not group_variable:
             return jsonify({
                 'success': False,
-                'message': '此检验类型需要指定分组变量'
+                'message': '此检验类型需要指定分组变量'
+            }), 400
+            
+        try:
+            alpha = float(alpha)
+        except (TypeError, ValueError):
+            alpha = -1
+        if not 0 < alpha < 1:
+            return jsonify({
+                'success': False,
+                'message': '显著性水平必须在0和1之间'
+            }), 400
+            
+        try:
+            n_resamples, resampling_method, seed = parse_resampling_options(request_data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
             }), 400
             
         # 检查数据集是否存在，并验证访问权限
@@ -5624,274 +5671,34 @@ def hypothesis_test_analysis():
                         'message': f'没有权限访问数据集(ID={dataset_id})'
                     }), 403
         
-        # 获取数据集条目
-        entries = DatasetEntry.query.filter_by(dataset_id=dataset_id).all()
-        if not entries:
+        # 相同数据版本和请求参数的结果直接从缓存返回
+        cache_key = analysis_cache_key(dataset, 'hypothesis', request_data)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return jsonify(cached)
+        
+        # 从列式存储读取所需变量
+        fields = variables + ([group_variable] if needs_group_var else [])
+        if test_type == 'paired_ttest' and isinstance(pairs, list):
+            fields += [variable for pair in pairs if isinstance(pair, list) for variable in pair]
+        columns = load_dataset_columns(dataset, list(dict.fromkeys(fields)))
+        if columns.n_rows == 0:
             return jsonify({
                 'success': False,
                 'message': f'数据集(ID={dataset_id})没有数据条目'
             }), 404
             
-        # 提取数据
-        data = {}
-        for variable in variables:
-            data[variable] = []
-            
-        if group_variable:
-            data[group_variable] = []
-            
-        # 从所有条目中提取所需变量的值
-        for entry in entries:
-            try:
-                entry_data = json.loads(entry.data)
-                for variable in variables:
-                    if variable in entry_data:
-                        value = entry_data[variable]
-                        # 尝试将数值型字符串转换为数字
-                        if isinstance(value, str):
-                            try:
-                                if '.' in value:
-                                    value = float(value)
-                                else:
-                                    value = int(value)
-                            except (ValueError, TypeError):
-                                pass
-                        data[variable].append(value)
-                    else:
-                        data[variable].append(None)  # 缺失值
-                        
-                if group_variable and group_variable in entry_data:
-                    value = entry_data[group_variable]
-                    # 对于分组变量，我们保持其原始类型
-                    data[group_variable].append(value)
-                elif group_variable:
-                    data[group_variable].append(None)  # 缺失值
-            except Exception as e:
-                current_app.logger.error(f"处理条目数据时出错: {str(e)}")
-                continue
-                
-        # 准备存储测试结果
-        results = []
-        
-        # 根据检验类型执行相应的统计检验
+        # 所有变量一次整理为矩阵后批量检验
         try:
-            if test_type == 'ttest':
-                # 独立样本t检验
-                for variable in variables:
-                    var_data = {}
-                    group_values = {}
-                    
-                    # 根据分组变量分组数据
-                    for i, group in enumerate(data[group_variable]):
-                        if group not in group_values:
-                            group_values[group] = []
-                            
-                        if i < len(data[variable]) and data[variable][i] is not None and isinstance(data[variable][i], (int, float)):
-                            group_values[group].append(data[variable][i])
-                    
-                    # 只有两组数据才能执行t检验
-                    if len(group_values) != 2:
-                        var_data = {
-                            'variable_id': variable,
-                            'variable_name': variable,
-                            'error': f't检验需要恰好两个组'
-                        }
-                    else:
-                        group_names = list(group_values.keys())
-                        group1_data = group_values[group_names[0]]
-                        group2_data = group_values[group_names[1]]
-                        
-                        if len(group1_data) < 2 or len(group2_data) < 2:
-                            var_data = {
-                                'variable_id': variable,
-                                'variable_name': variable,
-                                'error': f'每组至少需要2个有效数据点进行t检验'
-                            }
-                        else:
-                            # 计算均值
-                            mean1 = sum(group1_data) / len(group1_data)
-                            mean2 = sum(group2_data) / len(group2_data)
-                            
-                            # 计算标准差
-                            var1 = sum((x - mean1) ** 2 for x in group1_data) / (len(group1_data) - 1)
-                            var2 = sum((x - mean2) ** 2 for x in group2_data) / (len(group2_data) - 1)
-                            sd1 = var1 ** 0.5
-                            sd2 = var2 ** 0.5
-                            
-                            # 计算t统计量
-                            # 假设两组方差相等的情况下的t检验
-                            n1 = len(group1_data)
-                            n2 = len(group2_data)
-                            
-                            # 计算合并方差
-                            pooled_var = ((n1 - 1) * var1 + (n2 - 1) * var2) / (n1 + n2 - 2)
-                            pooled_sd = pooled_var ** 0.5
-                            
-                            # 计算t值
-                            t_stat = (mean1 - mean2) / (pooled_sd * ((1/n1 + 1/n2) ** 0.5))
-                            
-                            # 计算自由度
-                            df = n1 + n2 - 2
-                            
-                            # 计算p值（这里简化处理，实际应该使用t分布表或scipy等库）
-                            # 这是一个简化的双尾p值估计
-                            # 实际应用中应使用scipy.stats.t.sf等函数
-                            p_value = 0.05  # 简化处理，实际应通过t分布计算
-                            if abs(t_stat) > 2.0:  # 简单估计，t > 2 通常表示p < 0.05
-                                p_value = 0.04
-                            if abs(t_stat) > 2.6:  # t > 2.6 通常表示p < 0.01
-                                p_value = 0.009
-                            if abs(t_stat) > 3.3:  # t > 3.3 通常表示p < 0.001
-                                p_value = 0.0009
-                                
-                            # 如果是单侧检验，调整p值
-                            if hypothesis != 'two-sided':
-                                p_value = p_value / 2
-                                if hypothesis == 'greater' and t_stat < 0:
-                                    p_value = 1 - p_value
-                                elif hypothesis == 'less' and t_stat > 0:
-                                    p_value = 1 - p_value
-                            
-                            # 判断是否显著
-                            significant = p_value < alpha
-                            
-                            # 计算95%置信区间
-                            # 简化处理，使用t=2作为近似
-                            margin = 2 * pooled_sd * ((1/n1 + 1/n2) ** 0.5)
-                            ci_lower = mean1 - mean2 - margin
-                            ci_upper = mean1 - mean2 + margin
-                            
-                            var_data = {
-                                'variable_id': variable,
-                                'variable_name': variable,
-                                'group1_name': group_names[0],
-                                'group1_n': n1,
-                                'group1_mean': mean1,
-                                'group1_sd': sd1,
-                                'group2_name': group_names[1],
-                                'group2_n': n2,
-                                'group2_mean': mean2,
-                                'group2_sd': sd2,
-                                'mean_diff': mean1 - mean2,
-                                'statistic': t_stat,
-                                'df': df,
-                                'p_value': p_value,
-                                'significant': significant,
-                                'confidence_interval': [ci_lower, ci_upper]
-                            }
-                    
-                    results.append(var_data)
-                    
-            elif test_type == 'chi2':
-                # 卡方检验（分类变量的独立性检验）
-                for variable in variables:
-                    var_data = {}
-                    contingency_table = {}
-                    
-                    # 构建列联表
-                    for i, group in enumerate(data[group_variable]):
-                        if group not in contingency_table:
-                            contingency_table[group] = {}
-                            
-                        if i < len(data[variable]):
-                            var_value = data[variable][i]
-                            if var_value not in contingency_table[group]:
-                                contingency_table[group][var_value] = 0
-                            contingency_table[group][var_value] += 1
-                    
-                    # 转换为二维数组
-                    group_names = list(contingency_table.keys())
-                    var_values = set()
-                    for group in contingency_table:
-                        var_values.update(contingency_table[group].keys())
-                    var_values = list(var_values)
-                    
-                    # 构建矩阵
-                    matrix = []
-                    for group in group_names:
-                        row = []
-                        for val in var_values:
-                            row.append(contingency_table[group].get(val, 0))
-                        matrix.append(row)
-                    
-                    # 计算卡方统计量
-                    # 简化版本的卡方计算
-                    row_sums = [sum(row) for row in matrix]
-                    col_sums = [sum(matrix[i][j] for i in range(len(matrix))) for j in range(len(var_values))]
-                    total = sum(row_sums)
-                    
-                    chi2 = 0
-                    df = (len(group_names) - 1) * (len(var_values) - 1)
-                    
-                    for i in range(len(group_names)):
-                        for j in range(len(var_values)):
-                            observed = matrix[i][j]
-                            expected = row_sums[i] * col_sums[j] / total
-                            if expected > 0:  # 避免除以零
-                                chi2 += ((observed - expected) ** 2) / expected
-                    
-                    # 简化的p值估计
-                    # 实际应用中应使用scipy.stats.chi2.sf
-                    p_value = 0.05  # 默认值
-                    
-                    # 根据自由度近似估计p值
-                    if df == 1:
-                        if chi2 > 3.84:
-                            p_value = 0.04
-                        if chi2 > 6.63:
-                            p_value = 0.009
-                        if chi2 > 10.83:
-                            p_value = 0.0009
-                    elif df == 2:
-                        if chi2 > 5.99:
-                            p_value = 0.04
-                        if chi2 > 9.21:
-                            p_value = 0.009
-                        if chi2 > 13.82:
-                            p_value = 0.0009
-                    elif df == 3:
-                        if chi2 > 7.81:
-                            p_value = 0.04
-                        if chi2 > 11.34:
-                            p_value = 0.009
-                        if chi2 > 16.27:
-                            p_value = 0.0009
-                    else:
-                        # 其他自由度使用近似值
-                        if chi2 > df + 1.96 * (2 * df) ** 0.5:
-                            p_value = 0.04
-                        if chi2 > df + 2.58 * (2 * df) ** 0.5:
-                            p_value = 0.009
-                        if chi2 > df + 3.29 * (2 * df) ** 0.5:
-                            p_value = 0.0009
-                    
-                    # 判断是否显著
-                    significant = p_value < alpha
-                    
-                    var_data = {
-                        'variable_id': variable,
-                        'variable_name': variable,
-                        'statistic': chi2,
-                        'df': df,
-                        'p_value': p_value,
-                        'significant': significant,
-                        'contingency_table': {
-                            'group_names': group_names,
-                            'var_values': var_values,
-                            'matrix': matrix
-                        }
-                    }
-                    
-                    results.append(var_data)
-                    
-            # 其他检验类型可以类似实现
-            # 实际应用中应使用scipy.stats等专业统计库
-            else:
-                return jsonify({
-                    'success': False,
-                    'message': f'未实现的检验类型: {test_type}'
-                }), 400
-                
+            results = run_hypothesis_test(columns, test_type, variables, group_variable, alpha,
+                                          hypothesis, pairs=pairs, equal_var=equal_var,
+                                          n_resamples=n_resamples, resampling_method=resampling_method,
+                                          seed=seed)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
         except Exception as e:
             current_app.logger.error(f"执行统计检验时出错: {str(e)}")
             return jsonify({
@@ -5909,7 +5716,10 @@ def hypothesis_test_analysis():
             'hypothesis': hypothesis,
             'results': results
         }
+        if n_resamples > 0:
+            response_data['resampling'] = resampling_summary(resampling_method, n_resamples, seed)
         
+        result_cache.put(cache_key, response_data)
         return jsonify(response_data)
         
     except Exception as e:
@@ -5932,7 +5742,11 @@ def correlation_analysis():
         "dataset_id": 1,  // 数据集ID
         "correlation_type": "pearson",  // 相关系数类型：pearson, spearman, kendall, point_biserial
         "variables": ["age", "bmi", "glucose"],  // 要分析的变量列表
-        "significance_test": true  // 是否进行显著性检验
+        "significance_test": true,  // 是否进行显著性检验
+        "missing": "listwise",  // 可选，缺失值处理：listwise（删除含缺失值的行）, pairwise（按变量对删除）
+        "n_resamples": 1000,  // 可选，重抽样次数，默认0（不做重抽样）
+        "resampling_method": "bootstrap",  // 可选，bootstrap（相关系数置信区间，默认）或permutation（置换检验p值）
+        "seed": 42  // 可选，重抽样随机种子，默认0
     }
     
     Returns:
@@ -5968,6 +5782,7 @@ def correlation_analysis():
         correlation_type = request_data.get('correlation_type', 'pearson')
         variables = request_data.get('variables', [])
         significance_test = request_data.get('significance_test', False)
+        missing = request_data.get('missing', 'listwise')
         
         current_app.logger.info(f"解析请求参数 - 数据集ID: {dataset_id}, 相关系数类型: {correlation_type}, "
                                f"变量: {variables}, 显著性检验: {significance_test}")
@@ -5991,6 +5806,20 @@ def correlation_analysis():
                 'message': '至少需要指定两个变量进行相关性分析'
             }), 400
             
+        if missing not in MISSING_POLICIES:
+            return jsonify({
+                'success': False,
+                'message': f'不支持的缺失值处理方式: {missing}'
+            }), 400
+            
+        try:
+            n_resamples, resampling_method, seed = parse_resampling_options(request_data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+            
         # 检查数据集是否存在，并验证访问权限
         dataset = DataSet.query.get(dataset_id)
         if not dataset:
@@ -6008,66 +5837,20 @@ def correlation_analysis():
                         'message': f'没有权限访问数据集(ID={dataset_id})'
                     }), 403
         
-        # 获取数据集条目
-        entries = DatasetEntry.query.filter_by(dataset_id=dataset_id).all()
-        if not entries:
+        # 相同数据版本和请求参数的结果直接从缓存返回
+        cache_key = analysis_cache_key(dataset, 'correlation', request_data)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return jsonify(cached)
+        
+        # 从列式存储读取所需变量
+        columns = load_dataset_columns(dataset, variables)
+        if columns.n_rows == 0:
             return jsonify({
                 'success': False,
                 'message': f'数据集(ID={dataset_id})没有数据条目'
             }), 404
             
-        # 提取数据
-        data = {}
-        for variable in variables:
-            data[variable] = []
-            
-        # 从所有条目中提取所需变量的值
-        for entry in entries:
-            try:
-                entry_data = json.loads(entry.data)
-                for variable in variables:
-                    if variable in entry_data:
-                        value = entry_data[variable]
-                        # 尝试将数值型字符串转换为数字
-                        if isinstance(value, str):
-                            try:
-                                if '.' in value:
-                                    value = float(value)
-                                else:
-                                    value = int(value)
-                            except (ValueError, TypeError):
-                                pass
-                        data[variable].append(value)
-                    else:
-                        data[variable].append(None)  # 缺失值
-            except Exception as e:
-                current_app.logger.error(f"处理条目数据时出错: {str(e)}")
-                continue
-                
-        # 数据预处理：移除包含缺失值的观测
-        valid_indices = set(range(len(entries)))
-        for variable in variables:
-            for i, value in enumerate(data[variable]):
-                if value is None or not isinstance(value, (int, float)):
-                    if i in valid_indices:
-                        valid_indices.remove(i)
-        
-        # 创建过滤后的数据
-        filtered_data = {}
-        for variable in variables:
-            filtered_data[variable] = [data[variable][i] for i in valid_indices]
-        
-        # 检查是否有足够的数据点
-        if len(valid_indices) < 3:
-            return jsonify({
-                'success': False,
-                'message': f'没有足够的数据点进行相关性分析(仅有{len(valid_indices)}个有效观测)'
-            }), 400
-            
-        # 计算相关系数矩阵
-        correlation_matrix = []
-        p_values = [] if significance_test else None
-        
         # 变量名称列表
         variable_info = []
         for var in variables:
@@ -6088,50 +5871,33 @@ def correlation_analysis():
                 'type': var_type
             })
             
-        # 根据相关系数类型执行相应的计算
-        for i, var1 in enumerate(variables):
-            correlation_matrix.append([])
-            if significance_test:
-                p_values.append([])
-                
-            for j, var2 in enumerate(variables):
-                if i == j:
-                    # 变量与自身的相关系数为1，p值为0
-                    correlation_matrix[i].append(1.0)
-                    if significance_test:
-                        p_values[i].append(0.0)
-                elif j < i:
-                    # 复制下三角矩阵的值到上三角矩阵
-                    correlation_matrix[i].append(correlation_matrix[j][i])
-                    if significance_test:
-                        p_values[i].append(p_values[j][i])
-                else:
-                    # 计算相关系数
-                    x = filtered_data[var1]
-                    y = filtered_data[var2]
-                    
-                    if correlation_type == 'pearson':
-                        r, p = calculate_pearson_correlation(x, y)
-                    elif correlation_type == 'spearman':
-                        r, p = calculate_spearman_correlation(x, y)
-                    else:
-                        # 默认使用Pearson相关系数
-                        r, p = calculate_pearson_correlation(x, y)
-                        
-                    correlation_matrix[i].append(r)
-                    if significance_test:
-                        p_values[i].append(p)
+        # 一次计算整个相关系数矩阵
+        try:
+            result = correlation_matrix(columns, variables, correlation_type, missing,
+                                        significance_test=bool(significance_test),
+                                        n_resamples=n_resamples, resampling_method=resampling_method,
+                                        seed=seed)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
         
         # 构建响应
         response_data = {
             'success': True,
             'correlation_type': correlation_type,
             'variables': variable_info,
-            'correlation_matrix': correlation_matrix,
-            'p_values': p_values,
-            'n': len(valid_indices)  # 样本量
+            'correlation_matrix': result['matrix'],
+            'p_values': result['p_values'],
+            'missing': missing,
+            'n_matrix': result['n_matrix'],  # 每对变量的有效样本量
+            'n': result['n']  # 样本量
         }
+        if 'resampling' in result:
+            response_data['resampling'] = result['resampling']
         
+        result_cache.put(cache_key, response_data)
         return jsonify(response_data)
         
     except Exception as e:
@@ -6142,111 +5908,6 @@ def correlation_analysis():
         }), 500
 
 
-def calculate_pearson_correlation(x, y):
-    """计算Pearson相关系数及其p值
-    
-    Args:
-        x: 第一个变量的值列表
-        y: 第二个变量的值列表
-        
-    Returns:
-        tuple: (相关系数, p值)
-    """
-    # 样本量
-    n = len(x)
-    
-    # 计算均值
-    mean_x = sum(x) / n
-    mean_y = sum(y) / n
-    
-    # 计算协方差和标准差
-    cov_xy = sum((x[i] - mean_x) * (y[i] - mean_y) for i in range(n))
-    var_x = sum((val - mean_x) ** 2 for val in x)
-    var_y = sum((val - mean_y) ** 2 for val in y)
-    
-    # 计算相关系数
-    if var_x == 0 or var_y == 0:
-        return 0, 1.0  # 如果某个变量没有变异性，相关系数为0
-    
-    r = cov_xy / (var_x ** 0.5 * var_y ** 0.5)
-    
-    # 计算t统计量
-    t = r * ((n - 2) / (1 - r**2)) ** 0.5
-    
-    # 计算p值（近似值）
-    # 实际应用中应使用t分布的累积分布函数
-    p = 0.05  # 默认值
-    if abs(t) > 2.0:  # 简单估计，|t| > 2 通常表示p < 0.05
-        p = 0.04
-    if abs(t) > 2.6:  # |t| > 2.6 通常表示p < 0.01
-        p = 0.009
-    if abs(t) > 3.3:  # |t| > 3.3 通常表示p < 0.001
-        p = 0.0009
-    
-    return r, p
-
-
-def calculate_spearman_correlation(x, y):
-    """计算Spearman等级相关系数及其p值
-    
-    Args:
-        x: 第一个变量的值列表
-        y: 第二个变量的值列表
-        
-    Returns:
-        tuple: (相关系数, p值)
-    """
-    # 样本量
-    n = len(x)
-    
-    # 计算等级
-    def rank_values(values):
-        # 排序并分配等级
-        sorted_with_index = sorted((val, idx) for idx, val in enumerate(values))
-        ranks = [0] * len(values)
-        
-        # 处理平局
-        i = 0
-        while i < len(sorted_with_index):
-            j = i
-            while j < len(sorted_with_index) - 1 and sorted_with_index[j][0] == sorted_with_index[j + 1][0]:
-                j += 1
-                
-            # 如果有平局，分配平均等级
-            if j > i:
-                avg_rank = sum(k + 1 for k in range(i, j + 1)) / (j - i + 1)
-                for k in range(i, j + 1):
-                    ranks[sorted_with_index[k][1]] = avg_rank
-                i = j + 1
-            else:
-                ranks[sorted_with_index[i][1]] = i + 1
-                i += 1
-                
-        return ranks
-    
-    rank_x = rank_values(x)
-    rank_y = rank_values(y)
-    
-    # 计算等级的差异
-    d_squared_sum = sum((rank_x[i] - rank_y[i]) ** 2 for i in range(n))
-    
-    # 计算Spearman相关系数
-    rho = 1 - (6 * d_squared_sum) / (n * (n**2 - 1))
-    
-    # 计算t统计量
-    t = rho * ((n - 2) / (1 - rho**2)) ** 0.5
-    
-    # 计算p值（近似值）
-    p = 0.05  # 默认值
-    if abs(t) > 2.0:  # 简单估计，|t| > 2 通常表示p < 0.05
-        p = 0.04
-    if abs(t) > 2.6:  # |t| > 2.6 通常表示p < 0.01
-        p = 0.009
-    if abs(t) > 3.3:  # |t| > 3.3 通常表示p < 0.001
-        p = 0.0009
-    
-    return rho, p
-
 @app.route('/api/analysis/survival', methods=['POST', 'OPTIONS'])
 @csrf.exempt
 @login_required
@@ -6259,10 +5920,20 @@ def survival_analysis():
     {
         "dataset_id": 1,  // 数据集ID
         "survival_method": "kaplan_meier",  // 分析方法：kaplan_meier, cox_regression
-        "time_variable": "survival_time",  // 时间变量
+        "time_variable": "survival_time",  // 时间变量（计数过程数据为区间的结束时间）
+        "start_variable": "start_time",  // 可选，区间的开始时间（计数过程数据，仅Cox回归）
         "event_variable": "event_status",  // 事件变量（0=censored, 1=event）
         "group_variable": "treatment_group",  // 可选的分组变量
-        "covariates": ["age", "gender"]  // 可选的协变量（Cox回归时使用）
+        "covariates": ["age", "gender"],  // 可选的协变量（Cox回归时使用）
+        "strata": "center",  // 可选的分层变量（分层Log-rank检验或分层Cox回归）
+        "rho": 0, "gamma": 0,  // 可选，Fleming-Harrington加权Log-rank检验的权重参数
+        "confidence_level": 0.95,  // 可选，生存曲线和风险比置信区间的置信水平
+        "ties": "efron",  // 可选，Cox回归中同时发生事件的处理方式：efron, breslow
+        "n_resamples": 200,  // 可选，重抽样次数，默认0（不做重抽样）
+        "resampling_method": "bootstrap",  // 可选，bootstrap（中位生存时间、Cox回归系数和C-index的置信区间，默认）
+                                           // 或permutation（分组Kaplan-Meier的置换Log-rank检验）
+        "seed": 42,  // 可选，重抽样随机种子，默认0
+        "auc_times": [90, 180, 365]  // 可选，Cox回归时间依赖AUC的评估时间点
     }
     
     Returns:
@@ -6297,9 +5968,12 @@ def survival_analysis():
         dataset_id = request_data.get('dataset_id')
         survival_method = request_data.get('survival_method', 'kaplan_meier')
         time_variable = request_data.get('time_variable')
+        start_variable = request_data.get('start_variable')
         event_variable = request_data.get('event_variable')
         group_variable = request_data.get('group_variable')
         covariates = request_data.get('covariates', [])
+        strata_variable = request_data.get('strata')
+        ties = request_data.get('ties', 'efron')
         
         current_app.logger.info(f"解析请求参数 - 数据集ID: {dataset_id}, 分析方法: {survival_method}, "
                                f"时间变量: {time_variable}, 事件变量: {event_variable}, "
@@ -6324,6 +5998,53 @@ def survival_analysis():
                 'message': '未指定事件变量'
             }), 400
             
+        try:
+            rho = float(request_data.get('rho', 0) or 0)
+            gamma = float(request_data.get('gamma', 0) or 0)
+            confidence_level = float(request_data.get('confidence_level', 0.95))
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': 'rho、gamma和confidence_level必须是数值'
+            }), 400
+        if rho < 0 or gamma < 0 or not 0 < confidence_level < 1:
+            return jsonify({
+                'success': False,
+                'message': 'rho和gamma不能为负数，confidence_level必须在0和1之间'
+            }), 400
+        if start_variable and survival_method != 'cox_regression':
+            return jsonify({
+                'success': False,
+                'message': '计数过程数据（start_variable）仅支持Cox回归'
+            }), 400
+        if ties not in TIES_METHODS:
+            return jsonify({
+                'success': False,
+                'message': f'不支持的结处理方式: {ties}，可选: {", ".join(TIES_METHODS)}'
+            }), 400
+        try:
+            auc_times = request_data.get('auc_times')
+            if auc_times is not None:
+                auc_times = [float(t) for t in auc_times]
+        except (TypeError, ValueError):
+            return jsonify({
+                'success': False,
+                'message': 'auc_times必须是数值列表'
+            }), 400
+        try:
+            n_resamples, resampling_method, seed = parse_resampling_options(request_data)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'message': str(e)
+            }), 400
+        if n_resamples > 0 and resampling_method == 'permutation' and (
+                survival_method != 'kaplan_meier' or not group_variable):
+            return jsonify({
+                'success': False,
+                'message': '置换检验仅用于分组Kaplan-Meier分析的组间比较，其他分析请使用bootstrap'
+            }), 400
+            
         # 检查数据集是否存在，并验证访问权限
         dataset = DataSet.query.get(dataset_id)
         if not dataset:
@@ -6341,125 +6062,49 @@ def survival_analysis():
                         'message': f'没有权限访问数据集(ID={dataset_id})'
                     }), 403
         
-        # 获取数据集条目
-        entries = DatasetEntry.query.filter_by(dataset_id=dataset_id).all()
-        if not entries:
+        # 相同数据版本和请求参数的结果直接从缓存返回
+        cache_key = analysis_cache_key(dataset, 'survival', request_data)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return jsonify(cached)
+        
+        # 从列式存储读取所需变量
+        columns = load_dataset_columns(
+            dataset,
+            [time_variable, event_variable] + ([start_variable] if start_variable else [])
+            + ([group_variable] if group_variable else [])
+            + ([strata_variable] if strata_variable else []) + list(covariates)
+        )
+        if columns.n_rows == 0:
             return jsonify({
                 'success': False,
                 'message': f'数据集(ID={dataset_id})没有数据条目'
             }), 404
             
-        # 提取数据
-        data = {}
-        data[time_variable] = []
-        data[event_variable] = []
-        
-        if group_variable:
-            data[group_variable] = []
-            
-        for cov in covariates:
-            data[cov] = []
-            
-        # 从所有条目中提取所需变量的值
-        for entry in entries:
-            try:
-                entry_data = json.loads(entry.data)
-                
-                # 提取时间变量
-                if time_variable in entry_data:
-                    time_value = entry_data[time_variable]
-                    # 尝试将数值型字符串转换为数字
-                    if isinstance(time_value, str):
-                        try:
-                            time_value = float(time_value)
-                        except (ValueError, TypeError):
-                            time_value = None
-                    data[time_variable].append(time_value)
-                else:
-                    data[time_variable].append(None)
-                
-                # 提取事件变量
-                if event_variable in entry_data:
-                    event_value = entry_data[event_variable]
-                    # 尝试将事件变量转换为二元值(0或1)
-                    if isinstance(event_value, str):
-                        if event_value.lower() in ['1', 'true', 'yes', 'y']:
-                            event_value = 1
-                        elif event_value.lower() in ['0', 'false', 'no', 'n']:
-                            event_value = 0
-                        else:
-                            try:
-                                event_value = int(float(event_value))
-                            except (ValueError, TypeError):
-                                event_value = None
-                    elif isinstance(event_value, bool):
-                        event_value = 1 if event_value else 0
-                    data[event_variable].append(event_value)
-                else:
-                    data[event_variable].append(None)
-                
-                # 提取分组变量
-                if group_variable and group_variable in entry_data:
-                    group_value = entry_data[group_variable]
-                    data[group_variable].append(group_value)
-                elif group_variable:
-                    data[group_variable].append(None)
-                
-                # 提取协变量
-                for cov in covariates:
-                    if cov in entry_data:
-                        cov_value = entry_data[cov]
-                        # 尝试将数值型字符串转换为数字
-                        if isinstance(cov_value, str):
-                            try:
-                                if '.' in cov_value:
-                                    cov_value = float(cov_value)
-                                else:
-                                    cov_value = int(cov_value)
-                            except (ValueError, TypeError):
-                                pass
-                        data[cov].append(cov_value)
-                    else:
-                        data[cov].append(None)
-                        
-            except Exception as e:
-                current_app.logger.error(f"处理条目数据时出错: {str(e)}")
-                continue
-                
-        # 数据预处理：移除包含缺失值的观测
-        valid_indices = set(range(len(entries)))
-        
-        # 时间变量和事件变量必须有效
-        for i, (time_value, event_value) in enumerate(zip(data[time_variable], data[event_variable])):
-            if time_value is None or event_value is None or not isinstance(time_value, (int, float)) or not isinstance(event_value, (int, float)):
-                if i in valid_indices:
-                    valid_indices.remove(i)
+        # 整理为数组：时间转换为数值，事件转换为1/0，无法解析的值为NaN
+        time_values = columns.numeric(time_variable)
+        event_values = event_indicator(columns.raw(event_variable))
         
-        # 分组变量处理（如果存在）
+        # 时间变量和事件变量必须有效，分组变量和分层变量不能缺失
+        valid = np.isfinite(time_values) & ~np.isnan(event_values)
+        if start_variable:
+            start_values = columns.numeric(start_variable)
+            valid &= np.isfinite(start_values)
         if group_variable:
-            for i, value in enumerate(data[group_variable]):
-                if value is None:
-                    if i in valid_indices:
-                        valid_indices.remove(i)
+            valid &= group_codes(columns.raw(group_variable))[0] >= 0
+        if strata_variable:
+            valid &= group_codes(columns.raw(strata_variable))[0] >= 0
         
         # 协变量处理（Cox回归时需要）
         if survival_method == 'cox_regression':
             for cov in covariates:
-                for i, value in enumerate(data[cov]):
-                    if value is None:
-                        if i in valid_indices:
-                            valid_indices.remove(i)
+                valid &= np.fromiter((value is not None for value in columns.raw(cov)),
+                                     dtype=bool, count=columns.n_rows)
         
-        # 创建过滤后的数据
-        filtered_data = {}
-        filtered_data[time_variable] = [data[time_variable][i] for i in valid_indices]
-        filtered_data[event_variable] = [data[event_variable][i] for i in valid_indices]
-        
-        if group_variable:
-            filtered_data[group_variable] = [data[group_variable][i] for i in valid_indices]
-            
-        for cov in covariates:
-            filtered_data[cov] = [data[cov][i] for i in valid_indices]
+        valid_indices = np.flatnonzero(valid)
+        time_values = time_values[valid_indices]
+        event_values = event_values[valid_indices]
+        start_values = start_values[valid_indices] if start_variable else None
         
         # 检查是否有足够的数据点
         if len(valid_indices) < 5:  # 至少需要5个观测
@@ -6472,21 +6117,29 @@ def survival_analysis():
         try:
             if survival_method == 'kaplan_meier':
                 # 执行Kaplan-Meier生存曲线分析
+                strata_codes = None
+                if strata_variable:
+                    strata_codes = group_codes(columns.raw(strata_variable)[valid_indices])[0]
                 if group_variable:
                     # 分组生存分析
-                    survival_results = perform_kaplan_meier_grouped(
-                        filtered_data, 
-                        time_variable, 
-                        event_variable, 
-                        group_variable
+                    codes, group_names = group_codes(columns.raw(group_variable)[valid_indices])
+                    survival_results = kaplan_meier_grouped(
+                        time_values,
+                        event_values,
+                        codes,
+                        group_names,
+                        strata=strata_codes,
+                        rho=rho,
+                        gamma=gamma,
+                        confidence_level=confidence_level,
+                        n_resamples=n_resamples,
+                        resampling_method=resampling_method,
+                        seed=seed
                     )
                 else:
                     # 单组生存分析
-                    survival_results = perform_kaplan_meier(
-                        filtered_data, 
-                        time_variable, 
-                        event_variable
-                    )
+                    survival_results = kaplan_meier(time_values, event_values, confidence_level,
+                                                    n_resamples=n_resamples, seed=seed)
             elif survival_method == 'cox_regression':
                 if not covariates:
                     return jsonify({
@@ -6495,13 +6148,32 @@ def survival_analysis():
                     }), 400
                     
                 # 执行Cox回归分析
-                survival_results = perform_cox_regression(
-                    filtered_data, 
-                    time_variable, 
-                    event_variable, 
-                    covariates,
-                    group_variable
-                )
+                # 分层Cox回归：各层有各自的基线风险
+                strata_codes = None
+                if strata_variable:
+                    strata_codes = group_codes(columns.raw(strata_variable)[valid_indices])[0]
+                try:
+                    X, names, covariate_types = design_matrix(columns, covariates, valid_indices)
+                    survival_results = cox_regression(time_values, event_values, X, names,
+                                                      ties=ties, confidence_level=confidence_level,
+                                                      start=start_values, strata=strata_codes,
+                                                      n_resamples=n_resamples, auc_times=auc_times,
+                                                      seed=seed)
+                except ValueError as e:
+                    return jsonify({
+                        'success': False,
+                        'message': str(e)
+                    }), 400
+                survival_results['covariate_types'] = covariate_types
+                
+                # 如果有分组变量，使用Kaplan-Meier方法估计各组生存曲线
+                # （计数过程数据中同一患者有多个区间，不适用）
+                if group_variable and not start_variable:
+                    codes, group_names = group_codes(columns.raw(group_variable)[valid_indices])
+                    survival_results['group_survival'] = kaplan_meier_grouped(
+                        time_values, event_values, codes, group_names,
+                        confidence_level=confidence_level
+                    )
             else:
                 return jsonify({
                     'success': False,
@@ -6530,6 +6202,13 @@ def survival_analysis():
             'results': survival_results
         }
         
+        # 添加开始时间变量信息（计数过程数据）
+        if start_variable:
+            response_data['start_variable'] = {
+                'id': start_variable,
+                'name': start_variable
+            }
+        
         # 添加分组变量信息（如果存在）
         if group_variable:
             response_data['group_variable'] = {
@@ -6540,7 +6219,17 @@ def survival_analysis():
         # 添加协变量信息（如果存在）
         if covariates:
             response_data['covariates'] = [{'id': cov, 'name': cov} for cov in covariates]
+            
+        if strata_variable:
+            response_data['strata'] = {
+                'id': strata_variable,
+                'name': strata_variable
+            }
+        
+        if n_resamples > 0:
+            response_data['resampling'] = resampling_summary(resampling_method, n_resamples, seed)
         
+        result_cache.put(cache_key, response_data)
         return jsonify(response_data)
         
     except Exception as e:
@@ -6551,452 +6240,88 @@ def survival_analysis():
         }), 500
 
 
-def perform_kaplan_meier(data, time_variable, event_variable):
-    """执行Kaplan-Meier生存曲线分析（单组）
-    
-    Args:
-        data: 包含时间和事件变量的数据字典
-        time_variable: 时间变量名
-        event_variable: 事件变量名（0=censored, 1=event）
-        
-    Returns:
-        dict: 生存分析结果
-    """
-    # 获取时间和事件数据
-    times = data[time_variable]
-    events = data[event_variable]
-    
-    # 按时间排序
-    sorted_indices = sorted(range(len(times)), key=lambda i: times[i])
-    sorted_times = [times[i] for i in sorted_indices]
-    sorted_events = [events[i] for i in sorted_indices]
-    
-    # 计算生存曲线
-    unique_times = []
-    survival_probs = []
-    at_risk = []
-    censored = []
-    events_count = []
-    
-    n_total = len(sorted_times)
-    current_at_risk = n_total
-    current_survival = 1.0
-    
-    i = 0
-    while i < len(sorted_times):
-        current_time = sorted_times[i]
-        
-        # 统计在当前时间点发生的事件和删失数
-        events_at_time = 0
-        censored_at_time = 0
-        
-        while i < len(sorted_times) and sorted_times[i] == current_time:
-            if sorted_events[i] == 1:
-                events_at_time += 1
-            else:
-                censored_at_time += 1
-            i += 1
-        
-        # 更新生存概率（如果有事件发生）
-        if events_at_time > 0:
-            current_survival *= (1 - events_at_time / current_at_risk)
-            
-            # 添加到结果列表
-            unique_times.append(current_time)
-            survival_probs.append(current_survival)
-            at_risk.append(current_at_risk)
-            censored.append(censored_at_time)
-            events_count.append(events_at_time)
-        
-        # 更新风险集大小
-        current_at_risk -= (events_at_time + censored_at_time)
-    
-    # 计算中位生存时间
-    median_survival = None
-    for i, prob in enumerate(survival_probs):
-        if prob <= 0.5:
-            if i == 0:
-                median_survival = unique_times[i]
-            else:
-                # 线性插值计算中位生存时间
-                prev_time = unique_times[i-1]
-                prev_prob = survival_probs[i-1]
-                current_time = unique_times[i]
-                current_prob = prob
-                
-                median_survival = prev_time + (current_time - prev_time) * \
-                                 (0.5 - prev_prob) / (current_prob - prev_prob)
-            break
-    
-    # 计算简单的生存率统计
-    survival_rates = {}
-    for milestone in [30, 60, 90, 180, 365]:  # 30天，60天，90天，180天，1年
-        rate = None
-        for i, time in enumerate(unique_times):
-            if time >= milestone:
-                if i == 0:
-                    rate = survival_probs[i]
-                else:
-                    # 找到最接近里程碑的时间点
-                    if abs(unique_times[i-1] - milestone) < abs(time - milestone):
-                        rate = survival_probs[i-1]
-                    else:
-                        rate = survival_probs[i]
-                break
-            elif i == len(unique_times) - 1:  # 如果所有时间点都小于里程碑
-                rate = survival_probs[i]
-        
-        if rate is not None:
-            survival_rates[str(milestone)] = rate
-    
-    # 构建结果
-    results = {
-        'survival_curve': [
-            {
-                'time': time,
-                'survival': prob,
-                'at_risk': at_risk[i],
-                'events': events_count[i],
-                'censored': censored[i]
-            }
-            for i, (time, prob) in enumerate(zip(unique_times, survival_probs))
-        ],
-        'median_survival': median_survival,
-        'survival_rates': survival_rates,
-        'total_events': sum(events),
-        'total_censored': len(events) - sum(events),
-        'total_subjects': len(events)
-    }
-    
-    return results
+# 初始化风险评估API和结局预测API
+setup_risk_assessment_api(app, csrf)
+setup_outcome_prediction_api(app, csrf)
 
 
-def perform_kaplan_meier_grouped(data, time_variable, event_variable, group_variable):
-    """执行分组Kaplan-Meier生存曲线分析
-    
-    Args:
-        data: 包含时间、事件和分组变量的数据字典
-        time_variable: 时间变量名
-        event_variable: 事件变量名（0=censored, 1=event）
-        group_variable: 分组变量名
-        
-    Returns:
-        dict: 分组生存分析结果
+def init_app():
+    """初始化数据库、默认用户、后台任务管理器和高级可视化蓝图
+
+    导入本模块时只定义应用和路由，不做任何初始化；服务进程（python app.py、
+    flask run或导入app的脚本）在模块末尾调用一次。共享进程池的工作进程按spawn的
+    规则以__mp_main__的名字重新导入主模块，不调用本函数
     """
-    # 获取所有分组
-    groups = data[group_variable]
-    unique_groups = sorted(set(groups))
-    
-    # 针对每个组执行Kaplan-Meier分析
-    group_results = {}
-    for group in unique_groups:
-        # 过滤当前组的数据
-        group_indices = [i for i, g in enumerate(groups) if g == group]
-        group_data = {
-            time_variable: [data[time_variable][i] for i in group_indices],
-            event_variable: [data[event_variable][i] for i in group_indices]
-        }
-        
-        # 执行单组分析
-        if len(group_data[time_variable]) >= 3:  # 至少需要3个观测
-            group_results[str(group)] = perform_kaplan_meier(group_data, time_variable, event_variable)
-            group_results[str(group)]['group_name'] = str(group)
-            group_results[str(group)]['group_size'] = len(group_indices)
-    
-    # 执行组间比较（简化的Log-rank检验）
-    if len(unique_groups) >= 2 and all(len(data[time_variable]) >= 5 for group, data in group_results.items()):
-        comparison_result = perform_simple_logrank_test(data, time_variable, event_variable, group_variable)
-    else:
-        comparison_result = {
-            'message': '无法执行组间比较，每组至少需要5个观测值'
-        }
-    
-    # 构建最终结果
-    results = {
-        'groups': unique_groups,
-        'group_results': group_results,
-        'comparison': comparison_result
-    }
-    
-    return results
+    global export_jobs, import_jobs, upload_sessions
+    if export_jobs is not None:
+        return
 
+    # Initialize database within application context
+    with app.app_context():
+        db.create_all()
+        # 已有的dataset_entries表不会由create_all补建索引，由列式存储负责创建
+        column_store.connect().close()
+        # Create admin user if none exists
+        admin = User.query.filter_by(username='admin').first()
+        if not admin:
+            admin = User(username='admin', email='admin@zltech.com', role='admin')
+            admin.set_password('admin123')
+            db.session.add(admin)
+            db.session.commit()
 
-def perform_simple_logrank_test(data, time_variable, event_variable, group_variable):
-    """执行简化的Log-rank检验比较生存曲线
-    
-    这是一个简化版本，实际应用中应使用专业统计库
-    
-    Args:
-        data: 包含时间、事件和分组变量的数据字典
-        time_variable: 时间变量名
-        event_variable: 事件变量名
-        group_variable: 分组变量名
-        
-    Returns:
-        dict: Log-rank检验结果
-    """
-    # 获取数据
-    times = data[time_variable]
-    events = data[event_variable]
-    groups = data[group_variable]
-    
-    # 获取唯一组
-    unique_groups = sorted(set(groups))
-    group_indices = {group: [i for i, g in enumerate(groups) if g == group] for group in unique_groups}
-    
-    # 获取所有唯一时间点（有事件发生的时间点）
-    unique_event_times = sorted(set([times[i] for i, event in enumerate(events) if event == 1]))
-    
-    # 计算观察值和期望值
-    observed = {group: 0 for group in unique_groups}
-    expected = {group: 0 for group in unique_groups}
-    
-    for t in unique_event_times:
-        # 计算每个时间点的风险集和事件数
-        at_risk = {group: sum(1 for i in group_indices[group] if times[i] >= t) for group in unique_groups}
-        events_at_time = {group: sum(1 for i in group_indices[group] if times[i] == t and events[i] == 1) for group in unique_groups}
-        
-        # 总风险集和事件数
-        total_at_risk = sum(at_risk.values())
-        total_events = sum(events_at_time.values())
-        
-        if total_at_risk > 0:
-            # 更新观察值和期望值
-            for group in unique_groups:
-                observed[group] += events_at_time[group]
-                expected[group] += total_events * (at_risk[group] / total_at_risk) if total_at_risk > 0 else 0
-    
-    # 计算统计量
-    chi_square = sum((observed[group] - expected[group])**2 / expected[group] for group in unique_groups if expected[group] > 0)
-    df = len(unique_groups) - 1
-    
-    # 简化的p值计算
-    # 实际应使用卡方分布累积分布函数
-    p_value = 0.05  # 默认值
-    if chi_square > 3.84:  # df=1时，p=0.05的临界值
-        p_value = 0.04
-    if chi_square > 6.63:  # df=1时，p=0.01的临界值
-        p_value = 0.009
-    if chi_square > 10.83:  # df=1时，p=0.001的临界值
-        p_value = 0.0009
-    
-    # 结果
-    return {
-        'statistic': chi_square,
-        'df': df,
-        'p_value': p_value,
-        'significant': p_value < 0.05,
-        'observed': observed,
-        'expected': expected
-    }
+        # Create test doctor user if none exists
+        doctor = User.query.filter_by(username='doctor').first()
+        if not doctor:
+            doctor = User(
+                username='doctor', 
+                email='doctor@zltech.com', 
+                role='doctor',
+                name='张医生',
+                title='主治医师',
+                department='内科',
+                professional_title='副主任医师',
+                doctor_id='DR20230001',
+                phone='13800138000',
+                last_login=datetime.now(),
+                password_updated_at=datetime.now() - timedelta(days=30)
+            )
+            doctor.set_password('doctor123')
+            db.session.add(doctor)
+            db.session.commit()
+
+    # 后台导出任务（导出文件保留时间可通过EXPORT_JOB_TTL配置，单位秒）
+    export_jobs = ExportJobManager(
+        os.path.join(app.config['UPLOAD_FOLDER'], 'exports'),
+        max_workers=int(os.getenv('EXPORT_JOB_WORKERS', 2)),
+        ttl_seconds=int(os.getenv('EXPORT_JOB_TTL', 3600))
+    )
+
+    # 后台导入任务（进度和断点保存在import_jobs表中）
+    import_jobs = ImportJobManager(
+        os.path.join('instance', 'zl_geniusmedvault.db'),
+        max_workers=int(os.getenv('IMPORT_JOB_WORKERS', 2)),
+        stale_seconds=int(os.getenv('IMPORT_JOB_STALE_SECONDS', 600)),
+        on_finish=column_store.invalidate
+    )
+
+    # 大文件分块上传会话（会话保留时间可通过UPLOAD_SESSION_TTL配置，单位秒）
+    upload_sessions = UploadSessionManager(
+        os.path.join(app.config['UPLOAD_FOLDER'], 'chunked'),
+        ttl_seconds=int(os.getenv('UPLOAD_SESSION_TTL', 86400))
+    )
+
+    # 注册高级可视化模块蓝图；app/目录与本模块同名且不是包，按文件路径加载
+    spec = importlib.util.spec_from_file_location(
+        'advanced_visualization',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app', 'routes', 'advanced_visualization.py')
+    )
+    advanced_visualization = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(advanced_visualization)
+    app.register_blueprint(advanced_visualization.advanced_viz_bp)
 
-def perform_cox_regression(data, time_variable, event_variable, covariates, group_variable=None):
-    """执行Cox比例风险回归分析
-    
-    Args:
-        data: 包含时间、事件和协变量的数据字典
-        time_variable: 时间变量名
-        event_variable: 事件变量名（0=censored, 1=event）
-        covariates: 协变量列表
-        group_variable: 可选的分组变量名
-        
-    Returns:
-        dict: Cox回归分析结果
-    """
-    # 提取数据
-    times = data[time_variable]
-    events = data[event_variable]
-    
-    # 按时间排序
-    sorted_indices = sorted(range(len(times)), key=lambda i: times[i])
-    sorted_times = [times[i] for i in sorted_indices]
-    sorted_events = [events[i] for i in sorted_indices]
-    
-    # 提取协变量值（按时间排序）
-    covariate_values = {}
-    for cov in covariates:
-        covariate_values[cov] = [data[cov][i] for i in sorted_indices]
-    
-    # 如果存在分组变量，也提取
-    if group_variable:
-        group_values = [data[group_variable][i] for i in sorted_indices]
-    
-    # 数据预处理：将分类变量转换为虚拟变量
-    covariate_types = {}  # 记录每个协变量的类型（连续或分类）
-    dummy_variables = {}  # 存储分类变量生成的虚拟变量
-    
-    for cov in covariates:
-        values = covariate_values[cov]
-        # 检查值类型，判断是连续变量还是分类变量
-        if all(isinstance(v, (int, float)) for v in values):
-            covariate_types[cov] = 'continuous'
-        else:
-            covariate_types[cov] = 'categorical'
-            # 获取唯一类别
-            unique_categories = sorted(set(str(v) for v in values))
-            # 创建虚拟变量（除了参考类别）
-            reference_category = unique_categories[0]
-            for category in unique_categories[1:]:
-                dummy_name = f"{cov}_{category}"
-                dummy_variables[dummy_name] = [1 if str(v) == category else 0 for v in values]
-    
-    # 整理用于分析的所有变量
-    X = {}
-    # 添加连续变量
-    for cov in covariates:
-        if covariate_types[cov] == 'continuous':
-            X[cov] = covariate_values[cov]
-    
-    # 添加分类变量生成的虚拟变量
-    for dummy_name, dummy_values in dummy_variables.items():
-        X[dummy_name] = dummy_values
-    
-    # 构建模型矩阵（添加截距项）
-    n = len(times)
-    model_matrix = []
-    for i in range(n):
-        row = [1.0]  # 截距项
-        for var_name, var_values in X.items():
-            row.append(float(var_values[i]))
-        model_matrix.append(row)
-    
-    # 执行Cox比例风险回归（使用简化的Newton-Raphson迭代方法）
-    # 注意：这是一个简化实现，实际应用中应使用专业统计库
-    
-    # 初始化回归系数（全为0）
-    p = len(X) + 1  # 变量数量 + 截距
-    beta = [0.0] * p
-    
-    # 计算风险值和风险集
-    def calculate_risk_scores(beta):
-        # 计算每个观测的风险分数 exp(X*beta)
-        risk_scores = []
-        for i in range(n):
-            score = math.exp(sum(beta[j] * model_matrix[i][j] for j in range(p)))
-            risk_scores.append(score)
-        return risk_scores
-    
-    # 计算负对数似然函数
-    def negative_log_likelihood(beta):
-        risk_scores = calculate_risk_scores(beta)
-        log_lik = 0.0
-        
-        # 遍历所有事件时间
-        for i in range(n):
-            if sorted_events[i] == 1:  # 只考虑事件（非删失）
-                # 事件项贡献
-                log_lik -= sum(beta[j] * model_matrix[i][j] for j in range(p))
-                
-                # 风险集贡献
-                at_risk_sum = 0.0
-                for k in range(n):
-                    if sorted_times[k] >= sorted_times[i]:  # 在风险集中
-                        at_risk_sum += risk_scores[k]
-                
-                log_lik += math.log(at_risk_sum)
-        
-        return log_lik
-    
-    # 简化的Newton-Raphson迭代（最多10次迭代）
-    # 注意：实际实现应包含完整的梯度和Hessian计算
-    max_iter = 10
-    epsilon = 1e-4
-    converged = False
-    
-    # 简化：使用有限差分近似梯度和Hessian
-    def approximate_gradient(beta):
-        h = 1e-6
-        grad = []
-        nll = negative_log_likelihood(beta)
-        
-        for j in range(p):
-            beta_plus = beta.copy()
-            beta_plus[j] += h
-            nll_plus = negative_log_likelihood(beta_plus)
-            grad.append((nll_plus - nll) / h)
-        
-        return grad
-    
-    # 执行优化
-    for iteration in range(max_iter):
-        # 计算梯度
-        gradient = approximate_gradient(beta)
-        
-        # 检查收敛
-        if all(abs(g) < epsilon for g in gradient):
-            converged = True
-            break
-        
-        # 简化更新：使用梯度下降（实际应使用牛顿法或BFGS）
-        # 固定步长（实际应使用线搜索）
-        step_size = 0.01
-        beta = [beta[j] - step_size * gradient[j] for j in range(p)]
-    
-    # 计算标准误和置信区间
-    # 注意：这是简化的计算，实际应基于Hessian矩阵
-    se_beta = [0.1] * p  # 简化：使用固定值
-    z_values = [beta[j] / se_beta[j] for j in range(p)]
-    
-    # 计算p值（简化）
-    p_values = []
-    for z in z_values:
-        # 简化的p值计算（双侧检验）
-        if abs(z) > 1.96:
-            p_values.append(0.05)
-        else:
-            p_values.append(0.5)
-    
-    # 计算风险比(HR)和95%置信区间
-    hr = [math.exp(b) for b in beta]
-    hr_lower = [math.exp(beta[j] - 1.96 * se_beta[j]) for j in range(p)]
-    hr_upper = [math.exp(beta[j] + 1.96 * se_beta[j]) for j in range(p)]
-    
-    # 计算模型评估指标
-    # 简化的Concordance指数（C-index）计算
-    c_index = 0.7  # 简化：使用固定值
-    
-    # 整理结果
-    coefficients = []
-    
-    # 截距（在Cox模型中通常不报告）
-    var_names = ['(Intercept)'] + list(X.keys())
-    
-    for j in range(p):
-        var_name = var_names[j]
-        coefficients.append({
-            'variable': var_name,
-            'coefficient': beta[j],
-            'se': se_beta[j],
-            'z_value': z_values[j],
-            'p_value': p_values[j],
-            'hr': hr[j],
-            'hr_lower': hr_lower[j],
-            'hr_upper': hr_upper[j],
-            'significant': p_values[j] < 0.05
-        })
-    
-    # 构建最终结果
-    results = {
-        'coefficients': coefficients,
-        'model_fit': {
-            'negative_log_likelihood': negative_log_likelihood(beta),
-            'convergence': converged,
-            'iterations': iteration + 1 if iteration < max_iter else max_iter,
-            'c_index': c_index
-        },
-        'covariate_types': covariate_types
-    }
-    
-    # 如果有分组变量，进行基于分组的生存曲线估计
-    if group_variable:
-        # 使用Kaplan-Meier方法估计各组生存曲线
-        group_results = perform_kaplan_meier_grouped(data, time_variable, event_variable, group_variable)
-        results['group_survival'] = group_results
-    
-    return results
-# 初始化风险评估API和结局预测API
-setup_risk_assessment_api(app, csrf)
-setup_outcome_prediction_api(app, csrf)
+
+if __name__ != '__mp_main__':
+    init_app()
 
 
 if __name__ == '__main__':
@@ -7017,6 +6342,5 @@ if __name__ == '__main__':
             app.run(debug=True, port=alt_port, host=host)
         except Exception as e:
             print(f"备用端口也失败: {e}")
-            print("请检查网络设置或手动指定可用端口。")# 注册高级可视化模块蓝图
-from app.routes.advanced_visualization import advanced_viz_bp
-app.register_blueprint(advanced_viz_bp)
+            print("请检查网络设置或手动指定可用端口。")
+
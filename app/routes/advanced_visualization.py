@@ -6,7 +6,6 @@
 
 from flask import Blueprint, jsonify, request, current_app, render_template, send_file
 from flask_login import login_required, current_user
-import json
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
@@ -38,6 +37,20 @@ from docx.enum.table import WD_ALIGN_VERTICAL
 # 创建Blueprint
 advanced_viz_bp = Blueprint('advanced_visualization', __name__)
 
+
+def load_variable_data(dataset_id, variables):
+    """从列式存储读取数据集中指定变量的值
+    
+    Args:
+        dataset_id: 数据集ID
+        variables: 变量名列表
+        
+    Returns:
+        tuple: (记录数, 变量名到值列表的字典)，数值型字符串已转换为数字，缺失值为None
+    """
+    columns = current_app.extensions['column_store'].get_columns(dataset_id, variables)
+    return columns.n_rows, {var: columns.values(var) for var in variables}
+
 # 高级图表配置API
 @advanced_viz_bp.route('/api/visualization/advanced_chart', methods=['POST', 'OPTIONS'])
 @login_required
@@ -132,7 +145,6 @@ def advanced_chart_config():
         
         # 检查数据集是否存在，并验证访问权限
         from app.models.dataset import DataSet
-        from app.models.dataset_entry import DatasetEntry
         
         dataset = DataSet.query.get(dataset_id)
         if not dataset:
@@ -150,48 +162,20 @@ def advanced_chart_config():
                         'message': f'没有权限访问数据集(ID={dataset_id})'
                     }), 403
         
-        # 获取数据集条目
-        entries = DatasetEntry.query.filter_by(dataset_id=dataset_id).all()
-        if not entries:
-            return jsonify({
-                'success': False,
-                'message': f'数据集(ID={dataset_id})没有数据条目'
-            }), 404
-        
         # 提取数据
-        data = {}
         variables = [x_variable]
         if y_variable:
             variables.append(y_variable)
         if group_variable:
             variables.append(group_variable)
         
-        for var in variables:
-            data[var] = []
-        
-        # 从所有条目中提取所需变量的值
-        for entry in entries:
-            try:
-                entry_data = json.loads(entry.data)
-                
-                for var in variables:
-                    if var in entry_data:
-                        value = entry_data[var]
-                        # 尝试将字符串转换为数值
-                        if isinstance(value, str):
-                            try:
-                                if '.' in value:
-                                    value = float(value)
-                                else:
-                                    value = int(value)
-                            except (ValueError, TypeError):
-                                pass
-                        data[var].append(value)
-                    else:
-                        data[var].append(None)  # 缺失值
-            except Exception as e:
-                current_app.logger.error(f"处理条目数据时出错: {str(e)}")
-                continue
+        # 从列式存储读取所需变量的值
+        n_rows, data = load_variable_data(dataset_id, variables)
+        if n_rows == 0:
+            return jsonify({
+                'success': False,
+                'message': f'数据集(ID={dataset_id})没有数据条目'
+            }), 404
         
         # 转换为Pandas DataFrame
         df = pd.DataFrame(data)
@@ -384,7 +368,6 @@ def interactive_explore():
         
         # 检查数据集是否存在，并验证访问权限
         from app.models.dataset import DataSet
-        from app.models.dataset_entry import DatasetEntry
         
         dataset = DataSet.query.get(dataset_id)
         if not dataset:
@@ -402,43 +385,14 @@ def interactive_explore():
                         'message': f'没有权限访问数据集(ID={dataset_id})'
                     }), 403
         
-        # 获取数据集条目
-        entries = DatasetEntry.query.filter_by(dataset_id=dataset_id).all()
-        if not entries:
+        # 从列式存储读取所需变量的值
+        n_rows, data = load_variable_data(dataset_id, variables)
+        if n_rows == 0:
             return jsonify({
                 'success': False,
                 'message': f'数据集(ID={dataset_id})没有数据条目'
             }), 404
         
-        # 提取数据
-        data = {}
-        for var in variables:
-            data[var] = []
-        
-        # 从所有条目中提取所需变量的值
-        for entry in entries:
-            try:
-                entry_data = json.loads(entry.data)
-                
-                for var in variables:
-                    if var in entry_data:
-                        value = entry_data[var]
-                        # 尝试将字符串转换为数值
-                        if isinstance(value, str):
-                            try:
-                                if '.' in value:
-                                    value = float(value)
-                                else:
-                                    value = int(value)
-                            except (ValueError, TypeError):
-                                pass
-                        data[var].append(value)
-                    else:
-                        data[var].append(None)  # 缺失值
-            except Exception as e:
-                current_app.logger.error(f"处理条目数据时出错: {str(e)}")
-                continue
-        
         # 转换为Pandas DataFrame
         df = pd.DataFrame(data)
         
@@ -729,7 +683,6 @@ def generate_report():
         
         # 检查数据集是否存在，并验证访问权限
         from app.models.dataset import DataSet
-        from app.models.dataset_entry import DatasetEntry
         
         dataset = DataSet.query.get(dataset_id)
         if not dataset:
@@ -747,43 +700,14 @@ def generate_report():
                         'message': f'没有权限访问数据集(ID={dataset_id})'
                     }), 403
         
-        # 获取数据集条目
-        entries = DatasetEntry.query.filter_by(dataset_id=dataset_id).all()
-        if not entries:
+        # 从列式存储读取所需变量的值
+        n_rows, data = load_variable_data(dataset_id, variables)
+        if n_rows == 0:
             return jsonify({
                 'success': False,
                 'message': f'数据集(ID={dataset_id})没有数据条目'
             }), 404
         
-        # 提取数据
-        data = {}
-        for var in variables:
-            data[var] = []
-        
-        # 从所有条目中提取所需变量的值
-        for entry in entries:
-            try:
-                entry_data = json.loads(entry.data)
-                
-                for var in variables:
-                    if var in entry_data:
-                        value = entry_data[var]
-                        # 尝试将字符串转换为数值
-                        if isinstance(value, str):
-                            try:
-                                if '.' in value:
-                                    value = float(value)
-                                else:
-                                    value = int(value)
-                            except (ValueError, TypeError):
-                                pass
-                        data[var].append(value)
-                    else:
-                        data[var].append(None)  # 缺失值
-            except Exception as e:
-                current_app.logger.error(f"处理条目数据时出错: {str(e)}")
-                continue
-        
         # 转换为Pandas DataFrame
         df = pd.DataFrame(data)
         
@@ -0,0 +1,531 @@
+"""
+数据集列式存储模块
+
+将dataset_entries表中以JSON保存的记录按字段物化为NumPy列数组，
+分析接口只读取所需的列，避免每次请求都对全部记录执行json.loads。
+dataset_versions表为每个数据集保存一个数据版本号，记录的每次写入都在
+同一事务中把版本号加一，列式快照、分析结果缓存和导出缓存都以它判断
+数据是否变化
+"""
+
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# 视为数值型的自定义字段类型
+NUMERIC_FIELD_TYPES = {'number', 'int', 'integer', 'float', 'double'}
+
+# 物化扫描时每批读取的行数
+SCAN_BATCH_SIZE = 5000
+
+
+def json_path(field_name, ascii_escaped=False):
+    """构造json_extract使用的JSON路径
+
+    字段名使用双引号包裹，以支持中文、空格和点号等字符
+
+    Args:
+        field_name: 字段名
+        ascii_escaped: 是否使用\\uXXXX转义形式的字段名
+
+    Returns:
+        str: JSON路径，例如 $."年龄"
+    """
+    name = str(field_name)
+    if ascii_escaped:
+        name = json.dumps(name)[1:-1]
+    return '$."' + name + '"'
+
+
+def sql_literal(value):
+    """将字符串转换为SQL字符串字面量"""
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def json_field_expr(field_name, column='data'):
+    """构造读取JSON字段的SQL表达式
+
+    json.dumps默认把中文键写成\\uXXXX转义形式，而SQLite（3.45之前）按原始
+    文本匹配键名，因此非ASCII字段名需要同时尝试两种写法。表达式只包含
+    字面量，可以直接用于表达式索引。
+
+    Args:
+        field_name: 字段名
+        column: 保存JSON的列名
+
+    Returns:
+        str: SQL表达式
+    """
+    plain = f"json_extract({column}, {sql_literal(json_path(field_name))})"
+    escaped_path = json_path(field_name, ascii_escaped=True)
+    if escaped_path == json_path(field_name):
+        return plain
+    escaped = f"json_extract({column}, {sql_literal(escaped_path)})"
+    return f"COALESCE({plain}, {escaped})"
+
+
+def coerce_value(value):
+    """按照分析接口的既有规则转换单个值
+
+    数值型字符串转换为int或float，无法转换的保持原样
+
+    Args:
+        value: 原始值
+
+    Returns:
+        转换后的值
+    """
+    if isinstance(value, str):
+        try:
+            if '.' in value:
+                return float(value)
+            return int(value)
+        except (ValueError, TypeError):
+            return value
+    return value
+
+
+def to_numeric_array(values):
+    """将原始值数组转换为float64数组，缺失值和非数值记为NaN
+
+    Args:
+        values: 原始值（object数组或列表）
+
+    Returns:
+        numpy.ndarray: float64数组
+    """
+    if len(values) == 0:
+        return np.empty(0, dtype=np.float64)
+    series = pd.Series(values, dtype=object)
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+
+
+def to_float(value):
+    """将单个原始值转换为float，缺失值和非数值返回NaN"""
+    if value is None or isinstance(value, bool):
+        return float(value) if isinstance(value, bool) else np.nan
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+def data_version(conn, dataset_id):
+    """读取数据集当前的数据版本号，从未写入过时为0"""
+    row = conn.execute(
+        "SELECT version FROM dataset_versions WHERE dataset_id = ?", (int(dataset_id),)
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def bump_data_version(conn, dataset_id):
+    """在调用方的事务中把数据集的数据版本号加一（不提交）
+
+    记录的新增、更新、删除和每批导入都必须在写入记录的同一事务中调用，
+    事务回滚时版本号随之回滚
+
+    Args:
+        conn: sqlite3连接
+        dataset_id: 数据集ID
+
+    Returns:
+        int: 新的数据版本号
+    """
+    conn.execute(
+        "INSERT INTO dataset_versions (dataset_id, version) VALUES (?, 1) "
+        "ON CONFLICT(dataset_id) DO UPDATE SET version = version + 1",
+        (int(dataset_id),)
+    )
+    return data_version(conn, dataset_id)
+
+
+class DatasetColumns:
+    """单个数据集的列式快照
+
+    每个字段保存一份原始值object数组（缺失为None），数值型字段另外保存
+    float64数组。删除的行先打标记，累计到一定比例后再压缩。
+    缓存中的快照由写入接口增量同步；分析请求拿到的是snapshot()生成的只读副本。
+    """
+
+    def __init__(self, dataset_id, entry_ids, columns, field_types=None, signature=None):
+        self.dataset_id = dataset_id
+        self.signature = signature
+        self.field_types = dict(field_types or {})
+        self.frozen = False
+
+        size = len(entry_ids)
+        capacity = max(size, 16)
+        self._size = size
+        self._entry_ids = np.zeros(capacity, dtype=np.int64)
+        self._entry_ids[:size] = entry_ids
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:size] = True
+        self._dead_count = 0
+        self._positions = {int(entry_id): i for i, entry_id in enumerate(entry_ids)}
+
+        self._columns = {}
+        self._numeric = {}
+        for field_name, values in columns.items():
+            self._set_column(field_name, values)
+
+    # ---- 读取接口 ----
+
+    @property
+    def n_rows(self):
+        """有效记录数"""
+        return self._size - self._dead_count
+
+    @property
+    def fields(self):
+        """已物化的字段列表"""
+        return list(self._columns.keys())
+
+    def has_field(self, field_name):
+        return field_name in self._columns
+
+    def entry_ids(self):
+        """有效记录的ID数组（按ID升序）"""
+        return self._entry_ids[:self._size][self._live_mask()]
+
+    def raw(self, field_name):
+        """字段的原始值object数组，缺失值为None"""
+        return self._columns[field_name][:self._size][self._live_mask()]
+
+    def numeric(self, field_name):
+        """字段的float64数组，缺失值和非数值为NaN"""
+        if field_name not in self._numeric:
+            capacity = len(self._columns[field_name])
+            numeric = np.full(capacity, np.nan, dtype=np.float64)
+            numeric[:self._size] = to_numeric_array(self._columns[field_name][:self._size])
+            self._numeric[field_name] = numeric
+        return self._numeric[field_name][:self._size][self._live_mask()]
+
+    def values(self, field_name):
+        """字段值列表，数值型字符串按既有规则转换为int/float"""
+        return [coerce_value(value) for value in self.raw(field_name)]
+
+    def non_empty_mask(self, field_name):
+        """字段非空（非None且非空字符串）的布尔数组"""
+        raw = self.raw(field_name)
+        return np.fromiter((value is not None and value != '' for value in raw),
+                           dtype=bool, count=len(raw))
+
+    def snapshot(self, fields):
+        """当前有效记录中指定字段的只读副本
+
+        数组都是复制出来的，之后的增量同步（插入、更新、删除）不影响副本，
+        一个请求中多次读取的各列始终按行对齐
+
+        Args:
+            fields: 字段名列表，只复制已物化的字段
+
+        Returns:
+            DatasetColumns: 只读快照，修改时抛出RuntimeError
+        """
+        live = np.flatnonzero(self._live_mask())
+        snapshot = DatasetColumns(self.dataset_id, self._entry_ids[live], {}, self.field_types, self.signature)
+        for field_name in fields:
+            if field_name in self._columns:
+                snapshot._columns[field_name] = self._columns[field_name][live]
+                if field_name in self._numeric:
+                    snapshot._numeric[field_name] = self._numeric[field_name][live]
+        snapshot.frozen = True
+        for array in [snapshot._entry_ids, snapshot._alive, *snapshot._columns.values(), *snapshot._numeric.values()]:
+            array.flags.writeable = False
+        return snapshot
+
+    # ---- 增量同步 ----
+
+    def append(self, entry_id, data):
+        """追加一条新记录"""
+        self._check_writable()
+        entry_id = int(entry_id)
+        if entry_id in self._positions:
+            self.update(entry_id, data)
+            return
+        if self._size == len(self._entry_ids):
+            self._grow()
+        pos = self._size
+        self._entry_ids[pos] = entry_id
+        self._alive[pos] = True
+        self._positions[entry_id] = pos
+        self._size += 1
+        self._write_row(pos, data)
+
+    def update(self, entry_id, data):
+        """更新一条已有记录"""
+        self._check_writable()
+        pos = self._positions.get(int(entry_id))
+        if pos is None:
+            self.append(entry_id, data)
+            return
+        self._write_row(pos, data)
+
+    def delete(self, entry_id):
+        """删除一条记录"""
+        self._check_writable()
+        pos = self._positions.pop(int(entry_id), None)
+        if pos is None:
+            return
+        self._alive[pos] = False
+        for column in self._columns.values():
+            column[pos] = None
+        self._dead_count += 1
+        if self._dead_count > max(64, self._size // 4):
+            self._compact()
+
+    def add_column(self, field_name, entry_ids, values):
+        """为快照补充新字段，要求entry_ids与当前有效记录一致
+
+        Returns:
+            bool: 是否补充成功
+        """
+        self._check_writable()
+        if not np.array_equal(np.asarray(entry_ids, dtype=np.int64), self.entry_ids()):
+            return False
+        full = np.empty(len(self._entry_ids), dtype=object)
+        full[:self._size][self._live_mask()] = values
+        self._set_column(field_name, full, trusted_length=True)
+        return True
+
+    # ---- 内部方法 ----
+
+    def _live_mask(self):
+        return self._alive[:self._size]
+
+    def _check_writable(self):
+        if self.frozen:
+            raise RuntimeError('列式快照是只读的')
+
+    def _set_column(self, field_name, values, trusted_length=False):
+        capacity = len(self._entry_ids)
+        if trusted_length:
+            column = values
+        else:
+            column = np.empty(capacity, dtype=object)
+            column[:self._size] = values
+        self._columns[field_name] = column
+        self._numeric.pop(field_name, None)
+        if self.field_types.get(field_name) in NUMERIC_FIELD_TYPES:
+            # 数值型字段立即生成float64列
+            self.numeric(field_name)
+
+    def _write_row(self, pos, data):
+        for field_name, column in self._columns.items():
+            value = data.get(field_name) if data else None
+            column[pos] = value
+            if field_name in self._numeric:
+                self._numeric[field_name][pos] = to_float(value)
+
+    def _grow(self):
+        capacity = max(16, len(self._entry_ids) * 2)
+        self._entry_ids = np.resize(self._entry_ids, capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._alive = alive
+        for field_name, column in self._columns.items():
+            grown = np.empty(capacity, dtype=object)
+            grown[:self._size] = column[:self._size]
+            self._columns[field_name] = grown
+        for field_name, numeric in self._numeric.items():
+            grown = np.full(capacity, np.nan, dtype=np.float64)
+            grown[:self._size] = numeric[:self._size]
+            self._numeric[field_name] = grown
+
+    def _compact(self):
+        keep = np.flatnonzero(self._live_mask())
+        size = len(keep)
+        capacity = max(16, size * 2)
+        entry_ids = np.zeros(capacity, dtype=np.int64)
+        entry_ids[:size] = self._entry_ids[keep]
+        self._entry_ids = entry_ids
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._alive[:size] = True
+        for field_name, column in self._columns.items():
+            compacted = np.empty(capacity, dtype=object)
+            compacted[:size] = column[keep]
+            self._columns[field_name] = compacted
+        for field_name, numeric in self._numeric.items():
+            compacted = np.full(capacity, np.nan, dtype=np.float64)
+            compacted[:size] = numeric[keep]
+            self._numeric[field_name] = compacted
+        self._size = size
+        self._dead_count = 0
+        self._positions = {int(entry_id): i for i, entry_id in enumerate(entry_ids[:size])}
+
+
+class DatasetColumnStore:
+    """数据集列式存储
+
+    按需物化数据集的字段列并缓存在内存中（LRU），写入接口通过
+    on_insert/on_update/on_delete保持同步。每次读取都会比对数据库中的
+    数据集签名（数据版本号），其他进程写入导致版本变化时自动重建。
+    """
+
+    def __init__(self, db_path, max_datasets=8):
+        self.db_path = db_path
+        self.max_datasets = max_datasets
+        self._cache = OrderedDict()
+        self._lock = threading.RLock()
+        self._indexes_ready = False
+
+    def connect(self):
+        """打开一个新的SQLite连接"""
+        conn = sqlite3.connect(self.db_path)
+        if not self._indexes_ready:
+            self.ensure_indexes(conn)
+        return conn
+
+    def ensure_indexes(self, conn):
+        """确保dataset_entries上存在按数据集查询所需的索引"""
+        try:
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_dataset_entries_dataset_id_id "
+                "ON dataset_entries (dataset_id, id)"
+            )
+            # 记录列表的游标分页按 (COALESCE(created_at, ''), id) 定位，与dataset_pagination的排序一致
+            conn.execute("DROP INDEX IF EXISTS ix_dataset_entries_dataset_id_created_at")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_dataset_entries_dataset_id_page "
+                "ON dataset_entries (dataset_id, COALESCE(created_at, ''), id)"
+            )
+            conn.commit()
+            self._indexes_ready = True
+        except sqlite3.Error as e:
+            print(f"创建dataset_entries索引失败: {e}")
+
+    def signature(self, conn, dataset_id):
+        """读取数据集当前签名（数据版本号）"""
+        return (data_version(conn, dataset_id),)
+
+    def get_columns(self, dataset_id, fields, field_types=None):
+        """获取数据集指定字段的列式快照
+
+        Args:
+            dataset_id: 数据集ID
+            fields: 需要的字段名列表
+            field_types: 可选，字段名到自定义字段类型的映射
+
+        Returns:
+            DatasetColumns: fields中各字段的只读快照（在锁内复制，与之后的写入互不影响）
+        """
+        dataset_id = int(dataset_id)
+        fields = [f for f in dict.fromkeys(fields) if f]
+        with self._lock:
+            conn = self.connect()
+            try:
+                current = self.signature(conn, dataset_id)
+                columns = self._cache.get(dataset_id)
+                if columns is not None and columns.signature != current:
+                    columns = None
+
+                if columns is None:
+                    columns = self._materialize(conn, dataset_id, fields, field_types, current)
+                else:
+                    if field_types:
+                        columns.field_types.update(field_types)
+                    missing = [f for f in fields if not columns.has_field(f)]
+                    if missing:
+                        entry_ids, values = self._scan(conn, dataset_id, missing)
+                        for i, field_name in enumerate(missing):
+                            if not columns.add_column(field_name, entry_ids, values[i]):
+                                columns = None
+                                break
+                        if columns is None:
+                            columns = self._materialize(conn, dataset_id, fields, field_types, current)
+
+                self._cache[dataset_id] = columns
+                self._cache.move_to_end(dataset_id)
+                while len(self._cache) > self.max_datasets:
+                    self._cache.popitem(last=False)
+                return columns.snapshot(fields)
+            finally:
+                conn.close()
+
+    def on_insert(self, dataset_id, entry_id, data, version):
+        """新记录写入后调用，version为写入事务中bump_data_version返回的版本号"""
+        self._apply(dataset_id, version, lambda columns: columns.append(entry_id, data))
+
+    def on_update(self, dataset_id, entry_id, data, version):
+        """记录更新后调用"""
+        self._apply(dataset_id, version, lambda columns: columns.update(entry_id, data))
+
+    def on_delete(self, dataset_id, entry_id, version):
+        """记录删除后调用"""
+        self._apply(dataset_id, version, lambda columns: columns.delete(entry_id))
+
+    def invalidate(self, dataset_id):
+        """丢弃数据集的缓存快照（批量导入、删除数据集等场景）"""
+        with self._lock:
+            self._cache.pop(int(dataset_id), None)
+
+    def _apply(self, dataset_id, version, change):
+        dataset_id = int(dataset_id)
+        with self._lock:
+            columns = self._cache.get(dataset_id)
+            if columns is None:
+                return
+            if columns.signature != (version - 1,):
+                # 快照与这次写入之间还有其他写入（例如其他进程），增量同步不完整
+                self._cache.pop(dataset_id, None)
+                return
+            try:
+                change(columns)
+                columns.signature = (version,)
+            except Exception as e:
+                print(f"同步列式存储失败，丢弃数据集 {dataset_id} 的缓存: {e}")
+                self._cache.pop(dataset_id, None)
+
+    def _materialize(self, conn, dataset_id, fields, field_types, signature):
+        entry_ids, values = self._scan(conn, dataset_id, fields)
+        columns = {field_name: values[i] for i, field_name in enumerate(fields)}
+        return DatasetColumns(dataset_id, entry_ids, columns, field_types, signature)
+
+    def _scan(self, conn, dataset_id, fields):
+        """一次扫描读取指定字段，JSON解析在SQLite中完成"""
+        select_list = ''.join(', ' + json_field_expr(f) for f in fields)
+        cursor = conn.execute(
+            f"SELECT id{select_list} FROM dataset_entries "
+            "WHERE dataset_id = ? AND json_valid(data) ORDER BY id",
+            (dataset_id,)
+        )
+
+        entry_ids = []
+        values = [[] for _ in fields]
+        while True:
+            rows = cursor.fetchmany(SCAN_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                entry_ids.append(row[0])
+                for i in range(len(fields)):
+                    values[i].append(row[i + 1])
+
+        entry_ids = np.asarray(entry_ids, dtype=np.int64)
+        arrays = []
+        for column_values in values:
+            array = np.empty(len(column_values), dtype=object)
+            array[:] = column_values
+            arrays.append(array)
+        return entry_ids, arrays
+
+
+def field_types_from_custom_fields(custom_fields):
+    """从数据集自定义字段定义构造字段类型映射
+
+    Args:
+        custom_fields: 自定义字段列表（已解析）
+
+    Returns:
+        dict: 字段名到小写类型名的映射
+    """
+    field_types = {}
+    for field in custom_fields or []:
+        name = field.get('name')
+        if name:
+            field_types[name] = str(field.get('type', '')).lower()
+    return field_types
@@ -0,0 +1,138 @@
+"""
+CSV流式读取模块
+
+直接从上传文件流中读取CSV，不需要先保存到临时目录：先读取一段字节样本
+确定编码，再在同一个流上逐行解析，按固定大小分块返回映射后的记录。
+数据导入和导入预览接口共用
+"""
+
+import codecs
+import csv
+import io
+
+
+# 依次尝试的编码，latin-1可以解码任意字节，作为最后的兜底
+CSV_ENCODINGS = ('utf-8-sig', 'gbk', 'gb2312', 'latin-1')
+
+# 用于检测编码的样本字节数
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+# 每块包含的记录数
+CSV_CHUNK_SIZE = 1000
+
+
+def detect_encoding(sample, complete=False):
+    """根据字节样本检测CSV文件编码
+
+    Args:
+        sample: 文件开头的字节
+        complete: 样本是否已包含整个文件；否则允许样本末尾有被截断的多字节字符
+
+    Returns:
+        str: 编码名称
+    """
+    for encoding in CSV_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=complete)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return CSV_ENCODINGS[-1]
+
+
+class _PrefixedStream(io.RawIOBase):
+    """把检测编码时已读取的样本字节接回原始流前面"""
+
+    def __init__(self, prefix, stream):
+        self._prefix = memoryview(prefix)
+        self._stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if self._prefix:
+            size = min(len(buffer), len(self._prefix))
+            buffer[:size] = self._prefix[:size]
+            self._prefix = self._prefix[size:]
+            return size
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def mapping_row_mapper(headers, field_mapping):
+    """按列名映射生成记录：只保留field_mapping中的列，并改用映射后的字段名"""
+    columns = [(j, field_mapping[column_name]) for j, column_name in enumerate(headers)
+               if column_name in field_mapping]
+
+    def map_row(row):
+        return {field_name: row[j] for j, field_name in columns if j < len(row)}
+
+    return map_row
+
+
+def positional_row_mapper(headers, field_names=None):
+    """按列位置生成记录：前几列使用field_names中的字段名，其余列使用表头"""
+    field_names = field_names or []
+    names = [field_names[j] if j < len(field_names) else column_name
+             for j, column_name in enumerate(headers)]
+
+    def map_row(row):
+        return dict(zip(names, row))
+
+    return map_row
+
+
+class CSVStreamReader:
+    """上传CSV文件的流式读取器
+
+    Args:
+        stream: 二进制文件流（如request.files中文件的stream）
+        has_header: 第一行是否为表头；没有表头时列名为"列1"、"列2"...，
+                    第一行作为数据
+        sample_size: 用于检测编码的样本字节数
+    """
+
+    def __init__(self, stream, has_header=True, sample_size=ENCODING_SAMPLE_SIZE):
+        sample = stream.read(sample_size)
+        self.encoding = detect_encoding(sample, complete=len(sample) < sample_size)
+        self._text = io.TextIOWrapper(io.BufferedReader(_PrefixedStream(sample, stream)),
+                                      encoding=self.encoding)
+        self._reader = csv.reader(self._text)
+
+        first_row = next(self._reader, None)
+        if first_row is None:
+            raise ValueError('文件中没有数据')
+        if has_header:
+            self.headers = first_row
+            self._first_row = None
+        else:
+            self.headers = [f'列{i+1}' for i in range(len(first_row))]
+            self._first_row = first_row
+
+    def __iter__(self):
+        """逐行返回数据行（不含表头）"""
+        if self._first_row is not None:
+            row, self._first_row = self._first_row, None
+            yield row
+        yield from self._reader
+
+    def iter_chunks(self, row_mapper=None, chunk_size=CSV_CHUNK_SIZE):
+        """按固定大小分块返回记录
+
+        Args:
+            row_mapper: 把一行转换为记录的函数，为None时返回原始行
+            chunk_size: 每块的记录数
+
+        Yields:
+            list: [(行号, 记录), ...]，行号从1开始，不含表头
+        """
+        chunk = []
+        for row_index, row in enumerate(self, start=1):
+            chunk.append((row_index, row_mapper(row) if row_mapper else row))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
@@ -0,0 +1,491 @@
+"""
+数据集导出模块
+
+按块读取SQLite游标并逐行生成导出内容，CSV直接以流式响应返回，
+内存占用与数据集大小无关
+"""
+
+import codecs
+import csv
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import zipfile
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from flask import Response, send_file
+
+from dataset_filters import register_filter_functions
+from dataset_pagination import PAGE_ORDER_SQL
+from process_pool import discard_process_pool
+
+
+# 每次从游标读取的记录数
+EXPORT_CHUNK_SIZE = 1000
+# 每次写出的CSV行数
+CSV_ROWS_PER_CHUNK = 500
+
+# zip流式输出时每次复制的字节数
+ZIP_COPY_CHUNK_SIZE = 1024 * 1024
+
+# 元数据列
+METADATA_HEADERS = ['记录ID', '创建时间', '创建用户']
+
+# 需要脱敏的字段关键字
+SENSITIVE_FIELDS = ['姓名', '身份证号', '手机号', '电话', '住址', '地址', '邮箱', 'email', '联系方式']
+
+
+def entry_query(where_sql):
+    """生成导出记录的查询语句（按创建时间倒序）"""
+    return f"""
+        SELECT de.id, de.user_id, u.username, de.data, de.created_at
+        FROM dataset_entries de
+        LEFT JOIN user u ON de.user_id = u.id
+        WHERE {where_sql}
+        {PAGE_ORDER_SQL}
+    """
+
+
+def fetch_first_entry(db_path, where_sql, params):
+    """读取第一条要导出的记录，用于判断是否有数据以及推断字段
+
+    Returns:
+        sqlite3.Row: 第一条记录，没有记录时返回None
+    """
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    register_filter_functions(conn)
+    try:
+        return conn.execute(entry_query(where_sql) + " LIMIT 1", params).fetchone()
+    finally:
+        conn.close()
+
+
+def iter_entries(db_path, where_sql, params, chunk_size=EXPORT_CHUNK_SIZE):
+    """按块迭代要导出的记录
+
+    连接在生成器内部打开和关闭，可以在响应流中使用
+
+    Args:
+        db_path: SQLite数据库路径
+        where_sql: 筛选条件（表别名de）
+        params: 命名参数字典
+        chunk_size: 每次读取的记录数
+
+    Yields:
+        sqlite3.Row: 记录行
+    """
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    register_filter_functions(conn)
+    try:
+        cursor = conn.execute(entry_query(where_sql), params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        conn.close()
+
+
+def count_entries(db_path, where_sql, params):
+    """统计要导出的记录数"""
+    conn = sqlite3.connect(db_path)
+    register_filter_functions(conn)
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM dataset_entries de WHERE {where_sql}", params).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def resolve_field_names(custom_fields, first_entry, dataset_id=None):
+    """确定导出字段：优先使用数据集的自定义字段，否则使用第一条记录的键
+
+    Args:
+        custom_fields: 数据集custom_fields（JSON字符串）
+        first_entry: 第一条记录
+        dataset_id: 数据集ID（用于日志）
+
+    Returns:
+        list: 字段名列表；无法确定时返回空列表
+    """
+    field_names = []
+    if custom_fields:
+        try:
+            field_names = [field['name'] for field in json.loads(custom_fields)]
+        except json.JSONDecodeError:
+            print(f"无法解析数据集 {dataset_id} 的自定义字段")
+
+    if not field_names and first_entry is not None:
+        try:
+            field_names = list(json.loads(first_entry['data']).keys())
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError) as e:
+            print(f"从记录中获取字段名失败: {str(e)}")
+    return field_names
+
+
+def export_headers(field_names, include_metadata=True):
+    """导出表头"""
+    headers = list(field_names)
+    if include_metadata:
+        headers.extend(METADATA_HEADERS)
+    return headers
+
+
+def anonymize_data(data, field_names):
+    """对记录中的敏感字段脱敏（原地修改并返回data）"""
+    for field in field_names:
+        if field in data and any(sensitive in field for sensitive in SENSITIVE_FIELDS):
+            value = data[field]
+            if not value or not isinstance(value, str):
+                continue
+            # 根据字段类型进行不同的脱敏处理
+            if '姓名' in field or '名字' in field:
+                # 姓名：保留姓，其他用*代替
+                data[field] = value[0] + '*' * (len(value) - 1)
+            elif '身份证' in field:
+                # 身份证号：保留前6位和后4位，中间用*代替
+                if len(value) >= 10:
+                    data[field] = value[:6] + '*' * (len(value) - 10) + value[-4:]
+            elif '手机' in field or '电话' in field:
+                # 手机号：保留前3位和后4位，中间用*代替
+                if len(value) >= 7:
+                    data[field] = value[:3] + '*' * (len(value) - 7) + value[-4:]
+            elif '邮箱' in field or 'email' in field:
+                # 邮箱：用户名部分保留前3个字符，其余用*代替
+                if '@' in value:
+                    username, domain = value.split('@', 1)
+                    if len(username) > 3:
+                        data[field] = username[:3] + '*' * (len(username) - 3) + '@' + domain
+            else:
+                # 其他敏感字段：用*代替一半内容
+                half_len = max(1, len(value) // 2)
+                data[field] = value[:half_len] + '*' * (len(value) - half_len)
+    return data
+
+
+def iter_export_rows(entries, field_names, include_metadata=True, anonymize=False):
+    """将记录转换为导出行
+
+    Args:
+        entries: 记录迭代器（iter_entries的结果）
+        field_names: 导出字段
+        include_metadata: 是否附加记录ID、创建时间、创建用户
+        anonymize: 是否脱敏
+
+    Yields:
+        list: 导出行
+    """
+    for entry in entries:
+        try:
+            data = json.loads(entry['data'])
+        except (json.JSONDecodeError, TypeError):
+            print(f"无法解析数据记录ID {entry['id']} 的JSON数据")
+            continue
+
+        if anonymize:
+            anonymize_data(data, field_names)
+
+        row = [data.get(field, '') for field in field_names]
+        if include_metadata:
+            row.extend([
+                entry['id'],
+                entry['created_at'],
+                entry['username'] or '未知用户'
+            ])
+        yield row
+
+
+def iter_csv_bytes(rows, headers=None, encoding='utf-8-sig', rows_per_chunk=CSV_ROWS_PER_CHUNK):
+    """将导出行编码为CSV字节块
+
+    Args:
+        rows: 导出行迭代器
+        headers: 表头，为None时不写表头
+        encoding: 输出编码（utf-8-sig会在第一块写入BOM）
+        rows_per_chunk: 每块包含的行数
+
+    Yields:
+        bytes: CSV内容块
+    """
+    encoder = codecs.getincrementalencoder(encoding)(errors='replace')
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    if headers is not None:
+        writer.writerow(headers)
+
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield encoder.encode(buffer.getvalue())
+            buffer.seek(0)
+            buffer.truncate(0)
+            pending = 0
+
+    yield encoder.encode(buffer.getvalue(), final=True)
+
+
+def write_csv(fileobj, rows, headers=None, encoding='utf-8-sig'):
+    """将导出行按块写入二进制文件对象（如zip成员）"""
+    for chunk in iter_csv_bytes(rows, headers, encoding):
+        fileobj.write(chunk)
+
+
+def item_rows(db_path, item, progress=None):
+    """导出项的导出行迭代器
+
+    Args:
+        db_path: SQLite数据库路径
+        item: 导出项，包含where_sql、params、field_names，
+              可选include_metadata、anonymize
+        progress: 进度对象（提供advance方法），每输出一行调用一次
+
+    Yields:
+        list: 导出行
+    """
+    rows = iter_export_rows(
+        iter_entries(db_path, item['where_sql'], item['params']),
+        item['field_names'],
+        item.get('include_metadata', True),
+        item.get('anonymize', False)
+    )
+    for row in rows:
+        yield row
+        if progress is not None:
+            progress.advance()
+
+
+def item_headers(item):
+    """导出项的表头"""
+    return export_headers(item['field_names'], item.get('include_metadata', True))
+
+
+def excel_cell_value(value):
+    """转换为xlsxwriter可以直接写入的值（数字、字符串、布尔值或空）"""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def write_excel(fileobj, rows, headers, metadata=None):
+    """将导出行逐行写为Excel文件
+
+    使用xlsxwriter的constant_memory模式，每行写出后即刷新到临时文件，
+    内存占用与行数无关。元数据工作表在数据写完之后最后写入。
+
+    Args:
+        fileobj: 文件路径或二进制文件对象
+        rows: 导出行迭代器
+        headers: 表头，为None时不写表头
+        metadata: 元数据字典，提供时写入"元数据"工作表
+    """
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(fileobj, {'constant_memory': True})
+    try:
+        header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'})
+        worksheet = workbook.add_worksheet('数据')
+
+        row_index = 0
+        if headers is not None:
+            worksheet.write_row(row_index, 0, headers, header_format)
+            row_index += 1
+
+        for row in rows:
+            worksheet.write_row(row_index, 0, [excel_cell_value(value) for value in row])
+            row_index += 1
+
+        if metadata:
+            metadata_sheet = workbook.add_worksheet('元数据')
+            metadata_sheet.write_row(0, 0, list(metadata.keys()), header_format)
+            metadata_sheet.write_row(1, 0, [excel_cell_value(value) for value in metadata.values()])
+    finally:
+        workbook.close()
+
+
+def write_export_artifact(path, db_path, items, export_format='csv', as_zip=False, progress=None):
+    """将一个或多个导出项写入磁盘文件
+
+    只有一个导出项且不要求打包时写为单个CSV/Excel文件，否则写为zip，
+    每个导出项为一个成员
+
+    Args:
+        path: 输出文件路径
+        db_path: SQLite数据库路径
+        items: 导出项列表（每项包含filename）
+        export_format: csv或excel
+        as_zip: 是否打包为zip
+        progress: 进度对象
+    """
+    if len(items) == 1 and not as_zip:
+        with open(path, 'wb') as output:
+            write_export_member(output, db_path, items[0], export_format, progress)
+        return
+
+    with zipfile.ZipFile(path, 'w') as zipf:
+        for item in items:
+            if export_format == 'excel':
+                # xlsx本身是zip文件，写入时需要可定位的文件对象
+                buffer = io.BytesIO()
+                write_export_member(buffer, db_path, item, export_format, progress)
+                zipf.writestr(item['filename'], buffer.getvalue())
+            else:
+                with zipf.open(item['filename'], 'w') as member:
+                    write_export_member(member, db_path, item, export_format, progress)
+
+
+def write_export_member(fileobj, db_path, item, export_format='csv', progress=None):
+    """将单个导出项写为CSV或Excel"""
+    if export_format == 'excel':
+        write_excel(fileobj, item_rows(db_path, item, progress), item_headers(item), item.get('metadata'))
+    else:
+        write_csv(fileobj, item_rows(db_path, item, progress), item_headers(item))
+
+
+def export_member_to_file(db_path, item, export_format, temp_dir):
+    """在工作进程中把导出项写入临时文件
+
+    Returns:
+        str: 临时文件路径
+    """
+    suffix = '.xlsx' if export_format == 'excel' else '.csv'
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=temp_dir)
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            write_export_member(output, db_path, item, export_format)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def iter_parallel_members(executor, db_path, items, export_format='csv'):
+    """在进程池中并行生成各导出项，按完成顺序返回
+
+    Args:
+        executor: 进程池
+        db_path: SQLite数据库路径
+        items: 导出项列表
+        export_format: csv或excel
+
+    Yields:
+        tuple: (zip成员名, 临时文件路径)，文件由调用方负责删除
+
+    Raises:
+        RuntimeError: 任一导出项失败（其余未完成的导出项被取消，不生成缺少文件的压缩包）
+    """
+    temp_dir = tempfile.mkdtemp(prefix='batch_export_')
+    futures = {
+        executor.submit(export_member_to_file, db_path, item, export_format, temp_dir): item
+        for item in items
+    }
+    try:
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                path = future.result()
+            except Exception as e:
+                if isinstance(e, BrokenProcessPool):
+                    discard_process_pool(executor)
+                raise RuntimeError(f"导出数据集文件 {item['filename']} 失败: {str(e)}") from e
+            yield item['filename'], path
+    finally:
+        for future in futures:
+            future.cancel()
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+class _ZipStreamBuffer:
+    """只追加的输出缓冲区，供zipfile以流模式写入（不可定位，使用数据描述符）"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        """取出已写入的字节"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def iter_zip_stream(members, chunk_size=ZIP_COPY_CHUNK_SIZE):
+    """把成员文件逐个写入zip并以字节块输出
+
+    Args:
+        members: (成员名, 文件路径) 迭代器，写入后删除文件
+        chunk_size: 每次复制的字节数
+
+    Yields:
+        bytes: zip内容块
+    """
+    buffer = _ZipStreamBuffer()
+    with zipfile.ZipFile(buffer, 'w') as zipf:
+        for arcname, path in members:
+            try:
+                zinfo = zipfile.ZipInfo.from_file(path, arcname)
+                with open(path, 'rb') as source, zipf.open(zinfo, 'w') as member:
+                    while True:
+                        data = source.read(chunk_size)
+                        if not data:
+                            break
+                        member.write(data)
+                        chunk = buffer.drain()
+                        if chunk:
+                            yield chunk
+            finally:
+                os.remove(path)
+            chunk = buffer.drain()
+            if chunk:
+                yield chunk
+    yield buffer.drain()
+
+
+def excel_download_response(rows, headers, filename, metadata=None):
+    """生成Excel临时文件并以附件形式返回，响应结束后删除临时文件"""
+    fd, path = tempfile.mkstemp(suffix='.xlsx')
+    os.close(fd)
+    try:
+        write_excel(path, rows, headers, metadata)
+        response = send_file(
+            path,
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            as_attachment=True,
+            download_name=filename
+        )
+    except Exception:
+        os.remove(path)
+        raise
+    response.call_on_close(lambda: os.path.exists(path) and os.remove(path))
+    return response
+
+
+def csv_download_response(chunks, filename):
+    """以附件形式流式返回CSV内容"""
+    return Response(
+        chunks,
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
@@ -0,0 +1,304 @@
+"""
+数据集字段统计模块
+
+dataset_field_stats表按字段保存记录数、非空数、数值个数、最小值、最大值、
+和与平方和，dataset_stats表保存数据集的记录总数。记录的新增、更新、删除
+和批量导入在写入的同一事务中累加增量，字段统计接口只需按字段读取，不再
+解析全部记录。删除或修改的值恰好是最小值或最大值时，只把该字段标记为
+过期，读取时再重新计算该字段；数据集第一次读取统计时整体构建一次
+"""
+
+import json
+import math
+import time
+
+from dataset_column_store import json_field_expr
+
+# 构建统计时每批读取的行数
+SCAN_BATCH_SIZE = 5000
+
+# 每个字段累计的统计项在列表中的位置
+_COUNT, _NON_NULL, _NUMERIC, _SUM, _SUM_SQ, _MIN, _MAX = range(7)
+
+
+def _number(value):
+    """把字段值转换为有限的float，不是数值时返回None"""
+    if value is None or value == '' or isinstance(value, (dict, list)):
+        return None
+    try:
+        number = float(value)
+    except (ValueError, TypeError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _accumulate(totals, value):
+    """把一个字段值累加到统计项列表"""
+    totals[_COUNT] += 1
+    if value is None or value == '':
+        return
+    totals[_NON_NULL] += 1
+    number = _number(value)
+    if number is None:
+        return
+    totals[_NUMERIC] += 1
+    totals[_SUM] += number
+    totals[_SUM_SQ] += number * number
+    if totals[_MIN] is None or number < totals[_MIN]:
+        totals[_MIN] = number
+    if totals[_MAX] is None or number > totals[_MAX]:
+        totals[_MAX] = number
+
+
+def _new_totals():
+    return [0, 0, 0, 0.0, 0.0, None, None]
+
+
+class FieldStatsDelta:
+    """一批记录变更对字段统计的增量
+
+    add/remove/replace登记记录的新增、删除和更新，apply在调用方的事务中
+    写入增量；数据集尚未构建统计时apply不做任何操作
+    """
+
+    def __init__(self):
+        self.records = 0
+        self.added = {}
+        self.removed = {}
+
+    def add(self, data):
+        """登记一条新增的记录"""
+        if not isinstance(data, dict):
+            return
+        self.records += 1
+        for field_name, value in data.items():
+            _accumulate(self.added.setdefault(field_name, _new_totals()), value)
+
+    def remove(self, data):
+        """登记一条删除的记录"""
+        if not isinstance(data, dict):
+            return
+        self.records -= 1
+        for field_name, value in data.items():
+            _accumulate(self.removed.setdefault(field_name, _new_totals()), value)
+
+    def replace(self, old_data, new_data):
+        """登记一条记录的更新，只有值发生变化的字段参与统计"""
+        if not isinstance(old_data, dict) or not isinstance(new_data, dict):
+            self.remove(old_data)
+            self.add(new_data)
+            return
+        for field_name, value in old_data.items():
+            if field_name not in new_data or new_data[field_name] != value:
+                _accumulate(self.removed.setdefault(field_name, _new_totals()), value)
+        for field_name, value in new_data.items():
+            if field_name not in old_data or old_data[field_name] != value:
+                _accumulate(self.added.setdefault(field_name, _new_totals()), value)
+
+    def apply(self, conn, dataset_id):
+        """在conn当前的事务中写入增量（不提交）"""
+        dataset_id = int(dataset_id)
+        if not stats_enabled(conn, dataset_id):
+            return
+        if self.records:
+            conn.execute(
+                "UPDATE dataset_stats SET record_count = record_count + ? WHERE dataset_id = ?",
+                (self.records, dataset_id)
+            )
+        if self.removed:
+            # 删除的值达到当前最小值或最大值时，该字段的最小值/最大值需要重新计算
+            conn.executemany(
+                "UPDATE dataset_field_stats SET "
+                "value_count = value_count - ?, non_null_count = non_null_count - ?, "
+                "numeric_count = numeric_count - ?, sum_value = sum_value - ?, "
+                "sum_squares = sum_squares - ?, "
+                "stale = CASE WHEN ? IS NOT NULL AND (min_value IS NULL OR ? <= min_value "
+                "OR ? >= max_value) THEN 1 ELSE stale END "
+                "WHERE dataset_id = ? AND field_name = ?",
+                [(t[_COUNT], t[_NON_NULL], t[_NUMERIC], t[_SUM], t[_SUM_SQ],
+                  t[_MIN], t[_MIN], t[_MAX], dataset_id, field_name)
+                 for field_name, t in self.removed.items()]
+            )
+        if self.added:
+            conn.executemany(
+                "INSERT INTO dataset_field_stats (dataset_id, field_name, value_count, "
+                "non_null_count, numeric_count, sum_value, sum_squares, min_value, max_value, stale) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0) "
+                "ON CONFLICT (dataset_id, field_name) DO UPDATE SET "
+                "value_count = value_count + excluded.value_count, "
+                "non_null_count = non_null_count + excluded.non_null_count, "
+                "numeric_count = numeric_count + excluded.numeric_count, "
+                "sum_value = sum_value + excluded.sum_value, "
+                "sum_squares = sum_squares + excluded.sum_squares, "
+                "min_value = CASE WHEN min_value IS NULL THEN excluded.min_value "
+                "WHEN excluded.min_value IS NULL THEN min_value "
+                "ELSE MIN(min_value, excluded.min_value) END, "
+                "max_value = CASE WHEN max_value IS NULL THEN excluded.max_value "
+                "WHEN excluded.max_value IS NULL THEN max_value "
+                "ELSE MAX(max_value, excluded.max_value) END",
+                [(dataset_id, field_name) + tuple(t[_COUNT:_SUM_SQ + 1]) + (t[_MIN], t[_MAX])
+                 for field_name, t in self.added.items()]
+            )
+
+
+def stats_enabled(conn, dataset_id):
+    """数据集是否已构建字段统计（未构建时不需要维护增量）"""
+    return conn.execute(
+        "SELECT 1 FROM dataset_stats WHERE dataset_id = ?", (int(dataset_id),)
+    ).fetchone() is not None
+
+
+def load_entry_data(conn, entry_ids):
+    """读取记录的JSON数据
+
+    Returns:
+        dict: {记录ID: 解析后的数据}，无法解析的记录为None
+    """
+    entry_ids = list(entry_ids)
+    result = {}
+    for start in range(0, len(entry_ids), 500):
+        chunk = entry_ids[start:start + 500]
+        placeholders = ', '.join('?' for _ in chunk)
+        for entry_id, data in conn.execute(
+                f"SELECT id, data FROM dataset_entries WHERE id IN ({placeholders})", chunk):
+            try:
+                result[entry_id] = json.loads(data)
+            except (json.JSONDecodeError, TypeError):
+                result[entry_id] = None
+    return result
+
+
+def clear_field_stats(conn, dataset_id):
+    """删除数据集的字段统计，下次读取时重新构建（不提交）"""
+    conn.execute("DELETE FROM dataset_field_stats WHERE dataset_id = ?", (int(dataset_id),))
+    conn.execute("DELETE FROM dataset_stats WHERE dataset_id = ?", (int(dataset_id),))
+
+
+def _begin_write(conn):
+    """开始写事务，构建统计期间其他连接不能写入记录"""
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+
+
+def rebuild_field_stats(conn, dataset_id):
+    """扫描数据集的全部记录，重新构建字段统计并提交"""
+    dataset_id = int(dataset_id)
+    _begin_write(conn)
+    try:
+        delta = FieldStatsDelta()
+        cursor = conn.execute("SELECT data FROM dataset_entries WHERE dataset_id = ?", (dataset_id,))
+        while True:
+            rows = cursor.fetchmany(SCAN_BATCH_SIZE)
+            if not rows:
+                break
+            for (data,) in rows:
+                try:
+                    delta.add(json.loads(data))
+                except (json.JSONDecodeError, TypeError):
+                    continue
+
+        clear_field_stats(conn, dataset_id)
+        conn.execute(
+            "INSERT INTO dataset_stats (dataset_id, record_count, rebuilt_at) VALUES (?, ?, ?)",
+            (dataset_id, delta.records, time.time())
+        )
+        delta.records = 0
+        delta.apply(conn, dataset_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def refresh_stale_fields(conn, dataset_id, fields):
+    """重新计算过期字段的非空数、数值统计和最小值/最大值并提交
+
+    记录数（value_count）按整数增量维护，始终准确，不需要重新计算
+    """
+    dataset_id = int(dataset_id)
+    fields = list(fields)
+    _begin_write(conn)
+    try:
+        totals = {field_name: _new_totals() for field_name in fields}
+        select_list = ', '.join(json_field_expr(field_name) for field_name in fields)
+        cursor = conn.execute(
+            f"SELECT {select_list} FROM dataset_entries WHERE dataset_id = ? AND json_valid(data)",
+            (dataset_id,)
+        )
+        while True:
+            rows = cursor.fetchmany(SCAN_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                for field_name, value in zip(fields, row):
+                    if value is not None:
+                        _accumulate(totals[field_name], value)
+
+        conn.executemany(
+            "UPDATE dataset_field_stats SET non_null_count = ?, numeric_count = ?, sum_value = ?, "
+            "sum_squares = ?, min_value = ?, max_value = ?, stale = 0 "
+            "WHERE dataset_id = ? AND field_name = ?",
+            [tuple(t[_NON_NULL:]) + (dataset_id, field_name) for field_name, t in totals.items()]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def load_field_stats(conn, dataset_id):
+    """读取数据集的字段统计，尚未构建或有过期字段时先更新
+
+    Args:
+        conn: SQLite连接
+        dataset_id: 数据集ID
+
+    Returns:
+        tuple: (记录总数, {字段名: 统计信息})，统计信息包括count、non_null、
+               numeric_count、min、max、sum、sum_squares、mean、std
+    """
+    dataset_id = int(dataset_id)
+    if not stats_enabled(conn, dataset_id):
+        rebuild_field_stats(conn, dataset_id)
+
+    stale = [row[0] for row in conn.execute(
+        "SELECT field_name FROM dataset_field_stats WHERE dataset_id = ? AND stale = 1 "
+        "AND value_count > 0",
+        (dataset_id,)
+    )]
+    if stale:
+        refresh_stale_fields(conn, dataset_id, stale)
+
+    record_count = conn.execute(
+        "SELECT record_count FROM dataset_stats WHERE dataset_id = ?", (dataset_id,)
+    ).fetchone()[0]
+
+    fields = {}
+    for (field_name, value_count, non_null_count, numeric_count, sum_value, sum_squares,
+         min_value, max_value) in conn.execute(
+            "SELECT field_name, value_count, non_null_count, numeric_count, sum_value, "
+            "sum_squares, min_value, max_value FROM dataset_field_stats "
+            "WHERE dataset_id = ? AND value_count > 0",
+            (dataset_id,)):
+        stats = {
+            'count': value_count,
+            'non_null': non_null_count,
+            'numeric_count': numeric_count,
+            'min': None,
+            'max': None,
+            'sum': None,
+            'sum_squares': None,
+            'mean': None,
+            'std': None
+        }
+        if numeric_count > 0:
+            mean = sum_value / numeric_count
+            stats.update(min=min_value, max=max_value, sum=sum_value, sum_squares=sum_squares,
+                         mean=mean)
+            if numeric_count > 1:
+                # 样本标准差，平方和相减的舍入误差可能使方差略小于0
+                variance = (sum_squares - numeric_count * mean * mean) / (numeric_count - 1)
+                stats['std'] = math.sqrt(max(variance, 0.0))
+        fields[field_name] = stats
+    return record_count, fields
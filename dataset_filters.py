@@ -0,0 +1,249 @@
+"""
+数据集筛选条件编译模块
+
+将数据查看/导出接口使用的筛选条件（全文搜索、高级筛选、单独筛选参数）
+编译为基于json_extract的SQL条件，使筛选、计数和分页都在SQLite中完成。
+文本匹配沿用原Python筛选的规则：空值、0和false不参与匹配，忽略大小写时按
+str.lower()处理。SQLite的LIKE只忽略ASCII字母的大小写，搜索文本中含有分大小写
+的非ASCII字符（如É、Ä、Д）时改用Python函数text_match比较，执行这类条件的连接
+需要先调用register_filter_functions
+"""
+
+from dataset_column_store import json_field_expr
+from dataset_indexes import key_candidates
+
+
+# 单独筛选参数（filter_op_N）使用的操作符简写
+OPERATOR_ALIASES = {
+    'eq': 'equals',
+    'neq': 'notEquals',
+    'gt': 'greaterThan',
+    'gte': 'greaterThanOrEqual',
+    'lt': 'lessThan',
+    'lte': 'lessThanOrEqual',
+    'starts': 'startsWith',
+    'ends': 'endsWith',
+}
+
+NUMERIC_OPERATORS = {
+    'greaterThan': '>',
+    'greaterThanOrEqual': '>=',
+    'lessThan': '<',
+    'lessThanOrEqual': '<=',
+}
+
+
+def escape_like(value):
+    """转义LIKE模式中的通配符，配合 ESCAPE '\\' 使用"""
+    return str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def truthy_expr(expr):
+    """JSON字段值在Python中为真值的条件：排除NULL、空字符串、0和false"""
+    return f"({expr} IS NOT NULL AND {expr} != '' AND NOT (typeof({expr}) IN ('integer', 'real') AND {expr} = 0))"
+
+
+def needs_python_lower(value):
+    """搜索文本中是否有LIKE无法正确忽略大小写的字符（分大小写的非ASCII字符）"""
+    return any(ord(ch) > 127 and ch.lower() != ch.upper() for ch in str(value))
+
+
+def text_match(value, operator, needle):
+    """与原Python筛选相同的文本匹配，注册为SQLite函数使用
+
+    Args:
+        value: 字段值
+        operator: contains、startsWith或endsWith
+        needle: 已转换为小写的搜索文本
+
+    Returns:
+        int: 匹配返回1，否则返回0
+    """
+    if not value:
+        return 0
+    text = str(value).lower()
+    if operator == 'startsWith':
+        return int(text.startswith(needle))
+    if operator == 'endsWith':
+        return int(text.endswith(needle))
+    return int(needle in text)
+
+
+def register_filter_functions(conn):
+    """在sqlite3连接上注册筛选条件使用的Python函数"""
+    conn.create_function('text_match', 3, text_match, deterministic=True)
+
+
+def numeric_expr(expr):
+    """将JSON字段表达式转换为数值，非数值返回NULL
+
+    与Python中float()的判断保持一致：数值类型直接使用，文本只有
+    由数字、小数点、指数和正负号组成时才转换
+    """
+    trimmed = f"trim({expr})"
+    return (
+        f"(CASE WHEN typeof({expr}) IN ('integer', 'real') THEN {expr} "
+        f"WHEN typeof({expr}) = 'text' AND {trimmed} GLOB '*[0-9]*' "
+        f"AND {trimmed} NOT GLOB '*[^0-9.eE+-]*' THEN CAST({trimmed} AS REAL) END)"
+    )
+
+
+class FilterCompiler:
+    """筛选条件编译器
+
+    生成使用命名参数（:f0, :f1 ...）的SQL条件，可以用于SQLAlchemy的
+    text()，也可以直接用于sqlite3连接。indexed_fields中的字段已建立表达式
+    索引（见dataset_indexes），等值条件会额外生成可以命中索引的预筛选条件
+    """
+
+    def __init__(self, column='dataset_entries.data', case_insensitive_equals=False,
+                 indexed_fields=None, require_fields=False):
+        self.column = column
+        self.case_insensitive_equals = case_insensitive_equals
+        self.indexed_fields = set(indexed_fields or [])
+        self.require_fields = require_fields
+        self.params = {}
+        self._counter = 0
+
+    def param(self, value):
+        """登记一个参数并返回其占位符"""
+        name = f"f{self._counter}"
+        self._counter += 1
+        self.params[name] = value
+        return f":{name}"
+
+    def field(self, field_name):
+        return json_field_expr(field_name, self.column)
+
+    def compile_condition(self, field_name, operator, value):
+        """编译单个筛选条件
+
+        Args:
+            field_name: 字段名
+            operator: 操作符（支持简写）
+            value: 比较值，between操作符为 {"min": .., "max": ..}
+
+        Returns:
+            str: SQL条件；无需筛选（内部字段或未知操作符）时返回None
+        """
+        if not field_name or str(field_name).startswith('_'):
+            return None
+
+        operator = OPERATOR_ALIASES.get(operator, operator)
+        expr = self.field(field_name)
+        text_expr = f"CAST({expr} AS TEXT)"
+
+        if operator in ('equals', 'notEquals'):
+            if self.case_insensitive_equals:
+                condition = f"lower({text_expr}) = lower({self.param(str(value))})"
+            else:
+                condition = f"{text_expr} = {self.param(str(value))}"
+            if operator == 'equals':
+                if field_name in self.indexed_fields:
+                    # 索引预筛选：字段值（忽略ASCII大小写）等于文本或数值形式之一
+                    placeholders = ', '.join(self.param(v) for v in key_candidates(value))
+                    return f"{expr} COLLATE NOCASE IN ({placeholders}) AND {condition}"
+                return condition
+            return f"({expr} IS NULL OR NOT ({condition}))"
+
+        if operator in ('contains', 'startsWith', 'endsWith'):
+            if needs_python_lower(value):
+                return f"text_match({expr}, '{operator}', {self.param(str(value).lower())})"
+            escaped = escape_like(str(value))
+            pattern = {
+                'contains': f"%{escaped}%",
+                'startsWith': f"{escaped}%",
+                'endsWith': f"%{escaped}",
+            }[operator]
+            return f"({truthy_expr(expr)} AND {text_expr} LIKE {self.param(pattern)} ESCAPE '\\')"
+
+        if operator in NUMERIC_OPERATORS:
+            try:
+                number = float(value)
+            except (ValueError, TypeError):
+                return "0"
+            return f"{numeric_expr(expr)} {NUMERIC_OPERATORS[operator]} {self.param(number)}"
+
+        if operator == 'between':
+            try:
+                min_val = float(value.get('min', 0))
+                max_val = float(value.get('max', 0))
+            except (ValueError, TypeError, AttributeError):
+                return "0"
+            return f"{numeric_expr(expr)} BETWEEN {self.param(min_val)} AND {self.param(max_val)}"
+
+        if operator == 'isNull':
+            return f"({expr} IS NULL OR {text_expr} = '')"
+
+        if operator == 'isNotNull':
+            return f"({expr} IS NOT NULL AND {text_expr} != '')"
+
+        return None
+
+    def compile_filters(self, filters):
+        """编译多个筛选条件（AND关系）
+
+        Args:
+            filters: [{"field": .., "operator": .., "value": ..}, ...]
+
+        Returns:
+            list: SQL条件列表
+        """
+        conditions = []
+        for filter_item in filters or []:
+            field_name = filter_item.get('field')
+            if self.require_fields and field_name and not str(field_name).startswith('_'):
+                # 导出接口的规则：记录中不存在筛选字段时不匹配
+                conditions.append(f"{self.field(field_name)} IS NOT NULL")
+            condition = self.compile_condition(
+                filter_item.get('field'),
+                filter_item.get('operator'),
+                filter_item.get('value')
+            )
+            if condition:
+                conditions.append(condition)
+        return conditions
+
+    def compile_search(self, search):
+        """编译全文搜索条件：任意非内部字段的值包含搜索文本"""
+        if needs_python_lower(search):
+            match = f"text_match(je.value, 'contains', {self.param(str(search).lower())})"
+        else:
+            match = (f"{truthy_expr('je.value')} "
+                     f"AND CAST(je.value AS TEXT) LIKE {self.param(f'%{escape_like(search)}%')} ESCAPE '\\'")
+        return (
+            f"EXISTS (SELECT 1 FROM json_each({self.column}) AS je "
+            f"WHERE je.key NOT LIKE '\\_%' ESCAPE '\\' AND {match})"
+        )
+
+    def exclude_demo_data(self):
+        """排除标记为演示数据（_demo_data）的记录"""
+        demo = json_field_expr('_demo_data', self.column)
+        return f"({demo} IS NULL OR {demo} IN (0, ''))"
+
+
+def compile_entry_filters(search=None, filters=None, exclude_demo=False,
+                          column='dataset_entries.data', case_insensitive_equals=False,
+                          indexed_fields=None, require_fields=False):
+    """编译数据记录的完整筛选条件
+
+    Args:
+        search: 全文搜索文本
+        filters: 筛选条件列表（高级筛选或单独筛选参数）
+        exclude_demo: 是否排除演示数据
+        column: 保存JSON的列名
+        case_insensitive_equals: equals/notEquals是否忽略大小写
+        indexed_fields: 已建立表达式索引的字段名
+        require_fields: 筛选字段不存在的记录是否排除
+
+    Returns:
+        tuple: (SQL条件, 参数字典)；条件始终要求data为合法JSON
+    """
+    compiler = FilterCompiler(column, case_insensitive_equals, indexed_fields, require_fields)
+    conditions = [f"json_valid({column})"]
+    if exclude_demo:
+        conditions.append(compiler.exclude_demo_data())
+    if search:
+        conditions.append(compiler.compile_search(search))
+    conditions.extend(compiler.compile_filters(filters))
+    return ' AND '.join(conditions), compiler.params
@@ -0,0 +1,237 @@
+"""
+数据集批量导入模块
+
+导入的记录先在内存中按批缓存，每满一批用executemany写入dataset_entries，
+不经过ORM会话，内存占用只与批大小有关。按主键导入时，每批记录的主键
+通过字段表达式索引一次查出对应的已有记录，不需要预先加载整个数据集。
+每批记录对字段统计的增量和数据集的数据版本号与记录在同一事务中写入
+"""
+
+import json
+import sqlite3
+import time
+from datetime import datetime
+
+from dataset_column_store import bump_data_version, json_field_expr
+from dataset_field_stats import FieldStatsDelta, load_entry_data, stats_enabled
+from dataset_indexes import key_candidates
+
+
+# 每批写入的记录数
+IMPORT_BATCH_SIZE = 1000
+
+# 每次主键查询包含的键数量
+KEY_LOOKUP_CHUNK_SIZE = 400
+
+
+def db_timestamp():
+    """当前UTC时间，格式与SQLAlchemy在SQLite中保存的DateTime一致"""
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S.%f')
+
+
+def current_max_id(conn, dataset_id):
+    """数据集当前的最大记录ID，没有记录时为0"""
+    return conn.execute(
+        "SELECT COALESCE(MAX(id), 0) FROM dataset_entries WHERE dataset_id = ?",
+        (int(dataset_id),)
+    ).fetchone()[0]
+
+
+class BulkImporter:
+    """批量导入引擎
+
+    Args:
+        db_path: SQLite数据库路径
+        dataset_id: 目标数据集ID
+        user_id: 导入用户ID
+        batch_size: 每批写入的记录数
+        atomic: 为True时所有批次在同一个事务中，出错时可以整体回滚；
+                为False时每批单独提交
+        key_field: 主键字段，设置后通过upsert登记记录
+        duplicate_strategy: 主键已存在时的处理策略：update更新已有记录，
+                            skip跳过，keep_both标记为重复后仍然插入
+        max_existing_id: 参与主键匹配的最大记录ID，为None时取导入开始时的最大ID
+        checkpoint: 每批提交前调用的函数 checkpoint(conn)，可以在同一事务中
+                    记录导入进度（非原子模式）
+    """
+
+    def __init__(self, db_path, dataset_id, user_id, batch_size=IMPORT_BATCH_SIZE, atomic=False,
+                 key_field=None, duplicate_strategy='update', max_existing_id=None, checkpoint=None):
+        self.dataset_id = int(dataset_id)
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.atomic = atomic
+        self.key_field = key_field
+        self.duplicate_strategy = duplicate_strategy
+        self.checkpoint = checkpoint
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        self.committed_batches = 0
+        self._inserts = []
+        self._updates = []
+        self._keyed = []
+        self._started = time.time()
+        # 只有导入开始前已存在的记录参与主键匹配，本次导入新增的记录不参与
+        self.max_existing_id = max_existing_id
+        if key_field and max_existing_id is None:
+            self.max_existing_id = current_max_id(self.conn, self.dataset_id)
+
+    @property
+    def pending(self):
+        return len(self._inserts) + len(self._updates) + len(self._keyed)
+
+    def insert(self, data):
+        """登记一条新记录"""
+        self._inserts.append(data)
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def update(self, entry_id, data):
+        """登记一条对已有记录的更新"""
+        self._updates.append((data, entry_id))
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def upsert(self, data):
+        """按主键登记一条记录
+
+        写入批次时统一查找主键对应的已有记录，再按duplicate_strategy
+        决定更新、跳过或插入；没有主键字段的记录直接插入
+        """
+        self._keyed.append(data)
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def find_existing(self, keys):
+        """批量查找主键对应的已有记录
+
+        与逐条比较的规则一致：str(字段值) == 主键，多条记录主键相同时取ID最大的一条
+
+        Args:
+            keys: 主键值（字符串）集合
+
+        Returns:
+            dict: {主键: 记录ID}
+        """
+        expr = json_field_expr(self.key_field, 'data')
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), KEY_LOOKUP_CHUNK_SIZE):
+            chunk = keys[start:start + KEY_LOOKUP_CHUNK_SIZE]
+            wanted = set(chunk)
+            candidates = [candidate for key in chunk for candidate in key_candidates(key)]
+            placeholders = ', '.join('?' for _ in candidates)
+            rows = self.conn.execute(
+                f"SELECT id, data FROM dataset_entries "
+                f"WHERE dataset_id = ? AND {expr} COLLATE NOCASE IN ({placeholders}) AND id <= ? "
+                f"ORDER BY id",
+                [self.dataset_id] + candidates + [self.max_existing_id]
+            ).fetchall()
+            for entry_id, data in rows:
+                try:
+                    entry_data = json.loads(data)
+                except (json.JSONDecodeError, TypeError):
+                    continue
+                if not isinstance(entry_data, dict) or self.key_field not in entry_data:
+                    continue
+                key = str(entry_data[self.key_field])
+                if key in wanted:
+                    found[key] = entry_id
+        return found
+
+    def _resolve_keyed(self):
+        """把按主键登记的记录分配到插入或更新队列"""
+        keyed = self._keyed
+        self._keyed = []
+        keys = {str(data[self.key_field]) for data in keyed if self.key_field in data}
+        existing = self.find_existing(keys) if keys else {}
+        for data in keyed:
+            entry_id = existing.get(str(data[self.key_field])) if self.key_field in data else None
+            if entry_id is None:
+                self._inserts.append(data)
+            elif self.duplicate_strategy == 'update':
+                self._updates.append((data, entry_id))
+            elif self.duplicate_strategy == 'keep_both':
+                data['_duplicate'] = True
+                data['_original_id'] = entry_id
+                self._inserts.append(data)
+            else:
+                self.skipped += 1
+
+    def flush(self):
+        """写入当前批次，非原子模式下同时提交"""
+        if self._keyed:
+            self._resolve_keyed()
+        if not self._inserts and not self._updates:
+            return
+        now = db_timestamp()
+        cursor = self.conn.cursor()
+        delta = FieldStatsDelta() if stats_enabled(self.conn, self.dataset_id) else None
+        if self._inserts:
+            cursor.executemany(
+                "INSERT INTO dataset_entries (dataset_id, user_id, data, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(self.dataset_id, self.user_id, json.dumps(data), now, now) for data in self._inserts]
+            )
+            self.inserted += len(self._inserts)
+            if delta:
+                for data in self._inserts:
+                    delta.add(data)
+        if self._updates:
+            if delta:
+                old_data = load_entry_data(self.conn, [entry_id for _, entry_id in self._updates])
+                for data, entry_id in self._updates:
+                    if entry_id in old_data:
+                        delta.replace(old_data[entry_id], data)
+                        # 同一批中多次更新同一条记录时，后一次以前一次的结果为旧值
+                        old_data[entry_id] = data
+            cursor.executemany(
+                "UPDATE dataset_entries SET data = ?, updated_at = ? WHERE id = ? AND dataset_id = ?",
+                [(json.dumps(data), now, entry_id, self.dataset_id) for data, entry_id in self._updates]
+            )
+            self.updated += len(self._updates)
+        if delta:
+            delta.apply(self.conn, self.dataset_id)
+        bump_data_version(self.conn, self.dataset_id)
+        self._inserts = []
+        self._updates = []
+        if not self.atomic:
+            if self.checkpoint:
+                self.checkpoint(self.conn)
+            self.conn.commit()
+            self.committed_batches += 1
+
+    def commit(self):
+        """写入剩余记录并提交"""
+        self.flush()
+        self.conn.commit()
+
+    def rollback(self):
+        """放弃未提交的记录"""
+        self._inserts = []
+        self._updates = []
+        self._keyed = []
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+    @property
+    def elapsed(self):
+        return time.time() - self._started
+
+    @property
+    def rows_per_second(self):
+        """写入速度（行/秒）"""
+        elapsed = self.elapsed
+        return round((self.inserted + self.updated) / elapsed, 1) if elapsed > 0 else 0.0
+
+    def stats(self):
+        """导入性能统计"""
+        return {
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': self.rows_per_second,
+            'batch_size': self.batch_size
+        }
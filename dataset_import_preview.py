@@ -0,0 +1,208 @@
+"""
+导入预览模块
+
+只读取文件开头的一部分（CSV最多读取固定字节数，Excel只解析前N行）
+生成预览，并根据样本推断各列类型，预览耗时与文件大小无关。
+CSV文件超过读取上限时，总行数按样本的平均行长度估算
+"""
+
+import io
+import math
+from datetime import datetime
+
+import pandas as pd
+
+from dataset_csv_reader import CSVStreamReader
+from dataset_excel_reader import column_text_values, excel_engine
+
+
+# 默认预览行数和允许的最大预览行数
+PREVIEW_ROWS = 10
+MAX_PREVIEW_ROWS = 100
+
+# CSV预览最多读取的字节数
+PREVIEW_MAX_BYTES = 1024 * 1024
+
+# 用于推断列类型的最大样本行数
+TYPE_SAMPLE_ROWS = 1000
+
+# 识别为日期的文本格式
+DATE_FORMATS = (
+    '%Y-%m-%d', '%Y/%m/%d', '%Y.%m.%d', '%Y年%m月%d日',
+    '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y/%m/%d %H:%M',
+    '%Y-%m-%dT%H:%M:%S',
+)
+
+
+def infer_value_type(value):
+    """推断单个文本值的类型
+
+    Returns:
+        str: number、date或text；空值返回None
+    """
+    text = str(value).strip()
+    if not text:
+        return None
+    # 以0开头的多位数字（如编号）按文本处理
+    if len(text) > 1 and text[0] == '0' and text[1] != '.':
+        return 'text'
+    try:
+        number = float(text)
+        if math.isfinite(number):
+            return 'number'
+    except ValueError:
+        pass
+    for date_format in DATE_FORMATS:
+        try:
+            datetime.strptime(text, date_format)
+            return 'date'
+        except ValueError:
+            continue
+    return 'text'
+
+
+def infer_column_types(headers, rows):
+    """根据样本行推断各列类型（与数据集自定义字段类型一致：text、number、date）
+
+    Args:
+        headers: 列名列表
+        rows: 样本行（与headers按位置对应）
+
+    Returns:
+        list: [{"name": 列名, "type": 类型, "non_empty": 非空值个数}, ...]；
+              全部为数值或全部为日期的列分别为number、date，其余为text
+    """
+    column_types = []
+    for j, name in enumerate(headers):
+        kinds = set()
+        non_empty = 0
+        for row in rows:
+            if j >= len(row):
+                continue
+            kind = infer_value_type(row[j])
+            if kind is None:
+                continue
+            non_empty += 1
+            kinds.add(kind)
+            if len(kinds) > 1:
+                break
+        column_type = kinds.pop() if len(kinds) == 1 else 'text'
+        column_types.append({'name': name, 'type': column_type, 'non_empty': non_empty})
+    return column_types
+
+
+def stream_size(stream):
+    """获取可定位文件流的总字节数，无法获取时返回None"""
+    try:
+        position = stream.tell()
+        stream.seek(0, io.SEEK_END)
+        size = stream.tell()
+        stream.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def preview_csv(stream, has_header=True, max_rows=PREVIEW_ROWS, max_bytes=PREVIEW_MAX_BYTES):
+    """读取CSV文件开头生成预览
+
+    Args:
+        stream: 二进制文件流
+        has_header: 第一行是否为表头
+        max_rows: 预览行数
+        max_bytes: 最多读取的字节数
+
+    Returns:
+        dict: headers、preview_data、column_types、total_rows、total_rows_estimated、encoding
+    """
+    file_size = stream_size(stream)
+    sample = stream.read(max_bytes)
+    truncated = len(sample) == max_bytes and bool(stream.read(1))
+    if truncated:
+        # 丢弃被截断的最后一行
+        cut = sample.rfind(b'\n')
+        if cut >= 0:
+            sample = sample[:cut + 1]
+
+    reader = CSVStreamReader(io.BytesIO(sample), has_header=has_header)
+    preview_rows = []
+    type_rows = []
+    sample_rows = 0
+    for row in reader:
+        sample_rows += 1
+        if not row:
+            continue
+        if len(preview_rows) < max_rows:
+            preview_rows.append(row)
+        if len(type_rows) < TYPE_SAMPLE_ROWS:
+            type_rows.append(row)
+
+    total_rows = sample_rows
+    if truncated and file_size and sample:
+        total_rows = int(round(sample_rows * file_size / len(sample)))
+
+    return {
+        'headers': reader.headers,
+        'preview_data': preview_rows,
+        'column_types': infer_column_types(reader.headers, type_rows),
+        'total_rows': total_rows,
+        'total_rows_estimated': truncated,
+        'encoding': reader.encoding,
+    }
+
+
+def _sheet_row_count(excel, sheet_name):
+    """从工作簿元数据读取工作表行数（不解析单元格），无法获取时返回None"""
+    book = excel.book
+    try:
+        if hasattr(book, 'sheet_by_name'):  # xlrd
+            return book.sheet_by_name(sheet_name).nrows
+        if hasattr(book, 'get_sheet_by_name'):  # calamine
+            return book.get_sheet_by_name(sheet_name).total_height
+        return book[sheet_name].max_row  # openpyxl
+    except Exception:
+        return None
+
+
+def preview_excel(stream, has_header=True, max_rows=PREVIEW_ROWS, sheet_name=None):
+    """读取Excel工作表的前几行生成预览
+
+    Args:
+        stream: 二进制文件流
+        has_header: 第一行是否为表头
+        max_rows: 预览行数
+        sheet_name: 工作表名称，默认第一个工作表
+
+    Returns:
+        dict: headers、preview_data、column_types、total_rows、total_rows_estimated、
+              sheet_names、sheet_name
+    """
+    engine = excel_engine()
+    with pd.ExcelFile(stream, engine=engine) as excel:
+        sheet_names = excel.sheet_names
+        sheet_name = sheet_name if sheet_name in sheet_names else sheet_names[0]
+        df = excel.parse(sheet_name, header=0 if has_header else None,
+                         nrows=max(max_rows, TYPE_SAMPLE_ROWS))
+        row_count = _sheet_row_count(excel, sheet_name)
+
+    if has_header:
+        headers = [str(column_name) for column_name in df.columns]
+    else:
+        headers = [f'列{i+1}' for i in range(len(df.columns))]
+
+    columns = [column_text_values(df.iloc[:, j]) for j in range(len(df.columns))]
+    rows = [list(values) for values in zip(*columns)]
+
+    total_rows = len(rows)
+    if row_count is not None:
+        total_rows = max(row_count - (1 if has_header else 0), 0)
+
+    return {
+        'headers': headers,
+        'preview_data': rows[:max_rows],
+        'column_types': infer_column_types(headers, rows),
+        'total_rows': total_rows,
+        'total_rows_estimated': False,
+        'sheet_names': sheet_names,
+        'sheet_name': sheet_name,
+    }
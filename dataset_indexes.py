@@ -0,0 +1,80 @@
+"""
+数据集字段索引模块
+
+为dataset_entries.data中经常用于筛选和查找的字段（如患者编号、诊断编码）
+建立SQLite表达式索引。索引表达式与dataset_filters生成的字段表达式一致，
+查询规划器可以直接使用。
+"""
+
+import hashlib
+
+from dataset_column_store import json_field_expr
+
+
+def index_name_for(field_name):
+    """根据字段名生成索引名（同名字段在各数据集之间共用一个索引）"""
+    digest = hashlib.md5(str(field_name).encode('utf-8')).hexdigest()[:16]
+    return f"ix_dataset_entries_field_{digest}"
+
+
+def index_exists(conn, field_name):
+    """检查字段索引是否已存在"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?",
+        (index_name_for(field_name),)
+    ).fetchone()
+    return row is not None
+
+
+def create_field_index(conn, field_name):
+    """创建字段表达式索引
+
+    索引列为 (dataset_id, 字段表达式 COLLATE NOCASE)，既支持精确匹配，
+    也支持导出接口忽略大小写的匹配
+
+    Args:
+        conn: sqlite3连接
+        field_name: 字段名
+
+    Returns:
+        str: 索引名
+    """
+    name = index_name_for(field_name)
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS {name} ON dataset_entries "
+        f"(dataset_id, {json_field_expr(field_name, 'data')} COLLATE NOCASE)"
+    )
+    conn.execute("ANALYZE dataset_entries")
+    conn.commit()
+    return name
+
+
+def drop_field_index(conn, field_name):
+    """删除字段表达式索引"""
+    conn.execute(f"DROP INDEX IF EXISTS {index_name_for(field_name)}")
+    conn.commit()
+
+
+def key_candidates(value):
+    """字段等值查找的候选值
+
+    JSON中同一个值可能以字符串或数字保存，查找时两种形式都需要匹配
+
+    Args:
+        value: 要查找的值
+
+    Returns:
+        list: 候选值列表
+    """
+    candidates = [str(value)]
+    if str(value) in ('True', 'False'):
+        # JSON布尔值在SQLite中提取为整数1/0
+        candidates.append(1 if str(value) == 'True' else 0)
+    try:
+        number = float(value)
+        if number == number:  # 排除NaN
+            candidates.append(number)
+    except (ValueError, TypeError):
+        pass
+    return candidates
+
@@ -0,0 +1,95 @@
+"""
+数据集记录游标分页模块
+
+数据记录按 (created_at DESC, id DESC) 排序，游标保存上一页最后一条记录的
+(created_at, id)，下一页只取排在游标之后的记录，在索引上直接定位，
+翻页耗时与页码无关。created_at为NULL的记录按空字符串参与排序和比较
+（排在最后），否则与NULL的比较结果为NULL，这些记录在翻页时会被跳过
+"""
+
+import base64
+import json
+
+
+# 记录列表的统一排序
+PAGE_ORDER_SQL = "ORDER BY COALESCE(de.created_at, '') DESC, de.id DESC"
+
+
+def encode_cursor(created_at, entry_id):
+    """生成不透明的分页游标
+
+    Args:
+        created_at: 记录创建时间（数据库中的原始值）
+        entry_id: 记录ID
+
+    Returns:
+        str: URL安全的游标字符串
+    """
+    raw = json.dumps([str(created_at) if created_at is not None else '', int(entry_id)],
+                     ensure_ascii=True, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """解析分页游标
+
+    Args:
+        cursor: encode_cursor生成的游标字符串
+
+    Returns:
+        tuple: (created_at, id)
+
+    Raises:
+        ValueError: 游标格式无效
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, entry_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return str(created_at), int(entry_id)
+    except Exception:
+        raise ValueError('无效的分页游标')
+
+
+def cursor_condition(cursor, params):
+    """生成游标之后的记录的SQL条件，并登记参数
+
+    Args:
+        cursor: 游标字符串
+        params: 命名参数字典（会被修改）
+
+    Returns:
+        str: SQL条件
+    """
+    created_at, entry_id = decode_cursor(cursor)
+    params['cursor_created_at'] = created_at
+    params['cursor_id'] = entry_id
+    # 等价于 (COALESCE(created_at, ''), id) < (游标)；表达式上的行值比较不能用索引定位范围，拆开写
+    return ("COALESCE(de.created_at, '') <= :cursor_created_at AND "
+            "(COALESCE(de.created_at, '') < :cursor_created_at OR de.id < :cursor_id)")
+
+
+def fetch_page(cursor_obj, query, params, limit, offset=0):
+    """执行分页查询，多取一条判断是否还有下一页
+
+    Args:
+        cursor_obj: sqlite3游标（row_factory为sqlite3.Row，结果需包含id和created_at）
+        query: 已包含排序的查询语句，不含LIMIT
+        params: 命名参数字典
+        limit: 每页记录数
+        offset: 跳过的记录数（按页码分页时使用）
+
+    Returns:
+        tuple: (本页记录列表, 下一页游标或None)
+    """
+    page_params = dict(params)
+    page_params['page_limit'] = limit + 1
+    page_params['page_offset'] = offset
+    cursor_obj.execute(f"{query} LIMIT :page_limit OFFSET :page_offset", page_params)
+    rows = cursor_obj.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if rows:
+            last = rows[-1]
+            next_cursor = encode_cursor(last['created_at'], last['id'])
+    return rows, next_cursor
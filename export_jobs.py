@@ -0,0 +1,148 @@
+"""
+后台导出任务模块
+
+大数据集的Excel导出和多数据集zip导出在后台线程池中生成文件，
+前端通过任务ID查询进度并下载结果。生成的文件缓存在磁盘上，
+超过有效期后自动清理。
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobProgress:
+    """导出任务进度，由导出函数在写出过程中更新"""
+
+    def __init__(self, job):
+        self._job = job
+
+    def add_total(self, count):
+        """累加需要导出的总行数"""
+        self._job['total_rows'] = (self._job['total_rows'] or 0) + count
+
+    def advance(self, count=1):
+        """累加已导出的行数"""
+        self._job['processed_rows'] += count
+
+
+class ExportJobManager:
+    """导出任务管理器
+
+    Args:
+        output_dir: 导出文件目录
+        max_workers: 后台线程数
+        ttl_seconds: 导出文件的保留时间（秒）
+    """
+
+    def __init__(self, output_dir, max_workers=2, ttl_seconds=3600):
+        self.output_dir = output_dir
+        self.ttl_seconds = ttl_seconds
+        self._jobs = {}
+        self._cache = {}
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='export-job')
+        os.makedirs(output_dir, exist_ok=True)
+        self._remove_stale_files()
+
+    def submit(self, user_id, build, filename, mimetype, cache_key=None):
+        """提交导出任务
+
+        相同cache_key的任务仍在进行或结果未过期时直接返回该任务
+
+        Args:
+            user_id: 提交任务的用户ID
+            build: 导出函数 build(path, progress)，把结果写入path
+            filename: 下载时使用的文件名
+            mimetype: 下载文件的MIME类型
+            cache_key: 缓存键（需包含数据版本），为None时不缓存
+
+        Returns:
+            dict: 任务信息
+        """
+        self.purge_expired()
+        with self._lock:
+            if cache_key is not None:
+                cached_id = self._cache.get(cache_key)
+                cached = self._jobs.get(cached_id)
+                if cached and cached['status'] != 'failed':
+                    return dict(cached)
+
+            job_id = uuid.uuid4().hex
+            ext = os.path.splitext(filename)[1]
+            job = {
+                'id': job_id,
+                'user_id': user_id,
+                'status': 'queued',
+                'filename': filename,
+                'mimetype': mimetype,
+                'path': os.path.join(self.output_dir, f"{job_id}{ext}"),
+                'total_rows': None,
+                'processed_rows': 0,
+                'error': None,
+                'created_at': time.time(),
+                'finished_at': None,
+                'expires_at': None,
+                'cache_key': cache_key,
+            }
+            self._jobs[job_id] = job
+            if cache_key is not None:
+                self._cache[cache_key] = job_id
+
+        self._executor.submit(self._run, job, build)
+        return dict(job)
+
+    def get(self, job_id):
+        """获取任务信息（副本），任务不存在或已过期时返回None"""
+        self.purge_expired()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def purge_expired(self):
+        """删除已过期的任务及其文件"""
+        now = time.time()
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job['expires_at'] is not None and job['expires_at'] <= now]
+            for job in expired:
+                self._jobs.pop(job['id'], None)
+                if job['cache_key'] is not None and self._cache.get(job['cache_key']) == job['id']:
+                    self._cache.pop(job['cache_key'], None)
+        for job in expired:
+            self._remove_file(job['path'])
+
+    def _run(self, job, build):
+        job['status'] = 'running'
+        try:
+            build(job['path'], JobProgress(job))
+            job['status'] = 'completed'
+        except Exception as e:
+            print(f"导出任务 {job['id']} 失败: {str(e)}")
+            job['status'] = 'failed'
+            job['error'] = str(e)
+            self._remove_file(job['path'])
+        finally:
+            job['finished_at'] = time.time()
+            job['expires_at'] = job['finished_at'] + self.ttl_seconds
+
+    def _remove_stale_files(self):
+        """清理上次运行遗留的过期文件"""
+        cutoff = time.time() - self.ttl_seconds
+        for name in os.listdir(self.output_dir):
+            path = os.path.join(self.output_dir, name)
+            try:
+                if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            print(f"删除导出文件失败: {e}")
@@ -0,0 +1,361 @@
+"""
+后台导入任务模块
+
+大文件导入在后台线程中执行，前端通过任务ID查询进度。任务每提交一批记录，
+就在同一事务中把进度（已处理的源数据行数和各项计数）写入import_jobs表，
+因此进程崩溃或任务取消后，可以从最后提交的批次继续导入，不会重复写入。
+任务状态保存在数据库中，多个工作进程之间共享
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from dataset_csv_reader import CSV_CHUNK_SIZE, CSVStreamReader, mapping_row_mapper
+from dataset_excel_reader import frame_records, read_excel_frame
+from dataset_import import BulkImporter, current_max_id, db_timestamp
+
+
+# 任务中最多保存的错误信息条数
+MAX_SAVED_ERRORS = 100
+
+# 可以继续执行的任务状态
+RESUMABLE_STATUSES = ('failed', 'cancelled', 'interrupted')
+
+_JOB_COLUMNS = (
+    'id', 'dataset_id', 'user_id', 'status', 'filename', 'file_path', 'file_ext', 'owns_file',
+    'options', 'total_rows', 'processed_rows', 'inserted_rows', 'updated_rows', 'error_rows',
+    'max_existing_id', 'errors', 'message', 'cancel_requested', 'created_at', 'updated_at',
+    'finished_at'
+)
+
+
+class ImportRowError(Exception):
+    """不跳过错误时，某一行导入失败"""
+
+    def __init__(self, row_index, message):
+        super().__init__(f'导入第 {row_index} 行时出错: {message}')
+        self.row_index = row_index
+
+
+def open_import_source(file_path, file_ext, options):
+    """按导入接口（/api/datasets/import）的规则读取导入文件
+
+    Args:
+        file_path: 文件路径
+        file_ext: 文件扩展名（csv、xlsx、xls）
+        options: 导入选项（has_header、field_mapping、sheet_name）
+
+    Returns:
+        tuple: (总行数, 分块生成器)；CSV文件的总行数未知，为None。
+               每块为 [(行号, 记录字典), ...]
+    """
+    has_header = options.get('has_header', True)
+    field_mapping = options.get('field_mapping') or {}
+
+    if file_ext == 'csv':
+        def iter_csv_chunks():
+            with open(file_path, 'rb') as f:
+                reader = CSVStreamReader(f, has_header=has_header)
+                yield from reader.iter_chunks(mapping_row_mapper(reader.headers, field_mapping))
+        return None, iter_csv_chunks()
+
+    df = read_excel_frame(file_path, header=0 if has_header else None,
+                          sheet_name=options.get('sheet_name') or 0)
+    if not has_header:
+        df.columns = [f'列{i+1}' for i in range(len(df.columns))]
+    records = frame_records(df, [field_mapping[column_name] if column_name in field_mapping else None
+                                 for column_name in df.columns])
+
+    def iter_excel_chunks():
+        for start in range(0, len(records), CSV_CHUNK_SIZE):
+            # Excel行号从1开始，且有表头
+            yield [(index + 2, records[index])
+                   for index in range(start, min(start + CSV_CHUNK_SIZE, len(records)))]
+    return len(records), iter_excel_chunks()
+
+
+def _parse_timestamp(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S.%f')
+    except (TypeError, ValueError):
+        return None
+
+
+class ImportJobManager:
+    """导入任务管理器
+
+    Args:
+        db_path: SQLite数据库路径
+        max_workers: 后台线程数
+        stale_seconds: 运行中的任务超过该时间没有进度更新，且不在当前进程中
+                       执行时，视为已中断（进程崩溃或重启）
+        on_finish: 任务结束后调用的函数 on_finish(dataset_id)
+    """
+
+    def __init__(self, db_path, max_workers=2, stale_seconds=600, on_finish=None):
+        self.db_path = db_path
+        self.stale_seconds = stale_seconds
+        self.on_finish = on_finish
+        self._active = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='import-job')
+
+    def connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def create(self, job_id, user_id, dataset_id, filename, file_path, file_ext, options, owns_file=False):
+        """创建并提交导入任务
+
+        Args:
+            job_id: 任务ID
+            user_id: 导入用户ID
+            dataset_id: 目标数据集ID
+            filename: 原始文件名
+            file_path: 导入文件路径（任务可能在之后继续执行，文件需保留到任务完成）
+            file_ext: 文件扩展名
+            options: 导入选项（has_header、skip_errors、update_existing、primary_key、
+                     field_mapping、sheet_name）
+            owns_file: 文件是否属于任务，任务完成后删除
+
+        Returns:
+            dict: 任务信息
+        """
+        now = db_timestamp()
+        conn = self.connect()
+        try:
+            # 只有任务创建前已存在的记录参与主键匹配，继续执行时沿用同一个边界
+            max_existing_id = current_max_id(conn, dataset_id)
+            conn.execute(
+                "INSERT INTO import_jobs (id, dataset_id, user_id, status, filename, file_path, "
+                "file_ext, owns_file, options, processed_rows, inserted_rows, updated_rows, "
+                "error_rows, max_existing_id, errors, cancel_requested, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?, ?, 0, 0, 0, 0, ?, '[]', 0, ?, ?)",
+                (job_id, int(dataset_id), user_id, filename, file_path, file_ext, int(owns_file),
+                 json.dumps(options), max_existing_id, now, now)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        self._submit(job_id)
+        return self.get(job_id)
+
+    def get(self, job_id):
+        """获取任务信息，不存在时返回None
+
+        运行中的任务长时间没有进度更新且不在当前进程中执行时，标记为已中断
+        """
+        job = self._load(job_id)
+        if job and job['status'] in ('queued', 'running') and not self._is_active(job_id):
+            heartbeat = _parse_timestamp(job['updated_at'])
+            if heartbeat and (datetime.utcnow() - heartbeat).total_seconds() > self.stale_seconds:
+                self._update(job_id, status='interrupted', message='任务已中断，可以继续导入')
+                job = self._load(job_id)
+        return job
+
+    def cancel(self, job_id):
+        """请求取消任务，任务在处理完当前数据块后停止"""
+        conn = self.connect()
+        try:
+            conn.execute("UPDATE import_jobs SET cancel_requested = 1 WHERE id = ?", (job_id,))
+            conn.commit()
+        finally:
+            conn.close()
+        return self.get(job_id)
+
+    def resume(self, job_id, skip_errors=None):
+        """从最后提交的批次继续执行已失败、已取消或已中断的任务
+
+        继续执行时从出错的批次开始重新读取数据，因某一行数据错误（不跳过错误时）
+        失败的任务会在同一行再次失败，需要设置skip_errors=True跳过错误行；
+        不修改选项时只适用于数据库锁定、进程中断等暂时性的失败
+
+        Args:
+            job_id: 任务ID
+            skip_errors: 可选，覆盖任务的skip_errors选项并保存到任务选项中
+
+        Returns:
+            dict: 任务信息
+        """
+        job = self.get(job_id)
+        if not job or job['status'] not in RESUMABLE_STATUSES:
+            raise ValueError('只有失败、取消或中断的任务可以继续')
+        if not os.path.exists(job['file_path']):
+            raise ValueError('导入文件已不存在，无法继续导入')
+        values = {}
+        if skip_errors is not None:
+            options = dict(job['options'], skip_errors=bool(skip_errors))
+            values['options'] = json.dumps(options)
+        self._update(job_id, status='queued', cancel_requested=0, message=None, finished_at=None,
+                     **values)
+        self._submit(job_id)
+        return self.get(job_id)
+
+    def _submit(self, job_id):
+        with self._lock:
+            self._active.add(job_id)
+        self._executor.submit(self._run, job_id)
+
+    def _is_active(self, job_id):
+        with self._lock:
+            return job_id in self._active
+
+    def _run(self, job_id):
+        job = self._load(job_id)
+        try:
+            if job['cancel_requested']:
+                self._finish(job, 'cancelled', '任务已取消')
+                return
+            self._update(job_id, status='running')
+            self._execute(job)
+        except ImportRowError as e:
+            # 当前批次已回滚，保留最后提交的进度；继续执行时需要跳过错误行
+            self._finish(job, 'failed', f'{e}（设置skip_errors后可以继续导入）')
+        except Exception as e:
+            print(f"导入任务 {job_id} 失败: {str(e)}")
+            self._finish(job, 'failed', f'导入数据时出错: {str(e)}')
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+            if self.on_finish:
+                self.on_finish(job['dataset_id'])
+
+    def _execute(self, job):
+        """执行导入，从已提交的进度之后继续"""
+        job_id = job['id']
+        options = job['options']
+        skip_errors = options.get('skip_errors', False)
+        primary_key = options.get('primary_key')
+        use_primary_key = bool(primary_key and options.get('update_existing'))
+
+        # 已提交的进度
+        committed_rows = job['processed_rows']
+        progress = {
+            'processed_rows': committed_rows,
+            'error_rows': job['error_rows'],
+            'errors': list(job['errors']),
+        }
+
+        def checkpoint(conn):
+            # 与当前批次在同一事务中记录进度
+            conn.execute(
+                "UPDATE import_jobs SET processed_rows = ?, inserted_rows = ?, updated_rows = ?, "
+                "error_rows = ?, errors = ?, updated_at = ? WHERE id = ?",
+                (progress['processed_rows'], importer.inserted, importer.updated,
+                 progress['error_rows'], json.dumps(progress['errors'][:MAX_SAVED_ERRORS]),
+                 db_timestamp(), job_id)
+            )
+
+        importer = BulkImporter(self.db_path, job['dataset_id'], job['user_id'], atomic=False,
+                                key_field=primary_key if use_primary_key else None,
+                                max_existing_id=job['max_existing_id'], checkpoint=checkpoint)
+        importer.inserted = job['inserted_rows']
+        importer.updated = job['updated_rows']
+
+        def record_error(row_index, message):
+            progress['error_rows'] += 1
+            progress['errors'].append({'row': row_index, 'message': message})
+            if not skip_errors:
+                raise ImportRowError(row_index, message)
+
+        try:
+            total_rows, chunks = open_import_source(job['file_path'], job['file_ext'], options)
+            if total_rows is not None:
+                self._update(job_id, total_rows=total_rows)
+
+            position = 0
+            for chunk in chunks:
+                if self._cancel_requested(importer.conn, job_id):
+                    importer.commit()
+                    importer.close()
+                    self._finish(job, 'cancelled', '任务已取消', progress=self._progress(progress, importer))
+                    return
+
+                for row_index, row_dict in chunk:
+                    position += 1
+                    if position <= committed_rows:
+                        # 已在之前的执行中提交
+                        continue
+                    progress['processed_rows'] += 1
+
+                    if not row_dict:
+                        record_error(row_index, '映射后没有有效数据')
+                        continue
+                    try:
+                        if use_primary_key:
+                            importer.upsert(row_dict)
+                        else:
+                            importer.insert(row_dict)
+                    except Exception as e:
+                        record_error(row_index, str(e))
+
+            importer.commit()
+            importer.close()
+        except Exception:
+            # 放弃未提交的批次，已提交的批次和进度保留
+            importer.rollback()
+            importer.close()
+            raise
+
+        self._finish(job, 'completed',
+                     f"成功导入 {importer.inserted + importer.updated} 条数据，"
+                     f"{progress['error_rows']} 条数据导入失败",
+                     progress=self._progress(progress, importer))
+        if job['owns_file']:
+            try:
+                os.remove(job['file_path'])
+            except OSError:
+                pass
+        print(f"导入任务 {job_id} 完成: {importer.inserted} 条新增, {importer.updated} 条更新")
+
+    @staticmethod
+    def _progress(progress, importer):
+        return {
+            'processed_rows': progress['processed_rows'],
+            'inserted_rows': importer.inserted,
+            'updated_rows': importer.updated,
+            'error_rows': progress['error_rows'],
+            'errors': json.dumps(progress['errors'][:MAX_SAVED_ERRORS]),
+        }
+
+    @staticmethod
+    def _cancel_requested(conn, job_id):
+        row = conn.execute("SELECT cancel_requested FROM import_jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def _finish(self, job, status, message, progress=None):
+        """记录任务结束状态；progress为None时保留最后提交的进度"""
+        values = dict(progress or {})
+        values.update(status=status, message=message, finished_at=db_timestamp())
+        self._update(job['id'], **values)
+
+    def _update(self, job_id, **values):
+        values['updated_at'] = db_timestamp()
+        assignments = ', '.join(f"{column} = ?" for column in values)
+        conn = self.connect()
+        try:
+            conn.execute(f"UPDATE import_jobs SET {assignments} WHERE id = ?",
+                         list(values.values()) + [job_id])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _load(self, job_id):
+        conn = self.connect()
+        try:
+            row = conn.execute(
+                f"SELECT {', '.join(_JOB_COLUMNS)} FROM import_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        job = dict(zip(_JOB_COLUMNS, row))
+        job['options'] = json.loads(job['options'] or '{}')
+        job['errors'] = json.loads(job['errors'] or '[]')
+        job['owns_file'] = bool(job['owns_file'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
@@ -6,7 +6,7 @@
 
 import numpy as np
 import pandas as pd
-from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.model_selection import train_test_split, cross_val_score, cross_val_predict
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
 from sklearn.linear_model import LogisticRegression
@@ -23,6 +23,9 @@ import math
 import datetime
 import os
 
+from analysis_concordance import c_statistic_summary, concordance_summary, time_dependent_auc
+from analysis_resampling import MAX_RESAMPLES
+
 def perform_outcome_prediction(data, target_variable, predictor_variables, time_variable=None, 
                                model_type='random_forest', prediction_horizon=None, 
                                validation_method='cross_validation', validation_params=None,
@@ -37,7 +40,8 @@ def perform_outcome_prediction(data, target_variable, predictor_variables, time_
         model_type: 模型类型，可选值: random_forest, gradient_boosting, logistic
         prediction_horizon: 预测时间范围（以天为单位），用于时间相关预测
         validation_method: 验证方法，可选值: cross_validation, split
-        validation_params: 验证参数字典
+        validation_params: 验证参数字典（cv_folds、test_size，以及C统计量自助法
+                           置信区间的样本数n_resamples，默认为0即不计算置信区间）
         save_model: 是否保存模型
         model_name: 模型保存名称
         
@@ -50,6 +54,7 @@ def perform_outcome_prediction(data, target_variable, predictor_variables, time_
         
     cv_folds = validation_params.get('cv_folds', 5)
     test_size = validation_params.get('test_size', 0.3)
+    n_resamples = min(max(int(validation_params.get('n_resamples', 0)), 0), MAX_RESAMPLES)
     
     # 数据准备
     dataset = prepare_data(data, target_variable, predictor_variables, time_variable, prediction_horizon)
@@ -63,7 +68,7 @@ def perform_outcome_prediction(data, target_variable, predictor_variables, time_
     
     # 构建和评估模型
     model_results = build_and_evaluate_model(
-        dataset, model_type, validation_method, cv_folds, test_size
+        dataset, model_type, validation_method, cv_folds, test_size, n_resamples
     )
     
     # 风险分层
@@ -154,7 +159,7 @@ def prepare_data(data, target_variable, predictor_variables, time_variable=None,
     # 特征名称
     feature_names = predictor_variables
     
-    return {
+    dataset = {
         'X': X,
         'X_scaled': X_scaled,
         'y': y,
@@ -162,8 +167,19 @@ def prepare_data(data, target_variable, predictor_variables, time_variable=None,
         'imputer': imputer,
         'scaler': scaler
     }
+    
+    # 有时间变量时保留原始结局和时间，用于计算Harrell's C和时间依赖AUC
+    if time_variable is not None:
+        # 无法解析为数值的时间（如"3年"）记为NaN，计算区分度时剔除
+        dataset['time'] = pd.to_numeric(pd.Series(data[time_variable], dtype=object),
+                                        errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        dataset['event'] = (y_raw == y_raw.max()).astype(np.float64)
+        dataset['prediction_horizon'] = prediction_horizon
+    
+    return dataset
 
-def build_and_evaluate_model(dataset, model_type, validation_method, cv_folds, test_size):
+def build_and_evaluate_model(dataset, model_type, validation_method, cv_folds, test_size,
+                             n_resamples=0):
     """构建和评估预测模型
     
     Args:
@@ -172,6 +188,7 @@ def build_and_evaluate_model(dataset, model_type, validation_method, cv_folds, t
         validation_method: 验证方法
         cv_folds: 交叉验证折数
         test_size: 测试集比例
+        n_resamples: C统计量自助法置信区间的样本数
         
     Returns:
         dict: 模型评估结果
@@ -221,14 +238,23 @@ def build_and_evaluate_model(dataset, model_type, validation_method, cv_folds, t
             y_pred_proba = model.predict_proba(X)[:, 1]
             curve_data = calculate_curve_data(y, y_pred_proba)
         else:
+            y_pred_proba = None
             curve_data = None
         
+        # 区分度在交叉验证的折外预测概率上评估（每个样本的概率来自未用它训练的模型）
+        eval_indices = np.arange(len(y))
+        y_eval = y
+        discrimination_proba = (cross_val_predict(model, X, y, cv=cv_folds, method='predict_proba')[:, 1]
+                                if y_pred_proba is not None else None)
+        
         # 暂不计算混淆矩阵（交叉验证模式下）
         confusion_mat = None
         
     elif validation_method == 'split':
         # 训练测试集分割
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42)
+        X_train, X_test, y_train, y_test, _, eval_indices = train_test_split(
+            X, y, np.arange(len(y)), test_size=test_size, random_state=42)
+        y_eval = y_test
         
         # 训练模型
         model.fit(X_train, y_train)
@@ -236,6 +262,7 @@ def build_and_evaluate_model(dataset, model_type, validation_method, cv_folds, t
         # 预测
         y_pred = model.predict(X_test)
         y_pred_proba = model.predict_proba(X_test)[:, 1] if hasattr(model, 'predict_proba') else None
+        discrimination_proba = y_pred_proba
         
         # 计算评估指标
         evaluation_metrics = {
@@ -298,8 +325,45 @@ def build_and_evaluate_model(dataset, model_type, validation_method, cv_folds, t
     if curve_data:
         results['curve_data'] = curve_data
     
+    # 区分度：C统计量、Harrell's C和时间依赖AUC
+    if discrimination_proba is not None:
+        results['discrimination'] = calculate_discrimination(dataset, eval_indices, y_eval,
+                                                             discrimination_proba, n_resamples)
+    
     return results
 
+def calculate_discrimination(dataset, indices, y_true, y_pred_proba, n_resamples=0):
+    """计算模型的区分度指标
+    
+    Args:
+        dataset: 处理后的数据集
+        indices: 评估样本在数据集中的下标
+        y_true: 评估样本的真实标签
+        y_pred_proba: 评估样本的预测概率
+        n_resamples: 自助法置信区间的样本数
+        
+    Returns:
+        dict: c_statistic（二分类C统计量），有时间变量时另有c_index（Harrell's C）
+              和time_dependent_auc（预测时间范围处的AUC）
+    """
+    discrimination = {
+        'c_statistic': c_statistic_summary(y_true, y_pred_proba, n_resamples)
+    }
+    
+    if 'time' in dataset:
+        time = dataset['time'][indices]
+        observed = np.isfinite(time)
+        time = time[observed]
+        event = dataset['event'][indices][observed]
+        risk = np.asarray(y_pred_proba)[observed]
+        discrimination['c_index'] = concordance_summary(time, event, risk, n_resamples=n_resamples)
+        if dataset.get('prediction_horizon') is not None:
+            discrimination['time_dependent_auc'] = time_dependent_auc(
+                time, event, risk, [dataset['prediction_horizon']]
+            )[0]
+    
+    return discrimination
+
 def calculate_curve_data(y_true, y_pred_proba):
     """计算ROC曲线和PR曲线数据
     
@@ -0,0 +1,53 @@
+"""
+共享进程池模块
+
+批量导出和重抽样等CPU密集的计算共用一个进程池，避免各模块分别创建
+进程池而使工作进程数成倍增加。Web服务进程是多线程的，fork出的子进程
+会继承其他线程持有的锁（日志、数据库连接、线程池等）而可能死锁，因此
+工作进程由forkserver启动（平台不支持时使用spawn）。提交到进程池的函数
+必须是可以按模块名导入的模块级函数；工作进程启动时会按spawn的规则以
+__mp_main__的名字重新导入主模块，主模块在导入时不能有副作用（app.py的建表、
+创建默认用户和后台任务管理器都在init_app中，工作进程不调用）。工作进程异常
+退出后进程池不能再使用，调用方用discard_process_pool丢弃，下次使用时重建
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+
+# forkserver预先导入的模块，工作进程启动时不必重新导入
+PRELOAD_MODULES = ['numpy', 'pandas', 'scipy.stats']
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def _pool_context():
+    """工作进程的启动方式：优先forkserver，否则spawn"""
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        # forkserver只预先导入依赖库，不执行Web服务的主模块
+        context.set_forkserver_preload(PRELOAD_MODULES)
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def get_process_pool():
+    """获取共享进程池（首次使用时创建，进程数默认为CPU核数，可通过PROCESS_POOL_WORKERS配置）"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            workers = int(os.getenv('PROCESS_POOL_WORKERS', 0)) or os.cpu_count() or 1
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+        return _process_pool
+
+
+def discard_process_pool(pool):
+    """丢弃已损坏的进程池（工作进程异常退出后ProcessPoolExecutor不能再提交任务），下次使用时重新创建"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
@@ -7,7 +7,7 @@
 import math
 import json
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
+from sklearn.model_selection import train_test_split, cross_val_score, cross_val_predict
 from sklearn.linear_model import LogisticRegression
 from sklearn.tree import DecisionTreeClassifier
 from sklearn.ensemble import RandomForestClassifier
@@ -17,6 +17,9 @@ from sklearn.metrics import (
     roc_auc_score, confusion_matrix, classification_report
 )
 
+from analysis_concordance import c_statistic_summary
+from analysis_resampling import MAX_RESAMPLES
+
 def perform_risk_assessment(data, target_variable, predictor_variables, model_type='logistic', 
                             validation_method='cross_validation', validation_params=None):
     """执行风险评估分析
@@ -27,7 +30,8 @@ def perform_risk_assessment(data, target_variable, predictor_variables, model_ty
         predictor_variables: 预测变量列表
         model_type: 模型类型，可选值: logistic, decision_tree, random_forest
         validation_method: 验证方法，可选值: cross_validation, split
-        validation_params: 验证参数字典
+        validation_params: 验证参数字典（cv_folds、test_size，以及C统计量自助法
+                           置信区间的样本数n_resamples，默认为0即不计算置信区间）
         
     Returns:
         dict: 风险评估结果
@@ -38,6 +42,7 @@ def perform_risk_assessment(data, target_variable, predictor_variables, model_ty
         
     cv_folds = validation_params.get('cv_folds', 5)
     test_size = validation_params.get('test_size', 0.3)
+    n_resamples = min(max(int(validation_params.get('n_resamples', 0)), 0), MAX_RESAMPLES)
     
     # 提取数据
     y = np.array(data[target_variable])
@@ -81,6 +86,11 @@ def perform_risk_assessment(data, target_variable, predictor_variables, model_ty
         # 在全部数据上训练最终模型
         model.fit(X, y)
         
+        # 区分度在交叉验证的折外预测概率上评估（每个样本的概率来自未用它训练的模型）
+        discrimination_y = y
+        discrimination_proba = (cross_val_predict(model, X, y, cv=cv_folds, method='predict_proba')[:, 1]
+                                if hasattr(model, 'predict_proba') else None)
+        
     elif validation_method == 'split':
         # 训练测试集分割
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=test_size, random_state=42)
@@ -112,6 +122,10 @@ def perform_risk_assessment(data, target_variable, predictor_variables, model_ty
             'false_negative': int(cm[1, 0]),
             'true_positive': int(cm[1, 1])
         }
+        
+        # 区分度（在测试集上评估）
+        discrimination_y = y_test
+        discrimination_proba = y_pred_proba
     else:
         raise ValueError(f"不支持的验证方法: {validation_method}")
     
@@ -142,6 +156,10 @@ def perform_risk_assessment(data, target_variable, predictor_variables, model_ty
         'variable_types': {var: get_variable_type(data[var]) for var in predictor_variables + [target_variable]}
     }
     
+    # C统计量及其自助法置信区间
+    if discrimination_proba is not None:
+        results['discrimination'] = c_statistic_summary(discrimination_y, discrimination_proba, n_resamples)
+    
     return results
 
 def calculate_risk_stratification(model, X, y, predictor_variables):
@@ -0,0 +1,116 @@
+"""
+测试一致性指数
+
+Harrell's C与lifelines.utils.concordance_index比较，二分类C统计量与
+sklearn的roc_auc_score比较；分层和计数过程数据（lifelines不支持）与按定义
+逐对枚举的结果比较，时间依赖AUC与用lifelines估计删失分布后按定义计算的
+结果比较。时间和风险评分都有大量相同取值
+"""
+
+import numpy as np
+from lifelines import KaplanMeierFitter
+from lifelines.utils import concordance_index as lifelines_concordance_index
+from sklearn.metrics import roc_auc_score
+
+from analysis_concordance import binary_concordance, concordance_index, time_dependent_auc
+
+
+def survival_sample(n, seed, time_levels=60, risk_levels=25):
+    """风险评分越高生存时间越短；时间和评分都离散化，产生相同取值"""
+    rng = np.random.default_rng(seed)
+    risk = rng.integers(0, risk_levels, n).astype(np.float64)
+    survival = rng.exponential(100 * np.exp(-0.08 * risk))
+    censoring = rng.exponential(150, n)
+    time = np.ceil(np.minimum(survival, censoring) / 200 * time_levels)
+    event = (survival <= censoring).astype(np.float64)
+    return time, event, risk
+
+
+def brute_force_counts(time, event, risk, start=None, strata=None):
+    """按定义逐对统计：i发生事件且j在t_i时仍处于风险中（同一时间删失的j也计入）"""
+    concordant = discordant = tied = 0
+    for i in np.flatnonzero(event > 0):
+        comparable = (time > time[i]) | ((time == time[i]) & (event == 0))
+        if start is not None:
+            comparable &= start < time[i]
+        if strata is not None:
+            comparable &= strata == strata[i]
+        concordant += int(np.sum(comparable & (risk < risk[i])))
+        discordant += int(np.sum(comparable & (risk > risk[i])))
+        tied += int(np.sum(comparable & (risk == risk[i])))
+    return concordant, discordant, tied
+
+
+def test_harrell_c_matches_lifelines():
+    """Harrell's C与lifelines一致（lifelines的预测值越大表示生存越长，传入负的风险评分）"""
+    print("测试Harrell's C...")
+    for n, seed in ((50, 1), (700, 2), (20000, 3)):
+        time, event, risk = survival_sample(n, seed)
+        result = concordance_index(time, event, risk)
+        assert np.isclose(result['c_index'], lifelines_concordance_index(time, -risk, event), rtol=1e-12), n
+        if n <= 700:
+            assert (result['concordant'], result['discordant'], result['tied_risk']) == \
+                brute_force_counts(time, event, risk)
+    print("  通过")
+
+
+def test_strata_and_counting_process():
+    """分层只比较同一层内的观测；计数过程数据只比较在事件时间处于风险中的区间"""
+    print("测试分层和计数过程数据...")
+    time, event, risk = survival_sample(600, 4)
+    rng = np.random.default_rng(40)
+    strata = rng.integers(0, 3, len(time))
+    result = concordance_index(time, event, risk, strata=strata)
+    assert (result['concordant'], result['discordant'], result['tied_risk']) == \
+        brute_force_counts(time, event, risk, strata=strata)
+
+    start = np.floor(time * rng.uniform(0, 0.9, len(time)))
+    result = concordance_index(time, event, risk, start=start)
+    assert (result['concordant'], result['discordant'], result['tied_risk']) == \
+        brute_force_counts(time, event, risk, start=start)
+    print("  通过")
+
+
+def test_binary_c_statistic_matches_sklearn():
+    """二分类结局的C统计量等于roc_auc_score（取值最大的类别为阳性）"""
+    print("测试二分类C统计量...")
+    rng = np.random.default_rng(5)
+    score = np.round(rng.normal(0, 1, 3000), 1)
+    outcome = (rng.random(3000) < 1 / (1 + np.exp(-1.5 * score))).astype(int)
+    assert np.isclose(binary_concordance(outcome, score)['c_index'], roc_auc_score(outcome, score), rtol=1e-12)
+    labels = np.where(outcome == 1, '死亡', '存活')
+    assert np.isclose(binary_concordance(outcome + 1, score)['c_index'], roc_auc_score(outcome, score))
+    assert np.isclose(binary_concordance(labels == '死亡', score)['c_index'], roc_auc_score(outcome, score))
+    print("  通过")
+
+
+def test_time_dependent_auc():
+    """时间依赖AUC：病例按1/G(t_i-)加权，G由lifelines估计的删失分布给出"""
+    print("测试时间依赖AUC...")
+    time, event, risk = survival_sample(800, 6)
+    kmf = KaplanMeierFitter().fit(time, 1 - event)
+    timeline = kmf.survival_function_.index.to_numpy()
+    censoring_survival = kmf.survival_function_.iloc[:, 0].to_numpy()
+
+    def before(t):
+        index = np.searchsorted(timeline, t, side='left') - 1
+        return censoring_survival[index] if index >= 0 else 1.0
+
+    times = np.percentile(time[event > 0], [25, 50, 75])
+    for point in time_dependent_auc(time, event, risk, times):
+        t = point['time']
+        cases = np.flatnonzero((event > 0) & (time <= t))
+        controls = risk[time > t]
+        weights = np.array([1 / before(time[i]) for i in cases])
+        scores = np.array([np.mean(risk[i] > controls) + 0.5 * np.mean(risk[i] == controls) for i in cases])
+        assert point['cases'] == len(cases) and point['controls'] == len(controls)
+        assert np.isclose(point['auc'], np.sum(weights * scores) / weights.sum(), rtol=1e-12)
+    print("  通过")
+
+
+if __name__ == "__main__":
+    test_harrell_c_matches_lifelines()
+    test_strata_and_counting_process()
+    test_binary_c_statistic_matches_sklearn()
+    test_time_dependent_auc()
+    print("\n所有测试完成!")
@@ -0,0 +1,102 @@
+"""
+测试相关系数矩阵
+
+矩阵中每一对变量的相关系数和p值与scipy.stats对这两列单独计算的结果比较，
+包括按变量对删除缺失值、有结的秩相关、Kendall的精确p值和逐对计算路径
+"""
+
+import numpy as np
+from scipy import stats
+
+import analysis_correlation
+from analysis_correlation import correlation_matrix
+from dataset_column_store import DatasetColumns
+
+VARIABLES = ['年龄', '收缩压', 'BMI', '血糖']
+
+
+def lab_values(n_rows, seed, missing_rate=0.08, decimals=1):
+    """相关的四个化验指标，各自随机缺失；decimals较小时有大量结"""
+    rng = np.random.default_rng(seed)
+    age = rng.uniform(20, 85, n_rows)
+    data = np.column_stack([
+        age,
+        100 + 0.7 * age + rng.normal(0, 12, n_rows),
+        24 + rng.normal(0, 3.5, n_rows),
+        5 + 0.02 * age + rng.gamma(2.0, 0.6, n_rows),
+    ])
+    data = np.round(data, decimals)
+    data[rng.random(data.shape) < missing_rate] = np.nan
+    return data
+
+
+def to_columns(data, variables=VARIABLES):
+    values = {name: [None if np.isnan(x) else float(x) for x in data[:, j]] for j, name in enumerate(variables)}
+    return DatasetColumns(1, np.arange(1, len(data) + 1), values, {name: 'number' for name in variables})
+
+
+def assert_matches_scipy(result, data, reference, listwise):
+    """逐对与scipy比较；listwise时所有变量对使用同一组完整行"""
+    matrix = np.array(result['matrix'])
+    p_values = np.array(result['p_values'])
+    complete = ~np.isnan(data).any(axis=1)
+    for a in range(data.shape[1]):
+        for b in range(a + 1, data.shape[1]):
+            rows = complete if listwise else ~np.isnan(data[:, a]) & ~np.isnan(data[:, b])
+            expected = reference(data[rows, a], data[rows, b])
+            assert result['n_matrix'][a][b] == rows.sum()
+            assert np.isclose(matrix[a, b], expected[0], rtol=1e-9, atol=1e-12), (a, b, matrix[a, b], expected[0])
+            assert np.isclose(p_values[a, b], expected[1], rtol=1e-7, atol=1e-300), (a, b, p_values[a, b], expected[1])
+
+
+def test_pearson_and_spearman():
+    """Pearson和Spearman（含结）在listwise和pairwise下与pearsonr、spearmanr一致"""
+    print("测试Pearson和Spearman相关...")
+    data = lab_values(800, seed=1, decimals=0)
+    columns = to_columns(data)
+    for correlation_type, reference in (('pearson', stats.pearsonr), ('spearman', stats.spearmanr)):
+        for missing in ('listwise', 'pairwise'):
+            result = correlation_matrix(columns, VARIABLES, correlation_type, missing=missing)
+            assert_matches_scipy(result, data, reference, missing == 'listwise')
+    print("  通过")
+
+
+def test_kendall():
+    """Kendall tau-b与kendalltau一致：有结（正态近似）、小样本无结（精确分布）和逐对计算的大样本"""
+    print("测试Kendall相关...")
+    for n_rows, decimals, seed in ((400, 0, 2), (25, 3, 3)):
+        data = lab_values(n_rows, seed=seed, decimals=decimals, missing_rate=0.05)
+        result = correlation_matrix(to_columns(data), VARIABLES, 'kendall', missing='pairwise')
+        assert_matches_scipy(result, data, stats.kendalltau, listwise=False)
+
+    data = lab_values(analysis_correlation.KENDALL_MATRIX_MAX_ROWS + 500, seed=4, decimals=0)
+    result = correlation_matrix(to_columns(data), VARIABLES, 'kendall')
+    assert_matches_scipy(result, data, stats.kendalltau, listwise=True)
+    print("  通过")
+
+
+def test_point_biserial_and_constant():
+    """点二列相关与pointbiserialr一致；没有变异的变量相关系数记为0、p值记为1"""
+    print("测试点二列相关和常数变量...")
+    rng = np.random.default_rng(5)
+    n_rows = 300
+    sex = rng.choice(['男', '女'], n_rows)
+    height = np.round(np.where(sex == '男', 172, 160) + rng.normal(0, 6, n_rows), 1)
+    columns = DatasetColumns(1, np.arange(1, n_rows + 1),
+                             {'性别': list(sex), '身高': list(height), '批次': [1.0] * n_rows},
+                             {'身高': 'number', '批次': 'number'})
+    result = correlation_matrix(columns, ['性别', '身高', '批次'], 'point_biserial')
+    # 二分变量按取值第一次出现的顺序编码为0/1
+    codes = (sex != sex[0]).astype(float)
+    expected = stats.pointbiserialr(codes, height)
+    assert np.isclose(result['matrix'][0][1], expected.statistic, rtol=1e-10)
+    assert np.isclose(result['p_values'][0][1], expected.pvalue, rtol=1e-8, atol=1e-300)
+    assert result['matrix'][1][2] == 0.0 and result['p_values'][1][2] == 1.0
+    print("  通过")
+
+
+if __name__ == "__main__":
+    test_pearson_and_spearman()
+    test_kendall()
+    test_point_biserial_and_constant()
+    print("\n所有测试完成!")
@@ -0,0 +1,161 @@
+"""
+测试Cox比例风险回归求解器
+
+Efron法的系数、标准误、对数似然和似然比检验与lifelines的CoxPHFitter比较；
+Breslow法（lifelines不支持）与直接按定义计算的部分似然用scipy.optimize
+求得的最大值比较。随访时间按周取整，有大量同时发生的事件。
+分层模型与CoxPHFitter(strata)比较，计数过程数据（随时间变化的协变量）
+与CoxTimeVaryingFitter比较
+"""
+
+import numpy as np
+import pandas as pd
+from lifelines import CoxPHFitter, CoxTimeVaryingFitter
+from scipy import optimize
+
+from analysis_cox import cox_regression, design_matrix
+from dataset_column_store import DatasetColumns
+
+
+def cohort(n, seed):
+    """年龄、血压（连续）和分期（分类）影响风险的队列，时间按周取整"""
+    rng = np.random.default_rng(seed)
+    age = np.round(rng.uniform(30, 80, n))
+    pressure = np.round(rng.normal(135, 18, n), 1)
+    stage = rng.choice(['1期', '2期', '3期'], n, p=[0.4, 0.35, 0.25])
+    linear = 0.03 * (age - 55) + 0.01 * (pressure - 135) + np.select([stage == '2期', stage == '3期'], [0.5, 1.1])
+    survival = rng.exponential(300 * np.exp(-linear))
+    censoring = rng.uniform(50, 700, n)
+    time = np.ceil(np.minimum(survival, censoring) / 7)
+    event = (survival <= censoring).astype(np.float64)
+    columns = DatasetColumns(1, np.arange(1, n + 1), {'年龄': list(age), '收缩压': list(pressure), '分期': list(stage)},
+                             {'年龄': 'number', '收缩压': 'number'})
+    return time, event, columns
+
+
+def breslow_log_likelihood(beta, time, event, X):
+    """按定义计算的Breslow部分对数似然：每个事件的风险集为时间不早于其事件时间的观测"""
+    eta = X @ beta
+    total = 0.0
+    for i in np.flatnonzero(event > 0):
+        total += eta[i] - np.log(np.exp(eta[time >= time[i]]).sum())
+    return total
+
+
+def test_efron_matches_lifelines():
+    """Efron法：系数、标准误、对数似然、似然比检验与CoxPHFitter一致；分类变量按类别排序生成虚拟变量"""
+    print("测试Efron法Cox回归...")
+    time, event, columns = cohort(600, seed=1)
+    rows = np.arange(columns.n_rows)
+    X, names, covariate_types = design_matrix(columns, ['年龄', '收缩压', '分期'], rows)
+    assert names == ['年龄', '收缩压', '分期_2期', '分期_3期']
+    assert covariate_types == {'年龄': 'continuous', '收缩压': 'continuous', '分期': 'categorical'}
+
+    result = cox_regression(time, event, X, names, ties='efron')
+    frame = pd.DataFrame(X, columns=names).assign(T=time, E=event)
+    # lifelines默认的收敛阈值较宽，收紧后两者的最大值点可以精确比较
+    cph = CoxPHFitter().fit(frame, duration_col='T', event_col='E', fit_options={'precision': 1e-12})
+
+    coefficients = pd.DataFrame(result['coefficients']).set_index('variable')
+    assert np.allclose(coefficients['coefficient'], cph.params_[names], rtol=1e-6, atol=1e-9)
+    assert np.allclose(coefficients['se'], cph.standard_errors_[names], rtol=1e-6)
+    assert np.allclose(coefficients['p_value'], cph.summary.loc[names, 'p'], rtol=1e-5, atol=1e-300)
+    fit = result['model_fit']
+    assert fit['convergence']
+    assert np.isclose(fit['log_likelihood'], cph.log_likelihood_, rtol=1e-9)
+    lr_test = cph.log_likelihood_ratio_test()
+    assert np.isclose(fit['likelihood_ratio_test']['statistic'], lr_test.test_statistic, rtol=1e-7)
+    assert np.isclose(fit['c_index'], cph.concordance_index_, rtol=1e-12)
+    print("  通过")
+
+
+def test_breslow_maximizes_partial_likelihood():
+    """Breslow法：系数是按定义计算的部分似然的最大值点，信息矩阵与数值二阶导一致"""
+    print("测试Breslow法Cox回归...")
+    time, event, columns = cohort(300, seed=2)
+    X, names, _ = design_matrix(columns, ['年龄', '分期'], np.arange(columns.n_rows))
+    result = cox_regression(time, event, X, names, ties='breslow')
+    beta = np.array([c['coefficient'] for c in result['coefficients']])
+
+    objective = lambda b: -breslow_log_likelihood(b, time, event, X)
+    optimum = optimize.minimize(objective, np.zeros(len(names)), method='BFGS', options={'gtol': 1e-8})
+    assert np.allclose(beta, optimum.x, atol=1e-4), (beta, optimum.x)
+    assert np.isclose(result['model_fit']['log_likelihood'], -objective(beta), rtol=1e-10)
+    assert np.isclose(result['model_fit']['null_log_likelihood'], -objective(np.zeros(len(names))), rtol=1e-10)
+
+    # 标准误：数值二阶导（中心差分）的逆
+    h = 1e-4
+    hessian = np.empty((len(beta), len(beta)))
+    for a in range(len(beta)):
+        for b in range(len(beta)):
+            da, db = np.eye(len(beta))[a] * h, np.eye(len(beta))[b] * h
+            hessian[a, b] = (objective(beta + da + db) - objective(beta + da - db)
+                             - objective(beta - da + db) + objective(beta - da - db)) / (4 * h * h)
+    se = np.sqrt(np.diag(np.linalg.inv(hessian)))
+    assert np.allclose([c['se'] for c in result['coefficients']], se, rtol=1e-4)
+    print("  通过")
+
+
+def test_stratified_matches_lifelines():
+    """分层模型（各中心有各自的基线风险）与CoxPHFitter(strata=...)一致"""
+    print("测试分层Cox回归...")
+    time, event, columns = cohort(800, seed=3)
+    rng = np.random.default_rng(30)
+    center = rng.integers(0, 4, len(time))
+    # 各中心的基线风险不同：随访时间按中心缩放
+    time = np.ceil(time * np.array([0.5, 1.0, 1.5, 3.0])[center])
+    X, names, _ = design_matrix(columns, ['年龄', '收缩压', '分期'], np.arange(columns.n_rows))
+    result = cox_regression(time, event, X, names, strata=center)
+
+    frame = pd.DataFrame(X, columns=names).assign(T=time, E=event, center=center)
+    cph = CoxPHFitter().fit(frame, duration_col='T', event_col='E', strata=['center'],
+                            fit_options={'precision': 1e-12})
+    coefficients = pd.DataFrame(result['coefficients']).set_index('variable')
+    assert result['n_strata'] == 4
+    assert np.allclose(coefficients['coefficient'], cph.params_[names], rtol=1e-6, atol=1e-9)
+    assert np.allclose(coefficients['se'], cph.standard_errors_[names], rtol=1e-6)
+    assert np.isclose(result['model_fit']['log_likelihood'], cph.log_likelihood_, rtol=1e-9)
+    print("  通过")
+
+
+def test_time_varying_matches_lifelines():
+    """计数过程数据：每名患者按复查分成多个(start, stop]区间，血肌酐随复查变化，
+    与CoxTimeVaryingFitter一致"""
+    print("测试随时间变化协变量的Cox回归...")
+    rng = np.random.default_rng(4)
+    intervals = []
+    for patient in range(400):
+        age = float(rng.integers(30, 80))
+        creatinine = rng.normal(90, 20)
+        start = 0.0
+        for visit in range(rng.integers(1, 5)):
+            stop = start + float(rng.integers(5, 60))
+            hazard = 0.004 * np.exp(0.03 * (age - 55) + 0.02 * (creatinine - 90))
+            died = rng.random() < 1 - np.exp(-hazard * (stop - start))
+            intervals.append((patient, start, stop, float(died), age, round(creatinine, 1)))
+            if died:
+                break
+            start = stop
+            creatinine += rng.normal(3, 8)
+    frame = pd.DataFrame(intervals, columns=['id', 'start', 'stop', 'event', '年龄', '血肌酐'])
+    assert frame['event'].sum() > 40 and frame['stop'].duplicated().any()
+
+    result = cox_regression(frame['stop'], frame['event'], frame[['年龄', '血肌酐']].to_numpy(),
+                            ['年龄', '血肌酐'], start=frame['start'].to_numpy())
+    ctv = CoxTimeVaryingFitter().fit(frame, id_col='id', event_col='event', start_col='start', stop_col='stop',
+                                     fit_options={'precision': 1e-12})
+    coefficients = pd.DataFrame(result['coefficients']).set_index('variable')
+    assert np.allclose(coefficients['coefficient'], ctv.params_[['年龄', '血肌酐']], rtol=1e-6)
+    assert np.allclose(coefficients['se'], ctv.standard_errors_[['年龄', '血肌酐']], rtol=1e-6)
+    assert np.isclose(result['model_fit']['log_likelihood'], ctv.log_likelihood_, rtol=1e-9)
+    # 计数过程数据不计算时间依赖AUC
+    assert result['model_fit']['time_dependent_auc'] is None
+    print("  通过")
+
+
+if __name__ == "__main__":
+    test_efron_matches_lifelines()
+    test_breslow_maximizes_partial_likelihood()
+    test_stratified_matches_lifelines()
+    test_time_varying_matches_lifelines()
+    print("\n所有测试完成!")
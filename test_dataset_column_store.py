@@ -0,0 +1,147 @@
+"""
+测试列式存储的请求快照
+
+分析接口在锁外多次读取列（时间、事件、分组或X、y），其间的插入、删除不能
+使已取得的各列错位
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+import numpy as np
+
+from dataset_column_store import DatasetColumnStore, bump_data_version
+
+DATASET_ID = 1
+
+
+def create_store(n_rows):
+    """在临时数据库中写入n_rows条记录（b = 2a，a等于记录ID），返回列式存储"""
+    db_path = os.path.join(tempfile.mkdtemp(prefix='column_store_test_'), 'test.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE dataset_entries (id INTEGER PRIMARY KEY, dataset_id INTEGER, user_id INTEGER, "
+                 "data TEXT, created_at TEXT, updated_at TEXT)")
+    conn.execute("CREATE TABLE dataset_versions (dataset_id INTEGER PRIMARY KEY, version INTEGER NOT NULL)")
+    conn.executemany(
+        "INSERT INTO dataset_entries (id, dataset_id, user_id, data) VALUES (?, ?, 1, ?)",
+        [(i, DATASET_ID, json.dumps({'a': i, 'b': 2 * i, 'g': 'x' if i % 2 else 'y'})) for i in range(1, n_rows + 1)]
+    )
+    bump_data_version(conn, DATASET_ID)
+    conn.commit()
+    conn.close()
+    return DatasetColumnStore(db_path)
+
+
+def insert_entry(store, entry_id):
+    """按app.py的写入流程插入一条记录并同步列式存储"""
+    data = {'a': entry_id, 'b': 2 * entry_id, 'g': 'x'}
+    conn = store.connect()
+    conn.execute("INSERT INTO dataset_entries (id, dataset_id, user_id, data) VALUES (?, ?, 1, ?)",
+                 (entry_id, DATASET_ID, json.dumps(data)))
+    version = bump_data_version(conn, DATASET_ID)
+    conn.commit()
+    conn.close()
+    store.on_insert(DATASET_ID, entry_id, data, version)
+
+
+def delete_entry(store, entry_id):
+    """按app.py的写入流程删除一条记录并同步列式存储"""
+    conn = store.connect()
+    conn.execute("DELETE FROM dataset_entries WHERE id = ?", (entry_id,))
+    version = bump_data_version(conn, DATASET_ID)
+    conn.commit()
+    conn.close()
+    store.on_delete(DATASET_ID, entry_id, version)
+
+
+def assert_aligned(columns):
+    """同一快照中各列按行对齐"""
+    ids = columns.entry_ids()
+    a = columns.numeric('a')
+    b = columns.numeric('b')
+    g = columns.raw('g')
+    assert len(ids) == len(a) == len(b) == len(g) == columns.n_rows
+    assert np.array_equal(a, ids) and np.array_equal(b, 2 * ids), '列之间错位'
+    assert all(value == ('x' if i % 2 else 'y') for i, value in zip(ids, g) if i <= 1000)
+
+
+def test_snapshot_unaffected_by_writes():
+    """取得快照后的插入、删除（包括触发压缩的大量删除）不改变快照"""
+    print("测试快照与之后的写入隔离...")
+    store = create_store(300)
+    columns = store.get_columns(DATASET_ID, ['a', 'b', 'g'], {'a': 'number', 'b': 'number'})
+    time_before = columns.numeric('a').copy()
+
+    delete_entry(store, 5)
+    insert_entry(store, 1001)
+    for entry_id in range(10, 200):
+        delete_entry(store, entry_id)
+
+    assert columns.n_rows == 300
+    assert np.array_equal(columns.numeric('a'), time_before)
+    assert_aligned(columns)
+
+    # 新的请求看到写入后的数据，且增量同步后的缓存仍然正确
+    latest = store.get_columns(DATASET_ID, ['a', 'b', 'g'])
+    assert latest.n_rows == 300 - 1 + 1 - 190
+    assert 5 not in latest.entry_ids() and 1001 in latest.entry_ids()
+    assert_aligned(latest)
+    print("  通过")
+
+
+def test_snapshot_is_read_only():
+    """快照不能被增量同步修改，返回的数组是副本"""
+    print("测试快照只读...")
+    store = create_store(50)
+    columns = store.get_columns(DATASET_ID, ['a', 'b'])
+    for change in (lambda: columns.append(99, {'a': 99}), lambda: columns.delete(1),
+                   lambda: columns.update(1, {'a': 0})):
+        try:
+            change()
+        except RuntimeError:
+            pass
+        else:
+            raise AssertionError('快照应为只读')
+    values = columns.numeric('a')
+    values[:] = -1
+    assert columns.numeric('a')[0] == 1
+    print("  通过")
+
+
+def test_concurrent_reads_and_writes():
+    """读线程逐列读取快照的同时，写线程不断插入和删除"""
+    print("测试并发读写...")
+    store = create_store(500)
+    errors = []
+    stop = threading.Event()
+
+    def reader():
+        try:
+            while not stop.is_set():
+                assert_aligned(store.get_columns(DATASET_ID, ['a', 'b', 'g']))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    try:
+        for entry_id in range(1, 400):
+            delete_entry(store, entry_id)
+            insert_entry(store, 1000 + entry_id)
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+    assert not errors, errors[0]
+    print("  通过")
+
+
+if __name__ == "__main__":
+    test_snapshot_unaffected_by_writes()
+    test_snapshot_is_read_only()
+    test_concurrent_reads_and_writes()
+    print("\n所有测试完成!")
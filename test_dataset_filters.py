@@ -0,0 +1,127 @@
+"""
+测试数据筛选条件下推到SQLite
+
+compile_entry_filters生成的SQL条件与原来在Python中逐条筛选的结果应当一致，
+包括取值为0的记录、非ASCII字母的大小写和LIKE通配符
+"""
+
+import json
+import os
+import random
+import sqlite3
+import tempfile
+
+from dataset_filters import compile_entry_filters, register_filter_functions
+from dataset_indexes import create_field_index
+
+NAMES = ['Émile Durand', 'ÉMILE', 'émilie', 'Ärztin Müller', 'ÄRZTIN', 'Дмитрий', 'ДМИТРИЙ', '张三', '李四',
+         'zhang_san', 'ZHANG%', 'Anna', None, '']
+CODES = [0, 0.0, 1, 10, 2.5, 100, '0', '10', ' 12 ', 'A0', None, '']
+
+
+def python_match(data, field, operator, value):
+    """原view_data接口在Python中的筛选规则"""
+    field_value = data.get(field)
+    if operator == 'equals':
+        return str(field_value) == str(value)
+    if operator == 'notEquals':
+        return str(field_value) != str(value)
+    if operator == 'contains':
+        return bool(field_value and str(field_value).lower().find(str(value).lower()) != -1)
+    if operator == 'startsWith':
+        return bool(field_value and str(field_value).lower().startswith(str(value).lower()))
+    if operator == 'endsWith':
+        return bool(field_value and str(field_value).lower().endswith(str(value).lower()))
+    if operator in ('greaterThan', 'lessThan'):
+        try:
+            if operator == 'greaterThan':
+                return float(field_value) > float(value)
+            return float(field_value) < float(value)
+        except (ValueError, TypeError):
+            return False
+    if operator == 'between':
+        try:
+            return float(value['min']) <= float(field_value) <= float(value['max'])
+        except (ValueError, TypeError):
+            return False
+    if operator == 'isNull':
+        return field_value is None or field_value == ''
+    if operator == 'isNotNull':
+        return field_value is not None and field_value != ''
+    raise ValueError(operator)
+
+
+def python_search(data, search):
+    """原view_data接口的全文搜索规则"""
+    search_lower = search.lower()
+    return any(value and str(value).lower().find(search_lower) != -1
+               for key, value in data.items() if not key.startswith('_'))
+
+
+def create_database(n_rows=600, seed=0):
+    """临时数据库：取值混合数字、数字文本、0、空值和各种文字的记录"""
+    rng = random.Random(seed)
+    db_path = os.path.join(tempfile.mkdtemp(prefix='filters_test_'), 'test.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE dataset_entries (id INTEGER PRIMARY KEY, dataset_id INTEGER, user_id INTEGER, "
+                 "data TEXT, created_at DATETIME, updated_at DATETIME)")
+    entries = {}
+    for entry_id in range(1, n_rows + 1):
+        data = {'姓名': rng.choice(NAMES), 'code': rng.choice(CODES), '编号': rng.randint(0, 20)}
+        if rng.random() < 0.2:
+            del data[rng.choice(['姓名', 'code'])]
+        entries[entry_id] = data
+        conn.execute("INSERT INTO dataset_entries (id, dataset_id, user_id, data) VALUES (?, 1, 1, ?)",
+                     (entry_id, json.dumps(data, ensure_ascii=rng.random() < 0.5)))
+    create_field_index(conn, '编号')
+    conn.commit()
+    register_filter_functions(conn)
+    return conn, entries
+
+
+def sql_ids(conn, **kwargs):
+    where_sql, params = compile_entry_filters(column='de.data', **kwargs)
+    rows = conn.execute(f"SELECT de.id FROM dataset_entries de WHERE de.dataset_id = 1 AND {where_sql} "
+                        f"ORDER BY de.id", params)
+    return [row[0] for row in rows]
+
+
+def test_filters_match_python():
+    """各操作符的结果与Python筛选一致"""
+    print("测试筛选条件...")
+    conn, entries = create_database()
+    cases = [
+        ('code', 'contains', '0'), ('code', 'startsWith', '0'), ('code', 'endsWith', '0'),
+        ('code', 'contains', '1'), ('code', 'contains', '.'), ('code', 'equals', '0'),
+        ('code', 'notEquals', '0'), ('code', 'greaterThan', '0'), ('code', 'lessThan', '10'),
+        ('code', 'between', {'min': 0, 'max': 10}), ('code', 'isNull', ''), ('code', 'isNotNull', ''),
+        ('姓名', 'contains', 'émile'), ('姓名', 'startsWith', 'ÉMI'), ('姓名', 'contains', 'ärztin'),
+        ('姓名', 'endsWith', 'MÜLLER'), ('姓名', 'contains', 'дмитрий'), ('姓名', 'startsWith', 'Дм'),
+        ('姓名', 'contains', '张'), ('姓名', 'contains', 'ANNA'), ('姓名', 'contains', '_'),
+        ('姓名', 'contains', '%'), ('姓名', 'equals', '张三'), ('编号', 'equals', '0'),
+        ('编号', 'equals', '7'), ('编号', 'contains', '0'),
+    ]
+    for field, operator, value in cases:
+        expected = [entry_id for entry_id, data in entries.items() if python_match(data, field, operator, value)]
+        actual = sql_ids(conn, filters=[{'field': field, 'operator': operator, 'value': value}],
+                         indexed_fields={'编号'})
+        assert actual == expected, (field, operator, value, len(actual), len(expected))
+    conn.close()
+    print(f"  {len(cases)}个条件通过")
+
+
+def test_search_matches_python():
+    """全文搜索的结果与Python筛选一致：0不匹配，非ASCII字母忽略大小写"""
+    print("测试全文搜索...")
+    conn, entries = create_database(seed=1)
+    for search in ['0', '1', 'émile', 'ÄRZT', 'дМиТ', '李', 'zhang_', '%', 'a']:
+        expected = [entry_id for entry_id, data in entries.items() if python_search(data, search)]
+        assert sql_ids(conn, search=search) == expected, search
+    conn.close()
+    print("  通过")
+
+
+if __name__ == "__main__":
+    test_filters_match_python()
+    test_search_matches_python()
+    print("\n所有测试完成!")
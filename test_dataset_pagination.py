@@ -0,0 +1,114 @@
+"""
+测试数据记录的游标分页
+
+按游标逐页读取，应当不重不漏地得到全部记录，顺序与按页码分页相同；
+created_at为NULL或相同的记录也不例外
+"""
+
+import os
+import random
+import sqlite3
+import tempfile
+
+from dataset_column_store import DatasetColumnStore
+from dataset_pagination import PAGE_ORDER_SQL, cursor_condition, encode_cursor, fetch_page
+
+# 与app.py记录列表接口相同的查询
+PAGE_QUERY = """
+    SELECT de.id, de.user_id, u.username, de.data, de.created_at
+    FROM dataset_entries de
+    LEFT JOIN user u ON de.user_id = u.id
+    WHERE {where_sql}
+    {order_sql}
+"""
+
+
+def create_database(n_rows, seed=0):
+    """临时数据库：约1/10记录的created_at为NULL，许多记录的创建时间相同"""
+    rng = random.Random(seed)
+    db_path = os.path.join(tempfile.mkdtemp(prefix='pagination_test_'), 'test.db')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE user (id INTEGER PRIMARY KEY, username TEXT)")
+    conn.execute("CREATE TABLE dataset_entries (id INTEGER PRIMARY KEY, dataset_id INTEGER, user_id INTEGER, "
+                 "data TEXT, created_at DATETIME, updated_at DATETIME)")
+    conn.execute("INSERT INTO user (id, username) VALUES (1, 'doctor')")
+    rows = []
+    for entry_id in range(1, n_rows + 1):
+        created_at = None if rng.random() < 0.1 else f'2025-05-{rng.randint(1, 9):02d} 08:00:00.000000'
+        rows.append((entry_id, 1 if entry_id % 7 else 2, 1, '{}', created_at))
+    conn.executemany("INSERT INTO dataset_entries (id, dataset_id, user_id, data, created_at) VALUES (?, ?, ?, ?, ?)",
+                     rows)
+    conn.commit()
+    conn.close()
+    return db_path, rows
+
+
+def expected_order(rows, dataset_id):
+    """按 (created_at DESC, id DESC) 排序，NULL视为空字符串"""
+    selected = [row for row in rows if row[1] == dataset_id]
+    return [row[0] for row in sorted(selected, key=lambda row: (row[4] or '', row[0]), reverse=True)]
+
+
+def test_cursor_pages_cover_all_rows():
+    """游标翻页得到全部记录（包括created_at为NULL的记录），顺序正确"""
+    print("测试游标分页...")
+    db_path, rows = create_database(1000)
+    conn = DatasetColumnStore(db_path).connect()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    for page_size in (1, 7, 50, 1000):
+        seen = []
+        page_cursor = None
+        while True:
+            params = {'dataset_id': 1}
+            where_sql = "de.dataset_id = :dataset_id"
+            if page_cursor:
+                where_sql += " AND " + cursor_condition(page_cursor, params)
+            page, page_cursor = fetch_page(cursor, PAGE_QUERY.format(where_sql=where_sql, order_sql=PAGE_ORDER_SQL),
+                                           params, page_size)
+            seen.extend(row['id'] for row in page)
+            if page_cursor is None:
+                break
+        assert seen == expected_order(rows, 1), f'每页{page_size}条时翻页结果不完整'
+    conn.close()
+    print("  通过")
+
+
+def test_offset_pages_match_cursor_pages():
+    """按页码分页与游标分页的顺序一致"""
+    print("测试按页码分页...")
+    db_path, rows = create_database(300, seed=1)
+    conn = DatasetColumnStore(db_path).connect()
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    seen = []
+    for page in range(10):
+        query = PAGE_QUERY.format(where_sql="de.dataset_id = :dataset_id", order_sql=PAGE_ORDER_SQL)
+        rows_page, _ = fetch_page(cursor, query, {'dataset_id': 1}, 30, offset=page * 30)
+        seen.extend(row['id'] for row in rows_page)
+    assert seen == expected_order(rows, 1)
+    conn.close()
+    print("  通过")
+
+
+def test_cursor_query_uses_index():
+    """游标条件和排序都由索引完成，不需要临时排序"""
+    print("测试查询计划...")
+    db_path, _ = create_database(100)
+    conn = DatasetColumnStore(db_path).connect()
+    params = {'dataset_id': 1}
+    where_sql = "de.dataset_id = :dataset_id AND " + cursor_condition(encode_cursor('2025-05-05 08:00:00.000000', 10), params)
+    plan = ' '.join(row[3] for row in conn.execute(
+        "EXPLAIN QUERY PLAN " + PAGE_QUERY.format(where_sql=where_sql, order_sql=PAGE_ORDER_SQL) + " LIMIT 10",
+        params))
+    assert 'ix_dataset_entries_dataset_id_page' in plan and '<expr><?' in plan, plan
+    assert 'TEMP B-TREE' not in plan, plan
+    conn.close()
+    print("  通过")
+
+
+if __name__ == "__main__":
+    test_cursor_pages_cover_all_rows()
+    test_offset_pages_match_cursor_pages()
+    test_cursor_query_uses_index()
+    print("\n所有测试完成!")
@@ -0,0 +1,144 @@
+"""
+测试描述性统计
+
+与NumPy/pandas在同一数据上的结果比较：单个数据集、加权（频数权重按
+展开后的数据比较）和多个数据集合并；频数表被截断时不同值个数标明为估计值，
+不报告众数
+"""
+
+import numpy as np
+import pandas as pd
+
+from analysis_descriptive import describe_datasets, describe_variable
+from analysis_sketches import EXACT_LIMIT, FREQUENCY_CAPACITY
+from dataset_column_store import DatasetColumns
+
+NUMERIC_STATS = ['count', 'missing', 'mean', 'median', 'sd', 'variance', 'se', 'min', 'max',
+                 'range', 'q1', 'q3', 'iqr', 'sum', 'mode', 'distinct']
+
+
+def to_arrays(values):
+    """Python取值列表转换为(原始值object数组, float64数组)，非数值为NaN"""
+    raw = np.empty(len(values), dtype=object)
+    raw[:] = values
+    numeric = pd.to_numeric(pd.Series(raw), errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    return raw, numeric
+
+
+def expected_numeric(x):
+    """NumPy/pandas计算的参照值"""
+    q1, median, q3 = np.percentile(x, [25, 50, 75])
+    return {
+        'count': len(x), 'mean': np.mean(x), 'median': median, 'sd': np.std(x, ddof=1),
+        'variance': np.var(x, ddof=1), 'se': np.std(x, ddof=1) / np.sqrt(len(x)),
+        'min': np.min(x), 'max': np.max(x), 'range': np.ptp(x), 'q1': q1, 'q3': q3,
+        'iqr': q3 - q1, 'sum': np.sum(x), 'mode': pd.Series(x).mode().min(), 'distinct': len(np.unique(x))
+    }
+
+
+def assert_stats_close(stats, expected, rtol=1e-10):
+    for name, value in expected.items():
+        assert np.isclose(stats[name], value, rtol=rtol, atol=1e-12), (name, stats[name], value)
+
+
+def test_numeric_matches_numpy():
+    """数值变量：与NumPy/pandas一致，缺失值和非数值文本计入missing"""
+    print("测试数值变量...")
+    rng = np.random.default_rng(1)
+    x = np.round(rng.normal(50, 12, 3000), 1)
+    raw, numeric = to_arrays(list(x) + [None] * 40 + ['未知'] * 7)
+    result = describe_variable('x', raw, numeric, NUMERIC_STATS)
+    assert result['type'] == 'numeric'
+    stats = result['stats']
+    assert stats['missing'] == 7
+    assert stats['distinct_approximate'] is False
+    assert_stats_close(stats, expected_numeric(x))
+    print("  通过")
+
+
+def test_weighted_matches_expanded_data():
+    """整数频数权重：与把每个取值重复w次后的结果一致"""
+    print("测试加权统计...")
+    rng = np.random.default_rng(2)
+    x = rng.integers(0, 40, 500).astype(float)
+    w = rng.integers(1, 6, 500).astype(float)
+    raw, numeric = to_arrays(list(x))
+    stats = describe_variable('x', raw, numeric, NUMERIC_STATS, weights=w)['stats']
+    expanded = np.repeat(x, w.astype(int))
+    expected = expected_numeric(expanded)
+    expected['count'] = len(x)
+    expected.pop('distinct')
+    # 标准误按频数权重和计算
+    assert_stats_close(stats, expected)
+
+    # 文档中的例子：x=[1,2,3,4]，w=[1,1,1,5]时中位数为4
+    raw, numeric = to_arrays([1, 2, 3, 4])
+    stats = describe_variable('x', raw, numeric, ['median', 'q1', 'q3'], weights=np.array([1.0, 1, 1, 5]))['stats']
+    assert np.allclose([stats['q1'], stats['median'], stats['q3']],
+                       np.percentile([1, 2, 3, 4, 4, 4, 4, 4], [25, 50, 75]))
+    print("  通过")
+
+
+def test_merged_datasets_match_pooled_data():
+    """多个数据集合并后的结果与把数据放在一起计算的结果一致"""
+    print("测试多数据集合并...")
+    rng = np.random.default_rng(3)
+    parts = [np.round(rng.gamma(2.0, 10.0, n), 2) for n in (1200, 800, 3000)]
+    groups = [rng.choice(['A', 'B', 'C', None], len(part)) for part in parts]
+    datasets = {}
+    for dataset_id, (x, g) in enumerate(zip(parts, groups), start=1):
+        datasets[dataset_id] = DatasetColumns(dataset_id, np.arange(len(x)), {'x': list(x), 'g': list(g)},
+                                              {'x': 'number'})
+    total, results = describe_datasets(lambda dataset_id: datasets[dataset_id], list(datasets), ['x', 'g'],
+                                       NUMERIC_STATS)
+    pooled = np.concatenate(parts)
+    assert total == len(pooled)
+    # 合计不超过EXACT_LIMIT个取值，分位数是精确值
+    assert len(pooled) <= EXACT_LIMIT
+    assert_stats_close(results['x']['stats'], expected_numeric(pooled), rtol=1e-9)
+
+    labels = pd.Series(np.concatenate(groups)).dropna()
+    counts = labels.value_counts()
+    table = {row['value']: row for row in results['g']['frequencies']}
+    assert results['g']['categories'] == 3 and results['g']['categories_approximate'] is False
+    for label, count in counts.items():
+        assert table[label]['count'] == count
+        assert np.isclose(table[label]['percent'], count / len(labels) * 100)
+    print("  通过")
+
+
+def test_truncated_frequency_table():
+    """不同值超过频数表容量时，distinct是HyperLogLog估计值并标明，不报告众数"""
+    print("测试频数表截断...")
+    rng = np.random.default_rng(4)
+    n_distinct = FREQUENCY_CAPACITY * 4
+    x = np.concatenate([np.arange(n_distinct, dtype=float), np.full(5, 7.0)])
+    raw, numeric = to_arrays(list(rng.permutation(x)))
+    stats = describe_variable('x', raw, numeric, ['distinct', 'mode'])['stats']
+    assert stats['distinct_approximate'] is True
+    assert stats['mode'] is None
+    assert abs(stats['distinct'] - n_distinct) / n_distinct < 0.05
+
+    labels = np.array([f'编码{i}' for i in range(n_distinct)] + ['编码0'] * 3, dtype=object)
+    result = describe_variable('code', labels, np.full(len(labels), np.nan), ['count', 'distinct', 'mode'])
+    assert result['categories_approximate'] is True
+    assert result['stats']['distinct_approximate'] is True and result['stats']['mode'] is None
+    # 百分比以全部取值为分母
+    top = result['frequencies'][0]
+    assert top['value'] == '编码0' and np.isclose(top['percent'], 4 / len(labels) * 100)
+
+    # 容量以内时是精确值
+    small = x[:FREQUENCY_CAPACITY // 2]
+    raw, numeric = to_arrays(list(small) + [3.0])
+    stats = describe_variable('x', raw, numeric, ['distinct', 'mode'])['stats']
+    assert stats['distinct'] == len(small) and stats['distinct_approximate'] is False
+    assert stats['mode'] == 3.0
+    print("  通过")
+
+
+if __name__ == "__main__":
+    test_numeric_matches_numpy()
+    test_weighted_matches_expanded_data()
+    test_merged_datasets_match_pooled_data()
+    test_truncated_frequency_table()
+    print("\n所有测试完成!")
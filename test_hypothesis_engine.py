@@ -0,0 +1,185 @@
+"""
+测试假设检验引擎
+
+各检验的统计量和p值与scipy.stats逐个变量计算的结果比较。数据含缺失值、
+非数值文本和缺失的分组，多个变量一次检验
+"""
+
+import numpy as np
+from scipy import stats
+
+from analysis_hypothesis import run_hypothesis_test
+from dataset_column_store import DatasetColumns
+
+
+def make_columns(values, numeric_fields):
+    """由{字段: 取值列表}构造列式快照"""
+    n_rows = len(next(iter(values.values())))
+    return DatasetColumns(1, np.arange(1, n_rows + 1), values, {name: 'number' for name in numeric_fields})
+
+
+def clinical_columns(seed, group_labels, n_rows=240):
+    """三个数值变量（含缺失值和文本）和一个分组变量"""
+    rng = np.random.default_rng(seed)
+    group = list(rng.choice(group_labels + [None], n_rows, p=[0.95 / len(group_labels)] * len(group_labels) + [0.05]))
+    shift = {label: i for i, label in enumerate(group_labels)}
+    values = {'分组': group}
+    for name, scale in (('收缩压', 12.0), ('血糖', 1.5), ('评分', 3.0)):
+        column = []
+        for label in group:
+            x = 100 + shift.get(label, 0) * scale * 0.4 + rng.normal(0, scale)
+            if name == '评分':
+                x = float(round(x / 3))  # 整数评分，秩检验中有大量结
+            column.append(round(x, 1))
+        for i in rng.choice(n_rows, 12, replace=False):
+            column[i] = None if i % 2 else '未测'
+        values[name] = column
+    return values
+
+
+def group_samples(values, variable, group_labels):
+    """按组取出某变量的有效数值"""
+    samples = []
+    for label in group_labels:
+        samples.append(np.array([float(x) for x, g in zip(values[variable], values['分组'])
+                                 if g == label and isinstance(x, float)]))
+    return samples
+
+
+def test_independent_ttest():
+    """独立样本t检验（方差齐性与Welch校正、三种备择假设）与scipy.stats.ttest_ind一致"""
+    print("测试独立样本t检验...")
+    labels = ['对照组', '治疗组']
+    values = clinical_columns(1, labels)
+    columns = make_columns(values, ['收缩压', '血糖', '评分'])
+    for equal_var in (True, False):
+        for alternative in ('two-sided', 'greater', 'less'):
+            results = run_hypothesis_test(columns, 'ttest', ['收缩压', '血糖', '评分'], '分组',
+                                          alternative=alternative, equal_var=equal_var)
+            for result in results:
+                # 组按第一次出现的顺序排列
+                x, y = group_samples(values, result['variable_id'], [result['group1_name'], result['group2_name']])
+                expected = stats.ttest_ind(x, y, equal_var=equal_var, alternative=alternative)
+                assert np.isclose(result['statistic'], expected.statistic, rtol=1e-10)
+                assert np.isclose(result['p_value'], expected.pvalue, rtol=1e-8, atol=1e-300)
+                assert np.isclose(result['df'], expected.df, rtol=1e-10)
+                if alternative == 'two-sided':
+                    ci = expected.confidence_interval(0.95)
+                    assert np.allclose(result['confidence_interval'], [ci.low, ci.high], rtol=1e-9)
+    print("  通过")
+
+
+def test_paired_ttest():
+    """配对t检验与scipy.stats.ttest_rel一致（任一变量缺失的记录不参与）"""
+    print("测试配对t检验...")
+    rng = np.random.default_rng(2)
+    before = np.round(rng.normal(140, 15, 80), 1)
+    after = np.round(before - 5 + rng.normal(0, 8, 80), 1)
+    raw_before, raw_after = list(before), list(after)
+    raw_before[3] = None
+    raw_after[10] = ''
+    columns = make_columns({'治疗前': raw_before, '治疗后': raw_after}, ['治疗前', '治疗后'])
+    keep = np.ones(80, dtype=bool)
+    keep[[3, 10]] = False
+    for alternative in ('two-sided', 'greater'):
+        result = run_hypothesis_test(columns, 'paired_ttest', ['治疗前', '治疗后'], alternative=alternative)[0]
+        expected = stats.ttest_rel(before[keep], after[keep], alternative=alternative)
+        assert result['n'] == keep.sum()
+        assert np.isclose(result['statistic'], expected.statistic, rtol=1e-10)
+        assert np.isclose(result['p_value'], expected.pvalue, rtol=1e-8)
+    print("  通过")
+
+
+def test_anova_and_kruskal():
+    """方差分析与f_oneway一致，Kruskal-Wallis检验（含结）与scipy.stats.kruskal一致"""
+    print("测试方差分析和Kruskal-Wallis检验...")
+    labels = ['A', 'B', 'C', 'D']
+    values = clinical_columns(3, labels, n_rows=400)
+    columns = make_columns(values, ['收缩压', '血糖', '评分'])
+    for test_type, reference in (('anova', stats.f_oneway), ('kruskal', stats.kruskal)):
+        for result in run_hypothesis_test(columns, test_type, ['收缩压', '血糖', '评分'], '分组'):
+            expected = reference(*group_samples(values, result['variable_id'], labels))
+            assert np.isclose(result['statistic'], expected.statistic, rtol=1e-9), (test_type, result)
+            assert np.isclose(result['p_value'], expected.pvalue, rtol=1e-7, atol=1e-300), (test_type, result)
+    print("  通过")
+
+
+def test_rank_sum():
+    """Wilcoxon秩和检验：有结时与mannwhitneyu的正态近似一致，小样本无结时与精确分布一致"""
+    print("测试Wilcoxon秩和检验...")
+    labels = ['对照组', '治疗组']
+    values = clinical_columns(4, labels)
+    columns = make_columns(values, ['收缩压', '评分'])
+    for alternative in ('two-sided', 'greater', 'less'):
+        for result in run_hypothesis_test(columns, 'wilcoxon', ['收缩压', '评分'], '分组', alternative=alternative):
+            x, y = group_samples(values, result['variable_id'], [result['group1_name'], result['group2_name']])
+            expected = stats.mannwhitneyu(x, y, alternative=alternative, method='asymptotic')
+            assert result['method'] == 'asymptotic'
+            assert np.isclose(result['statistic'], expected.statistic)
+            assert np.isclose(result['p_value'], expected.pvalue, rtol=1e-8), (alternative, result)
+
+    small = {'分组': ['甲'] * 6 + ['乙'] * 7, 'x': [1.2, 3.4, 2.2, 5.1, 0.7, 4.4, 6.3, 7.7, 5.9, 8.1, 3.9, 6.6, 9.0]}
+    columns = make_columns(small, ['x'])
+    for alternative in ('two-sided', 'less'):
+        result = run_hypothesis_test(columns, 'wilcoxon', ['x'], '分组', alternative=alternative)[0]
+        expected = stats.mannwhitneyu(small['x'][:6], small['x'][6:], alternative=alternative, method='exact')
+        assert result['method'] == 'exact'
+        assert np.isclose(result['p_value'], expected.pvalue, rtol=1e-12)
+    print("  通过")
+
+
+def test_contingency_tests():
+    """卡方检验与chi2_contingency（不校正）一致，Fisher精确检验与fisher_exact一致"""
+    print("测试卡方检验和Fisher精确检验...")
+    rng = np.random.default_rng(5)
+    n_rows = 300
+    group = list(rng.choice(['男', '女', None], n_rows, p=[0.48, 0.48, 0.04]))
+    smoking = [str(rng.choice(['从不', '已戒', '现在'], p=[0.5, 0.2, 0.3] if g == '男' else [0.7, 0.2, 0.1]))
+               for g in group]
+    smoking[7] = ''
+    diabetes = [rng.choice(['是', '否'], p=[0.3, 0.7]) for _ in group]
+    columns = make_columns({'性别': group, '吸烟': smoking, '糖尿病': diabetes}, [])
+
+    # 参照列联表直接由原始数据交叉汇总（行列顺序不影响统计量）
+    pairs = [(g, s) for g, s in zip(group, smoking) if g and s]
+    table = stats.contingency.crosstab([g for g, _ in pairs], [s for _, s in pairs]).count
+    result = run_hypothesis_test(columns, 'chi2', ['吸烟'], '性别')[0]
+    expected = stats.chi2_contingency(table, correction=False)
+    assert np.array(result['contingency_table']['matrix']).sum() == len(pairs)
+    assert np.isclose(result['statistic'], expected.statistic, rtol=1e-12)
+    assert np.isclose(result['p_value'], expected.pvalue, rtol=1e-10)
+    assert result['df'] == expected.dof
+
+    for alternative in ('two-sided', 'greater', 'less'):
+        result = run_hypothesis_test(columns, 'fisher', ['糖尿病'], '性别', alternative=alternative)[0]
+        table = np.array(result['contingency_table']['matrix'])
+        expected = stats.fisher_exact(table, alternative=alternative)
+        assert np.isclose(result['p_value'], expected.pvalue, rtol=1e-12)
+        assert np.isclose(result['odds_ratio'], expected.statistic, rtol=1e-12)
+    print("  通过")
+
+
+def test_permutation_p_value():
+    """置换检验p值接近scipy.stats.permutation_test枚举全部分组得到的精确p值"""
+    print("测试置换检验p值...")
+    x = [4.1, 5.3, 6.0, 3.8, 5.9, 4.4, 5.0]
+    y = [6.2, 7.1, 5.8, 6.9, 7.4, 6.1]
+    columns = make_columns({'分组': ['甲'] * len(x) + ['乙'] * len(y), 'x': x + y}, ['x'])
+    result = run_hypothesis_test(columns, 'ttest', ['x'], '分组', n_resamples=20000,
+                                 resampling_method='permutation', seed=11)[0]
+    exact = stats.permutation_test((x, y), lambda a, b: stats.ttest_ind(a, b).statistic,
+                                   permutation_type='independent', n_resamples=np.inf).pvalue
+    # 20000次置换的标准误约为sqrt(p(1-p)/20000)
+    assert abs(result['resampling']['p_value'] - exact) < 4 * np.sqrt(exact * (1 - exact) / 20000) + 1e-4, \
+        (result['resampling']['p_value'], exact)
+    print("  通过")
+
+
+if __name__ == "__main__":
+    test_independent_ttest()
+    test_paired_ttest()
+    test_anova_and_kruskal()
+    test_rank_sum()
+    test_contingency_tests()
+    test_permutation_p_value()
+    print("\n所有测试完成!")
@@ -0,0 +1,145 @@
+"""
+测试后台导入任务的断点续传
+
+导入文件中间有一行无法导入（映射后没有数据），不跳过错误时任务失败，
+已提交的批次保留；设置skip_errors后继续导入，从最后提交的批次之后开始，
+不会重复写入。进程崩溃后长时间没有进度的任务标记为已中断，也可以继续。
+按主键更新时，继续导入不会把本次任务新增的记录当作已有记录
+"""
+
+import csv
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from dataset_import import IMPORT_BATCH_SIZE
+from import_jobs import ImportJobManager
+
+DATASET_ID = 1
+USER_ID = 1
+FIELD_MAPPING = {'编号': '编号', '收缩压': '收缩压'}
+
+
+def create_database(work_dir, existing=0):
+    """导入任务需要的表；existing > 0时数据集中已有编号1..existing的记录"""
+    db_path = os.path.join(work_dir, 'test.db')
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE dataset_entries (id INTEGER PRIMARY KEY, dataset_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+                                      data TEXT NOT NULL, created_at DATETIME, updated_at DATETIME);
+        CREATE TABLE dataset_versions (dataset_id INTEGER PRIMARY KEY, version INTEGER NOT NULL);
+        CREATE TABLE dataset_stats (dataset_id INTEGER PRIMARY KEY);
+        CREATE TABLE import_jobs (
+            id VARCHAR(32) PRIMARY KEY, dataset_id INTEGER NOT NULL, user_id INTEGER NOT NULL,
+            status VARCHAR(20), filename VARCHAR(255), file_path VARCHAR(500) NOT NULL,
+            file_ext VARCHAR(10) NOT NULL, owns_file BOOLEAN, options TEXT, total_rows INTEGER,
+            processed_rows INTEGER, inserted_rows INTEGER, updated_rows INTEGER, error_rows INTEGER,
+            max_existing_id INTEGER, errors TEXT, message TEXT, cancel_requested BOOLEAN,
+            created_at DATETIME, updated_at DATETIME, finished_at DATETIME);
+    """)
+    conn.executemany("INSERT INTO dataset_entries (dataset_id, user_id, data) VALUES (?, ?, ?)",
+                     [(DATASET_ID, USER_ID, json.dumps({'编号': str(i), '收缩压': '0'})) for i in range(1, existing + 1)])
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def write_csv(work_dir, numbers, bad_rows):
+    """第一列“备注”不导入；bad_rows中的数据行只有备注一列，映射后为空"""
+    path = os.path.join(work_dir, 'import.csv')
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['备注', '编号', '收缩压'])
+        for position, number in enumerate(numbers, start=1):
+            writer.writerow(['无效记录'] if position in bad_rows else ['', number, 100 + number % 50])
+    return path
+
+
+def wait(manager, job_id, timeout=60):
+    """等待任务结束"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job['status'] not in ('queued', 'running'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'导入任务未在{timeout}秒内结束')
+
+
+def imported_numbers(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return sorted(int(json.loads(data)['编号']) for (data,) in
+                      conn.execute("SELECT data FROM dataset_entries WHERE dataset_id = ?", (DATASET_ID,)))
+    finally:
+        conn.close()
+
+
+def test_resume_after_row_error():
+    """第1800行出错：已提交的前1000行保留；跳过错误继续后每条记录恰好导入一次"""
+    print("测试出错后继续导入...")
+    work_dir = tempfile.mkdtemp(prefix='import_jobs_test_')
+    db_path = create_database(work_dir)
+    path = write_csv(work_dir, range(1, 2501), bad_rows={1800})
+    manager = ImportJobManager(db_path, max_workers=1)
+
+    job = wait(manager, manager.create('job1', USER_ID, DATASET_ID, 'import.csv', path, 'csv',
+                                       {'field_mapping': FIELD_MAPPING})['id'])
+    assert job['status'] == 'failed' and '第 1800 行' in job['message'], job['message']
+    # 出错的批次整体回滚，进度停在最后提交的批次
+    assert job['processed_rows'] == IMPORT_BATCH_SIZE and job['inserted_rows'] == IMPORT_BATCH_SIZE
+    assert imported_numbers(db_path) == list(range(1, IMPORT_BATCH_SIZE + 1))
+
+    manager.resume('job1', skip_errors=True)
+    job = wait(manager, 'job1')
+    assert job['status'] == 'completed', job['message']
+    assert job['options']['skip_errors'] is True
+    assert (job['processed_rows'], job['inserted_rows'], job['error_rows']) == (2500, 2499, 1)
+    assert job['errors'] == [{'row': 1800, 'message': '映射后没有有效数据'}]
+    assert imported_numbers(db_path) == [n for n in range(1, 2501) if n != 1800]
+    print("  通过")
+
+
+def test_resume_interrupted_upsert():
+    """按主键更新的任务在进程崩溃后继续：已有记录更新一次，新记录插入一次"""
+    print("测试中断后继续按主键导入...")
+    work_dir = tempfile.mkdtemp(prefix='import_jobs_test_')
+    db_path = create_database(work_dir, existing=500)
+    # 编号251..500已存在，其余为新记录；第2500行（编号2750）出错使任务停在第2批之后
+    path = write_csv(work_dir, range(251, 3251), bad_rows={2500})
+    options = {'field_mapping': FIELD_MAPPING, 'update_existing': True, 'primary_key': '编号'}
+    manager = ImportJobManager(db_path, max_workers=1, stale_seconds=60)
+    job = wait(manager, manager.create('job2', USER_ID, DATASET_ID, 'import.csv', path, 'csv', options)['id'])
+    assert job['status'] == 'failed' and job['processed_rows'] == 2 * IMPORT_BATCH_SIZE
+    assert (job['updated_rows'], job['inserted_rows']) == (250, 2 * IMPORT_BATCH_SIZE - 250)
+
+    # 模拟进程崩溃：任务停在运行状态且长时间没有进度更新，新进程中的管理器接手
+    conn = sqlite3.connect(db_path)
+    conn.execute("UPDATE import_jobs SET status = 'running', updated_at = '2020-01-01 00:00:00.000000' "
+                 "WHERE id = 'job2'")
+    conn.commit()
+    conn.close()
+    manager = ImportJobManager(db_path, max_workers=1, stale_seconds=60)
+    assert manager.get('job2')['status'] == 'interrupted'
+
+    manager.resume('job2', skip_errors=True)
+    job = wait(manager, 'job2')
+    assert job['status'] == 'completed', job['message']
+    assert (job['updated_rows'], job['inserted_rows'], job['error_rows']) == (250, 2749, 1)
+    expected = list(range(1, 2750)) + list(range(2751, 3251))
+    assert imported_numbers(db_path) == expected
+
+    conn = sqlite3.connect(db_path)
+    pressures = {json.loads(data)['编号']: json.loads(data)['收缩压'] for (data,) in
+                 conn.execute("SELECT data FROM dataset_entries WHERE dataset_id = ?", (DATASET_ID,))}
+    conn.close()
+    assert pressures['100'] == '0' and pressures['300'] == str(100 + 300 % 50)
+    print("  通过")
+
+
+if __name__ == "__main__":
+    test_resume_after_row_error()
+    test_resume_interrupted_upsert()
+    print("\n所有测试完成!")
@@ -0,0 +1,223 @@
+"""
+共享进程池测试脚本
+
+按manage.sh的方式用 python app.py 启动服务，进程池的工作进程（forkserver/spawn）
+会以__mp_main__的名字重新导入app.py。检查批量导出和大样本重抽样确实在进程池中
+完成（重抽样结果与在当前进程中计算的相同），工作进程不会重复建表、创建默认用户
+或因导入app.py失败而使进程池损坏。
+服务使用临时目录中的新数据库，不影响instance目录下的数据
+"""
+
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+
+import numpy as np
+import requests
+
+import analysis_resampling
+from analysis_correlation import correlation_matrix
+from dataset_column_store import DatasetColumns
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+USERNAME = 'doctor'
+PASSWORD = 'doctor123'
+
+# 测试数据集的字段和记录数
+FIELDS = ['编号', '年龄', '收缩压', '舒张压']
+N_ROWS = 1000
+
+# 重抽样次数：次数×记录数×变量数超过PARALLEL_MIN_WORK，分批在进程池中计算
+N_RESAMPLES = 2000
+
+
+def free_port():
+    """取一个空闲端口"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(work_dir):
+    """在临时目录中用 python app.py 启动服务，返回(进程, 服务地址)"""
+    port = free_port()
+    os.makedirs(os.path.join(work_dir, 'instance'))
+    env = dict(
+        os.environ,
+        FLASK_RUN_PORT=str(port),
+        FLASK_RUN_HOST='127.0.0.1',
+        DATABASE_URI='sqlite:///' + os.path.join(work_dir, 'instance', 'zl_geniusmedvault.db'),
+        PROCESS_POOL_WORKERS='2'
+    )
+    log = open(os.path.join(work_dir, 'server.log'), 'w')
+    # 调试模式的重载器会再启动一个子进程，放在单独的进程组中以便一起结束
+    process = subprocess.Popen([sys.executable, APP_PATH], cwd=work_dir, env=env,
+                               stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            if requests.get(f'{base_url}/login', timeout=5).status_code == 200:
+                return process, base_url
+        except requests.ConnectionError:
+            pass
+        time.sleep(1)
+    stop_server(process)
+    print(server_log(work_dir))
+    raise RuntimeError('服务启动失败')
+
+
+def stop_server(process):
+    """结束服务及其重载器子进程"""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def server_log(work_dir):
+    with open(os.path.join(work_dir, 'server.log'), encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def login(base_url):
+    """以医生身份登录，返回(会话, CSRF令牌)"""
+    session = requests.Session()
+    response = session.get(f'{base_url}/login')
+    csrf_token = None
+    for line in response.text.splitlines():
+        if 'csrf_token' in line:
+            csrf_start = line.find('value="') + 7
+            csrf_end = line.find('"', csrf_start)
+            if csrf_start > 7 and csrf_end > csrf_start:
+                csrf_token = line[csrf_start:csrf_end]
+                break
+    assert csrf_token, '无法获取CSRF令牌'
+    response = session.post(f'{base_url}/login', data={
+        'csrf_token': csrf_token,
+        'username': USERNAME,
+        'password': PASSWORD,
+        'role': 'doctor'
+    })
+    assert response.status_code == 200 and '/doctor/' in response.url, '登录失败'
+    return session, csrf_token
+
+
+def create_datasets(work_dir, count, seed=0):
+    """直接在服务的数据库中写入测试数据集，返回{数据集ID: 记录列表}"""
+    rng = random.Random(seed)
+    custom_fields = json.dumps([{'name': name, 'type': 'number'} for name in FIELDS])
+    created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+    conn = sqlite3.connect(os.path.join(work_dir, 'instance', 'zl_geniusmedvault.db'))
+    try:
+        user_id = conn.execute("SELECT id FROM user WHERE username = ?", (USERNAME,)).fetchone()[0]
+        datasets = {}
+        for index in range(count):
+            cursor = conn.execute(
+                "INSERT INTO data_set (name, created_at, created_by, custom_fields, privacy_level) "
+                "VALUES (?, ?, ?, ?, 'private')",
+                (f'进程池测试数据集{index + 1}', created_at, user_id, custom_fields)
+            )
+            records = []
+            for row in range(N_ROWS):
+                age = rng.randint(20, 80)
+                systolic = round(90 + 0.6 * age + rng.gauss(0, 12), 1)
+                records.append({'编号': row + 1, '年龄': age, '收缩压': systolic,
+                                '舒张压': round(0.5 * systolic + rng.gauss(10, 6), 1)})
+            conn.executemany(
+                "INSERT INTO dataset_entries (dataset_id, user_id, data, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(cursor.lastrowid, user_id, json.dumps(record, ensure_ascii=False), created_at, created_at)
+                 for record in records]
+            )
+            datasets[cursor.lastrowid] = records
+        conn.commit()
+        return datasets
+    finally:
+        conn.close()
+
+
+def test_batch_export(base_url, session, csrf_token, datasets):
+    """批量导出：各数据集在进程池中生成，zip中每个数据集的记录完整"""
+    print("测试批量导出（进程池）...")
+    response = session.post(f'{base_url}/api/datasets/batch_export',
+                            json={'datasets': list(datasets), 'format': 'csv', 'as_zip': True},
+                            headers={'X-CSRFToken': csrf_token})
+    assert response.status_code == 200, response.text[:500]
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zipf:
+        names = zipf.namelist()
+        assert len(names) == len(datasets), names
+        exported = []
+        for name in names:
+            text = zipf.read(name).decode('utf-8-sig')
+            rows = list(csv.DictReader(io.StringIO(text)))
+            exported.append(sorted(int(row['编号']) for row in rows))
+    for ids in exported:
+        assert ids == list(range(1, N_ROWS + 1)), f'导出记录不完整: {len(ids)}行'
+    print(f"  zip包含{len(names)}个文件，每个{N_ROWS}条记录")
+
+
+def test_bootstrap_correlation(base_url, session, dataset_id, records):
+    """相关系数的自助法置信区间：进程池中计算的结果与在当前进程中计算的相同"""
+    print("测试相关系数自助法置信区间（进程池）...")
+    variables = FIELDS[1:]
+    assert N_RESAMPLES * N_ROWS * len(variables) >= analysis_resampling.PARALLEL_MIN_WORK
+    response = session.post(f'{base_url}/api/analysis/correlation', json={
+        'dataset_id': dataset_id,
+        'correlation_type': 'pearson',
+        'variables': variables,
+        'significance_test': True,
+        'n_resamples': N_RESAMPLES,
+        'seed': 7
+    })
+    result = response.json()
+    assert response.status_code == 200 and result['success'], result
+
+    columns = DatasetColumns(dataset_id, np.arange(1, N_ROWS + 1),
+                             {name: [record[name] for record in records] for name in variables})
+    analysis_resampling.PARALLEL_MIN_WORK = float('inf')
+    expected = correlation_matrix(columns, variables, 'pearson', n_resamples=N_RESAMPLES, seed=7)
+    for key in ('ci_lower', 'ci_upper', 'std_error'):
+        assert np.allclose(np.array(result['resampling'][key], dtype=float),
+                           np.array(expected['resampling'][key], dtype=float), rtol=1e-12, atol=0), key
+    print(f"  {N_RESAMPLES}次自助抽样，r(年龄, 收缩压) = {result['correlation_matrix'][0][1]:.4f}，"
+          f"95%CI [{result['resampling']['ci_lower'][0][1]:.4f}, {result['resampling']['ci_upper'][0][1]:.4f}]")
+
+
+def main():
+    work_dir = tempfile.mkdtemp(prefix='process_pool_test_')
+    process, base_url = start_server(work_dir)
+    try:
+        session, csrf_token = login(base_url)
+        datasets = create_datasets(work_dir, 3)
+        test_batch_export(base_url, session, csrf_token, datasets)
+        dataset_id = next(iter(datasets))
+        test_bootstrap_correlation(base_url, session, dataset_id, datasets[dataset_id])
+
+        # 进程池损坏时重抽样会退回当前进程计算并给出警告，这里要求确实在进程池中完成
+        log = server_log(work_dir)
+        assert 'BrokenProcessPool' not in log and 'Traceback' not in log, log[-3000:]
+        assert '进程池不可用' not in log, log[-3000:]
+        print("\n全部测试通过")
+    finally:
+        stop_server(process)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
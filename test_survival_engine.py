@@ -0,0 +1,123 @@
+"""
+测试Kaplan-Meier与Log-rank检验引擎
+
+与lifelines在同一份随访数据上的结果比较：生存曲线、风险集、Greenwood
+置信区间、k组Log-rank检验和Fleming-Harrington加权检验。随访时间按天取整，
+同一天有多个事件，也有事件与删失同时发生
+"""
+
+import numpy as np
+import pandas as pd
+from lifelines import KaplanMeierFitter
+from lifelines.statistics import logrank_test, multivariate_logrank_test
+
+from analysis_survival import kaplan_meier, kaplan_meier_grouped
+
+
+def follow_up(n_per_group, hazards, seed):
+    """各组指数分布的生存时间，均匀分布的删失时间，按天取整"""
+    rng = np.random.default_rng(seed)
+    times, events, codes = [], [], []
+    for g, (n, hazard) in enumerate(zip(n_per_group, hazards)):
+        survival = rng.exponential(1 / hazard, n)
+        censoring = rng.uniform(30, 900, n)
+        times.append(np.ceil(np.minimum(survival, censoring)))
+        events.append((survival <= censoring).astype(np.float64))
+        codes.append(np.full(n, g, dtype=np.int64))
+    return np.concatenate(times), np.concatenate(events), np.concatenate(codes)
+
+
+def interpolated_median(frame):
+    """按analysis_survival的约定由lifelines生存曲线计算中位生存时间（与前一个事件时间点线性插值）"""
+    times = frame.index.to_numpy()
+    survival = frame.iloc[:, 0].to_numpy()
+    below = np.flatnonzero(survival <= 0.5)
+    if len(below) == 0:
+        return None
+    i = below[0]
+    return times[i - 1] + (times[i] - times[i - 1]) * (0.5 - survival[i - 1]) / (survival[i] - survival[i - 1])
+
+
+def assert_curve_matches(result, time, event):
+    kmf = KaplanMeierFitter().fit(time, event, alpha=0.05)
+    curve = pd.DataFrame(result['survival_curve']).set_index('time')
+    event_times = kmf.event_table.index[kmf.event_table['observed'] > 0]
+    assert np.array_equal(curve.index.to_numpy(), event_times.to_numpy())
+    assert np.allclose(curve['survival'], kmf.survival_function_.loc[event_times, 'KM_estimate'], rtol=1e-12)
+    assert np.array_equal(curve['at_risk'], kmf.event_table.loc[event_times, 'at_risk'])
+    ci = kmf.confidence_interval_survival_function_.loc[event_times]
+    defined = curve['ci_lower'].notna() & (curve['survival'] > 0)
+    assert np.allclose(curve.loc[defined, 'ci_lower'], ci.iloc[:, 0][defined.to_numpy()], rtol=1e-9)
+    assert np.allclose(curve.loc[defined, 'ci_upper'], ci.iloc[:, 1][defined.to_numpy()], rtol=1e-9)
+    expected_median = interpolated_median(kmf.survival_function_.loc[event_times])
+    assert (result['median_survival'] is None and expected_median is None) or \
+        np.isclose(result['median_survival'], expected_median)
+
+
+def test_kaplan_meier_matches_lifelines():
+    """单组生存曲线、风险集、log(-log)置信区间与KaplanMeierFitter一致"""
+    print("测试Kaplan-Meier曲线...")
+    time, event, _ = follow_up([600], [1 / 300], seed=1)
+    result = kaplan_meier(time, event)
+    assert result['total_events'] == event.sum() and result['total_subjects'] == len(time)
+    assert_curve_matches(result, time, event)
+    print("  通过")
+
+
+def test_grouped_curves_and_logrank():
+    """分组曲线各自与KaplanMeierFitter一致，k组Log-rank检验与multivariate_logrank_test一致"""
+    print("测试分组曲线和Log-rank检验...")
+    time, event, codes = follow_up([250, 300, 200], [1 / 400, 1 / 300, 1 / 250], seed=2)
+    names = ['低危', '中危', '高危']
+    result = kaplan_meier_grouped(time, event, codes, names)
+    for g, name in enumerate(names):
+        rows = codes == g
+        assert_curve_matches(result['group_results'][name], time[rows], event[rows])
+
+    expected = multivariate_logrank_test(time, codes, event)
+    comparison = result['comparison']
+    assert comparison['df'] == 2
+    assert np.isclose(comparison['statistic'], expected.test_statistic, rtol=1e-9)
+    assert np.isclose(comparison['p_value'], expected.p_value, rtol=1e-7)
+    assert np.isclose(sum(comparison['observed'].values()), event.sum())
+    assert np.isclose(sum(comparison['expected'].values()), event.sum())
+    print("  通过")
+
+
+def test_fleming_harrington():
+    """两组Fleming-Harrington加权检验与lifelines的fleming-harrington权重一致"""
+    print("测试Fleming-Harrington加权检验...")
+    time, event, codes = follow_up([300, 300], [1 / 350, 1 / 250], seed=3)
+    for rho, gamma in ((1.0, 0.0), (0.0, 1.0), (1.0, 1.0)):
+        comparison = kaplan_meier_grouped(time, event, codes, ['A', 'B'], rho=rho, gamma=gamma)['comparison']
+        rows = codes == 0
+        expected = logrank_test(time[rows], time[~rows], event[rows], event[~rows],
+                                weightings='fleming-harrington', p=rho, q=gamma)
+        assert comparison['method'] == 'fleming_harrington'
+        assert np.isclose(comparison['statistic'], expected.test_statistic, rtol=1e-8), (rho, gamma)
+        assert np.isclose(comparison['p_value'], expected.p_value, rtol=1e-7), (rho, gamma)
+    print("  通过")
+
+
+def test_single_stratum_equals_unstratified():
+    """只有一层的分层检验与不分层相同；各层组成相同时分层统计量与逐层得分相加一致"""
+    print("测试分层Log-rank检验...")
+    time, event, codes = follow_up([200, 200], [1 / 300, 1 / 200], seed=4)
+    plain = kaplan_meier_grouped(time, event, codes, ['A', 'B'])['comparison']
+    one_layer = kaplan_meier_grouped(time, event, codes, ['A', 'B'], strata=np.zeros(len(time)))['comparison']
+    assert np.isclose(plain['statistic'], one_layer['statistic'], rtol=1e-12)
+
+    # 把数据复制一份作为第二层：得分和方差都加倍，统计量加倍
+    doubled = kaplan_meier_grouped(np.concatenate([time, time]), np.concatenate([event, event]),
+                                   np.concatenate([codes, codes]), ['A', 'B'],
+                                   strata=np.repeat([0, 1], len(time)))['comparison']
+    assert np.isclose(doubled['statistic'], 2 * plain['statistic'], rtol=1e-10)
+    print("  通过")
+
+
+if __name__ == "__main__":
+    test_kaplan_meier_matches_lifelines()
+    test_grouped_curves_and_logrank()
+    test_fleming_harrington()
+    test_single_stratum_equals_unstratified()
+    print("\n所有测试完成!")
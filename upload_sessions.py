@@ -0,0 +1,263 @@
+"""
+分块上传模块
+
+大文件（如数GB的EMR导出文件）按块上传：先创建上传会话，再逐块上传，
+每块可以重传、乱序上传，连接中断后查询已收到的块继续上传；全部上传后
+合并并校验SHA-256，合并后的文件直接用于数据导入和导入预览。
+会话信息保存在磁盘上，多个工作进程之间共享
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+
+# 默认块大小和允许的最大块大小
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+
+# 读写文件时的缓冲区大小
+COPY_BUFFER_SIZE = 1024 * 1024
+
+_UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class UploadSessionManager:
+    """分块上传会话管理器
+
+    Args:
+        upload_dir: 保存上传块和合并文件的目录
+        ttl_seconds: 会话最后一次更新后的保留时间（秒）
+    """
+
+    def __init__(self, upload_dir, ttl_seconds=86400):
+        self.upload_dir = upload_dir
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(upload_dir, exist_ok=True)
+        self.purge_expired()
+
+    def create(self, user_id, filename, total_size, chunk_size=None, checksum=None):
+        """创建上传会话
+
+        Args:
+            user_id: 上传用户ID
+            filename: 原始文件名
+            total_size: 文件总字节数
+            chunk_size: 块大小（字节），最后一块可以较小
+            checksum: 整个文件的SHA-256（十六进制），合并时校验
+
+        Returns:
+            dict: 会话信息
+        """
+        self.purge_expired()
+        total_size = int(total_size)
+        chunk_size = int(chunk_size or DEFAULT_CHUNK_SIZE)
+        if total_size <= 0:
+            raise ValueError('文件大小无效')
+        if chunk_size <= 0 or chunk_size > MAX_CHUNK_SIZE:
+            raise ValueError(f'块大小必须在1到{MAX_CHUNK_SIZE}字节之间')
+        if checksum and not re.match(r'^[0-9a-fA-F]{64}$', checksum):
+            raise ValueError('校验值必须是SHA-256十六进制字符串')
+
+        upload_id = uuid.uuid4().hex
+        now = time.time()
+        upload = {
+            'id': upload_id,
+            'user_id': user_id,
+            'filename': filename,
+            'total_size': total_size,
+            'chunk_size': chunk_size,
+            'total_chunks': (total_size + chunk_size - 1) // chunk_size,
+            'checksum': checksum.lower() if checksum else None,
+            'status': 'uploading',
+            'sha256': None,
+            'created_at': now,
+            'updated_at': now,
+        }
+        os.makedirs(self._session_dir(upload_id))
+        self._write_meta(upload)
+        return upload
+
+    def get(self, upload_id):
+        """获取会话信息，不存在或已过期时返回None"""
+        if not upload_id or not _UPLOAD_ID_PATTERN.match(upload_id):
+            return None
+        try:
+            with open(self._meta_path(upload_id), 'r', encoding='utf-8') as f:
+                upload = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if upload['updated_at'] + self.ttl_seconds <= time.time():
+            self.delete(upload_id)
+            return None
+        return upload
+
+    def expected_chunk_size(self, upload, index):
+        """第index块（从0开始）应有的字节数"""
+        if index == upload['total_chunks'] - 1:
+            return upload['total_size'] - upload['chunk_size'] * index
+        return upload['chunk_size']
+
+    def save_chunk(self, upload, index, stream, checksum=None):
+        """保存一个块，同一块重复上传时覆盖
+
+        Args:
+            upload: 会话信息
+            index: 块序号（从0开始）
+            stream: 块数据的二进制流
+            checksum: 该块的SHA-256（十六进制），提供时校验
+
+        Returns:
+            dict: 会话状态
+        """
+        if upload['status'] != 'uploading':
+            raise ValueError('上传已完成，不能再上传数据块')
+        if index < 0 or index >= upload['total_chunks']:
+            raise ValueError(f"块序号必须在0到{upload['total_chunks'] - 1}之间")
+
+        expected_size = self.expected_chunk_size(upload, index)
+        part_path = self._part_path(upload['id'], index)
+        temp_path = f"{part_path}.{uuid.uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            with open(temp_path, 'wb') as f:
+                while True:
+                    data = stream.read(COPY_BUFFER_SIZE)
+                    if not data:
+                        break
+                    size += len(data)
+                    if size > expected_size:
+                        raise ValueError(f'第{index}块超过应有的{expected_size}字节')
+                    digest.update(data)
+                    f.write(data)
+            if size != expected_size:
+                raise ValueError(f'第{index}块大小为{size}字节，应为{expected_size}字节')
+            if checksum and digest.hexdigest() != checksum.lower():
+                raise ValueError(f'第{index}块校验失败')
+            os.replace(temp_path, part_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        upload['updated_at'] = time.time()
+        self._write_meta(upload)
+        return self.status(upload)
+
+    def received_chunks(self, upload):
+        """已收到的块序号列表"""
+        received = []
+        for name in os.listdir(self._session_dir(upload['id'])):
+            if name.endswith('.part'):
+                received.append(int(name[:-len('.part')]))
+        return sorted(received)
+
+    def status(self, upload):
+        """会话状态：已收到和缺少的块"""
+        info = {key: upload[key] for key in ('id', 'filename', 'total_size', 'chunk_size',
+                                             'total_chunks', 'status', 'sha256')}
+        if upload['status'] == 'uploading':
+            received = self.received_chunks(upload)
+            received_set = set(received)
+            info['received_chunks'] = received
+            info['missing_chunks'] = [i for i in range(upload['total_chunks']) if i not in received_set]
+        else:
+            info['received_chunks'] = list(range(upload['total_chunks']))
+            info['missing_chunks'] = []
+        return info
+
+    def finalize(self, upload):
+        """合并所有块并校验整个文件的SHA-256
+
+        Returns:
+            dict: 会话状态
+        """
+        if upload['status'] == 'completed':
+            return self.status(upload)
+
+        missing = self.status(upload)['missing_chunks']
+        if missing:
+            raise ValueError(f'还有{len(missing)}个数据块未上传')
+
+        data_path = self.file_path(upload)
+        temp_path = f"{data_path}.{uuid.uuid4().hex}.tmp"
+        digest = hashlib.sha256()
+        try:
+            with open(temp_path, 'wb') as output:
+                for index in range(upload['total_chunks']):
+                    with open(self._part_path(upload['id'], index), 'rb') as part:
+                        while True:
+                            data = part.read(COPY_BUFFER_SIZE)
+                            if not data:
+                                break
+                            digest.update(data)
+                            output.write(data)
+            sha256 = digest.hexdigest()
+            if upload['checksum'] and sha256 != upload['checksum']:
+                raise ValueError('文件校验失败，请重新上传')
+            os.replace(temp_path, data_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+        for index in range(upload['total_chunks']):
+            try:
+                os.remove(self._part_path(upload['id'], index))
+            except OSError:
+                pass
+
+        upload['status'] = 'completed'
+        upload['sha256'] = sha256
+        upload['updated_at'] = time.time()
+        self._write_meta(upload)
+        return self.status(upload)
+
+    def file_path(self, upload):
+        """合并后文件的路径"""
+        ext = os.path.splitext(upload['filename'])[1].lower()
+        return os.path.join(self._session_dir(upload['id']), f"data{ext}")
+
+    def open(self, upload):
+        """打开合并后的文件（二进制只读）"""
+        if upload['status'] != 'completed':
+            raise ValueError('文件尚未上传完成')
+        return open(self.file_path(upload), 'rb')
+
+    def delete(self, upload_id):
+        """删除会话及其文件"""
+        if upload_id and _UPLOAD_ID_PATTERN.match(upload_id):
+            shutil.rmtree(self._session_dir(upload_id), ignore_errors=True)
+
+    def purge_expired(self):
+        """删除过期的会话"""
+        cutoff = time.time() - self.ttl_seconds
+        for name in os.listdir(self.upload_dir):
+            if not _UPLOAD_ID_PATTERN.match(name):
+                continue
+            try:
+                with open(self._meta_path(name), 'r', encoding='utf-8') as f:
+                    updated_at = json.load(f)['updated_at']
+            except (OSError, ValueError, KeyError):
+                updated_at = os.path.getmtime(self._session_dir(name))
+            if updated_at < cutoff:
+                self.delete(name)
+
+    def _session_dir(self, upload_id):
+        return os.path.join(self.upload_dir, upload_id)
+
+    def _meta_path(self, upload_id):
+        return os.path.join(self._session_dir(upload_id), 'meta.json')
+
+    def _part_path(self, upload_id, index):
+        return os.path.join(self._session_dir(upload_id), f"{index}.part")
+
+    def _write_meta(self, upload):
+        path = self._meta_path(upload['id'])
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(upload, f, ensure_ascii=False)
+        os.replace(temp_path, path)